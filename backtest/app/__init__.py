@@ -45,6 +45,9 @@ def create_app(config_name):
             init_scheduler()
             # Initialize Python packages cache
             refresh_packages_cache()
+        if app.config.get("BACKTEST_AUTO_RESUME", True):
+            from .api.backtest_api import resume_interrupted_jobs
+            resume_interrupted_jobs(app)
     except Exception:
         app.logger.exception("failed to initialize app")
 
@@ -14,15 +14,18 @@ from werkzeug.exceptions import HTTPException
 
 from app.auth import auth_required
 from app.backtest.services.runner import (
+    RESULT_STREAM_DIRNAME,
     RQALPHA_CANCELLED_EXIT_CODE,
     StrategyReferencedError,
     StrategyRenameConflictError,
     StrategyRenameCycleError,
+    acquire_job_lock,
     build_config_yaml,
     build_run_fingerprint,
     bind_run_fingerprint,
     clear_cancel_request,
     compile_strategy_debug,
+    current_bundle_version,
     delete_job,
     delete_strategy_cascade,
     get_strategy_rename_map,
@@ -36,10 +39,16 @@ from app.backtest.services.runner import (
     load_strategy_metadata,
     load_strategy,
     locate_job_dir,
+    list_interrupted_jobs,
     list_strategy_jobs,
+    prepare_job_rerun,
     read_status,
+    release_job_lock,
     rename_strategy,
+    request_job_cancel,
     normalize_strategy_id,
+    pin_bundle_snapshot,
+    release_bundle_snapshot,
     resolve_current_strategy_id,
     run_rqalpha,
     save_strategy,
@@ -49,6 +58,15 @@ from app.backtest.services.runner import (
     write_status,
 )
 from app.backtest.services.extractor import extract_result
+from app.backtest.services.recost import (
+    COST_FIELDS,
+    benchmark_nav,
+    job_costs,
+    load_job_config,
+    load_job_result,
+    recost,
+)
+from app.backtest.mods.result_stream.stream import TRADE_COLUMNS, read_equity, read_summary, read_trades
 
 bp_backtest = Blueprint("bp_backtest", __name__, url_prefix="/api/backtest")
 
@@ -73,6 +91,7 @@ _DEFAULT_ERROR_MESSAGES = {
     500: "internal server error",
 }
 _DATE_FMT = "%Y-%m-%d"
+_RUN_ENGINES = {"rqalpha", "vector"}
 
 
 def _error_response(http_status: int, code: str, message: str, **extra):
@@ -241,6 +260,15 @@ def _validate_run_request(data: dict) -> dict:
         allowed = ", ".join(sorted(allowed_frequencies))
         raise ValueError(f"frequency must be one of: {allowed}")
 
+    engine_raw = data.get("engine", "rqalpha")
+    if not isinstance(engine_raw, str) or not engine_raw.strip():
+        raise ValueError("engine must be a non-empty string")
+    engine = engine_raw.strip().lower()
+    if engine not in _RUN_ENGINES:
+        raise ValueError(f"engine must be one of: {', '.join(sorted(_RUN_ENGINES))}")
+    if engine == "vector" and frequency != "1d":
+        raise ValueError("engine=vector only supports frequency 1d")
+
     return {
         "strategy_id": strategy_id,
         "start_date": start_date,
@@ -248,6 +276,7 @@ def _validate_run_request(data: dict) -> dict:
         "cash": cash,
         "benchmark": benchmark,
         "frequency": frequency,
+        "engine": engine,
     }
 
 
@@ -688,17 +717,17 @@ def api_compile_strategy(strategy_id: str):
     return jsonify(result), http_status
 
 
-def _run_job(app, job_id: str, job_dir: Path) -> None:
+def _run_job(app, job_id: str, job_dir: Path, engine: str = "rqalpha", lock=None) -> None:
     with app.app_context():
         try:
-            if is_cancel_requested(job_id):
+            if is_cancel_requested(job_dir):
                 write_status(job_dir, "CANCELLED", "JOB_CANCELLED", "job cancelled by user")
                 return
 
             write_status(job_dir, "RUNNING")
-            return_code = run_rqalpha(job_id, job_dir)
+            return_code = run_rqalpha(job_id, job_dir, engine=engine, lock=lock)
 
-            if return_code == RQALPHA_CANCELLED_EXIT_CODE or is_cancel_requested(job_id):
+            if return_code == RQALPHA_CANCELLED_EXIT_CODE or is_cancel_requested(job_dir):
                 write_status(job_dir, "CANCELLED", "JOB_CANCELLED", "job cancelled by user")
                 return
 
@@ -711,6 +740,11 @@ def _run_job(app, job_id: str, job_dir: Path) -> None:
                 )
                 return
 
+            if read_summary(job_dir / RESULT_STREAM_DIRNAME) is not None:
+                # the stream is the result; nothing to extract
+                write_status(job_dir, "FINISHED")
+                return
+
             result_pkl = job_dir / "result.pkl"
             if not result_pkl.exists():
                 write_status(
@@ -739,7 +773,9 @@ def _run_job(app, job_id: str, job_dir: Path) -> None:
                 f"{type(exc).__name__}: {exc}",
             )
         finally:
-            clear_cancel_request(job_id)
+            clear_cancel_request(job_dir)
+            release_bundle_snapshot(job_id)
+            release_job_lock(lock)
 
 @bp_backtest.post("/run")
 @auth_required
@@ -756,6 +792,7 @@ def api_run_backtest():
     cash = normalized["cash"]
     benchmark = normalized["benchmark"]
     frequency = normalized["frequency"]
+    engine = normalized["engine"]
 
     try:
         strategy_id = resolve_current_strategy_id(strategy_id)
@@ -768,15 +805,18 @@ def api_run_backtest():
         return _error_response(404, "NOT_FOUND", "strategy not found")
     code_sha256 = hashlib.sha256(code.encode("utf-8")).hexdigest()
 
-    run_fingerprint = build_run_fingerprint(
-        strategy_id=strategy_id,
-        start_date=start_date,
-        end_date=end_date,
-        cash=cash,
-        benchmark=benchmark,
-        frequency=frequency,
-        code=code,
-    )
+    fingerprint_fields = {
+        "strategy_id": strategy_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "cash": cash,
+        "benchmark": benchmark,
+        "frequency": frequency,
+        "code": code,
+        "engine": engine,
+    }
+    bundle_version = current_bundle_version()
+    run_fingerprint = build_run_fingerprint(**fingerprint_fields, bundle_version=bundle_version)
     idempotency_window_seconds = int(current_app.config.get("BACKTEST_IDEMPOTENCY_WINDOW_SECONDS", 30))
     reusable_job_id = find_reusable_job_id(run_fingerprint, idempotency_window_seconds)
     if reusable_job_id:
@@ -788,9 +828,16 @@ def api_run_backtest():
         current_app.logger.warning("cleanup_old_runs failed: %s", exc)
 
     job_id, job_dir = create_job_dir()
+    lock = acquire_job_lock(job_dir)
 
     (job_dir / "strategy.py").write_text(code, encoding="utf-8")
 
+    # Pin the bundle snapshot so bundle updates cannot change data under the job
+    data_bundle_path, pinned_version = pin_bundle_snapshot(job_id, bundle_version)
+    if pinned_version != bundle_version:
+        bundle_version = pinned_version
+        run_fingerprint = build_run_fingerprint(**fingerprint_fields, bundle_version=bundle_version)
+
     cfg = build_config_yaml(
         start_date=start_date,
         end_date=end_date,
@@ -798,6 +845,8 @@ def api_run_backtest():
         benchmark=benchmark,
         frequency=frequency,
         output_file=str((job_dir / "result.pkl").resolve()),
+        data_bundle_path=data_bundle_path,
+        engine=engine,
     )
     (job_dir / "config.yml").write_text(cfg, encoding="utf-8")
     status_payload = write_status(job_dir, "QUEUED")
@@ -810,6 +859,8 @@ def api_run_backtest():
         benchmark=benchmark,
         frequency=frequency,
         code_sha256=code_sha256,
+        bundle_version=bundle_version,
+        engine=engine,
     )
     update_job_index(
         job_id,
@@ -823,17 +874,92 @@ def api_run_backtest():
             "cash": cash,
             "benchmark": benchmark,
             "frequency": frequency,
+            "engine": engine,
         },
         error=None,
     )
     bind_run_fingerprint(run_fingerprint, job_id)
 
     app = current_app._get_current_object()
-    thread = threading.Thread(target=_run_job, args=(app, job_id, job_dir), daemon=True)
+    thread = threading.Thread(target=_run_job, args=(app, job_id, job_dir, engine, lock), daemon=True)
     thread.start()
 
     return jsonify({"job_id": job_id})
 
+
+@bp_backtest.post("/jobs/<job_id>/continue")
+@auth_required
+def api_continue_job(job_id: str):
+    """Extend a finished job to a later end_date from its last checkpoint.
+
+    The job is rerun in place on the current bundle snapshot, starting on the
+    trading day after the checkpoint; its result covers the whole range again.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        end_date = _parse_date_arg("end_date", data.get("end_date"))
+    except ValueError as exc:
+        return _error_response(400, "INVALID_ARGUMENT", str(exc))
+
+    job_dir = locate_job_dir(job_id)
+    if job_dir is None:
+        return _error_response(404, "NOT_FOUND", "job not found")
+    try:
+        status = read_status(job_dir).get("status")
+    except (FileNotFoundError, OSError, ValueError):
+        return _error_response(404, "STATUS_NOT_FOUND", "status not found")
+    if status != "FINISHED":
+        return _error_response(409, "CONFLICT", "only finished jobs can be continued")
+
+    lock = acquire_job_lock(job_dir)
+    if lock is None:
+        return _error_response(409, "CONFLICT", "job is running")
+    # a cancel that arrived after the previous run finished does not apply to this one
+    clear_cancel_request(job_dir)
+    try:
+        rerun = prepare_job_rerun(job_id, job_dir, end_date=end_date)
+    except ValueError as exc:
+        release_job_lock(lock)
+        return _error_response(400, "INVALID_ARGUMENT", str(exc))
+    except FileNotFoundError:
+        release_job_lock(lock)
+        return _error_response(409, "CONFLICT", "job has no checkpoint to continue from")
+    write_status(job_dir, "QUEUED")
+
+    app = current_app._get_current_object()
+    thread = threading.Thread(target=_run_job, args=(app, job_id, job_dir, rerun["engine"], lock), daemon=True)
+    thread.start()
+
+    return jsonify({"job_id": job_id, "resume_from": rerun["resume_from"], "end_date": rerun["end_date"]})
+
+
+def resume_interrupted_jobs(app) -> list[str]:
+    """Rerun the jobs a previous process left QUEUED or RUNNING, from their last checkpoint.
+
+    Jobs still locked by a live run (another worker, or an rqalpha process that
+    outlived its parent) are left alone. Returns the ids of the resumed jobs.
+    """
+    resumed = []
+    with app.app_context():
+        for job_id, job_dir in list_interrupted_jobs():
+            lock = acquire_job_lock(job_dir)
+            if lock is None:
+                continue
+            try:
+                rerun = prepare_job_rerun(job_id, job_dir)
+            except Exception as exc:
+                release_job_lock(lock)
+                write_status(job_dir, "FAILED", "RESUME_FAILED", f"{type(exc).__name__}: {exc}")
+                continue
+            write_status(job_dir, "QUEUED")
+            app.logger.info("resuming interrupted job %s from checkpoint %s", job_id, rerun["resume_from"])
+            thread = threading.Thread(
+                target=_run_job, args=(app, job_id, job_dir, rerun["engine"], lock), daemon=True
+            )
+            thread.start()
+            resumed.append(job_id)
+    return resumed
+
 @bp_backtest.get("/jobs/<job_id>")
 @auth_required
 def api_job_status(job_id: str):
@@ -917,6 +1043,89 @@ def api_job_progress(job_id: str):
     })
 
 
+def _job_dir_and_status(job_id: str):
+    job_dir = locate_job_dir(job_id)
+    if job_dir is None:
+        return None, None, _error_response(404, "NOT_FOUND", "not found")
+    try:
+        status_payload = read_status(job_dir)
+    except (FileNotFoundError, OSError, ValueError):
+        return None, None, _error_response(404, "STATUS_NOT_FOUND", "status not found")
+    return job_dir, status_payload.get("status"), None
+
+
+@bp_backtest.get("/jobs/<job_id>/live/equity")
+@auth_required
+def api_job_live_equity(job_id: str):
+    """Equity curve written so far by a running (or finished) rqalpha job.
+
+    ``offset`` skips the points already fetched; ``next_offset`` is the
+    offset of the next poll.
+    """
+    job_dir, status, error = _job_dir_and_status(job_id)
+    if error is not None:
+        return error
+    try:
+        offset = _parse_int_arg("offset", 0, min_value=0)
+    except ValueError as exc:
+        return _error_response(400, "INVALID_ARGUMENT", str(exc))
+
+    equity, total = read_equity(job_dir / RESULT_STREAM_DIRNAME, offset)
+    return jsonify({
+        "job_id": job_id,
+        "status": status,
+        "equity": equity,
+        "offset": min(offset, total),
+        "next_offset": total,
+        "total": total,
+    })
+
+
+@bp_backtest.get("/jobs/<job_id>/live/trades")
+@auth_required
+def api_job_live_trades(job_id: str):
+    """Trades written so far by a running (or finished) rqalpha job, ``limit`` from ``offset``."""
+    job_dir, status, error = _job_dir_and_status(job_id)
+    if error is not None:
+        return error
+    try:
+        offset = _parse_int_arg("offset", 0, min_value=0)
+        limit = _parse_int_arg("limit", 1000, min_value=1, max_value=5000)
+    except ValueError as exc:
+        return _error_response(400, "INVALID_ARGUMENT", str(exc))
+
+    trades, total = read_trades(job_dir / RESULT_STREAM_DIRNAME, offset, offset + limit)
+    return jsonify({
+        "job_id": job_id,
+        "status": status,
+        "trades": trades,
+        "offset": min(offset, total),
+        "next_offset": min(offset, total) + len(trades),
+        "total": total,
+    })
+
+
+@bp_backtest.post("/jobs/<job_id>/cancel")
+@auth_required
+def api_cancel_job(job_id: str):
+    """Stop a queued or running job, e.g. once its partial results show it is not worth finishing.
+
+    Any web worker can take the request; ``status`` is the job's status once
+    the run has stopped, or still QUEUED/RUNNING if it has not within a few seconds.
+    """
+    job_dir, status, error = _job_dir_and_status(job_id)
+    if error is not None:
+        return error
+    if status not in ("QUEUED", "RUNNING"):
+        return _error_response(409, "CONFLICT", "job is not running", status=status)
+    status = request_job_cancel(job_dir)
+    cancelled = status == "CANCELLED"
+    return _ok_response(
+        {"job_id": job_id, "cancel_requested": True, "cancelled": cancelled, "status": status},
+        message="cancelled" if cancelled else "cancel requested",
+    )
+
+
 @bp_backtest.delete("/jobs/<job_id>")
 @auth_required
 def api_delete_job(job_id: str):
@@ -986,6 +1195,29 @@ def _normalize_result_payload(payload: dict) -> dict:
         "raw_keys": raw_keys,
     }
 
+def _stream_result_payload(stream_dir: Path, summary: dict) -> dict:
+    """The /result payload of a job whose result is its stream; only the requested trades are read."""
+    equity, _ = read_equity(stream_dir)
+    payload = {
+        "summary": summary,
+        "equity": equity,
+        "trade_columns": [name for name, _ in TRADE_COLUMNS],
+        "raw_keys": ["equity", "positions", "summary", "trades"],
+    }
+    page_raw = request.args.get("page")
+    page_size_raw = request.args.get("page_size")
+    if page_raw is not None or page_size_raw is not None:
+        page = _parse_int_arg("page", 1, min_value=1)
+        page_size = _parse_int_arg("page_size", 100, min_value=1, max_value=1000)
+        start = (page - 1) * page_size
+        payload["trades"], payload["trades_total"] = read_trades(stream_dir, start, start + page_size)
+        payload["page"] = page
+        payload["page_size"] = page_size
+    else:
+        payload["trades"], payload["trades_total"] = read_trades(stream_dir)
+    return payload
+
+
 @bp_backtest.get("/jobs/<job_id>/result")
 @auth_required
 def api_job_result(job_id: str):
@@ -1009,6 +1241,14 @@ def api_job_result(job_id: str):
             detail=error.get("message") if error else None,
         )
 
+    stream_dir = job_dir / RESULT_STREAM_DIRNAME
+    summary = read_summary(stream_dir)
+    if summary is not None:
+        try:
+            return jsonify(_stream_result_payload(stream_dir, summary))
+        except ValueError as exc:
+            return _error_response(400, "INVALID_ARGUMENT", str(exc))
+
     path = job_dir / "extracted.json"
     if not path.exists():
         return _error_response(500, "RESULT_FILE_MISSING", "result file missing")
@@ -1042,6 +1282,68 @@ def api_job_result(job_id: str):
     return jsonify(normalized)
 
 
+def _parse_recost_request(data) -> tuple[dict, str | None]:
+    if not isinstance(data, dict):
+        raise ValueError("request body must be a JSON object")
+    overrides = {}
+    for field in COST_FIELDS:
+        if data.get(field) is None:
+            continue
+        value = data[field]
+        if field == "pit_tax":
+            if not isinstance(value, bool):
+                raise ValueError("pit_tax must be a boolean")
+            overrides[field] = value
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"{field} must be a non-negative number")
+        if field == "slippage" and value >= 1:
+            raise ValueError("slippage must be less than 1")
+        overrides[field] = float(value)
+    benchmark = data.get("benchmark")
+    if benchmark is not None and (not isinstance(benchmark, str) or not benchmark.strip()):
+        raise ValueError("benchmark must be an order_book_id")
+    return overrides, benchmark.strip() if benchmark else None
+
+
+@bp_backtest.post("/jobs/<job_id>/recost")
+@auth_required
+def api_recost_job(job_id: str):
+    """NAV and figures of a finished job's trades under other costs and/or another benchmark, without a rerun.
+
+    Body fields (all optional, defaults from the job's config): ``commission_multiplier``,
+    ``min_commission``, ``tax_multiplier``, ``pit_tax``, ``slippage`` and ``benchmark``.
+    """
+    job_dir, status, error = _job_dir_and_status(job_id)
+    if error is not None:
+        return error
+    if status != "FINISHED":
+        return _error_response(409, "RESULT_NOT_READY", "result not ready", status=status)
+    try:
+        overrides, benchmark = _parse_recost_request(request.get_json(silent=True) or {})
+    except ValueError as exc:
+        return _error_response(400, "INVALID_ARGUMENT", str(exc))
+
+    result = load_job_result(job_dir, RESULT_STREAM_DIRNAME)
+    if result is None:
+        return _error_response(500, "RESULT_FILE_MISSING", "result file missing")
+    config = load_job_config(job_dir)
+
+    replacement = None
+    if benchmark is not None:
+        bundle_path = Path((config.get("base") or {}).get("data_bundle_path") or "")
+        if not bundle_path.is_absolute() or not bundle_path.exists():
+            # the job's bundle snapshot may have been reclaimed since it finished
+            bundle_path = Path(current_app.config["RQALPHA_BUNDLE_PATH"]).expanduser()
+        try:
+            replacement = benchmark_nav(bundle_path, benchmark, result["dates"])
+        except ValueError as exc:
+            return _error_response(400, "INVALID_ARGUMENT", str(exc))
+
+    payload = recost(result, job_costs(config, overrides), job_costs(config), replacement)
+    return jsonify({"job_id": job_id, **payload})
+
+
 def _read_log_slice(log_path: Path, *, offset: int | None, tail: int | None) -> tuple[str, int, int, int]:
     size = log_path.stat().st_size
     start = 0
@@ -8,9 +8,9 @@ from datetime import datetime
 
 from app.auth import auth_required
 from app.database import get_db_connection, get_db_type
-from app.market_data.task_manager import get_task_manager
+from app.market_data.task_manager import TaskCancelled, get_task_manager
 from app.market_data.analyzer import analyze_bundle
-from app.market_data.tasks import do_incremental_update, do_full_download
+from app.market_data.tasks import submit_bundle_download
 from app.market_data.utils import is_current_month_updated, get_market_data_db_path
 
 bp_market_data = Blueprint('market_data', __name__, url_prefix='/api/market-data')
@@ -52,6 +52,13 @@ def _get_vnpy_table_name() -> str:
     return table
 
 
+def _get_resample_intervals() -> list[str]:
+    """Return the intervals materialized from 1m bars (MARKET_DATA_RESAMPLE_INTERVALS)."""
+    from app.market_data.resample import parse_materialized_intervals
+
+    return parse_materialized_intervals(os.environ.get('MARKET_DATA_RESAMPLE_INTERVALS'))
+
+
 @bp_market_data.route('/overview', methods=['GET'])
 @auth_required
 def get_overview():
@@ -75,6 +82,38 @@ def get_overview():
         return jsonify({'error': str(e)}), 500
 
 
+@bp_market_data.route('/coverage', methods=['GET'])
+@auth_required
+def get_instrument_coverage():
+    """Per-instrument first/last date and bar count recorded by the analyzer.
+
+    Query params: source_file (e.g. futures.h5), order_book_id (prefix match).
+    """
+    conditions = []
+    params = []
+    source_file = (request.args.get('source_file') or '').strip()
+    order_book_id = (request.args.get('order_book_id') or '').strip()
+    if source_file:
+        conditions.append('source_file = ?')
+        params.append(source_file)
+    if order_book_id:
+        conditions.append('order_book_id LIKE ?')
+        params.append(f'{order_book_id}%')
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    try:
+        with get_db_connection('market_data') as db:
+            rows = db.fetchall(
+                f"SELECT source_file, order_book_id, first_date, last_date, bar_count "
+                f"FROM market_data_instrument_coverage {where} "
+                f"ORDER BY source_file, order_book_id LIMIT 5000",
+                tuple(params),
+            )
+        return jsonify({'items': rows, 'total': len(rows)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @bp_market_data.route('/analyze', methods=['POST'])
 @auth_required
 def trigger_analyze():
@@ -117,7 +156,7 @@ def trigger_incremental():
 
     try:
         tm = get_task_manager()
-        task_id = tm.submit_task('incremental', do_incremental_update, source='manual')
+        task_id = submit_bundle_download('incremental', source='manual')
         return jsonify({'task_id': task_id}), 202
 
     except RuntimeError as e:
@@ -145,7 +184,7 @@ def trigger_full():
 
     try:
         tm = get_task_manager()
-        task_id = tm.submit_task('full', do_full_download, source='manual')
+        task_id = submit_bundle_download('full', source='manual')
         return jsonify({'task_id': task_id}), 202
 
     except RuntimeError as e:
@@ -161,7 +200,7 @@ def get_running_task():
     try:
         tm = get_task_manager()
         task = tm.get_running_task()
-        return jsonify({'task': task}), 200
+        return jsonify({'task': task, 'lanes': tm.lane_stats()}), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -205,9 +244,9 @@ def retry_task(task_id: str):
                                          task_args=(bundle_path, tm.db_config_dict),
                                          source='retry')
         elif task_type == 'incremental':
-            new_task_id = tm.submit_task('incremental', do_incremental_update, source='retry')
+            new_task_id = submit_bundle_download('incremental', source='retry')
         elif task_type == 'full':
-            new_task_id = tm.submit_task('full', do_full_download, source='retry')
+            new_task_id = submit_bundle_download('full', source='retry')
         else:
             return jsonify({'error': '未知任务类型'}), 400
 
@@ -411,8 +450,13 @@ def get_cron_log_detail(log_id: int):
 # ============================================================================
 
 def _refresh_vnpy_stats_to_db(config_dict=None):
-    """Query dbbardata live stats and save to vnpy_stats cache table."""
-    import json
+    """Roll the per-series bar summary up into the vnpy_stats cache table.
+
+    The importers keep vnpy_bar_summary current, so no bar is scanned here.
+    The first refresh after upgrading (summary empty, bars present) builds the
+    summary once from the bar table.
+    """
+    from app.market_data.bar_summary import rollup_stats, summary_is_empty, verify_summary
 
     table = _get_vnpy_table_name()
 
@@ -420,53 +464,9 @@ def _refresh_vnpy_stats_to_db(config_dict=None):
         _ensure_market_data_schema()
 
     with get_db_connection(config_dict=config_dict) as db:
-        lock_acquired = False
-        try:
-            if db.config.db_type == 'mariadb':
-                row = db.fetchone("SELECT GET_LOCK(?, ?) AS got", ("vnpy_stats_refresh", 10))
-                lock_acquired = bool(row and row.get("got") == 1)
-                if not lock_acquired:
-                    raise RuntimeError("刷新统计正在进行中，请稍后重试")
-
-            # Single scan: get all stats + per-exchange breakdown in one query
-            by_exchange = db.fetchall(
-                f"SELECT exchange, COUNT(DISTINCT symbol) AS contracts, COUNT(*) AS `rows`, "
-                f"MIN(datetime) AS min_dt, MAX(datetime) AS max_dt "
-                f"FROM {table} GROUP BY exchange ORDER BY `rows` DESC"
-            )
-
-            total_rows = sum(r['rows'] for r in by_exchange)
-            contract_count = sum(r['contracts'] for r in by_exchange)
-            exchange_count = len(by_exchange)
-            min_date = min((str(r['min_dt']) for r in by_exchange if r['min_dt']), default=None)
-            max_date = max((str(r['max_dt']) for r in by_exchange if r['max_dt']), default=None)
-
-            # Strip min_dt/max_dt from per-exchange results before caching
-            by_exchange_out = [
-                {'exchange': r['exchange'], 'contracts': r['contracts'], 'rows': r['rows']}
-                for r in by_exchange
-            ]
-
-            # Write to vnpy_stats cache (id=1), safe for concurrent refreshes
-            db.upsert(
-                "vnpy_stats",
-                ["id", "total_rows", "contract_count", "exchange_count", "min_date", "max_date", "by_exchange"],
-                (1, total_rows, contract_count, exchange_count, min_date, max_date, json.dumps(by_exchange_out)),
-                "id",
-                ["total_rows", "contract_count", "exchange_count", "min_date", "max_date", "by_exchange"],
-            )
-        finally:
-            if db.config.db_type == 'mariadb' and lock_acquired:
-                db.execute("SELECT RELEASE_LOCK(?)", ("vnpy_stats_refresh",))
-
-    return {
-        'total_rows': total_rows,
-        'contract_count': contract_count,
-        'exchange_count': exchange_count,
-        'min_date': min_date,
-        'max_date': max_date,
-        'by_exchange': by_exchange_out,
-    }
+        if summary_is_empty(db, table):
+            verify_summary(db, table, fix=True)
+        return rollup_stats(db)
 
 
 @bp_market_data.route('/vnpy/stats', methods=['GET'])
@@ -511,14 +511,110 @@ def get_vnpy_stats():
 @bp_market_data.route('/vnpy/refresh-stats', methods=['POST'])
 @auth_required
 def refresh_vnpy_stats():
-    """Manually refresh vnpy stats cache from live data."""
+    """Manually refresh vnpy stats cache from the per-series summary.
+
+    Body (optional): {"verify": true} reconciles the summary against the bar
+    table in a background task first and returns its task_id.
+    """
+    data = request.get_json(silent=True) or {}
     try:
+        if data.get('verify'):
+            tm = get_task_manager()
+            task_id = tm.submit_task('vnpy_stats_verify', _do_vnpy_stats_verify, source='manual')
+            return jsonify({'task_id': task_id}), 200
         result = _refresh_vnpy_stats_to_db()
         return jsonify(result), 200
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _do_vnpy_stats_verify(task_id: str):
+    """Task body for /vnpy/refresh-stats with verify: recount every series."""
+    from app.market_data.bar_summary import rollup_stats, verify_summary
+
+    tm = get_task_manager()
+    table = _get_vnpy_table_name()
+    tm.update_progress(task_id, 0, '校验', '正在核对K线汇总...')
+
+    def on_progress(done: int, total: int):
+        if done % 100 == 0 or done == total:
+            tm.update_progress(task_id, int(95 * done / max(total, 1)), '校验', f'已核对 {done}/{total} 个序列')
+
+    with get_db_connection(config_dict=tm.db_config_dict) as db:
+        result = verify_summary(db, table, fix=True, progress=on_progress,
+                                should_stop=lambda: tm.is_cancel_requested(task_id))
+        if tm.is_cancel_requested(task_id):
+            tm.log(task_id, 'WARNING', '任务已取消，停止校验')
+            return
+        tm.log(task_id, 'INFO',
+               f'核对 {result["checked"]} 个序列：不一致 {result["mismatched"]}，缺失 {result["missing"]}，'
+               f'多余 {result["stale"]}，已修正 {result["fixed"]}')
+        rollup_stats(db)
+    tm.update_progress(task_id, 100, '完成', 'K线汇总校验完成')
+
+
+@bp_market_data.route('/bars', methods=['GET'])
+@auth_required
+def get_bars():
+    """Query bars from dbbardata with keyset pagination.
+
+    Query params: symbol, exchange, interval (default 'd'), start, end, limit,
+    cursor (next_cursor of the previous page), format ('json' or 'binary').
+    """
+    from flask import current_app
+    from app.market_data.bars import (
+        BAR_COLUMNS, DEFAULT_LIMIT, MAX_LIMIT,
+        encode_bars_binary, get_bar_cache, normalize_bar_datetime, query_bars_cached,
+    )
+    from app.market_data.resample import get_trading_dates
+
+    symbol = (request.args.get('symbol') or '').strip()
+    exchange = (request.args.get('exchange') or '').strip().upper()
+    interval = (request.args.get('interval') or 'd').strip()
+    output_format = (request.args.get('format') or 'json').strip().lower()
+    if not symbol or not exchange:
+        return jsonify({'error': 'symbol 和 exchange 为必填参数'}), 400
+    if output_format not in ('json', 'binary'):
+        return jsonify({'error': 'format 仅支持 json 或 binary'}), 400
+
+    try:
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit 必须为整数'}), 400
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    try:
+        start = normalize_bar_datetime(request.args.get('start'))
+        end = normalize_bar_datetime(request.args.get('end'), end_of_day=True)
+        after = normalize_bar_datetime(request.args.get('cursor'))
+        table = _get_vnpy_table_name()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        cache = get_bar_cache(int(current_app.config.get('MARKET_DATA_BARS_CACHE_ROWS', 2_000_000)))
+        with get_db_connection('market_data') as db:
+            page = query_bars_cached(
+                db, table,
+                symbol=symbol, exchange=exchange, interval=interval,
+                start=start, end=end, after=after, limit=limit,
+                cache=cache, trading_dates=get_trading_dates(_get_bundle_path()),
+            )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    if output_format == 'binary':
+        response = current_app.response_class(encode_bars_binary(page), mimetype='application/octet-stream')
+        response.headers['X-Bar-Columns'] = ','.join(name for name, _ in BAR_COLUMNS)
+        response.headers['X-Bar-Count'] = str(page['count'])
+        response.headers['X-Next-Cursor'] = page['next_cursor'] or ''
+        response.headers['X-Bar-Version'] = page.get('version') or ''
+        return response
+    return jsonify(page), 200
+
+
 @bp_market_data.route('/vnpy/running-task', methods=['GET'])
 @auth_required
 def get_vnpy_running_task():
@@ -550,8 +646,17 @@ def cancel_vnpy_task(task_id: str):
 @bp_market_data.route('/vnpy/import', methods=['POST'])
 @auth_required
 def trigger_vnpy_import():
-    """Trigger futures data import from rqalpha bundle into MariaDB."""
+    """Trigger futures data import from rqalpha bundle into MariaDB.
+
+    Body (optional): {"mode": "auto" | "incremental" | "full"}; when omitted
+    the mode is chosen by _choose_vnpy_import_mode().
+    """
     try:
+        data = request.get_json(silent=True) or {}
+        mode = data.get('mode') or _choose_vnpy_import_mode()
+        if mode not in ('auto', 'incremental', 'full'):
+            return jsonify({'error': 'mode 仅支持 auto、incremental 或 full'}), 400
+
         bundle_path = _get_bundle_path()
         h5_path = bundle_path / 'futures.h5'
         pk_path = bundle_path / 'instruments.pk'
@@ -565,10 +670,10 @@ def trigger_vnpy_import():
         task_id = tm.submit_task(
             'vnpy_import',
             _do_vnpy_import,
-            (str(h5_path), str(pk_path)),
+            (str(h5_path), str(pk_path), mode),
             source='manual',
         )
-        return jsonify({'task_id': task_id}), 200
+        return jsonify({'task_id': task_id, 'mode': mode}), 200
 
     except RuntimeError as e:
         return jsonify({'error': str(e)}), 409
@@ -576,61 +681,199 @@ def trigger_vnpy_import():
         return jsonify({'error': str(e)}), 500
 
 
-def _do_vnpy_import(task_id: str, h5_path: str, pk_path: str):
+def _choose_vnpy_import_mode(config_dict=None) -> str:
+    """Pick the futures import mode for the next /vnpy/import run.
+
+    A full bundle download may revise history, so the first import after one
+    reloads every contract's daily bars (minute and resampled bars are left
+    alone); otherwise only bars newer than what is stored are loaded. 'auto' lets the script fall back to a full
+    rebuild when the table has no daily bars yet.
+    """
+    with get_db_connection('market_data', config_dict=config_dict) as db:
+        last = {}
+        for task_type in ('full', 'vnpy_import'):
+            row = db.fetchone(
+                "SELECT MAX(finished_at) AS finished_at FROM market_data_tasks "
+                "WHERE task_type = ? AND status = 'success'",
+                (task_type,)
+            )
+            last[task_type] = row['finished_at'] if row else None
+
+    if last['full'] and (not last['vnpy_import'] or str(last['full']) > str(last['vnpy_import'])):
+        return 'full'
+    return 'auto'
+
+
+def _do_vnpy_import(task_id: str, h5_path: str, pk_path: str, mode: str = 'auto'):
     """Run the import script as a subprocess, streaming logs to TaskManager."""
     import subprocess
 
     tm = get_task_manager()
-    tm.update_progress(task_id, 0, '导入', '启动期货数据导入...')
-    tm.log(task_id, 'INFO', f'h5={h5_path}, pk={pk_path}')
+    tm.update_progress(task_id, 0, '导入', f'启动期货数据导入（模式: {mode}）...')
+    tm.log(task_id, 'INFO', f'h5={h5_path}, pk={pk_path}, mode={mode}')
+    _ensure_bar_partitions(task_id)
 
     script = str(Path(__file__).resolve().parent.parent.parent / 'scripts' / 'import_rqalpha_futures_to_mariadb.py')
 
     cmd = [
-        sys.executable, script,
+        sys.executable, '-u', script,
         '--h5', h5_path,
         '--pk', pk_path,
+        '--mode', mode,
     ]
 
-    # 9-step progress: Reading futures.h5 gets the largest share (15%→55%)
+    # Export and load overlap: per-chunk lines drive progress from 15% to 80%
     step_progress = [
         ('Loading instruments.pk', 5),
         ('Loaded exchange map', 10),
+        ('Loaded stored daily series', 12),
         ('Reading futures.h5', 15),
-        ('Parsed rows', 55),
-        ('Truncating table', 65),
-        ('Loading data into MariaDB', 75),
+        ('Parsed rows', 80),
+        ('Removed stale daily series', 82),
         ('Import finished', 85),
     ]
+    chunk_re = re.compile(r'Loaded chunk (\d+)/(\d+)')
 
-    proc = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        bufsize=1,
-    )
-
-    current_pct = 0
-    for line in proc.stdout:
-        line = line.rstrip('\n')
-        if not line:
-            continue
-        tm.log(task_id, 'INFO', line)
-
-        for keyword, pct in step_progress:
-            if keyword in line:
-                current_pct = pct
-                break
-
-        tm.update_progress(task_id, current_pct, '导入', line)
-
-    proc.wait()
+    # The script runs in its own process group (export workers included); a
+    # cancel kills the group and the script rolls back its open chunk on SIGTERM.
+    try:
+        with tm.spawn_process(
+            task_id, cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+        ) as proc:
+            current_pct = 0
+            for line in proc.stdout:
+                line = line.rstrip('\n')
+                if not line:
+                    continue
+                tm.log(task_id, 'INFO', line)
+
+                chunk_match = chunk_re.search(line)
+                if chunk_match:
+                    done, total = int(chunk_match.group(1)), int(chunk_match.group(2))
+                    current_pct = 15 + int(65 * done / max(total, 1))
+                for keyword, pct in step_progress:
+                    if keyword in line:
+                        current_pct = pct
+                        break
+
+                tm.update_progress(task_id, current_pct, '导入', line)
+
+            proc.wait()
+    except TaskCancelled:
+        tm.log(task_id, 'WARNING', '期货数据导入已取消，已终止导入进程')
+        raise
     if proc.returncode != 0:
         raise RuntimeError(f'导入脚本退出码: {proc.returncode}')
 
+    _materialize_resampled_bars(task_id, _get_resample_intervals(), 85, 90)
+
     tm.update_progress(task_id, 90, '统计', '正在刷新统计数据...')
     tm.log(task_id, 'INFO', '导入完成，刷新统计缓存...')
     _refresh_vnpy_stats_to_db(config_dict=tm.db_config_dict)
 
     tm.update_progress(task_id, 100, '完成', '期货数据导入完成')
+
+
+@bp_market_data.route('/vnpy/resample', methods=['POST'])
+@auth_required
+def trigger_vnpy_resample():
+    """Materialize resampled bars (e.g. 5m/15m/1h) from 1m bars in dbbardata.
+
+    Body (optional): {"intervals": ["5m", "15m"]}; defaults to
+    MARKET_DATA_RESAMPLE_INTERVALS. Only bars newer than what is already
+    stored for each interval are computed.
+    """
+    from app.market_data.resample import MATERIALIZABLE_INTERVALS
+
+    data = request.get_json(silent=True) or {}
+    try:
+        intervals = data.get('intervals') or _get_resample_intervals()
+        # 'd' is rejected: the stored daily bars are the bundle's own
+        if not isinstance(intervals, list) or any(i not in MATERIALIZABLE_INTERVALS for i in intervals):
+            return jsonify({'error': f'intervals 仅支持: {", ".join(MATERIALIZABLE_INTERVALS)}'}), 400
+
+        tm = get_task_manager()
+        task_id = tm.submit_task('vnpy_resample', _do_vnpy_resample, (intervals,), source='manual')
+        return jsonify({'task_id': task_id}), 200
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _ensure_bar_partitions(task_id: str):
+    """Add next year's partition to a partitioned bar table before writing to it."""
+    from app.market_data.bar_storage import ensure_future_partitions
+
+    tm = get_task_manager()
+    table = _get_vnpy_table_name()
+    try:
+        with get_db_connection(config_dict=tm.db_config_dict) as db:
+            added = ensure_future_partitions(db, table)
+        if added:
+            tm.log(task_id, 'INFO', f'已为 {table} 新增分区: {", ".join(added)}')
+    except Exception as e:
+        tm.log(task_id, 'WARNING', f'新增分区失败: {str(e)}')
+
+
+def _do_vnpy_resample(task_id: str, intervals: list):
+    """Task body for /vnpy/resample."""
+    tm = get_task_manager()
+    tm.update_progress(task_id, 0, '重采样', f'开始生成周期数据: {", ".join(intervals)}')
+    _ensure_bar_partitions(task_id)
+    _materialize_resampled_bars(task_id, intervals, 0, 90)
+
+    tm.update_progress(task_id, 90, '统计', '正在刷新统计数据...')
+    _refresh_vnpy_stats_to_db(config_dict=tm.db_config_dict)
+    tm.update_progress(task_id, 100, '完成', '周期数据生成完成')
+
+
+def _materialize_resampled_bars(task_id: str, intervals: list, pct_from: int, pct_to: int):
+    """Incrementally resample every 1m series into `intervals`, reporting progress."""
+    from app.market_data.resample import (
+        is_series_current, list_source_series, load_trading_dates, materialize_series,
+    )
+    from app.market_data.bar_summary import tracking_appends
+    from app.market_data.bars import bump_import_version
+
+    if not intervals:
+        return
+    tm = get_task_manager()
+    table = _get_vnpy_table_name()
+    trading_dates = load_trading_dates(_get_bundle_path())
+
+    with get_db_connection(config_dict=tm.db_config_dict) as db:
+        series_list = list_source_series(db, table)
+        pending = [
+            s for s in series_list
+            if not is_series_current(db, table, s, intervals, trading_dates)
+        ]
+        tm.log(task_id, 'INFO',
+               f'1m 合约 {len(series_list)} 个，需要更新 {len(pending)} 个，周期: {", ".join(intervals)}')
+
+        written_total = 0
+        for idx, series in enumerate(pending, start=1):
+            if tm.is_cancel_requested(task_id):
+                tm.log(task_id, 'WARNING', '任务已取消，停止重采样')
+                return
+            with tracking_appends(db, table, series['symbol'], series['exchange'], intervals):
+                written = materialize_series(
+                    db, table,
+                    symbol=series['symbol'], exchange=series['exchange'],
+                    intervals=intervals, trading_dates=trading_dates,
+                )
+            if any(written.values()):
+                bump_import_version(db)
+            written_total += sum(written.values())
+            pct = pct_from + int((pct_to - pct_from) * idx / len(pending))
+            tm.update_progress(task_id, pct, '重采样',
+                               f'{series["symbol"]}.{series["exchange"]} ({idx}/{len(pending)})')
+
+        tm.log(task_id, 'INFO', f'重采样完成，写入 {written_total} 根K线')
@@ -9,6 +9,7 @@ from pathlib import Path
 
 from flask import Blueprint, current_app, jsonify
 from app.market_data.analyzer import ensure_bundle_analysis_task
+from app.market_data.manifest import get_bundle_manifest
 
 bp_system = Blueprint("bp_system", __name__, url_prefix="/api/system")
 
@@ -19,39 +20,14 @@ _BUNDLE_META_TTL_SECONDS = 10 * 60
 
 
 def _bundle_is_ready(bundle_path: Path) -> bool:
-    if not bundle_path.exists() or not bundle_path.is_dir():
+    manifest = get_bundle_manifest(bundle_path)
+    if not manifest.exists or not manifest.top_level_sizes:
         return False
-    try:
-        if not any(bundle_path.iterdir()):
-            return False
-    except OSError:
-        return False
-    for filename in _BUNDLE_REQUIRED_FILES:
-        candidate = bundle_path / filename
-        try:
-            if not candidate.is_file() or candidate.stat().st_size <= 0:
-                return False
-        except OSError:
-            return False
-    return True
+    return manifest.has_files(_BUNDLE_REQUIRED_FILES)
 
 
 def _dir_size_bytes(path: Path) -> int:
-    if not path.exists():
-        return 0
-    if path.is_file():
-        try:
-            return path.stat().st_size
-        except OSError:
-            return 0
-    total = 0
-    for root, _dirs, files in os.walk(path):
-        for name in files:
-            try:
-                total += (Path(root) / name).stat().st_size
-            except OSError:
-                continue
-    return total
+    return get_bundle_manifest(path).total_size
 
 
 def _bundle_status_file() -> Path:
@@ -240,4 +216,6 @@ def bundle_status():
         "message": resolved_message,
         "progress": progress,
     }
+    if ready:
+        payload["bundle"] = get_bundle_manifest(bundle_path).to_dict()
     return jsonify(payload)
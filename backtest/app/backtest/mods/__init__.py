@@ -0,0 +1,5 @@
+"""rqalpha mods shipped with the backtest service.
+
+They are enabled from the generated config.yml by import path
+(``mod.<name>.lib``); run_rqalpha puts the project root on PYTHONPATH.
+"""
@@ -0,0 +1,30 @@
+"""Periodic state checkpoints of backtests, and resuming runs from them.
+
+rqalpha can persist the portfolio, the strategy context, the analyser's
+records and the other Persistable objects through a persist provider, but
+ships none that survives the process. This mod provides one backed by a
+single pickle file (store.py): after the first day settled once
+``interval_seconds`` have passed since the previous checkpoint, and at the
+end of a successful run, the current state is written there atomically.
+
+With ``resume`` set and a checkpoint present, the run starts on the trading
+day after the checkpoint with that state restored, so a job killed halfway
+or extended to a later end_date does not replay the history before it. The
+result written by sys_analyser still covers the whole run from start_date.
+"""
+
+__config__ = {
+    # 检查点文件路径（一般为 <job_dir>/checkpoint.pkl）
+    "path": None,
+    # 距上次保存超过多少秒后，在下一次日终结算时保存检查点；0 为只在回测结束时保存
+    "interval_seconds": 60,
+    # 存在检查点时从其后一个交易日继续回测
+    "resume": False,
+    # 先于 sys 模块启动，以便在回测区间确定前改写 start_date；并在 sys_analyser 输出结果之后保存最终检查点
+    "priority": 50,
+}
+
+
+def load_mod():
+    from .mod import CheckpointMod
+    return CheckpointMod()
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+import jsonpickle
+import numpy as np
+from rqalpha.const import PERSIST_MODE
+from rqalpha.core.events import EVENT
+from rqalpha.interface import AbstractMod, AbstractPersistProvider
+from rqalpha.utils.logger import system_log
+
+from .store import read_checkpoint, write_checkpoint
+
+ANALYSER_KEY = 'mod_sys_analyser'
+EXECUTOR_KEY = 'executor'
+
+
+class CheckpointProvider(AbstractPersistProvider):
+    """Persist provider holding the latest state of every key in memory.
+
+    Starts from the checkpoint being resumed (if any); the mod writes the
+    whole set to disk, never single keys, so a checkpoint is consistent.
+    """
+
+    def __init__(self, states: Optional[Dict[str, bytes]] = None):
+        self._states: Dict[str, bytes] = dict(states or {})
+
+    def store(self, key, value):
+        self._states[key] = value
+
+    def load(self, key):
+        return self._states.get(key)
+
+    def should_resume(self):
+        return bool(self._states)
+
+    def should_run_init(self):
+        # init() rebuilds what the checkpoint cannot hold (scheduled functions, subscriptions)
+        return True
+
+    def states(self) -> Dict[str, bytes]:
+        return dict(self._states)
+
+
+class CheckpointMod(AbstractMod):
+    def __init__(self):
+        self._env = None
+        self._path: Optional[Path] = None
+        self._interval = 0.0
+        self._saved_at = 0.0
+        self._provider: Optional[CheckpointProvider] = None
+        self._start_date: Optional[date] = None
+        self._resumed_from: Optional[date] = None
+        self._last_settled: Optional[date] = None
+        self._last_prices: dict = {}
+
+    def start_up(self, env, mod_config):
+        if not mod_config.path:
+            raise RuntimeError('checkpoint mod 需要配置 path')
+        self._env = env
+        self._path = Path(mod_config.path)
+        self._interval = float(mod_config.interval_seconds)
+        self._saved_at = time.monotonic()
+        base = env.config.base
+        self._start_date = base.start_date
+
+        states = {}
+        checkpoint = read_checkpoint(self._path) if mod_config.resume else None
+        if checkpoint is not None:
+            if checkpoint.get('start_date') != self._start_date.isoformat():
+                raise RuntimeError('检查点属于开始日期为 {} 的回测，与当前开始日期 {} 不一致'.format(
+                    checkpoint.get('start_date'), self._start_date))
+            if date.fromisoformat(checkpoint['date']) >= base.end_date:
+                # killed between the final checkpoint and writing the result: nothing left to resume
+                system_log.warning('checkpoint: 检查点 {} 已到结束日期，从头重新回测', checkpoint['date'])
+                checkpoint = None
+        if checkpoint is not None:
+            self._resumed_from = date.fromisoformat(checkpoint['date'])
+            # The checkpointed day is settled already. The executor only remembers that day so as to
+            # publish its settlement before the next one's before_trading, which would settle it twice.
+            states = {key: value for key, value in checkpoint['states'].items() if key != EXECUTOR_KEY}
+            self._last_prices = checkpoint.get('last_prices') or {}
+            # rqalpha moves the start to the next trading day when this one is not
+            base.start_date = self._resumed_from + timedelta(days=1)
+            system_log.info('checkpoint: 从 {} 的检查点继续回测', self._resumed_from)
+
+        self._provider = CheckpointProvider(states)
+        env.set_persist_provider(self._provider)
+        # The mod decides when to write checkpoints; rqalpha only collects state on normal exit.
+        base.persist = True
+        base.persist_mode = PERSIST_MODE.ON_NORMAL_EXIT
+
+        env.event_bus.add_listener(EVENT.POST_SETTLEMENT, self._on_settlement)
+        env.event_bus.add_listener(EVENT.POST_STRATEGY_RUN, self._on_strategy_run)
+        if self._resumed_from is not None:
+            env.event_bus.add_listener(EVENT.POST_SYSTEM_RESTORED, self._on_restored)
+
+    def _on_restored(self, _event):
+        # Positions do not persist their last price and would value themselves at the resumed
+        # day's price before it opens; put back the checkpointed day's close.
+        for position in self._env.portfolio.get_positions():
+            price = self._last_prices.get((position.order_book_id, position.direction.value))
+            if price is not None:
+                position.update_last_price(price)
+        self._merge_benchmark()
+
+    def _merge_benchmark(self):
+        # AnalyserMod.set_state restores the portfolio records but not the benchmark ones, which
+        # it regenerated for the resumed range only; prepend the checkpointed days to them.
+        analyser = self._env.mod_dict.get('sys_analyser')
+        state = self._provider.load(ANALYSER_KEY)
+        if analyser is None or not state:
+            return
+        restored_days = [record['date'] for record in analyser._total_portfolios]
+        saved = jsonpickle.loads(state.decode('utf-8'))
+        returns = np.concatenate([
+            np.asarray(saved.get('benchmark_daily_returns', []), dtype=float)[:len(restored_days)],
+            np.asarray(analyser._benchmark_daily_returns, dtype=float),
+        ])
+        analyser._benchmark_daily_returns = returns
+        if isinstance(analyser._total_benchmark_portfolios, dict):
+            analyser._total_benchmark_portfolios = {
+                'date': restored_days + list(analyser._total_benchmark_portfolios['date']),
+                'unit_net_value': (returns + 1).cumprod(),
+            }
+
+    def _on_settlement(self, _event):
+        self._last_settled = self._env.calendar_dt.date()
+        # A checkpoint serializes every record so far, so it is paced by wall time rather than by days
+        if self._interval > 0 and time.monotonic() - self._saved_at >= self._interval:
+            self._save()
+
+    def _on_strategy_run(self, _event):
+        self._save()
+        if self._resumed_from is not None:
+            # sys_analyser reports (and computes the risk-free rate over) the whole run, which
+            # started on the first trading day on or after start_date
+            analyser = self._env.mod_dict.get('sys_analyser')
+            records = analyser._total_portfolios if analyser is not None else None
+            self._env.config.base.start_date = records[0]['date'] if records else self._start_date
+
+    def _save(self):
+        helper = self._env.persist_helper
+        if helper is None or self._last_settled is None:
+            return
+        helper.persist()
+        write_checkpoint(
+            self._path,
+            day=self._last_settled.isoformat(),
+            start_date=self._start_date.isoformat(),
+            states=self._provider.states(),
+            last_prices={
+                # plain keys: the web app reads checkpoints without importing rqalpha
+                (position.order_book_id, position.direction.value): position.last_price
+                for position in self._env.portfolio.get_positions()
+            },
+        )
+        self._saved_at = time.monotonic()
+        system_log.debug('checkpoint: 已保存 {} 的检查点', self._last_settled)
+
+    def tear_down(self, code, exception=None):
+        pass
@@ -0,0 +1,38 @@
+"""On-disk format of backtest checkpoints.
+
+A checkpoint is one pickle holding the last settled trading day, the run's
+original start_date, rqalpha's persisted state of every object (key ->
+bytes) and the last price of every position, which positions do not
+persist. It is replaced atomically, so a reader sees either the previous
+checkpoint or the new one.
+"""
+from __future__ import annotations
+
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def read_checkpoint(path: Path) -> Optional[dict]:
+    """The checkpoint at ``path``, or None when there is none (or it is unreadable)."""
+    try:
+        with Path(path).open("rb") as f:
+            payload = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if not isinstance(payload, dict) or not payload.get("date") or not isinstance(payload.get("states"), dict):
+        return None
+    return payload
+
+
+def write_checkpoint(path: Path, *, day: str, start_date: str, states: Dict[str, bytes],
+                     last_prices: Optional[dict] = None) -> None:
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("wb") as f:
+        payload = {"date": day, "start_date": start_date, "states": states, "last_prices": last_prices or {}}
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,27 @@
+"""Incremental indicators and rolling history windows for strategies.
+
+Strategies that call ``history_bars(..., 100, '1d', 'close')`` and rerun
+``talib.MACD`` over the whole window on every bar redo O(window) work per
+bar. This mod exports two strategy APIs instead:
+
+* ``indicator(order_book_id, 'MACD', 12, 26, 9)`` returns an SMA/EMA/MACD/RSI/ATR
+  object that is fed only the bars added since the previous call.
+* ``rolling_history_bars(order_book_id, 100, '1d', 'close')`` returns the same
+  window as ``history_bars(..., skip_suspended=False)`` as a read-only view of
+  a ring buffer that is appended to rather than rebuilt.
+
+history_bars pre-adjusts its whole window to the current day. Each read also
+re-reads the last bar already fed, and when an ex-dividend or split changed
+it, the indicator or window is rebuilt from a fresh warmup read.
+"""
+
+__config__ = {
+    # 指标首次使用时预热的K线数（不少于指标本身的 lookback）
+    "warmup_bars": 100,
+    "priority": 30,
+}
+
+
+def load_mod():
+    from .mod import IndicatorsMod
+    return IndicatorsMod()
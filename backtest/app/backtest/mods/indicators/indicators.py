@@ -0,0 +1,279 @@
+"""Incremental technical indicators and a copy-free ring buffer.
+
+Every indicator takes one bar per ``update`` call in O(1) and keeps its last
+``maxlen`` outputs in a RingBuffer, so ``ind[-1]`` and ``ind[-2]`` read like
+the arrays talib returns. Warm-up and seeding follow talib: values are NaN
+until ``lookback`` bars have been seen, EMAs start from the SMA of their first
+``period`` inputs and RSI/ATR use Wilder smoothing.
+"""
+from __future__ import annotations
+
+import math
+from typing import Dict, Optional, Type
+
+import numpy as np
+
+NAN = float('nan')
+
+
+class RingBuffer:
+    """Fixed-capacity buffer whose last ``n`` items are always one contiguous view.
+
+    Each item is written twice, at ``i`` and ``i + capacity`` of a buffer of
+    twice the capacity, so the window ending at the newest item never wraps
+    and can be returned without copying.
+    """
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError('capacity must be >= 1')
+        self.capacity = int(capacity)
+        self._data = np.zeros(2 * self.capacity, dtype=dtype)
+        self._readonly = self._data.view()
+        self._readonly.flags.writeable = False
+        self._next = 0
+        self._count = 0
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._data.dtype
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value) -> None:
+        self._data[self._next] = value
+        self._data[self._next + self.capacity] = value
+        self._next = (self._next + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def extend(self, values: np.ndarray) -> None:
+        values = values[-self.capacity:]
+        for value in values:
+            self.append(value)
+
+    def view(self, n: Optional[int] = None) -> np.ndarray:
+        """Read-only view of the last n items (all held items by default), oldest first."""
+        count = self._count if n is None else min(int(n), self._count)
+        end = self._next + self.capacity
+        return self._readonly[end - count:end]
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def clear(self) -> None:
+        self._next = 0
+        self._count = 0
+
+
+class Indicator:
+    """Base class: one output series of the last ``maxlen`` values."""
+
+    #: bar fields update() reads
+    fields = ('close',)
+
+    def __init__(self, maxlen: int = 2):
+        self.values = RingBuffer(maxlen)
+        self.count = 0
+
+    @property
+    def lookback(self) -> int:
+        """Number of bars consumed before the first non-NaN value."""
+        raise NotImplementedError
+
+    @property
+    def ready(self) -> bool:
+        return self.count > self.lookback
+
+    @property
+    def value(self) -> float:
+        return self.values[-1] if len(self.values) else NAN
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def update(self, bar) -> float:
+        """Feed one bar (any mapping or record with the fields above); returns the new value."""
+        value = self._step(bar)
+        self.count += 1
+        self.values.append(value)
+        return value
+
+    def _step(self, bar) -> float:
+        raise NotImplementedError
+
+
+class SMA(Indicator):
+    def __init__(self, period: int = 30, maxlen: int = 2):
+        super().__init__(maxlen)
+        self.period = int(period)
+        self._window = RingBuffer(self.period)
+        self._sum = 0.0
+
+    @property
+    def lookback(self) -> int:
+        return self.period - 1
+
+    def _step(self, bar) -> float:
+        price = float(bar['close'])
+        if len(self._window) == self.period:
+            self._sum -= self._window[0]
+        self._window.append(price)
+        self._sum += price
+        if len(self._window) < self.period:
+            return NAN
+        return self._sum / self.period
+
+
+class _EMA:
+    """Exponential average of a scalar stream, seeded with the SMA of its first inputs."""
+
+    def __init__(self, period: int):
+        self.period = int(period)
+        self.k = 2.0 / (self.period + 1)
+        self.value = NAN
+        self._seed_sum = 0.0
+        self._seen = 0
+
+    def seed(self, value: float) -> None:
+        self.value = value
+        self._seen = self.period
+
+    def push(self, price: float) -> float:
+        if self._seen < self.period:
+            self._seed_sum += price
+            self._seen += 1
+            if self._seen == self.period:
+                self.value = self._seed_sum / self.period
+            return self.value
+        self.value += self.k * (price - self.value)
+        return self.value
+
+
+class EMA(Indicator):
+    def __init__(self, period: int = 30, maxlen: int = 2):
+        super().__init__(maxlen)
+        self.period = int(period)
+        self._ema = _EMA(self.period)
+
+    @property
+    def lookback(self) -> int:
+        return self.period - 1
+
+    def _step(self, bar) -> float:
+        return self._ema.push(float(bar['close']))
+
+
+class MACD(Indicator):
+    """MACD line, signal line and histogram, aligned like talib.MACD.
+
+    The fast EMA is seeded at the bar where the slow EMA becomes ready, from
+    the last ``fast`` closes, so both averages start together. ``values``
+    holds the MACD line; ``signal`` and ``hist`` are ring buffers of the same
+    length.
+    """
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9, maxlen: int = 2):
+        super().__init__(maxlen)
+        if fast > slow:
+            fast, slow = slow, fast
+        self.fast, self.slow, self.signal_period = int(fast), int(slow), int(signal)
+        self._recent = RingBuffer(self.fast)
+        self._fast = _EMA(self.fast)
+        self._slow = _EMA(self.slow)
+        self._signal = _EMA(self.signal_period)
+        self.signal = RingBuffer(maxlen)
+        self.hist = RingBuffer(maxlen)
+
+    @property
+    def lookback(self) -> int:
+        return self.slow + self.signal_period - 2
+
+    def _step(self, bar) -> float:
+        price = float(bar['close'])
+        self._recent.append(price)
+        slow = self._slow.push(price)
+        if self.count + 1 < self.slow:
+            macd = signal = NAN
+        else:
+            if self.count + 1 == self.slow:
+                self._fast.seed(float(self._recent.view().mean()))
+            else:
+                self._fast.push(price)
+            macd = self._fast.value - slow
+            signal = self._signal.push(macd)
+            if math.isnan(signal):
+                macd = NAN
+        self.signal.append(signal)
+        self.hist.append(macd - signal)
+        return macd
+
+
+class RSI(Indicator):
+    def __init__(self, period: int = 14, maxlen: int = 2):
+        super().__init__(maxlen)
+        self.period = int(period)
+        self._prev: Optional[float] = None
+        self._gain = 0.0
+        self._loss = 0.0
+
+    @property
+    def lookback(self) -> int:
+        return self.period
+
+    def _step(self, bar) -> float:
+        price = float(bar['close'])
+        prev, self._prev = self._prev, price
+        if prev is None:
+            return NAN
+        change = price - prev
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self.count <= self.period:
+            self._gain += gain / self.period
+            self._loss += loss / self.period
+            if self.count < self.period:
+                return NAN
+        else:
+            self._gain = (self._gain * (self.period - 1) + gain) / self.period
+            self._loss = (self._loss * (self.period - 1) + loss) / self.period
+        total = self._gain + self._loss
+        return 100.0 * self._gain / total if total else 0.0
+
+
+class ATR(Indicator):
+    fields = ('high', 'low', 'close')
+
+    def __init__(self, period: int = 14, maxlen: int = 2):
+        super().__init__(maxlen)
+        self.period = int(period)
+        self._prev_close: Optional[float] = None
+        self._atr = 0.0
+
+    @property
+    def lookback(self) -> int:
+        return self.period
+
+    def _step(self, bar) -> float:
+        high, low, close = float(bar['high']), float(bar['low']), float(bar['close'])
+        prev_close, self._prev_close = self._prev_close, close
+        if prev_close is None:
+            return NAN
+        true_range = max(high, prev_close) - min(low, prev_close)
+        if self.count <= self.period:
+            self._atr += true_range / self.period
+            return self._atr if self.count == self.period else NAN
+        self._atr = (self._atr * (self.period - 1) + true_range) / self.period
+        return self._atr
+
+
+INDICATORS: Dict[str, Type[Indicator]] = {
+    'SMA': SMA,
+    'EMA': EMA,
+    'MACD': MACD,
+    'RSI': RSI,
+    'ATR': ATR,
+}
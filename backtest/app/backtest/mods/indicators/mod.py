@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from rqalpha.api import export_as_api
+from rqalpha.interface import AbstractMod
+from rqalpha.utils.logger import system_log
+
+from .indicators import INDICATORS, Indicator, RingBuffer
+
+# history_bars(order_book_id, bar_count, frequency, fields) -> structured array including 'datetime'
+HistoryFunc = Callable[[str, int, str, Sequence[str]], np.ndarray]
+
+
+def bars_since(history: HistoryFunc, order_book_id: str, frequency: str, fields: Optional[Sequence[str]],
+               last_dt: Optional[int], warmup: int) -> np.ndarray:
+    """Bars from last_dt on (inclusive), or the last `warmup` bars on the first call.
+
+    `fields` of None reads every field, as history_bars does.
+
+    Asks for two bars and doubles the request until it reaches back to
+    last_dt, so a consumer synced every bar costs one short read.
+    """
+    if fields is not None:
+        fields = ['datetime'] + [f for f in fields if f != 'datetime']
+    if last_dt is None:
+        return history(order_book_id, warmup, frequency, fields)
+    count = 2
+    while True:
+        bars = history(order_book_id, count, frequency, fields)
+        if len(bars) < count or bars['datetime'][0] <= last_dt:
+            break
+        count *= 2
+    return bars[bars['datetime'] >= last_dt]
+
+
+def _same_bar(a, b) -> bool:
+    return all(x == y or (x != x and y != y) for x, y in zip(a.tolist(), b.tolist()))
+
+
+class _Feed:
+    """Keeps one consumer (indicator or rolling window) in step with the bar series."""
+
+    def __init__(self, order_book_id: str, frequency: str, fields: Optional[Sequence[str]], warmup: int):
+        self.order_book_id = order_book_id
+        self.frequency = frequency
+        self.fields = None if fields is None else tuple(fields)
+        self.warmup = warmup
+        self.last_dt: Optional[int] = None
+        self._last_bar = None
+
+    def pull(self, history: HistoryFunc) -> Tuple[np.ndarray, bool]:
+        """Bars the consumer has not seen, and whether they replace everything it was fed.
+
+        history_bars pre-adjusts its whole window to the current day, so an
+        ex-dividend or split rewrites bars the consumer already holds. The bar
+        at last_dt is read again on every pull; when it changed, the warmup
+        window is read from scratch and the consumer must be rebuilt.
+        """
+        rebuilt = self.last_dt is None
+        bars = bars_since(history, self.order_book_id, self.frequency, self.fields, self.last_dt, self.warmup)
+        if not rebuilt:
+            overlap = bars[bars['datetime'] == self.last_dt]
+            if len(overlap) and not _same_bar(overlap[0], self._last_bar):
+                rebuilt = True
+                bars = bars_since(history, self.order_book_id, self.frequency, self.fields, None, self.warmup)
+            else:
+                bars = bars[bars['datetime'] > self.last_dt]
+        if len(bars):
+            self.last_dt = int(bars['datetime'][-1])
+            self._last_bar = bars[-1].copy()
+        return bars, rebuilt
+
+
+class IndicatorCache:
+    """Indicators and rolling history windows of one run, keyed by their arguments."""
+
+    def __init__(self, history: HistoryFunc, warmup_bars: int = 100):
+        self._history = history
+        self.warmup_bars = int(warmup_bars)
+        self._indicators: Dict[tuple, Tuple[Indicator, _Feed]] = {}
+        self._windows: Dict[tuple, Tuple[RingBuffer, _Feed]] = {}
+
+    def indicator(self, order_book_id: str, name: str, *args, frequency: str = '1d',
+                  maxlen: int = 2, **kwargs) -> Indicator:
+        key = (order_book_id, name.upper(), args, tuple(sorted(kwargs.items())), frequency, maxlen)
+        entry = self._indicators.get(key)
+        if entry is None:
+            try:
+                cls = INDICATORS[name.upper()]
+            except KeyError:
+                raise ValueError('unknown indicator {}, expected one of {}'.format(
+                    name, ', '.join(INDICATORS)))
+            indicator = cls(*args, maxlen=maxlen, **kwargs)
+            warmup = max(self.warmup_bars, indicator.lookback + maxlen)
+            entry = self._indicators[key] = (indicator, _Feed(order_book_id, frequency, cls.fields, warmup))
+        indicator, feed = entry
+        bars, rebuilt = feed.pull(self._history)
+        if rebuilt and indicator.count:
+            # prices were re-adjusted: start over on the new basis
+            indicator = type(indicator)(*args, maxlen=maxlen, **kwargs)
+            self._indicators[key] = (indicator, feed)
+        for bar in bars:
+            indicator.update(bar)
+        return indicator
+
+    def history(self, order_book_id: str, bar_count: int, frequency: str = '1d',
+                fields=None) -> np.ndarray:
+        single = isinstance(fields, str)
+        names = (fields,) if single else (None if fields is None else tuple(fields))
+        key = (order_book_id, frequency, names)
+        entry = self._windows.get(key)
+        if entry is None or entry[0].capacity < bar_count:
+            feed = _Feed(order_book_id, frequency, names, bar_count)
+            bars, _ = feed.pull(self._history)
+            ring = RingBuffer(bar_count, dtype=bars.dtype)
+            ring.extend(bars)
+            entry = self._windows[key] = (ring, feed)
+        else:
+            ring, feed = entry
+            bars, rebuilt = feed.pull(self._history)
+            if rebuilt:
+                ring.clear()
+            ring.extend(bars)
+        window = entry[0].view(bar_count)
+        if single:
+            return window[fields]
+        return window if names is None else window[list(names)]
+
+    def __len__(self) -> int:
+        return len(self._indicators) + len(self._windows)
+
+
+class IndicatorsMod(AbstractMod):
+    def __init__(self):
+        self._cache: Optional[IndicatorCache] = None
+
+    def start_up(self, env, mod_config):
+        from rqalpha.apis.api_base import history_bars
+
+        def _history(order_book_id, bar_count, frequency, fields):
+            fields = None if fields is None else list(fields)
+            return history_bars(order_book_id, bar_count, frequency, fields, skip_suspended=False)
+
+        self._cache = cache = IndicatorCache(_history, mod_config.warmup_bars)
+
+        def indicator(order_book_id, name, *args, frequency='1d', maxlen=2, **kwargs):
+            """增量指标（SMA/EMA/MACD/RSI/ATR），每根K线只更新一次，参数与 talib 相同"""
+            return cache.indicator(order_book_id, name, *args, frequency=frequency, maxlen=maxlen, **kwargs)
+
+        def rolling_history_bars(order_book_id, bar_count, frequency='1d', fields=None):
+            """等同于 history_bars(..., skip_suspended=False)，由环形缓冲区增量维护，返回只读视图"""
+            return cache.history(order_book_id, bar_count, frequency, fields)
+
+        export_as_api(indicator)
+        export_as_api(rolling_history_bars)
+
+    def tear_down(self, code, exception=None):
+        if self._cache is not None:
+            system_log.info("indicators: 共维护 {} 个指标/滚动窗口", len(self._cache))
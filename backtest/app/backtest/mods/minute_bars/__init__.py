@@ -0,0 +1,27 @@
+"""Serve 1m bars to rqalpha from the dbbardata table.
+
+rqalpha's bundle only holds day bars, so minute backtests need another bar
+source. This mod wraps the data source already set up (the bundle, or the
+shared_bundle mod) and answers the ``1m`` queries from the 1-minute bars the
+importers load into dbbardata. Bars are fetched a few trading days at a time
+with one range scan per contract and kept in an LRU of decoded windows, so
+neither ``handle_bar`` nor ``history_bars`` goes back to the database per bar.
+"""
+
+__config__ = {
+    # dbbardata 所在的 K 线表
+    "table": "dbbardata",
+    # 数据库连接参数（DatabaseConfig.to_dict()，不含密码，密码取 DB_PASSWORD）
+    "database": None,
+    # 每次预取的交易日数
+    "prefetch_days": 5,
+    # 已解码窗口 LRU 的行数上限
+    "cache_rows": 1_000_000,
+    # 在 shared_bundle 之后启动，包装其数据源
+    "priority": 20,
+}
+
+
+def load_mod():
+    from .mod import MinuteBarsMod
+    return MinuteBarsMod()
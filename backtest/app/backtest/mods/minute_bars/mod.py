@@ -0,0 +1,359 @@
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from rqalpha.const import TRADING_CALENDAR_TYPE
+from rqalpha.data.base_data_source import BaseDataSource
+from rqalpha.interface import AbstractMod
+from rqalpha.model.tick import TickObject
+from rqalpha.utils.datetime_func import convert_date_to_int, convert_dt_to_int, convert_int_to_datetime
+from rqalpha.utils.exception import RQInvalidArgument
+from rqalpha.utils.logger import system_log
+
+from app.database import DatabaseConfig, DatabaseConnection
+
+MINUTE_FREQUENCY = '1m'
+
+MINUTE_BAR_DTYPE = np.dtype([
+    ('datetime', '<u8'),
+    ('trading_date', '<u4'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+    ('total_turnover', '<f8'),
+    ('open_interest', '<f8'),
+])
+
+# rqalpha bar field -> dbbardata column
+_FIELD_COLUMNS = (
+    ('open', 'open_price'),
+    ('high', 'high_price'),
+    ('low', 'low_price'),
+    ('close', 'close_price'),
+    ('volume', 'volume'),
+    ('total_turnover', 'turnover'),
+    ('open_interest', 'open_interest'),
+)
+
+# Bars stamped at or after this hour belong to the night session of the next trading day.
+NIGHT_SESSION_HOUR = 18
+
+
+def _datetime_int(value) -> int:
+    """dbbardata datetime (datetime, 'YYYY-mm-dd HH:MM:SS' or ISO string) -> YYYYmmddHHMMSS."""
+    if hasattr(value, 'strftime'):
+        return convert_dt_to_int(value)
+    text = str(value)
+    return int(text[0:4] + text[5:7] + text[8:10] + text[11:13] + text[14:16] + text[17:19])
+
+
+def _format_datetime_int(value: int) -> str:
+    return convert_int_to_datetime(value).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def assign_trading_dates(datetimes: np.ndarray, trading_dates: np.ndarray) -> np.ndarray:
+    """Trading day (YYYYmmdd) of each bar time.
+
+    Day session bars belong to their own date; night session bars (from
+    NIGHT_SESSION_HOUR) and the after-midnight bars of Friday night belong to
+    the next trading date, which skips weekends and holidays.
+    """
+    datetimes = np.asarray(datetimes, dtype='<u8')
+    days = (datetimes // 1_000_000).astype('<i8')
+    night = (datetimes // 10_000) % 100 >= NIGHT_SESSION_HOUR
+    pos = np.where(
+        night,
+        np.searchsorted(trading_dates, days, side='right'),
+        np.searchsorted(trading_dates, days, side='left'),
+    )
+    result = np.zeros(len(datetimes), dtype='<u4')
+    valid = pos < len(trading_dates)
+    result[valid] = trading_dates[pos[valid]]
+    return result
+
+
+def fetch_minute_bars(db, table: str, *, symbol: str, exchange: str,
+                      start: int, end: int) -> np.ndarray:
+    """All 1m bars of one contract with start <= datetime <= end, oldest first.
+
+    trading_date is left at 0 for the caller to fill in. Contract codes are
+    matched in both cases since the importers keep the spelling of the source
+    files (rb2405 on SHFE) while rqalpha order_book_ids are upper case.
+    """
+    select_cols = ', '.join(['datetime'] + [column for _, column in _FIELD_COLUMNS])
+    rows = db.fetchall(
+        f"SELECT {select_cols} FROM {table} "
+        f"WHERE symbol IN (?, ?) AND exchange = ? AND `interval` = ? "
+        f"AND datetime >= ? AND datetime <= ? "
+        f"ORDER BY datetime ASC",
+        (symbol.upper(), symbol.lower(), exchange, MINUTE_FREQUENCY,
+         _format_datetime_int(start), _format_datetime_int(end)),
+    )
+    bars = np.zeros(len(rows), dtype=MINUTE_BAR_DTYPE)
+    if rows:
+        bars['datetime'] = [_datetime_int(row['datetime']) for row in rows]
+        for field, column in _FIELD_COLUMNS:
+            bars[field] = [float(row[column] or 0.0) for row in rows]
+    return bars
+
+
+class WindowCache:
+    """LRU of decoded bar windows, bounded by the total number of rows held."""
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self._entries: OrderedDict = OrderedDict()
+        self._rows = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[np.ndarray]:
+        bars = self._entries.get(key)
+        if bars is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return bars
+
+    def put(self, key: tuple, bars: np.ndarray) -> None:
+        if len(bars) > self.max_rows:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._rows -= len(old)
+        self._entries[key] = bars
+        self._rows += len(bars)
+        while self._rows > self.max_rows and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._rows -= len(evicted)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def rows(self) -> int:
+        return self._rows
+
+
+class MinuteBarDataSource:
+    """Wraps another rqalpha data source and answers 1m queries from dbbardata.
+
+    Bars are loaded per chunk of `prefetch_days` trading days, aligned on the
+    trading calendar so that every bar time maps to exactly one chunk. Every
+    other call, and every non-1m frequency, goes to the wrapped data source.
+    """
+
+    def __init__(self, inner, db, table: str = 'dbbardata',
+                 prefetch_days: int = 5, cache_rows: int = 1_000_000):
+        self._inner = inner
+        self._db = db
+        self._table = table
+        self._prefetch_days = max(1, int(prefetch_days))
+        self._windows = WindowCache(int(cache_rows))
+        self._spans: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._trading_dates: Optional[np.ndarray] = None
+        self.queries = 0
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    @property
+    def trading_dates(self) -> np.ndarray:
+        if self._trading_dates is None:
+            calendar = self._inner.get_trading_calendars()[TRADING_CALENDAR_TYPE.CN_STOCK]
+            self._trading_dates = np.asarray(convert_date_to_int(calendar), dtype='<i8') // 1_000_000
+        return self._trading_dates
+
+    def _trading_date_of(self, dt) -> int:
+        return int(assign_trading_dates(np.array([convert_dt_to_int(dt)]), self.trading_dates)[0])
+
+    def _chunk_of(self, trading_date: int) -> int:
+        pos = int(np.searchsorted(self.trading_dates, trading_date, side='left'))
+        return min(pos, len(self.trading_dates) - 1) // self._prefetch_days
+
+    def _chunk_bounds(self, chunk: int) -> Tuple[int, int]:
+        """Bar time range [start, end] of the trading days in a chunk."""
+        dates = self.trading_dates
+        first = chunk * self._prefetch_days
+        last = min(first + self._prefetch_days, len(dates)) - 1
+        if first > 0:
+            previous = int(dates[first - 1])
+        else:
+            previous = convert_date_to_int(convert_int_to_datetime(int(dates[0]) * 1_000_000) - timedelta(days=1))
+            previous //= 1_000_000
+        return (previous * 1_000_000 + NIGHT_SESSION_HOUR * 10_000,
+                int(dates[last]) * 1_000_000 + (NIGHT_SESSION_HOUR - 1) * 10_000 + 5959)
+
+    def _span(self, instrument) -> Optional[Tuple[int, int]]:
+        """(first, last) bar time of a contract in dbbardata, None if it has no 1m bars."""
+        order_book_id = instrument.order_book_id
+        if order_book_id not in self._spans:
+            row = self._db.fetchone(
+                f"SELECT MIN(datetime) AS first_dt, MAX(datetime) AS last_dt FROM {self._table} "
+                f"WHERE symbol IN (?, ?) AND exchange = ? AND `interval` = ?",
+                (order_book_id.upper(), order_book_id.lower(), instrument.exchange, MINUTE_FREQUENCY),
+            )
+            self.queries += 1
+            if row and row.get('first_dt') is not None:
+                self._spans[order_book_id] = (_datetime_int(row['first_dt']), _datetime_int(row['last_dt']))
+            else:
+                self._spans[order_book_id] = None
+        return self._spans[order_book_id]
+
+    def _window(self, instrument, chunk: int) -> np.ndarray:
+        span = self._span(instrument)
+        start, end = self._chunk_bounds(chunk)
+        if span is None or end < span[0] or start > span[1]:
+            return np.empty(0, dtype=MINUTE_BAR_DTYPE)
+        key = (instrument.order_book_id, chunk)
+        bars = self._windows.get(key)
+        if bars is None:
+            bars = fetch_minute_bars(
+                self._db, self._table,
+                symbol=instrument.order_book_id, exchange=instrument.exchange, start=start, end=end,
+            )
+            self.queries += 1
+            bars['trading_date'] = assign_trading_dates(bars['datetime'], self.trading_dates)
+            bars.flags.writeable = False
+            self._windows.put(key, bars)
+        return bars
+
+    def _day_bars(self, instrument, trading_date: int) -> np.ndarray:
+        bars = self._window(instrument, self._chunk_of(trading_date))
+        lo, hi = np.searchsorted(bars['trading_date'], [trading_date, trading_date + 1])
+        return bars[lo:hi]
+
+    def get_bar(self, instrument, dt, frequency):
+        if frequency != MINUTE_FREQUENCY:
+            return self._inner.get_bar(instrument, dt, frequency)
+        bars = self._window(instrument, self._chunk_of(self._trading_date_of(dt)))
+        dt_int = np.uint64(convert_dt_to_int(dt))
+        pos = bars['datetime'].searchsorted(dt_int)
+        if pos >= len(bars) or bars['datetime'][pos] != dt_int:
+            return None
+        return bars[pos]
+
+    def history_bars(self, instrument, bar_count, frequency, fields, dt, skip_suspended=True,
+                     include_now=False, adjust_type='pre', adjust_orig=None):
+        if frequency != MINUTE_FREQUENCY:
+            return self._inner.history_bars(
+                instrument, bar_count, frequency, fields, dt, skip_suspended=skip_suspended,
+                include_now=include_now, adjust_type=adjust_type, adjust_orig=adjust_orig,
+            )
+        if not BaseDataSource._are_fields_valid(fields, MINUTE_BAR_DTYPE.names):
+            raise RQInvalidArgument("invalid fields: {}".format(fields))
+
+        # dbbardata holds futures, which need no price adjustment.
+        chunk = self._chunk_of(self._trading_date_of(dt))
+        bars = self._window(instrument, chunk)
+        parts = [bars[:bars['datetime'].searchsorted(np.uint64(convert_dt_to_int(dt)), side='right')]]
+        count = len(parts[0])
+        span = self._span(instrument)
+        while span is not None and (bar_count is None or count < bar_count) and chunk > 0:
+            chunk -= 1
+            if self._chunk_bounds(chunk)[1] < span[0]:
+                break
+            bars = self._window(instrument, chunk)
+            parts.append(bars)
+            count += len(bars)
+
+        bars = np.concatenate(parts[::-1]) if len(parts) > 1 else parts[0]
+        if bar_count is not None:
+            bars = bars[max(len(bars) - bar_count, 0):]
+        return bars if fields is None else bars[fields]
+
+    def get_trading_minutes_for(self, instrument, trading_dt) -> List[int]:
+        """Bar times of a contract on a trading day, taken from its bars."""
+        trading_date = convert_date_to_int(trading_dt) // 1_000_000
+        return self._day_bars(instrument, trading_date)['datetime'].tolist()
+
+    def current_snapshot(self, instrument, frequency, dt):
+        if frequency != MINUTE_FREQUENCY:
+            return self._inner.current_snapshot(instrument, frequency, dt)
+        trading_date = self._trading_date_of(dt)
+        bars = self._day_bars(instrument, trading_date)
+        bars = bars[:bars['datetime'].searchsorted(np.uint64(convert_dt_to_int(dt)), side='right')]
+        if len(bars) == 0:
+            return None
+        snapshot = {
+            'datetime': bars['datetime'][-1],
+            'open': bars['open'][0],
+            'high': bars['high'].max(),
+            'low': bars['low'].min(),
+            'last': bars['close'][-1],
+            'volume': bars['volume'].sum(),
+            'total_turnover': bars['total_turnover'].sum(),
+            'open_interest': bars['open_interest'][-1],
+        }
+        day_bar = self._inner.get_bar(instrument, convert_int_to_datetime(trading_date * 1_000_000), '1d')
+        if day_bar is not None:
+            for field in ('prev_close', 'limit_up', 'limit_down', 'prev_settlement'):
+                if field in day_bar.dtype.names:
+                    snapshot[field] = day_bar[field]
+        return TickObject(instrument, snapshot)
+
+    def available_data_range(self, frequency):
+        if frequency == MINUTE_FREQUENCY:
+            frequency = '1d'
+        return self._inner.available_data_range(frequency)
+
+    def stats(self) -> dict:
+        return {
+            'queries': self.queries,
+            'windows': len(self._windows),
+            'rows': self._windows.rows,
+            'hits': self._windows.hits,
+            'misses': self._windows.misses,
+        }
+
+
+def database_config(mod_config) -> DatabaseConfig:
+    """Connection settings from the mod config, falling back to the DB_* environment."""
+    config_dict = dict(getattr(mod_config, 'database', None) or {})
+    if not config_dict:
+        config_dict = {
+            'db_type': os.environ.get('DB_TYPE', 'sqlite').lower(),
+            'sqlite_path': os.environ.get('MARKET_DATA_DB_PATH') or None,
+            'host': os.environ.get('DB_HOST', 'localhost'),
+            'port': int(os.environ.get('DB_PORT', '3306')),
+            'database': os.environ.get('DB_NAME', 'backquant'),
+            'user': os.environ.get('DB_USER', 'root'),
+        }
+    config_dict.setdefault('password', os.environ.get('DB_PASSWORD', ''))
+    return DatabaseConfig.from_dict(config_dict)
+
+
+class MinuteBarsMod(AbstractMod):
+    def __init__(self):
+        self._db = None
+        self._data_source = None
+
+    def start_up(self, env, mod_config):
+        if env.config.base.frequency != MINUTE_FREQUENCY:
+            return
+        inner = getattr(env, 'data_source', None)
+        if inner is None:
+            inner = BaseDataSource(env.config.base)
+        self._db = DatabaseConnection(database_config(mod_config))
+        self._db.connect()
+        self._data_source = MinuteBarDataSource(
+            inner, self._db, table=mod_config.table,
+            prefetch_days=mod_config.prefetch_days, cache_rows=mod_config.cache_rows,
+        )
+        env.set_data_source(self._data_source)
+        system_log.info("minute_bars: 分钟线从 {} 读取，每次预取 {} 个交易日",
+                        mod_config.table, mod_config.prefetch_days)
+
+    def tear_down(self, code, exception=None):
+        if self._data_source is not None:
+            system_log.info("minute_bars: 统计 {}", self._data_source.stats())
+        if self._db is not None:
+            self._db.close()
+            self._db = None
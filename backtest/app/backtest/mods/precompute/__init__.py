@@ -0,0 +1,29 @@
+"""Vectorized pre-compute hook for signal strategies.
+
+A strategy may define ``precompute(context, data)`` next to ``init`` and
+``handle_bar``. It is called once after ``init`` with a ``PrecomputeData``
+whose ``prices(order_book_ids, 'close')`` returns whole daily price arrays
+aligned on ``data.dates``, and returns a dict of signal arrays computed in
+one shot with NumPy/talib::
+
+    def precompute(context, data):
+        close = data.prices(context.stocks)
+        fast, slow = ..., ...
+        return {'cross': {obid: (fast > slow)[:, i] for i, obid in enumerate(context.stocks)}}
+
+``handle_bar`` then reads the current bar's value with
+``precomputed('cross', order_book_id)`` (``offset=-1`` for the previous bar)
+instead of calling history_bars and recomputing on every bar. Only daily
+backtests call the hook.
+"""
+
+__config__ = {
+    # 回测开始前额外提供的历史交易日数（策略可用 context.precompute_lookback 覆盖）
+    "lookback_days": 250,
+    "priority": 40,
+}
+
+
+def load_mod():
+    from .mod import PrecomputeMod
+    return PrecomputeMod()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+from rqalpha.api import export_as_api
+from rqalpha.const import EXC_TYPE, EXECUTION_PHASE
+from rqalpha.core.events import EVENT
+from rqalpha.core.execution_context import ExecutionContext
+from rqalpha.interface import AbstractMod, AbstractStrategyLoader
+from rqalpha.utils.datetime_func import convert_date_to_int
+from rqalpha.utils.exception import ModifyExceptionFromType
+from rqalpha.utils.logger import system_log, user_system_log
+
+HOOK_NAME = 'precompute'
+
+# Phases that run before the day's bar closes read the previous trading day's value.
+_PRE_BAR_PHASES = {EXECUTION_PHASE.BEFORE_TRADING, EXECUTION_PHASE.OPEN_AUCTION}
+
+
+class PrecomputeData:
+    """Whole price histories aligned on the trading days of the run.
+
+    ``dates`` (YYYYmmdd ints) starts `lookback` trading days before the
+    backtest start so that indicators are warmed up by the first bar; row i
+    of every array returned here belongs to ``dates[i]``.
+    """
+
+    def __init__(self, data_proxy, dates: np.ndarray, end_dt: datetime):
+        self._data_proxy = data_proxy
+        self.dates = dates
+        self._end_dt = end_dt
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def index_of(self, date) -> int:
+        """Row of a trading date, or of the last trading date before it."""
+        return int(np.searchsorted(self.dates, convert_date_to_int(date) // 1_000_000, side='right')) - 1
+
+    def _column(self, order_book_id: str, field: str, adjust_type: str) -> np.ndarray:
+        column = np.full(len(self.dates), np.nan)
+        try:
+            bars = self._data_proxy.history_bars(
+                order_book_id, len(self.dates), '1d', ['datetime', field], self._end_dt,
+                skip_suspended=False, adjust_type=adjust_type, adjust_orig=self._end_dt,
+            )
+        except Exception as exc:
+            user_system_log.warn('precompute: 无法读取 {} 的 {}: {}'.format(order_book_id, field, exc))
+            return column
+        if bars is None or len(bars) == 0:
+            return column
+        days = bars['datetime'] // 1_000_000
+        rows = np.searchsorted(self.dates, days)
+        found = (rows < len(self.dates)) & (self.dates[np.minimum(rows, len(self.dates) - 1)] == days)
+        column[rows[found]] = bars[field][found]
+        return column
+
+    def prices(self, order_book_ids: Union[str, Sequence[str]], field: str = 'close',
+               adjust_type: str = 'pre') -> np.ndarray:
+        """One field of daily bars: a 1-D array for one order_book_id, else (len(dates), n).
+
+        Days without a bar (not yet listed, suspended, delisted) are NaN.
+        Pre-adjusted prices are relative to the end of the run, a constant
+        factor away from what history_bars returns on any earlier day.
+        """
+        if isinstance(order_book_ids, str):
+            return self._column(order_book_ids, field, adjust_type)
+        columns = [self._column(order_book_id, field, adjust_type) for order_book_id in order_book_ids]
+        if not columns:
+            return np.empty((len(self.dates), 0))
+        return np.column_stack(columns)
+
+
+class Precomputed:
+    """Signals returned by the strategy's precompute hook, looked up by bar."""
+
+    def __init__(self, data: PrecomputeData, values: Dict[str, object]):
+        self.data = data
+        self._values = values
+
+    def names(self) -> List[str]:
+        return sorted(self._values)
+
+    def value(self, name: str, order_book_id: Optional[str], dt, phase=None, offset: int = 0):
+        try:
+            series = self._values[name]
+        except KeyError:
+            raise KeyError('precompute 未返回信号 {}，已有: {}'.format(name, ', '.join(self.names())))
+        if isinstance(series, dict):
+            if order_book_id is None:
+                raise ValueError('信号 {} 按合约返回，需要指定 order_book_id'.format(name))
+            series = series[order_book_id]
+        elif order_book_id is not None:
+            raise ValueError('信号 {} 不区分合约，不能指定 order_book_id'.format(name))
+        index = self.data.index_of(dt) + int(offset)
+        if phase in _PRE_BAR_PHASES:
+            index -= 1
+        if index < 0 or index >= len(series):
+            return np.nan
+        return series[index]
+
+
+class _HookCapturingLoader(AbstractStrategyLoader):
+    """Strategy loader that remembers the scope it loaded the strategy into."""
+
+    def __init__(self, loader):
+        self._loader = loader
+        self.scope = None
+
+    def load(self, scope):
+        self.scope = self._loader.load(scope)
+        return self.scope
+
+
+class PrecomputeMod(AbstractMod):
+    def __init__(self):
+        self._env = None
+        self._lookback = 0
+        self._loader: Optional[_HookCapturingLoader] = None
+        self._precomputed: Optional[Precomputed] = None
+
+    def start_up(self, env, mod_config):
+        self._env = env
+        self._lookback = int(mod_config.lookback_days)
+        self._loader = _HookCapturingLoader(env.strategy_loader)
+        env.set_strategy_loader(self._loader)
+        env.event_bus.add_listener(EVENT.POST_USER_INIT, self._on_post_user_init)
+
+        def precomputed(name, order_book_id=None, offset=0):
+            """读取 precompute(context, data) 返回的信号在当前K线的取值，offset=-1 为上一根"""
+            if self._precomputed is None:
+                raise RuntimeError('策略未定义 precompute(context, data)，或当前频率不支持预计算（仅 1d）')
+            return self._precomputed.value(
+                name, order_book_id, env.trading_dt, ExecutionContext.phase(), offset)
+
+        export_as_api(precomputed)
+
+    def _on_post_user_init(self, _event):
+        hook = (self._loader.scope or {}).get(HOOK_NAME)
+        if hook is None:
+            return
+        env = self._env
+        if env.config.base.frequency != '1d':
+            user_system_log.warn('precompute 仅支持日线回测，当前频率 {} 下不会调用'.format(env.config.base.frequency))
+            return
+        context = env.user_strategy.user_context
+        lookback = int(getattr(context, 'precompute_lookback', self._lookback))
+        start, end = env.config.base.start_date, env.config.base.end_date
+        trading_dates = env.data_proxy.get_trading_dates(start, end)
+        first = env.data_proxy.get_previous_trading_date(start, lookback) if lookback > 0 else trading_dates[0]
+        dates = env.data_proxy.get_trading_dates(first, end)
+        dates = np.asarray(convert_date_to_int(dates), dtype='<i8') // 1_000_000
+        end_dt = datetime.combine(end, datetime.max.time()).replace(microsecond=0)
+
+        data = PrecomputeData(env.data_proxy, dates, end_dt)
+        with ExecutionContext(EXECUTION_PHASE.ON_INIT):
+            with ModifyExceptionFromType(EXC_TYPE.USER_EXC):
+                values = hook(context, data)
+                if values is not None and not isinstance(values, dict):
+                    raise TypeError('precompute 应返回 dict（信号名 -> 数组，或 order_book_id -> 数组）')
+        self._precomputed = Precomputed(data, values or {})
+        system_log.info('precompute: {} 个交易日，信号 {}', len(dates), ', '.join(self._precomputed.names()) or '无')
+
+    def tear_down(self, code, exception=None):
+        pass
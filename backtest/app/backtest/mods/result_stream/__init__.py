@@ -0,0 +1,31 @@
+"""Equity points, trades and positions of a running backtest, for partial results.
+
+sys_analyser only writes result.pkl when the run ends. This mod appends each
+settled day's portfolio values (with the benchmark's net value), the day's
+trades and the positions held at the close to append-only columnar tables
+under ``path`` (stream.py), so the web app can serve the equity curve and
+trades of a job that is still running and a bad run can be cancelled early.
+
+With ``summary`` on, the stream is the job's result: sys_analyser is
+disabled (it keeps every trade, position and order record in memory until
+the run ends) and this mod writes ``summary.json`` from the tables instead
+(summary.py).
+
+Rows on or after the run's start date are dropped when it starts: a run
+resumed from a checkpoint keeps the rows written before it, a fresh run
+starts empty.
+"""
+
+__config__ = {
+    # 数据流目录（一般为 <job_dir>/stream）
+    "path": None,
+    # 结束时写入 summary.json，数据流即回测结果（此时 sys_analyser 不启用）
+    "summary": False,
+    # 晚于 checkpoint 启动，以便按续跑后的开始日期截断已有数据
+    "priority": 60,
+}
+
+
+def load_mod():
+    from .mod import ResultStreamMod
+    return ResultStreamMod()
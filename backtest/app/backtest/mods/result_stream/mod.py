@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from rqalpha.const import EXIT_CODE
+from rqalpha.core.events import EVENT
+from rqalpha.interface import AbstractMod
+from rqalpha.mod.rqalpha_mod_sys_analyser.mod import AnalyserMod
+from rqalpha.utils.logger import system_log
+
+from .stream import (
+    EQUITY_COLUMNS,
+    EQUITY_TABLE,
+    POSITION_COLUMNS,
+    POSITIONS_TABLE,
+    TRADE_COLUMNS,
+    TRADES_TABLE,
+    StreamTable,
+    read_table,
+    remove_summary,
+    write_summary,
+)
+from .summary import build_summary
+
+
+def _datetime_int(dt) -> int:
+    return int(dt.strftime('%Y%m%d%H%M%S'))
+
+
+def _date_int(d) -> int:
+    return int(d.strftime('%Y%m%d'))
+
+
+class ResultStreamMod(AbstractMod):
+    def __init__(self):
+        self._env = None
+        self._root: Optional[Path] = None
+        self._summary = False
+        self._equity: Optional[StreamTable] = None
+        self._trades: Optional[StreamTable] = None
+        self._positions: Optional[StreamTable] = None
+        self._pending_trades: List[tuple] = []
+        self._benchmark_nav: Optional[Dict[int, float]] = None
+        # benchmark net value of the last day kept from before a resumed run
+        self._benchmark_base = 1.0
+
+    def start_up(self, env, mod_config):
+        if not mod_config.path:
+            raise RuntimeError('result_stream mod 需要配置 path')
+        self._env = env
+        self._root = Path(mod_config.path)
+        self._summary = bool(mod_config.summary)
+        self._equity = StreamTable(self._root / EQUITY_TABLE, EQUITY_COLUMNS)
+        self._trades = StreamTable(self._root / TRADES_TABLE, TRADE_COLUMNS)
+        self._positions = StreamTable(self._root / POSITIONS_TABLE, POSITION_COLUMNS)
+        remove_summary(self._root)
+
+        # keep only what a resumed run does not write again
+        start = _date_int(env.config.base.start_date)
+        equity, _ = read_table(self._equity.path)
+        kept = int(np.searchsorted(equity.get('date', []), start))
+        self._equity.truncate(kept)
+        if kept and not np.isnan(equity['benchmark_nav'][kept - 1]):
+            self._benchmark_base = float(equity['benchmark_nav'][kept - 1])
+        trades, _ = read_table(self._trades.path)
+        self._trades.truncate(int(np.searchsorted(trades.get('trading_datetime', []), start * 1000000)))
+        positions, _ = read_table(self._positions.path)
+        self._positions.truncate(int(np.searchsorted(positions.get('date', []), start)))
+
+        env.event_bus.add_listener(EVENT.TRADE, self._on_trade)
+        # ahead of the checkpoint mod, so a checkpointed day's rows are already written
+        env.event_bus.prepend_listener(EVENT.POST_SETTLEMENT, self._on_settlement)
+
+    def _symbol(self, order_book_id, dt) -> bytes:
+        return self._env.data_proxy.get_active_instrument(order_book_id, dt).symbol.encode('utf-8')
+
+    def _on_trade(self, event):
+        trade = event.trade
+        self._pending_trades.append((
+            _datetime_int(trade.datetime),
+            _datetime_int(trade.trading_datetime),
+            trade.order_book_id.encode('utf-8'),
+            self._symbol(trade.order_book_id, trade.trading_datetime),
+            trade.side.name.encode('utf-8'),
+            trade.position_effect.name.encode('utf-8'),
+            trade.exec_id,
+            trade.tax,
+            trade.commission,
+            trade.last_quantity,
+            trade.last_price,
+            trade.order_id,
+            trade.transaction_cost,
+        ))
+
+    def _parsed_benchmark(self):
+        benchmark = getattr(self._env.config.base, 'benchmark', None)
+        return AnalyserMod._parse_benchmark(benchmark) if benchmark else None
+
+    def _benchmark_value(self, day: int) -> float:
+        if self._benchmark_nav is None:
+            self._benchmark_nav = {}
+            analyser = self._env.mod_dict.get('sys_analyser')
+            if analyser is not None:
+                # sys_analyser computes the whole benchmark series before the run (and the checkpoint
+                # mod completes it on resume, before the first settlement)
+                portfolios = getattr(analyser, '_total_benchmark_portfolios', None)
+                base = 1.0
+            else:
+                # sys_analyser is off when the stream is the result: build its series for this run
+                # (the resumed range only, continued from the last kept day)
+                benchmark = self._parsed_benchmark()
+                portfolios = None
+                if benchmark:
+                    helper = AnalyserMod()
+                    helper._env = self._env
+                    helper._benchmark = benchmark
+                    helper.generate_benchmark_daily_returns_and_portfolio(None)
+                    portfolios = helper._total_benchmark_portfolios
+                base = self._benchmark_base
+            if isinstance(portfolios, dict):
+                self._benchmark_nav = {
+                    _date_int(d): base * float(v) for d, v in zip(portfolios['date'], portfolios['unit_net_value'])
+                }
+        return self._benchmark_nav.get(day, np.nan)
+
+    def _on_settlement(self, _event):
+        day = _date_int(self._env.calendar_dt)
+        portfolio = self._env.portfolio
+        if self._pending_trades:
+            columns = list(zip(*self._pending_trades))
+            self._trades.append({name: columns[i] for i, (name, _) in enumerate(TRADE_COLUMNS)})
+            self._pending_trades = []
+        positions = [p for p in portfolio.get_positions() if p.quantity]
+        if positions:
+            self._positions.append({
+                'date': [day] * len(positions),
+                'order_book_id': [p.order_book_id.encode('utf-8') for p in positions],
+                'symbol': [self._symbol(p.order_book_id, self._env.trading_dt) for p in positions],
+                'direction': [p.direction.name.encode('utf-8') for p in positions],
+                'quantity': [p.quantity for p in positions],
+                'avg_price': [p.avg_price for p in positions],
+                'last_price': [p.last_price for p in positions],
+                'market_value': [p.market_value for p in positions],
+                'pnl': [p.pnl for p in positions],
+            })
+        self._equity.append({
+            'date': [day],
+            'total_value': [portfolio.total_value],
+            'unit_net_value': [portfolio.unit_net_value],
+            'returns': [portfolio.daily_returns],
+            'cash': [portfolio.cash],
+            'market_value': [portfolio.market_value],
+            'daily_pnl': [portfolio.daily_pnl],
+            'benchmark_nav': [self._benchmark_value(day)],
+        })
+
+    def tear_down(self, code, exception=None):
+        if not self._summary or code != EXIT_CODE.EXIT_SUCCESS or not len(self._equity):
+            return
+        write_summary(self._root, build_summary(self._env, self._root, self._parsed_benchmark()))
+        system_log.info('result_stream: 已写入回测汇总 {}', self._root)
@@ -0,0 +1,211 @@
+"""Append-only columnar tables written while a backtest runs.
+
+A table is a directory holding ``schema.json`` (column names and NumPy
+dtypes) and one raw ``<column>.bin`` file per column, appended in place::
+
+    <job_dir>/stream/equity/
+      schema.json  date.bin  total_value.bin  unit_net_value.bin  ...
+
+Rows are appended one column file after another, so a reader may see a
+column that is a few rows ahead of the others; it uses the complete rows
+only (the shortest column). Nothing here imports rqalpha: the web app
+reads the tables of running jobs with ``read_table``.
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SCHEMA_FILE = "schema.json"
+SUMMARY_FILE = "summary.json"
+
+
+def _column_path(path: Path, name: str) -> Path:
+    return path / f"{name}.bin"
+
+
+def _read_schema(path: Path) -> Optional[List[Tuple[str, np.dtype]]]:
+    try:
+        payload = json.loads((path / SCHEMA_FILE).read_text(encoding="utf-8"))
+        return [(str(name), np.dtype(dtype)) for name, dtype in payload["columns"]]
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+
+
+def _row_count(path: Path, columns: Sequence[Tuple[str, np.dtype]]) -> int:
+    counts = []
+    for name, dtype in columns:
+        try:
+            counts.append(os.path.getsize(_column_path(path, name)) // dtype.itemsize)
+        except OSError:
+            return 0
+    return min(counts) if counts else 0
+
+
+class StreamTable:
+    """Writer of one table; created (or reopened with the same schema) on construction."""
+
+    def __init__(self, path: Path, columns: Sequence[Tuple[str, str]]):
+        self.path = Path(path)
+        self.columns = [(name, np.dtype(dtype)) for name, dtype in columns]
+        if _read_schema(self.path) != self.columns:
+            self.path.mkdir(parents=True, exist_ok=True)
+            for name, _ in self.columns:
+                _column_path(self.path, name).write_bytes(b"")
+            (self.path / SCHEMA_FILE).write_text(
+                json.dumps({"columns": [[name, dtype.str] for name, dtype in self.columns]}), encoding="utf-8"
+            )
+
+    def __len__(self) -> int:
+        return _row_count(self.path, self.columns)
+
+    def truncate(self, rows: int) -> None:
+        """Keep the first ``rows`` rows (and drop any partly written one)."""
+        rows = min(rows, len(self))
+        for name, dtype in self.columns:
+            os.truncate(_column_path(self.path, name), rows * dtype.itemsize)
+
+    def append(self, rows: Dict[str, Sequence]) -> None:
+        arrays = [np.asarray(rows[name], dtype=dtype) for name, dtype in self.columns]
+        if len({len(array) for array in arrays}) != 1:
+            raise ValueError("columns of appended rows must have the same length")
+        if not len(arrays[0]):
+            return
+        for (name, _), array in zip(self.columns, arrays):
+            with _column_path(self.path, name).open("ab") as f:
+                f.write(array.tobytes())
+
+
+def read_table(path: Path, start: int = 0, stop: Optional[int] = None) -> Tuple[Dict[str, np.ndarray], int]:
+    """Columns of rows ``[start, stop)`` of the table at ``path`` and its complete row count.
+
+    A missing table reads as empty. String columns are bytes (``dtype 'S'``).
+    """
+    path = Path(path)
+    columns = _read_schema(path)
+    if columns is None:
+        return {}, 0
+    total = _row_count(path, columns)
+    start = min(max(start, 0), total)
+    stop = total if stop is None else min(max(stop, start), total)
+    data = {}
+    for name, dtype in columns:
+        with _column_path(path, name).open("rb") as f:
+            f.seek(start * dtype.itemsize)
+            data[name] = np.fromfile(f, dtype=dtype, count=stop - start)
+    return data, total
+
+
+EQUITY_TABLE = "equity"
+TRADES_TABLE = "trades"
+POSITIONS_TABLE = "positions"
+# date is YYYYmmdd, datetimes YYYYmmddHHMMSS, like the bundle's bars
+EQUITY_COLUMNS = [
+    ("date", "<i4"),
+    ("total_value", "<f8"),
+    ("unit_net_value", "<f8"),
+    ("returns", "<f8"),
+    ("cash", "<f8"),
+    ("market_value", "<f8"),
+    ("daily_pnl", "<f8"),
+    ("benchmark_nav", "<f8"),
+]
+TRADE_COLUMNS = [
+    ("datetime", "<i8"),
+    ("trading_datetime", "<i8"),
+    ("order_book_id", "S32"),
+    ("symbol", "S64"),
+    ("side", "S8"),
+    ("position_effect", "S16"),
+    ("exec_id", "<i8"),
+    ("tax", "<f8"),
+    ("commission", "<f8"),
+    ("last_quantity", "<f8"),
+    ("last_price", "<f8"),
+    ("order_id", "<i8"),
+    ("transaction_cost", "<f8"),
+]
+POSITION_COLUMNS = [
+    ("date", "<i4"),
+    ("order_book_id", "S32"),
+    ("symbol", "S64"),
+    ("direction", "S8"),
+    ("quantity", "<f8"),
+    ("avg_price", "<f8"),
+    ("last_price", "<f8"),
+    ("market_value", "<f8"),
+    ("pnl", "<f8"),
+]
+
+
+def _format_date(value: int) -> str:
+    text = f"{int(value):08d}"
+    return f"{text[:4]}-{text[4:6]}-{text[6:8]}"
+
+
+def _format_datetime(value: int) -> str:
+    text = f"{int(value):014d}"
+    return f"{text[:4]}-{text[4:6]}-{text[6:8]} {text[8:10]}:{text[10:12]}:{text[12:14]}"
+
+
+def _json_float(value: float):
+    return None if np.isnan(value) else float(value)
+
+
+def read_equity(stream_dir: Path, start: int = 0) -> Tuple[dict, int]:
+    """Equity points from row ``start`` on, shaped like the result's ``equity``, and the row count."""
+    data, total = read_table(Path(stream_dir) / EQUITY_TABLE, start)
+    if not data:
+        return {"dates": [], "nav": [], "returns": [], "benchmark_nav": []}, total
+    return {
+        "dates": [_format_date(v) for v in data["date"]],
+        # the result's equity.nav is total_value as well
+        "nav": data["total_value"].tolist(),
+        "returns": data["returns"].tolist(),
+        "benchmark_nav": [_json_float(v) for v in data["benchmark_nav"]],
+    }, total
+
+
+def read_trades(stream_dir: Path, start: int = 0, stop: Optional[int] = None) -> Tuple[List[dict], int]:
+    """Trade records of rows ``[start, stop)``, keyed like the result's trades, and the row count."""
+    data, total = read_table(Path(stream_dir) / TRADES_TABLE, start, stop)
+    if not data:
+        return [], total
+    columns = {}
+    for name, _ in TRADE_COLUMNS:
+        values = data[name]
+        if name in ("datetime", "trading_datetime"):
+            columns[name] = [_format_datetime(v) for v in values]
+        elif values.dtype.kind == "S":
+            columns[name] = [v.decode("utf-8", "replace") for v in values]
+        else:
+            columns[name] = values.tolist()
+    return [dict(zip(columns, row)) for row in zip(*columns.values())], total
+
+
+def write_summary(stream_dir: Path, summary: dict) -> None:
+    """Write the summary of a finished run; its presence marks the stream as the job's result."""
+    path = Path(stream_dir) / SUMMARY_FILE
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(json.dumps(summary, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def read_summary(stream_dir: Path) -> Optional[dict]:
+    """Summary written by a run whose result is the stream, or None."""
+    try:
+        payload = json.loads((Path(stream_dir) / SUMMARY_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def remove_summary(stream_dir: Path) -> None:
+    try:
+        (Path(stream_dir) / SUMMARY_FILE).unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,194 @@
+"""sys_analyser's summary, computed from the stream tables when the run ends.
+
+Only the per-day equity columns are loaded (a few floats per trading day);
+trades are read in chunks for the turnover. Memory stays flat however many
+bars and trades the run has.
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from rqalpha.mod.rqalpha_mod_sys_analyser.mod import EQUITIES_OID_RE
+from rqalpha.mod.rqalpha_mod_sys_analyser.plot.utils import max_ddd as _max_ddd
+from rqalpha.utils import resample_monthly
+from rqrisk import DAILY, MONTHLY, WEEKLY, Risk
+
+from .stream import EQUITY_TABLE, TRADES_TABLE, read_table
+
+TRADES_CHUNK_ROWS = 65536
+
+
+def _period_returns(nav: pd.Series) -> pd.Series:
+    return (nav / nav.shift(1).fillna(1)).fillna(0) - 1
+
+
+def _trade_values(root: Path, days: np.ndarray):
+    """Traded value per equity day, or None if the run traded anything but equities."""
+    values = np.zeros(len(days))
+    start = 0
+    while True:
+        data, total = read_table(root / TRADES_TABLE, start, start + TRADES_CHUNK_ROWS)
+        if not data or not len(data['datetime']):
+            break
+        if not all(EQUITIES_OID_RE.match(oid.decode('utf-8')) for oid in np.unique(data['order_book_id'])):
+            return None
+        index = np.searchsorted(days, data['datetime'] // 1000000).clip(0, len(days) - 1)
+        np.add.at(values, index, data['last_price'] * data['last_quantity'])
+        start += len(data['datetime'])
+        if start >= total:
+            break
+    return values if start else None
+
+
+def build_summary(env, root: Path, benchmark) -> dict:
+    """The summary sys_analyser would report for this run.
+
+    ``benchmark`` is the parsed ``[(order_book_id, weight)]`` list, or None.
+    """
+    base = env.config.base
+    data_proxy = env.data_proxy
+    trading_days_a_year = env.trading_days_a_year
+    equity, _ = read_table(root / EQUITY_TABLE)
+    days = equity['date']
+    index = pd.to_datetime(days.astype(str), format='%Y%m%d')
+
+    summary = {
+        'strategy_name': os.path.basename(base.strategy_file).split('.')[0],
+        'start_date': base.start_date.strftime('%Y-%m-%d'),
+        'end_date': base.end_date.strftime('%Y-%m-%d'),
+        'strategy_file': base.strategy_file,
+        'run_type': base.run_type.value,
+        'starting_cash': ','.join(f'{t}:{c}' for t, c in base.accounts.items()),
+    }
+    for account_type, starting_cash in base.accounts.items():
+        summary[account_type] = starting_cash
+    if benchmark:
+        def _symbol(oid):
+            return data_proxy.instrument_not_none(oid).symbol if oid.lower() != 'null' else 'null'
+        if len(benchmark) == 1:
+            summary['benchmark'] = benchmark[0][0]
+            summary['benchmark_symbol'] = _symbol(benchmark[0][0])
+        else:
+            summary['benchmark'] = ','.join(f'{o}:{w}' for o, w in benchmark)
+            summary['benchmark_symbol'] = ','.join(f'{_symbol(o)}:{w}' for o, w in benchmark)
+
+    returns = equity['returns']
+    benchmark_nav = equity['benchmark_nav']
+    benchmark_returns = benchmark_nav / np.concatenate([[1.0], benchmark_nav[:-1]]) - 1
+    risk_free_rate = data_proxy.get_risk_free_rate(base.start_date, base.end_date)
+    risk = Risk(returns, benchmark_returns, risk_free_rate, period=DAILY, trading_days_a_year=trading_days_a_year)
+    summary.update({
+        'alpha': risk.alpha,
+        'beta': risk.beta,
+        'sharpe': risk.sharpe,
+        'excess_sharpe': risk.excess_sharpe,
+        'information_ratio': risk.information_ratio,
+        'downside_risk': risk.annual_downside_risk,
+        'tracking_error': risk.annual_tracking_error,
+        'sortino': risk.sortino,
+        'volatility': risk.annual_volatility,
+        'excess_volatility': risk.excess_annual_volatility,
+        'max_drawdown': risk.max_drawdown,
+        'excess_max_drawdown': risk.geometric_excess_drawdown,
+        'excess_returns': risk.geometric_excess_return,
+        'excess_annual_returns': risk.geometric_excess_annual_return,
+        'var': risk.var,
+        'win_rate': risk.win_rate,
+        'excess_win_rate': risk.excess_win_rate,
+        'excess_cum_returns': risk.arithmetic_excess_return,
+    })
+
+    # 盈亏比
+    daily_pnl = equity['daily_pnl']
+    profit, loss = daily_pnl[daily_pnl > 0], daily_pnl[daily_pnl < 0]
+    profit, loss = profit.mean() if len(profit) else 0, loss.mean() if len(loss) else 0
+    summary['profit_loss_rate'] = np.abs(profit / loss) if loss else np.nan
+
+    portfolio = env.portfolio
+    summary.update({
+        'total_value': portfolio.total_value,
+        'cash': portfolio.cash,
+        'total_returns': portfolio.total_returns,
+        'annualized_returns': portfolio.annualized_returns,
+        'unit_net_value': portfolio.unit_net_value,
+        'units': portfolio.units,
+    })
+    if benchmark:
+        benchmark_total_returns = (benchmark_returns + 1.0).prod() - 1.0
+        summary['benchmark_total_returns'] = benchmark_total_returns
+        summary['benchmark_annualized_returns'] = (
+            (benchmark_total_returns + 1) ** (trading_days_a_year / len(benchmark_returns)) - 1
+        )
+
+    # 最长回撤持续期
+    # rounded like sys_analyser's portfolio records, which its drawdown and weekly/monthly figures use
+    unit_net_value = pd.Series(np.round(equity['unit_net_value'], 6), index=index)
+    max_ddd = _max_ddd(unit_net_value.values, index)
+    summary.update({
+        'max_drawdown_duration': max_ddd,
+        'max_drawdown_duration_start_date': str(max_ddd.start_date),
+        'max_drawdown_duration_end_date': str(max_ddd.end_date),
+        'max_drawdown_duration_days': (max_ddd.end_date - max_ddd.start_date).days,
+    })
+
+    # 策略仅交易股票、指数、场内基金等品种时才计算换手率
+    trade_values = _trade_values(root, days)
+    if trade_values is not None:
+        market_values = equity['market_value']
+        summary['turnover'] = trade_values.sum() / market_values.mean() / 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            daily_turnover = trade_values / market_values / 2
+        summary['avg_daily_turnover'] = np.where(np.isfinite(daily_turnover), daily_turnover, 0).mean()
+    else:
+        summary['turnover'] = np.nan
+
+    df = pd.DataFrame({'date': index, 'unit_net_value': unit_net_value.values}, index=index)
+    weekly_returns = _period_returns(df.resample('W').last().set_index('date').unit_net_value.dropna())
+    monthly_returns = _period_returns(resample_monthly(df).last().set_index('date').unit_net_value.dropna())
+    if benchmark:
+        b_df = pd.DataFrame({'date': index, 'unit_net_value': benchmark_nav}, index=index)
+        weekly_b_returns = _period_returns(b_df.resample('W').last().set_index('date').unit_net_value.dropna())
+        monthly_b_returns = _period_returns(resample_monthly(b_df).last().set_index('date').unit_net_value.dropna())
+        # 超额收益最长回撤持续期
+        excess_ddd = _max_ddd(unit_net_value.values / benchmark_nav, index)
+        summary.update({
+            'excess_max_drawdown_duration': excess_ddd,
+            'excess_max_drawdown_duration_start_date': str(excess_ddd.start_date),
+            'excess_max_drawdown_duration_end_date': str(excess_ddd.end_date),
+            'excess_max_drawdown_duration_days': (excess_ddd.end_date - excess_ddd.start_date).days,
+        })
+    else:
+        weekly_b_returns = pd.Series(index=weekly_returns.index, dtype=float)
+        monthly_b_returns = pd.Series(index=monthly_returns.index, dtype=float)
+
+    # 周度、月度风险指标
+    weekly_risk = Risk(weekly_returns, weekly_b_returns, risk_free_rate, WEEKLY)
+    summary.update({
+        'weekly_alpha': weekly_risk.alpha,
+        'weekly_beta': weekly_risk.beta,
+        'weekly_sharpe': weekly_risk.sharpe,
+        'weekly_sortino': weekly_risk.sortino,
+        'weekly_information_ratio': weekly_risk.information_ratio,
+        'weekly_tracking_error': weekly_risk.annual_tracking_error,
+        'weekly_max_drawdown': weekly_risk.max_drawdown,
+        'weekly_win_rate': weekly_risk.win_rate,
+        'weekly_volatility': weekly_risk.annual_volatility,
+        'weekly_ulcer_index': weekly_risk.ulcer_index,
+        'weekly_ulcer_performance_index': weekly_risk.ulcer_performance_index,
+        'weekly_excess_sharpe': weekly_risk.excess_sharpe,
+    })
+    monthly_risk = Risk(monthly_returns, monthly_b_returns, risk_free_rate, MONTHLY)
+    summary.update({
+        'monthly_sharpe': monthly_risk.sharpe,
+        'monthly_volatility': monthly_risk.annual_volatility,
+        'monthly_excess_win_rate': monthly_risk.excess_win_rate,
+    })
+    if benchmark:
+        summary.update({
+            'weekly_excess_ulcer_index': weekly_risk.excess_ulcer_index,
+            'weekly_excess_ulcer_performance_index': weekly_risk.excess_ulcer_performance_index,
+        })
+    return summary
@@ -0,0 +1,21 @@
+"""Serve day bars to rqalpha from the bundle's memory-mapped bar cache.
+
+rqalpha's default data source reads each instrument's bars out of HDF5 into a
+private array of every job process. This mod registers day bar stores that
+return read-only views into the ``records.npy`` files of the columnar cache
+(app/market_data/columnar.py) instead, so concurrent jobs share one copy of
+the bars in the page cache. Bar files without a matching cache keep using
+HDF5.
+"""
+
+__config__ = {
+    # 列式缓存目录，默认为 bundle 根目录下的 .columnar
+    "cache_root": None,
+    # 先于其他 mod 启动，以便后续 mod 在此数据源基础上扩展
+    "priority": 10,
+}
+
+
+def load_mod():
+    from .mod import SharedBundleMod
+    return SharedBundleMod()
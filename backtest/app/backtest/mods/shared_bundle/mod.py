@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from rqalpha.const import INSTRUMENT_TYPE, MARKET
+from rqalpha.data.base_data_source import BaseDataSource
+from rqalpha.data.base_data_source.storage_interface import AbstractDayBarStore
+from rqalpha.interface import AbstractMod
+from rqalpha.utils.logger import system_log
+
+from app.market_data.bundle_store import VERSIONS_DIR
+from app.market_data.columnar import BarTable, ColumnarBarCache, cache_root
+
+# Bundle bar file -> instrument types BaseDataSource reads from it.
+DAY_BAR_SOURCES = {
+    "stocks.h5": (INSTRUMENT_TYPE.CS,),
+    "indexes.h5": (INSTRUMENT_TYPE.INDX,),
+    "futures.h5": (INSTRUMENT_TYPE.FUTURE,),
+    "funds.h5": (INSTRUMENT_TYPE.ETF, INSTRUMENT_TYPE.LOF, INSTRUMENT_TYPE.REITs),
+}
+
+# What rqalpha's DayBarStore reports for an instrument without bars.
+_MISSING_DATE_RANGE = (20050104, 20050104)
+
+
+def default_cache_root(data_bundle_path: Path) -> Path:
+    """Cache of the bundle a (possibly pinned version) data_bundle_path belongs to."""
+    path = Path(data_bundle_path)
+    if path.parent.name == VERSIONS_DIR:
+        path = path.parent.parent
+    return cache_root(path)
+
+
+class MappedDayBarStore(AbstractDayBarStore):
+    """Day bars of one bar file as read-only views of the shared records file."""
+
+    def __init__(self, table: BarTable, empty_dtype: np.dtype):
+        self._table = table
+        self._empty_dtype = empty_dtype
+
+    def get_bars(self, order_book_id):
+        try:
+            return self._table.records(order_book_id)
+        except KeyError:
+            return np.empty(0, dtype=self._empty_dtype)
+
+    def get_date_range(self, order_book_id):
+        try:
+            return self._table.date_range(order_book_id)
+        except KeyError:
+            return _MISSING_DATE_RANGE
+
+
+class SharedBundleDataSource(BaseDataSource):
+    def __init__(self, base_config, cache_dir: Optional[Path] = None) -> None:
+        super().__init__(base_config)
+        bundle_path = Path(base_config.data_bundle_path)
+        cache_dir = Path(cache_dir) if cache_dir else default_cache_root(bundle_path)
+        cache = ColumnarBarCache.from_root(cache_dir)
+        self.mapped_sources = []
+        for source, ins_types in DAY_BAR_SOURCES.items():
+            table = cache.table(source)
+            if table is None or not table.has_records or not table.matches(bundle_path / source):
+                system_log.info("shared_bundle: {} 没有可用的共享缓存，继续从 HDF5 读取", source)
+                continue
+            for ins_type in ins_types:
+                default_store = self._day_bar_stores.get((ins_type, MARKET.CN))
+                empty_dtype = getattr(default_store, "DEFAULT_DTYPE", table.records_dtype)
+                self.register_day_bar_store(ins_type, MappedDayBarStore(table, empty_dtype))
+            self.mapped_sources.append(source)
+
+
+class SharedBundleMod(AbstractMod):
+    def start_up(self, env, mod_config):
+        data_source = SharedBundleDataSource(env.config.base, mod_config.cache_root)
+        env.set_data_source(data_source)
+        system_log.info("shared_bundle: 共享缓存已启用: {}", ", ".join(data_source.mapped_sources) or "无")
+
+    def tear_down(self, code, exception=None):
+        pass
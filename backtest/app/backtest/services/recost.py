@@ -0,0 +1,274 @@
+"""Re-costing of finished jobs: the same fills under other commission, tax and slippage settings.
+
+Positions are valued at the same closes whatever the trading costs were, so
+with the fills kept (quantities, and prices before slippage) only the cash
+spent on each trade changes and the job's NAV shifts by the cumulative cost
+difference. That is a few NumPy passes over the job's trades and days
+instead of a rerun. It is exact as long as the new costs would not have
+changed what the strategy ordered (order sizing that depends on cash,
+orders rejected for lack of cash); otherwise rerun the job.
+
+Stock and fund trades are re-priced with the cost model of the vector engine
+(``Costs``, rqalpha's stock defaults and config keys). Other trades, e.g.
+futures, keep their recorded prices and costs.
+"""
+from __future__ import annotations
+
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.backtest.mods.result_stream.stream import EQUITY_TABLE, TRADES_TABLE, read_summary, read_table
+from app.backtest.services.vector import (
+    STOCK_COMMISSION_RATE,
+    STOCK_PIT_TAX_CHANGE_DATE,
+    STOCK_TAX_RATE,
+    STOCK_TAX_RATE_BEFORE_CHANGE,
+    BundleBars,
+    Costs,
+    risk_metrics,
+)
+
+# stock account instruments, as sys_analyser tells them apart for the turnover
+EQUITY_OID_RE = re.compile(r"^\d{6}\.(XSHE|XSHG|BJSE)$")
+
+
+def _day(text: str) -> int:
+    """YYYYmmdd of a 'YYYY-mm-dd[ HH:MM:SS]' string of the result."""
+    return int(str(text)[:10].replace("-", ""))
+
+
+def _trade_arrays(trading_days, order_book_ids, sides, quantity, price, order_id, commission, tax) -> dict:
+    return {
+        "day": np.asarray(trading_days, dtype=np.int64),
+        "order_book_id": np.asarray(order_book_ids, dtype=str),
+        "sell": np.asarray(sides, dtype=str) == "SELL",
+        "quantity": np.asarray(quantity, dtype=float),
+        "price": np.asarray(price, dtype=float),
+        "order_id": np.asarray(order_id, dtype=np.int64),
+        "commission": np.asarray(commission, dtype=float),
+        "tax": np.asarray(tax, dtype=float),
+    }
+
+
+def _starting_value(summary: dict, total_value: np.ndarray, returns: Optional[np.ndarray]) -> float:
+    # units of the summary are the starting total value (no cash flows in a backtest)
+    try:
+        units = float(summary.get("units"))
+    except (TypeError, ValueError):
+        units = np.nan
+    if np.isfinite(units) and units > 0:
+        return units
+    if returns is not None and len(returns) == len(total_value):
+        return float(total_value[0] / (1.0 + returns[0]))
+    return float(total_value[0])
+
+
+def _daily_returns(total_value: np.ndarray, starting_value: float) -> np.ndarray:
+    return total_value / np.concatenate([[starting_value], total_value[:-1]]) - 1.0
+
+
+def load_job_result(job_dir: Path, stream_dirname: str) -> Optional[dict]:
+    """Days, equity and trades of a finished job as arrays, or None when it has no readable result.
+
+    Jobs whose result is the stream are read from its tables; the others from ``extracted.json``.
+    """
+    stream_dir = job_dir / stream_dirname
+    summary = read_summary(stream_dir)
+    if summary is not None:
+        equity, _ = read_table(stream_dir / EQUITY_TABLE)
+        trades, _ = read_table(stream_dir / TRADES_TABLE)
+        if not equity:
+            return None
+        if trades:
+            trades = _trade_arrays(
+                trades["trading_datetime"] // 1000000, np.char.decode(trades["order_book_id"], "utf-8"),
+                np.char.decode(trades["side"], "utf-8"), trades["last_quantity"], trades["last_price"],
+                trades["order_id"], trades["commission"], trades["tax"],
+            )
+        else:
+            trades = _trade_arrays([], [], [], [], [], [], [], [])
+        return {
+            "dates": equity["date"].astype(np.int64),
+            "starting_value": _starting_value(summary, equity["total_value"], equity["returns"]),
+            "total_value": equity["total_value"],
+            "benchmark_nav": equity["benchmark_nav"],
+            "trades": trades,
+        }
+
+    try:
+        payload = json.loads((job_dir / "extracted.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    equity = payload.get("equity") if isinstance(payload, dict) else None
+    if not isinstance(equity, dict) or not equity.get("dates"):
+        return None
+    records = [t for t in payload.get("trades") or [] if isinstance(t, dict)]
+    benchmark_nav = equity.get("benchmark_nav") or []
+    total_value = np.asarray(equity["nav"], dtype=float)
+    # sys_analyser's portfolio frame has no returns column; they follow from the NAV
+    returns = np.asarray(equity.get("returns") or [], dtype=float)
+    summary = payload.get("summary") if isinstance(payload.get("summary"), dict) else {}
+    return {
+        "dates": np.array([_day(d) for d in equity["dates"]], dtype=np.int64),
+        "starting_value": _starting_value(summary, total_value, returns if np.isfinite(returns).all() else None),
+        "total_value": total_value,
+        "benchmark_nav": (
+            np.array([np.nan if v is None else v for v in benchmark_nav], dtype=float)
+            if len(benchmark_nav) == len(equity["dates"]) else np.full(len(equity["dates"]), np.nan)
+        ),
+        "trades": _trade_arrays(
+            [_day(t.get("trading_datetime") or t["datetime"]) for t in records],
+            [t["order_book_id"] for t in records], [t["side"] for t in records],
+            [t["last_quantity"] for t in records], [t["last_price"] for t in records],
+            [t.get("order_id") or n for n, t in enumerate(records)],
+            [t.get("commission") or 0.0 for t in records], [t.get("tax") or 0.0 for t in records],
+        ),
+    }
+
+
+COST_FIELDS = ("commission_multiplier", "min_commission", "tax_multiplier", "pit_tax", "slippage")
+
+
+def load_job_config(job_dir: Path) -> dict:
+    import yaml
+
+    try:
+        config = yaml.safe_load((job_dir / "config.yml").read_text(encoding="utf-8"))
+    except (OSError, yaml.YAMLError):
+        return {}
+    return config if isinstance(config, dict) else {}
+
+
+def job_costs(config: dict, overrides: Optional[dict] = None) -> Costs:
+    """Cost model of a job's ``config.yml``, with ``COST_FIELDS`` replaced by ``overrides``."""
+    costs = Costs.from_config(config)
+    params = {
+        "commission_multiplier": costs.commission_rate / STOCK_COMMISSION_RATE,
+        "min_commission": costs.min_commission,
+        "tax_multiplier": costs.tax_multiplier,
+        "pit_tax": costs.pit_tax,
+        "slippage": costs.slippage,
+        "dividend_tax_rate": costs.dividend_tax_rate,
+    }
+    params.update(overrides or {})
+    return Costs(**params)
+
+
+@lru_cache(maxsize=2)
+def _bundle(bundle_path: str) -> BundleBars:
+    # snapshot directories are immutable, so one instance per resolved path stays valid
+    return BundleBars(bundle_path)
+
+
+def benchmark_nav(bundle_path: Path, order_book_id: str, dates: np.ndarray) -> np.ndarray:
+    """Net value of ``order_book_id`` on ``dates``, from its close on the trading day before the first."""
+    bundle = _bundle(str(Path(bundle_path).resolve()))
+    bars = bundle.bars(order_book_id)
+    bar_days = np.asarray(bars["datetime"], dtype=np.int64) // 1000000
+    previous = np.searchsorted(bundle.trading_dates, dates[0], side="left") - 1
+    days = np.concatenate([[bundle.trading_dates[max(previous, 0)]], dates])
+    # the last close on or before each day (suspended days keep the previous close)
+    at = np.searchsorted(bar_days, days, side="right") - 1
+    close = np.where(at >= 0, np.asarray(bars["close"], dtype=float)[np.maximum(at, 0)], np.nan)
+    if not np.isfinite(close).any():
+        raise ValueError(f"no bars of {order_book_id} before {dates[-1]}")
+    base = close[0] if np.isfinite(close[0]) else close[np.isfinite(close)][0]
+    return close[1:] / base
+
+
+def _order_commission(order_id: np.ndarray, value: np.ndarray, costs: Costs) -> np.ndarray:
+    """Commission of each trade, with the minimum charged once per order like rqalpha's stock decider."""
+    order = np.argsort(order_id, kind="stable")
+    charged = np.cumsum(value[order] * costs.commission_rate)
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = order_id[order][1:] != order_id[order][:-1]
+    group_start = np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+    charged -= np.concatenate([[0.0], charged])[group_start]
+    charged = np.maximum(charged, costs.min_commission)
+    per_trade = np.diff(charged, prepend=0.0)
+    per_trade[first] = charged[first]
+    commission = np.empty(len(order))
+    commission[order] = per_trade
+    return commission
+
+
+def recost(result: dict, costs: Costs, original: Costs, benchmark: Optional[np.ndarray] = None) -> dict:
+    """NAV and figures of ``result`` (``load_job_result``) with its trades paying ``costs`` instead of ``original``."""
+    dates, total_value, starting_value = result["dates"], result["total_value"], result["starting_value"]
+    trades = result["trades"]
+
+    oids, inverse = np.unique(trades["order_book_id"], return_inverse=True)
+    recosted = np.array([bool(EQUITY_OID_RE.match(oid)) for oid in oids], dtype=bool)[inverse]
+    sign = np.where(trades["sell"], -1.0, 1.0)
+    price = trades["price"]
+    # recorded prices include the original price-ratio slippage (buys up, sells down)
+    fill_price = price / (1.0 + sign * original.slippage)
+    new_price = np.where(recosted, fill_price * (1.0 + sign * costs.slippage), price)
+    value = trades["quantity"] * new_price
+
+    commission = np.where(
+        recosted, _order_commission(trades["order_id"], value * recosted, costs), trades["commission"]
+    )
+    # stamp tax only on what paid it before (stock sells), unless the original run charged none
+    taxable = trades["tax"] > 0 if original.tax_multiplier > 0 else trades["sell"]
+    rate = np.where(costs.pit_tax & (trades["day"] < STOCK_PIT_TAX_CHANGE_DATE),
+                    STOCK_TAX_RATE_BEFORE_CHANGE, STOCK_TAX_RATE)
+    tax = np.where(recosted, np.where(taxable, value * rate * costs.tax_multiplier, 0.0), trades["tax"])
+
+    # cash of each trade: buys pay value + costs, sells receive value - costs
+    delta = (sign * trades["quantity"] * (price - new_price)
+             + trades["commission"] + trades["tax"] - commission - tax)
+    row = np.searchsorted(dates, trades["day"], side="left").clip(0, len(dates) - 1)
+    new_total_value = total_value + np.cumsum(np.bincount(row, weights=delta, minlength=len(dates)))
+    unit_net_value = new_total_value / starting_value
+    new_returns = _daily_returns(new_total_value, starting_value)
+
+    summary = risk_metrics(unit_net_value, new_returns)
+    summary.update({
+        "total_value": float(new_total_value[-1]),
+        "commission": float(commission.sum()),
+        "tax": float(tax.sum()),
+        "transaction_cost": float(commission.sum() + tax.sum()),
+        "slippage_cost": float((recosted * sign * trades["quantity"] * (new_price - fill_price)).sum()),
+        "trades_recosted": int(recosted.sum()),
+        "trades_kept": int((~recosted).sum()),
+    })
+    original_summary = risk_metrics(total_value / starting_value, _daily_returns(total_value, starting_value))
+    original_summary.update({
+        "total_value": float(total_value[-1]),
+        "commission": float(trades["commission"].sum()),
+        "tax": float(trades["tax"].sum()),
+        "transaction_cost": float(trades["commission"].sum() + trades["tax"].sum()),
+    })
+
+    benchmark = result["benchmark_nav"] if benchmark is None else benchmark
+    if np.isfinite(benchmark).all():
+        benchmark_returns = benchmark / np.concatenate([[1.0], benchmark[:-1]]) - 1.0
+        bench = risk_metrics(benchmark, benchmark_returns)
+        for figures in (summary, original_summary):
+            figures["benchmark_total_returns"] = bench["total_returns"]
+            figures["benchmark_annualized_returns"] = bench["annualized_returns"]
+            figures["excess_returns"] = figures["total_returns"] - bench["total_returns"]
+
+    return {
+        "costs": {
+            "commission_multiplier": costs.commission_rate / STOCK_COMMISSION_RATE,
+            "min_commission": costs.min_commission,
+            "tax_multiplier": costs.tax_multiplier,
+            "pit_tax": costs.pit_tax,
+            "slippage": costs.slippage,
+        },
+        "equity": {
+            "dates": [f"{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}" for d in dates.tolist()],
+            "nav": new_total_value.tolist(),
+            "returns": new_returns.tolist(),
+            "benchmark_nav": [None if np.isnan(v) else float(v) for v in benchmark],
+        },
+        "summary": summary,
+        "original_summary": original_summary,
+    }
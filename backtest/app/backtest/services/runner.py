@@ -9,6 +9,7 @@ import re
 import secrets
 import shlex
 import shutil
+import signal
 import subprocess
 import sys
 import tempfile
@@ -20,14 +21,31 @@ from contextlib import contextmanager, redirect_stderr, redirect_stdout
 from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
 from flask import current_app
-from app.database import DatabaseConnection, get_db_connection
+from app.backtest.mods.checkpoint.store import read_checkpoint
+from app.database import DatabaseConfig, DatabaseConnection, get_db_connection
+from app.market_data.bundle_store import get_bundle_store
+from app.market_data.columnar import cache_root
 
 _STRATEGY_ID_PATTERN = re.compile(r"^[A-Za-z0-9._\-\u4E00-\u9FFF]+$")
 _STRATEGY_ID_MAX_LENGTH = 128
 _JOB_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
 VALID_JOB_STATUSES = {"QUEUED", "RUNNING", "FAILED", "FINISHED", "CANCELLED"}
 RQALPHA_CANCELLED_EXIT_CODE = -99999
+CHECKPOINT_FILENAME = "checkpoint.pkl"
+RESULT_STREAM_DIRNAME = "stream"
+_JOB_LOCK_FILENAME = "run.lock"
+# written by whichever web worker gets the cancel; polled by the worker running the job
+_CANCEL_FILENAME = "cancel.requested"
+_RUN_PID_FILENAME = "run.pid"
+_ACTIVE_JOB_STATUSES = ("QUEUED", "RUNNING")
+# a live owner sees the cancel marker within one poll of run_rqalpha (0.5s)
+_CANCEL_OWNER_GRACE_SECONDS = 1.5
 _INDEX_KEEP = object()
 _NOTEBOOK_DATE_FORMATS = ("%Y-%m-%d", "%Y%m%d")
 _NOTEBOOK_DEFAULT_FREQUENCY = "1d"
@@ -123,7 +141,6 @@ _BUILTIN_STRATEGIES = {
 
 _PROCESS_LOCK = threading.Lock()
 _RUNNING_PROCESSES: dict[str, subprocess.Popen] = {}
-_CANCEL_REQUESTED_JOB_IDS: set[str] = set()
 _RENAME_LOCK = threading.Lock()
 _RENAME_DB_FILENAME = "backtest_meta.sqlite3"
 
@@ -243,6 +260,62 @@ _COMPILE_WORKER_SOURCE = textwrap.dedent(
         else:
             stderr_lines.append("dependency check failed")
 
+        # Optional whole-array hooks: precompute(context, data), called once before the event
+        # loop, and vector_targets(data), the strategy of engine=vector runs
+        hook_specs = (
+            ("precompute", "(context, data)", "a dict of signals", "runs before the event loop"),
+            ("vector_targets", "(data)", "a dict of target weights", "is run by engine=vector"),
+        )
+        for hook_name, hook_signature, hook_result, hook_runs in hook_specs:
+            hook_ok = True
+            hook_arity = hook_signature.count(",") + 1
+            hook_nodes = [
+                node for node in syntax_tree.body
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == hook_name
+            ]
+            for node in hook_nodes:
+                line = getattr(node, "lineno", 0)
+                col = getattr(node, "col_offset", 0) + 1
+                if isinstance(node, ast.AsyncFunctionDef):
+                    hook_ok = False
+                    diagnostics.append(_diag(
+                        line, col, "error", "{0} must be a plain function, not async".format(hook_name),
+                    ))
+                args = node.args
+                positional = list(getattr(args, "posonlyargs", [])) + list(args.args)
+                required = len(positional) - len(args.defaults)
+                if args.vararg is None and len(positional) < hook_arity or required > hook_arity or any(
+                    default is None for default in args.kw_defaults
+                ):
+                    hook_ok = False
+                    diagnostics.append(_diag(
+                        line, col, "error", "{0} must accept {1}".format(hook_name, hook_signature),
+                    ))
+                for child in ast.walk(node):
+                    if isinstance(child, (ast.Yield, ast.YieldFrom)):
+                        hook_ok = False
+                        diagnostics.append(_diag(
+                            getattr(child, "lineno", line), getattr(child, "col_offset", 0) + 1, "error",
+                            "{0} must return {1}, not yield".format(hook_name, hook_result),
+                        ))
+                    elif isinstance(child, ast.Call):
+                        func = child.func
+                        called = func.id if isinstance(func, ast.Name) else getattr(func, "attr", "")
+                        if called.startswith("order") or called in (
+                            "buy_open", "buy_close", "sell_open", "sell_close", "submit_order", "cancel_order",
+                        ):
+                            hook_ok = False
+                            diagnostics.append(_diag(
+                                getattr(child, "lineno", line), getattr(child, "col_offset", 0) + 1, "error",
+                                "{0} {1} and cannot place orders ('{2}')".format(hook_name, hook_runs, called),
+                            ))
+            if hook_nodes:
+                if hook_ok:
+                    stdout_lines.append("{0} hook check passed".format(hook_name))
+                else:
+                    ok = False
+                    stderr_lines.append("{0} hook check failed".format(hook_name))
+
     diagnostics.sort(key=lambda item: (item.get("line", 0), item.get("column", 0), item.get("message", "")))
     if diagnostics:
         detail_lines = []
@@ -779,7 +852,6 @@ def _delete_job_artifacts(job_id: str) -> bool:
             _terminate_process(proc)
         except Exception:
             pass
-    clear_cancel_request(normalized_job_id)
 
     if index_path.exists():
         index_path.unlink()
@@ -973,6 +1045,8 @@ def build_run_fingerprint(
     benchmark: str,
     frequency: str,
     code: str,
+    bundle_version: str | None = None,
+    engine: str = "rqalpha",
 ) -> str:
     payload = {
         "strategy_id": strategy_id,
@@ -982,6 +1056,8 @@ def build_run_fingerprint(
         "benchmark": benchmark,
         "frequency": frequency,
         "code_sha256": hashlib.sha256(code.encode("utf-8")).hexdigest(),
+        "bundle_version": bundle_version,
+        "engine": engine,
     }
     raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
     return hashlib.sha256(raw.encode("utf-8")).hexdigest()
@@ -1161,6 +1237,8 @@ def write_job_meta(
     benchmark: str,
     frequency: str,
     code_sha256: str,
+    bundle_version: str | None = None,
+    engine: str = "rqalpha",
 ) -> Path:
     normalized_strategy_id = _validate_strategy_id(strategy_id)
     payload = {
@@ -1171,6 +1249,8 @@ def write_job_meta(
         "benchmark": str(benchmark),
         "frequency": str(frequency),
         "code_sha256": str(code_sha256),
+        "bundle_version": bundle_version,
+        "engine": str(engine),
         "created_at": _now_iso8601(),
     }
     path = job_dir / "job_meta.json"
@@ -1359,6 +1439,103 @@ def create_job_dir() -> tuple[str, Path]:
     return job_id, job_dir
 
 
+def job_checkpoint_date(job_dir: Path) -> str | None:
+    """Last trading day settled in the job's checkpoint, or None without a usable one."""
+    checkpoint = read_checkpoint(job_dir / CHECKPOINT_FILENAME)
+    return str(checkpoint["date"]) if checkpoint else None
+
+
+def acquire_job_lock(job_dir: Path):
+    """Take the job's run lock without blocking; None when another run holds it.
+
+    The lock is an flock on ``<job_dir>/run.lock``: it is dropped by the kernel
+    when its holders exit, so a job whose process died can be picked up again.
+    """
+    handle = open(job_dir / _JOB_LOCK_FILENAME, "a")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def release_job_lock(handle) -> None:
+    if handle is not None:
+        handle.close()
+
+
+def prepare_job_rerun(job_id: str, job_dir: Path, *, end_date: str | None = None) -> dict:
+    """Rewrite an existing job's config for another run of it.
+
+    Without ``end_date`` the job is resumed as it was (same end date and bundle
+    snapshot). With one it is continued to that later end date on the current
+    bundle snapshot, which needs a checkpoint. rqalpha jobs start from their
+    checkpoint when they have one; the result still covers the whole range.
+    """
+    meta = _read_job_meta(job_dir)
+    if not meta:
+        raise FileNotFoundError(f"job meta not found: {job_dir}")
+    engine = str(meta.get("engine") or "rqalpha")
+    checkpoint_date = job_checkpoint_date(job_dir) if engine == "rqalpha" else None
+
+    if end_date is None:
+        end_date = str(meta["end_date"])
+        bundle_version = meta.get("bundle_version")
+    else:
+        if engine != "rqalpha":
+            raise ValueError(f"{engine} jobs cannot be continued")
+        if end_date <= str(meta["end_date"]):
+            raise ValueError(f"end_date must be later than {meta['end_date']}")
+        if checkpoint_date is None:
+            raise FileNotFoundError(f"checkpoint not found: {job_dir / CHECKPOINT_FILENAME}")
+        bundle_version = current_bundle_version()
+
+    data_bundle_path, bundle_version = pin_bundle_snapshot(job_id, bundle_version)
+    cfg = build_config_yaml(
+        start_date=str(meta["start_date"]),
+        end_date=end_date,
+        cash=meta["cash"],
+        benchmark=str(meta["benchmark"]),
+        frequency=str(meta["frequency"]),
+        output_file=str((job_dir / "result.pkl").resolve()),
+        data_bundle_path=data_bundle_path,
+        engine=engine,
+    )
+    (job_dir / "config.yml").write_text(cfg, encoding="utf-8")
+    _write_json(job_dir / "job_meta.json", {**meta, "end_date": end_date, "bundle_version": bundle_version})
+    update_job_index(
+        job_id,
+        params={
+            "start_date": str(meta["start_date"]),
+            "end_date": end_date,
+            "cash": meta["cash"],
+            "benchmark": str(meta["benchmark"]),
+            "frequency": str(meta["frequency"]),
+            "engine": engine,
+        },
+    )
+    return {"engine": engine, "resume_from": checkpoint_date, "end_date": end_date}
+
+
+def list_interrupted_jobs() -> list[tuple[str, Path]]:
+    """Jobs whose status is still QUEUED or RUNNING, i.e. left behind by a process that exited."""
+    jobs = []
+    for index_path in sorted(_storage_dirs()["runs_index"].glob("*.json")):
+        job_dir = locate_job_dir(index_path.stem)
+        if job_dir is None:
+            continue
+        try:
+            status = read_status(job_dir)["status"]
+        except (FileNotFoundError, OSError, ValueError):
+            continue
+        if status in ("QUEUED", "RUNNING"):
+            jobs.append((job_dir.name, job_dir))
+    return jobs
+
+
 def build_config_yaml(
     *,
     start_date: str,
@@ -1367,8 +1544,11 @@ def build_config_yaml(
     benchmark: str,
     frequency: str,
     output_file: str,
+    data_bundle_path: Path | None = None,
+    engine: str = "rqalpha",
 ) -> str:
-    bundle_path = Path(current_app.config["RQALPHA_BUNDLE_PATH"]).expanduser()
+    bundle_root = Path(current_app.config["RQALPHA_BUNDLE_PATH"]).expanduser()
+    bundle_path = Path(data_bundle_path or bundle_root).expanduser()
     if not bundle_path.is_absolute():
         raise ValueError("RQALPHA_BUNDLE_PATH must be an absolute path")
 
@@ -1379,6 +1559,73 @@ def build_config_yaml(
     # Derive progress file path from result file
     progress_path = result_path.parent / "progress.json"
 
+    extra_mods = ""
+    if current_app.config.get("BACKTEST_SHARED_BUNDLE", True):
+        # Day bars from the memory-mapped cache shared by all concurrent jobs
+        extra_mods += (
+            "  shared_bundle:\n"
+            "    enabled: true\n"
+            "    lib: app.backtest.mods.shared_bundle\n"
+            f"    cache_root: {cache_root(bundle_root)}\n"
+        )
+    if current_app.config.get("BACKTEST_INDICATORS", True):
+        # indicator() / rolling_history_bars() strategy APIs, updated bar by bar
+        extra_mods += (
+            "  indicators:\n"
+            "    enabled: true\n"
+            "    lib: app.backtest.mods.indicators\n"
+        )
+    if current_app.config.get("BACKTEST_PRECOMPUTE", True):
+        # Optional precompute(context, data) hook and the precomputed() lookup API
+        extra_mods += (
+            "  precompute:\n"
+            "    enabled: true\n"
+            "    lib: app.backtest.mods.precompute\n"
+            f"    lookback_days: {int(current_app.config.get('BACKTEST_PRECOMPUTE_LOOKBACK_DAYS', 250))}\n"
+        )
+    if frequency == "1m":
+        # 1m bars from dbbardata; the password stays in the job's DB_PASSWORD environment
+        database = DatabaseConfig.from_flask_config("market_data").to_dict()
+        database.pop("password", None)
+        extra_mods += (
+            "  minute_bars:\n"
+            "    enabled: true\n"
+            "    lib: app.backtest.mods.minute_bars\n"
+            f"    table: {current_app.config.get('DB_TABLE', 'dbbardata')}\n"
+            f"    database: {json.dumps(database)}\n"
+            f"    prefetch_days: {int(current_app.config.get('BACKTEST_MINUTE_PREFETCH_DAYS', 5))}\n"
+            f"    cache_rows: {int(current_app.config.get('BACKTEST_MINUTE_CACHE_ROWS', 1_000_000))}\n"
+        )
+    if engine == "rqalpha" and current_app.config.get("BACKTEST_CHECKPOINT", True):
+        # State checkpoints next to the result; a rerun of the job resumes from the last one
+        extra_mods += (
+            "  checkpoint:\n"
+            "    enabled: true\n"
+            "    lib: app.backtest.mods.checkpoint\n"
+            f"    path: {result_path.parent / CHECKPOINT_FILENAME}\n"
+            f"    interval_seconds: {int(current_app.config.get('BACKTEST_CHECKPOINT_INTERVAL_SECONDS', 60))}\n"
+            "    resume: true\n"
+        )
+    stream_result = False
+    if engine == "rqalpha" and current_app.config.get("BACKTEST_RESULT_STREAM", True):
+        # Equity points, trades and positions appended during the run, served as partial results;
+        # for the streaming frequencies they are the result and sys_analyser is left out
+        stream_result = frequency in current_app.config.get("BACKTEST_STREAMING_RESULT_FREQUENCIES", ("1m",))
+        extra_mods += (
+            "  result_stream:\n"
+            "    enabled: true\n"
+            "    lib: app.backtest.mods.result_stream\n"
+            f"    path: {result_path.parent / RESULT_STREAM_DIRNAME}\n"
+            f"    summary: {'true' if stream_result else 'false'}\n"
+        )
+    engine_section = ""
+    if engine == "vector":
+        # Read by app.backtest.services.vector; rqalpha never sees this config
+        engine_section = (
+            "\nvector:\n"
+            f"  lookback_days: {int(current_app.config.get('BACKTEST_VECTOR_LOOKBACK_DAYS', 250))}\n"
+        )
+
     return textwrap.dedent(
         f"""\
         version: 0.1.6
@@ -1396,39 +1643,75 @@ def build_config_yaml(
 
         mod:
           sys_analyser:
-            enabled: true
+            enabled: {'false' if stream_result else 'true'}
             plot: false
             output_file: {result_path}
           sys_progress:
             enabled: true
             output_file: {progress_path}
         """
-    )
+    ) + extra_mods + engine_section
 
-def is_cancel_requested(job_id: str) -> bool:
-    with _PROCESS_LOCK:
-        return job_id in _CANCEL_REQUESTED_JOB_IDS
+def is_cancel_requested(job_dir: Path) -> bool:
+    """True once a cancel of the job has been requested, from any process."""
+    return (job_dir / _CANCEL_FILENAME).exists()
 
 
-def clear_cancel_request(job_id: str) -> None:
-    with _PROCESS_LOCK:
-        _CANCEL_REQUESTED_JOB_IDS.discard(job_id)
+def clear_cancel_request(job_dir: Path) -> None:
+    (job_dir / _CANCEL_FILENAME).unlink(missing_ok=True)
 
 
-def request_job_cancel(job_id: str) -> bool:
-    with _PROCESS_LOCK:
-        _CANCEL_REQUESTED_JOB_IDS.add(job_id)
-        proc = _RUNNING_PROCESSES.get(job_id)
+def _job_status(job_dir: Path) -> str | None:
+    try:
+        return read_status(job_dir).get("status")
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+
 
-    if proc is None:
-        return False
+def _signal_run(job_dir: Path) -> None:
+    """SIGTERM the run's recorded process, which keeps running if the worker that started it died."""
     try:
-        if proc.poll() is None:
-            proc.terminate()
-            return True
-    except Exception:
-        return False
-    return False
+        pid = int((job_dir / _RUN_PID_FILENAME).read_text(encoding="utf-8").strip())
+        os.kill(pid, signal.SIGTERM)
+    except (OSError, ValueError):
+        pass
+
+
+def request_job_cancel(job_dir: Path, wait: float = 5.0) -> str | None:
+    """Stop a queued or running job, whichever process runs it; returns its status afterwards.
+
+    The request is a marker file in the job directory, which the worker that
+    owns the run polls (see ``run_rqalpha``). When no process holds the job's
+    run lock any more, the run is gone and the job is marked cancelled here.
+    A run still going after a grace period (its worker died and left the
+    rqalpha process behind) is sent SIGTERM through its recorded pid.
+    Waits up to ``wait`` seconds for the job to leave QUEUED/RUNNING.
+    """
+    (job_dir / _CANCEL_FILENAME).touch()
+    started = time.monotonic()
+    deadline = started + wait
+    signalled = False
+    while True:
+        status = _job_status(job_dir)
+        if status not in _ACTIVE_JOB_STATUSES:
+            # finished before the request was seen: nothing left to cancel
+            clear_cancel_request(job_dir)
+            return status
+        lock = acquire_job_lock(job_dir) if fcntl is not None else None
+        if lock is not None:
+            try:
+                if _job_status(job_dir) in _ACTIVE_JOB_STATUSES:
+                    write_status(job_dir, "CANCELLED", "JOB_CANCELLED", "job cancelled by user")
+                clear_cancel_request(job_dir)
+                return _job_status(job_dir)
+            finally:
+                release_job_lock(lock)
+        if not signalled and time.monotonic() - started >= _CANCEL_OWNER_GRACE_SECONDS:
+            _signal_run(job_dir)
+            signalled = True
+        if time.monotonic() >= deadline:
+            return status
+        time.sleep(0.1)
 
 
 def _register_running_process(job_id: str, proc: subprocess.Popen) -> None:
@@ -1638,12 +1921,67 @@ def compile_strategy_debug(code: str, *, timeout_seconds: int = 10) -> tuple[dic
     return normalized, "internal_error"
 
 
-def run_rqalpha(job_id: str, job_dir: Path) -> int:
+def _bundle_store():
+    return get_bundle_store(Path(current_app.config["RQALPHA_BUNDLE_PATH"]).expanduser())
+
+
+def _bundle_lease_owner(job_id: str) -> str:
+    return f"backtest-{job_id}"
+
+
+def current_bundle_version() -> str | None:
+    """Active bundle snapshot, or None when the bundle is not versioned."""
+    return _bundle_store().current_version()
+
+
+def pin_bundle_snapshot(job_id: str, version: str | None = None) -> tuple[Path, str | None]:
+    """Lease an immutable bundle snapshot for a job.
+
+    Returns the directory to use as ``data_bundle_path`` and the snapshot
+    version. ``version`` is pinned when it still exists, otherwise the current
+    one; plain (unversioned) bundles are used as-is.
+    """
+    store = _bundle_store()
+    owner = _bundle_lease_owner(job_id)
+    try:
+        pinned = store.acquire_lease(owner, version) or store.acquire_lease(owner)
+    except OSError as exc:
+        current_app.logger.warning("bundle lease for job %s failed: %s", job_id, exc)
+        pinned = None
+    if pinned is None:
+        return store.root, None
+    return store.version_path(pinned), pinned
+
+
+def release_bundle_snapshot(job_id: str) -> None:
+    """Drop the job's lease and reclaim snapshots nothing references any more."""
+    store = _bundle_store()
+    try:
+        store.release_lease(_bundle_lease_owner(job_id))
+        store.collect_garbage()
+    except OSError as exc:
+        current_app.logger.warning("bundle snapshot release for job %s failed: %s", job_id, exc)
+
+
+def _rqalpha_env() -> dict[str, str]:
+    """Environment of rqalpha runs: the project root is importable for app.backtest.mods."""
+    env = dict(os.environ)
+    paths = [str(_project_root())]
+    if env.get("PYTHONPATH"):
+        paths.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(paths)
+    return env
+
+
+def run_rqalpha(job_id: str, job_dir: Path, engine: str = "rqalpha", lock=None) -> int:
     timeout = int(current_app.config.get("BACKTEST_TIMEOUT", 900))
     log_path = job_dir / "run.log"
-    command = [
-        *_resolve_rqalpha_command(),
-        "run",
+    if engine == "vector":
+        # vector_targets(data) strategies: whole-array simulation, same config.yml and result.pkl
+        command = [sys.executable, "-m", "app.backtest.services.vector"]
+    else:
+        command = [*_resolve_rqalpha_command(), "run"]
+    command += [
         "-f",
         "strategy.py",
         "--config",
@@ -1653,15 +1991,19 @@ def run_rqalpha(job_id: str, job_dir: Path) -> int:
         proc = subprocess.Popen(
             command,
             cwd=str(job_dir),
+            env=_rqalpha_env(),
             stdout=log_file,
             stderr=subprocess.STDOUT,
             text=True,
+            # the run keeps the job lock even if this process dies before it does
+            pass_fds=(lock.fileno(),) if lock is not None else (),
         )
         _register_running_process(job_id, proc)
+        (job_dir / _RUN_PID_FILENAME).write_text(str(proc.pid), encoding="utf-8")
         deadline = time.monotonic() + timeout
         try:
             while True:
-                if is_cancel_requested(job_id):
+                if is_cancel_requested(job_dir):
                     _terminate_process(proc)
                     return RQALPHA_CANCELLED_EXIT_CODE
 
@@ -1676,6 +2018,7 @@ def run_rqalpha(job_id: str, job_dir: Path) -> int:
                     continue
         finally:
             _unregister_running_process(job_id)
+            (job_dir / _RUN_PID_FILENAME).unlink(missing_ok=True)
 
 
 def _project_root() -> Path:
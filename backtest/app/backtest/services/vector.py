@@ -0,0 +1,645 @@
+"""Vectorized screening backtests over bundle day bars (``engine=vector``).
+
+A strategy run with this engine defines ``vector_targets(data)`` instead of
+``handle_bar``. It receives whole daily price arrays aligned on trading days
+(the same ``dates`` / ``prices()`` interface as the precompute mod) and
+returns target portfolio weights per order_book_id, one row per day of
+``data.dates``::
+
+    def vector_targets(data):
+        close = data.prices("000001.XSHE")
+        fast, slow = sma(close, 5), sma(close, 20)
+        weights = np.full(len(close), np.nan)       # NaN: no order that day
+        weights[cross_up(fast, slow)] = 1.0
+        weights[cross_down(fast, slow)] = 0.0
+        return {"000001.XSHE": weights}
+
+A finite weight is executed like ``order_target_percent`` at that day's
+close; NaN leaves the position alone. Order sizing, round lots, commission,
+stamp tax, slippage, price limits, dividends, splits and delistings follow
+rqalpha's stock account defaults (and the same ``sys_transaction_cost`` /
+``sys_simulation`` config keys), so the result of a daily stock strategy
+stays close to its event-driven version. The run writes a ``result.pkl`` in
+rqalpha's sys_analyser layout, which ``extract_result`` turns into the
+usual ``extracted.json``.
+
+Usage (what run_rqalpha starts for engine=vector)::
+
+    python -m app.backtest.services.vector -f strategy.py --config config.yml
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import pickle
+import time
+import traceback
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import h5py
+import numpy as np
+import pandas as pd
+
+from app.market_data.bundle_store import VERSIONS_DIR
+from app.market_data.columnar import ColumnarBarCache, cache_root
+
+HOOK_NAME = "vector_targets"
+TRADING_DAYS_A_YEAR = 252
+
+# Instrument type -> bundle bar file. Only stock-account instruments can be traded.
+BAR_FILES = {
+    "CS": "stocks.h5",
+    "ETF": "funds.h5",
+    "LOF": "funds.h5",
+    "REITs": "funds.h5",
+    "INDX": "indexes.h5",
+}
+TRADABLE_TYPES = {"CS", "ETF", "LOF", "REITs"}
+
+# rqalpha stock account defaults (sys_transaction_cost / sys_accounts)
+STOCK_COMMISSION_RATE = 0.0008
+STOCK_TAX_RATE = 0.0005
+STOCK_TAX_RATE_BEFORE_CHANGE = 0.001
+STOCK_PIT_TAX_CHANGE_DATE = 20230828
+KSH_MIN_AMOUNT = 200
+BJSE_MIN_AMOUNT = 100
+
+
+def _date_int(value) -> int:
+    """YYYYmmdd int of a date, datetime, YYYYmmdd[HHMMSS] int or string."""
+    if isinstance(value, (datetime, date)):
+        return value.year * 10000 + value.month * 100 + value.day
+    if isinstance(value, str):
+        value = "".join(ch for ch in value if ch.isdigit())
+    value = int(value)
+    return value // 1_000_000 if value > 100_000_000 else value
+
+
+def _default_cache_root(bundle_path: Path) -> Path:
+    if bundle_path.parent.name == VERSIONS_DIR:
+        bundle_path = bundle_path.parent.parent
+    return cache_root(bundle_path)
+
+
+class BundleBars:
+    """Instruments, day bars and corporate actions of one bundle, read lazily and kept.
+
+    Day bars come from the memory-mapped columnar cache when it was built
+    from the same bar file, otherwise from the HDF5 file.
+    """
+
+    def __init__(self, bundle_path: Union[str, Path], cache_dir: Optional[Union[str, Path]] = None):
+        self.path = Path(bundle_path).expanduser()
+        with open(self.path / "instruments.pk", "rb") as f:
+            self.instruments: Dict[str, dict] = {ins["order_book_id"]: ins for ins in pickle.load(f)}
+        self.trading_dates = np.asarray(np.load(self.path / "trading_dates.npy"), dtype="<i8")
+        cache_dir = Path(cache_dir) if cache_dir else _default_cache_root(self.path)
+        self._cache = ColumnarBarCache.from_root(cache_dir)
+        self._bars: Dict[str, Dict[str, np.ndarray]] = {}
+        self._events: Dict[tuple, Optional[np.ndarray]] = {}
+
+    def instrument(self, order_book_id: str) -> dict:
+        try:
+            return self.instruments[order_book_id]
+        except KeyError:
+            raise ValueError(f"bundle 中没有合约 {order_book_id}")
+
+    def bars(self, order_book_id: str) -> Dict[str, np.ndarray]:
+        """Every day bar of ``order_book_id`` as columns (empty when it has none)."""
+        bars = self._bars.get(order_book_id)
+        if bars is not None:
+            return bars
+        source = BAR_FILES.get(self.instrument(order_book_id)["type"])
+        if source is None:
+            raise ValueError(f"{order_book_id} 的合约类型不受向量化回测支持")
+        table = self._cache.table(source)
+        if table is not None and table.matches(self.path / source) and order_book_id in table:
+            bars = table.get(order_book_id)
+        else:
+            with h5py.File(self.path / source, "r") as h5:
+                records = h5[order_book_id][:] if order_book_id in h5 else None
+            if records is None:
+                bars = {"datetime": np.empty(0, dtype="<u8"), "close": np.empty(0)}
+            else:
+                bars = {name: records[name] for name in records.dtype.names}
+        self._bars[order_book_id] = bars
+        return bars
+
+    def _event_table(self, filename: str, order_book_id: str) -> Optional[np.ndarray]:
+        key = (filename, order_book_id)
+        if key not in self._events:
+            records = None
+            path = self.path / filename
+            if path.exists():
+                with h5py.File(path, "r") as h5:
+                    if order_book_id in h5:
+                        records = h5[order_book_id][:]
+            self._events[key] = records
+        return self._events[key]
+
+    def ex_cum_factors(self, order_book_id: str) -> Optional[np.ndarray]:
+        return self._event_table("ex_cum_factor.h5", order_book_id)
+
+    def dividends(self, order_book_id: str) -> Optional[np.ndarray]:
+        return self._event_table("dividends.h5", order_book_id)
+
+    def splits(self, order_book_id: str) -> Optional[np.ndarray]:
+        return self._event_table("split_factor.h5", order_book_id)
+
+
+class VectorData:
+    """Daily bars of the run aligned on ``dates`` (YYYYmmdd ints).
+
+    ``dates`` starts `lookback` trading days before the backtest start, which
+    is row ``start``; every array returned here and by ``vector_targets`` has
+    one row per entry of ``dates``.
+    """
+
+    def __init__(self, bundle: BundleBars, start_date, end_date, lookback: int = 0):
+        trading_dates = bundle.trading_dates
+        first = int(np.searchsorted(trading_dates, _date_int(start_date), side="left"))
+        last = int(np.searchsorted(trading_dates, _date_int(end_date), side="right"))
+        if first >= last:
+            raise ValueError(f"{start_date} 到 {end_date} 之间没有交易日")
+        lo = max(first - int(lookback), 0)
+        self.bundle = bundle
+        self.dates = trading_dates[lo:last]
+        self.start = first - lo
+        self._columns: Dict[tuple, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def index_of(self, day) -> int:
+        """Row of a trading date, or of the last trading date before it."""
+        return int(np.searchsorted(self.dates, _date_int(day), side="right")) - 1
+
+    def raw(self, order_book_id: str, field: str = "close") -> np.ndarray:
+        """Unadjusted ``field`` of ``order_book_id``, NaN on days without a bar."""
+        key = (order_book_id, field)
+        column = self._columns.get(key)
+        if column is not None:
+            return column
+        column = np.full(len(self.dates), np.nan)
+        bars = self.bundle.bars(order_book_id)
+        if field in bars and len(bars["datetime"]):
+            days = np.asarray(bars["datetime"], dtype="<i8") // 1_000_000
+            lo, hi = np.searchsorted(days, [self.dates[0], self.dates[-1]], side="left")
+            hi = int(np.searchsorted(days, self.dates[-1], side="right"))
+            days = days[lo:hi]
+            rows = np.searchsorted(self.dates, days)
+            found = self.dates[np.minimum(rows, len(self.dates) - 1)] == days
+            column[rows[found]] = np.asarray(bars[field][lo:hi], dtype=np.float64)[found]
+        column.setflags(write=False)
+        self._columns[key] = column
+        return column
+
+    def factors(self, order_book_id: str) -> np.ndarray:
+        """Cumulative ex-rights factor of every row (1 without corporate actions)."""
+        key = (order_book_id, "__ex_cum_factor__")
+        column = self._columns.get(key)
+        if column is None:
+            column = np.ones(len(self.dates))
+            factors = self.bundle.ex_cum_factors(order_book_id)
+            if factors is not None and len(factors):
+                starts = np.asarray(factors["start_date"], dtype="<i8")
+                starts = np.where(starts > 100_000_000, starts // 1_000_000, starts)
+                pos = np.searchsorted(starts, self.dates, side="right") - 1
+                values = np.asarray(factors["ex_cum_factor"], dtype=np.float64)
+                column = np.where(pos >= 0, values[np.maximum(pos, 0)], 1.0)
+            column.setflags(write=False)
+            self._columns[key] = column
+        return column
+
+    def _column(self, order_book_id: str, field: str, adjust_type: str) -> np.ndarray:
+        column = self.raw(order_book_id, field)
+        if adjust_type == "none" or field not in ("open", "close", "high", "low", "limit_up", "limit_down"):
+            return column.copy()
+        factors = self.factors(order_book_id)
+        if adjust_type == "pre":
+            return column * factors / factors[-1]
+        if adjust_type == "post":
+            return column * factors
+        raise ValueError(f"adjust_type 只支持 pre / post / none: {adjust_type}")
+
+    def prices(self, order_book_ids: Union[str, Sequence[str]], field: str = "close",
+               adjust_type: str = "pre") -> np.ndarray:
+        """One field of daily bars: a 1-D array for one order_book_id, else (len(dates), n).
+
+        Days without a bar (not yet listed, suspended, delisted) are NaN.
+        Pre-adjusted prices are relative to the end of the run.
+        """
+        if isinstance(order_book_ids, str):
+            return self._column(order_book_ids, field, adjust_type)
+        columns = [self._column(order_book_id, field, adjust_type) for order_book_id in order_book_ids]
+        if not columns:
+            return np.empty((len(self.dates), 0))
+        return np.column_stack(columns)
+
+
+class Costs:
+    """Commission, stamp tax and slippage of stock trades, configured with rqalpha's mod keys."""
+
+    def __init__(self, commission_multiplier: float = 1.0, min_commission: float = 5.0,
+                 tax_multiplier: float = 1.0, pit_tax: bool = False, slippage: float = 0.0,
+                 dividend_tax_rate: float = 0.0):
+        self.commission_rate = STOCK_COMMISSION_RATE * float(commission_multiplier)
+        self.min_commission = float(min_commission)
+        self.tax_multiplier = float(tax_multiplier)
+        self.pit_tax = bool(pit_tax)
+        self.slippage = float(slippage)
+        self.dividend_tax_rate = float(dividend_tax_rate)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Costs":
+        mods = config.get("mod") or {}
+        cost = mods.get("sys_transaction_cost") or {}
+        simulation = mods.get("sys_simulation") or {}
+        accounts = mods.get("sys_accounts") or {}
+        min_commission = cost.get("cn_stock_min_commission")
+        if min_commission is None:
+            min_commission = cost.get("stock_min_commission", 5)
+        return cls(
+            commission_multiplier=cost.get("stock_commission_multiplier", cost.get("commission_multiplier", 1)) or 1,
+            min_commission=min_commission,
+            tax_multiplier=cost.get("tax_multiplier", 1),
+            pit_tax=cost.get("pit_tax", False),
+            slippage=simulation.get("slippage", 0) or 0,
+            dividend_tax_rate=accounts.get("dividend_tax_rate", 0) or 0,
+        )
+
+    def commission(self, value: float) -> float:
+        return max(value * self.commission_rate, self.min_commission)
+
+    def tax(self, value: float, day: int, is_stock: bool) -> float:
+        if not is_stock:
+            return 0.0
+        rate = STOCK_TAX_RATE_BEFORE_CHANGE if self.pit_tax and day < STOCK_PIT_TAX_CHANGE_DATE else STOCK_TAX_RATE
+        return value * rate * self.tax_multiplier
+
+
+def _round_quantity(ins: dict, quantity: float) -> int:
+    """Quantity rounded toward zero to what the board accepts (rqalpha's _round_order_quantity)."""
+    board_type = ins.get("board_type")
+    if ins["type"] == "CS" and board_type == "KSH":
+        return 0 if abs(quantity) < KSH_MIN_AMOUNT else int(quantity)
+    if ins["type"] == "CS" and board_type == "BJS":
+        return 0 if abs(quantity) < BJSE_MIN_AMOUNT else int(quantity)
+    round_lot = int(ins.get("round_lot") or 1)
+    return int(quantity / round_lot) * round_lot
+
+
+def _split_ratio(splits: np.ndarray) -> Decimal:
+    """Combined ratio of the splits of one day, computed like rqalpha's StockPosition."""
+    if "split_coefficient_to" not in splits.dtype.names:
+        return Decimal(splits["split_factor"].cumprod()[-1])
+    for field in ("split_coefficient_to", "split_coefficient_from"):
+        if not np.all(np.isclose(splits[field] % 1, 0)):
+            return Decimal((splits["split_coefficient_to"] / splits["split_coefficient_from"]).cumprod()[-1])
+    coefficient_to = splits["split_coefficient_to"].astype(int).cumprod()[-1]
+    coefficient_from = splits["split_coefficient_from"].astype(int).cumprod()[-1]
+    return Decimal(int(coefficient_to)) / Decimal(int(coefficient_from))
+
+
+def _corporate_actions(data: VectorData, order_book_id: str, costs: Costs):
+    """(row -> split ratio, row -> (dividend per share, payable row)) within the run."""
+    splits_by_row: Dict[int, Decimal] = {}
+    dividends_by_row: Dict[int, tuple] = {}
+    first, last = data.dates[data.start], data.dates[-1]
+
+    splits = data.bundle.splits(order_book_id)
+    if splits is not None and len(splits):
+        ex_days = np.asarray(splits["ex_date"], dtype="<i8")
+        ex_days = np.where(ex_days > 100_000_000, ex_days // 1_000_000, ex_days)
+        for row in np.unique(np.searchsorted(data.dates, ex_days[(ex_days > first) & (ex_days <= last)])):
+            in_row = (ex_days > data.dates[row - 1]) & (ex_days <= data.dates[row])
+            splits_by_row[int(row)] = _split_ratio(splits[in_row])
+
+    dividends = data.bundle.dividends(order_book_id)
+    if dividends is not None and len(dividends):
+        ex_days = np.asarray(dividends["ex_dividend_date"], dtype="<i8")
+        ex_days = np.where(ex_days > 100_000_000, ex_days // 1_000_000, ex_days)
+        for row in np.unique(np.searchsorted(data.dates, ex_days[(ex_days > first) & (ex_days <= last)])):
+            in_row = dividends[(ex_days > data.dates[row - 1]) & (ex_days <= data.dates[row])]
+            per_share = float((in_row["dividend_cash_before_tax"] / in_row["round_lot"]).sum())
+            per_share *= 1 - costs.dividend_tax_rate
+            payable = _date_int(in_row["payable_date"][-1])
+            pay_row = int(np.searchsorted(data.dates, payable, side="left"))
+            dividends_by_row[int(row)] = (per_share, pay_row)
+    return splits_by_row, dividends_by_row
+
+
+def _delist_row(data: VectorData, ins: dict) -> Optional[int]:
+    """Row after whose close a delisted position is returned as cash (rqalpha settlement)."""
+    raw = str(ins.get("de_listed_date") or "")
+    if not raw or raw.startswith("0000"):
+        return None
+    delisted = _date_int(raw)
+    nxt = int(np.searchsorted(data.dates, delisted, side="left"))
+    if nxt <= data.start or nxt > len(data.dates) - 1:
+        return None
+    return nxt - 1
+
+
+def simulate(data: VectorData, targets: Dict[str, Iterable], cash: float, costs: Optional[Costs] = None,
+             benchmark: Optional[str] = None) -> dict:
+    """Execute target weights over the run; returns a result dict in rqalpha's sys_analyser layout."""
+    costs = costs or Costs()
+    starting_cash = cash = float(cash)
+    order_book_ids = sorted(targets)
+    n, rows_total = len(order_book_ids), len(data.dates)
+    start = data.start
+    instruments = [data.bundle.instrument(order_book_id) for order_book_id in order_book_ids]
+    for order_book_id, ins in zip(order_book_ids, instruments):
+        if ins["type"] not in TRADABLE_TYPES:
+            raise ValueError(f"{order_book_id} 不是股票账户可交易的合约（{ins['type']}）")
+
+    weights = np.full((rows_total, n), np.nan)
+    for i, order_book_id in enumerate(order_book_ids):
+        column = np.asarray(targets[order_book_id], dtype=np.float64)
+        if column.shape != (rows_total,):
+            raise ValueError(f"{order_book_id} 的目标权重长度为 {column.shape}，应为 ({rows_total},)")
+        weights[:, i] = column
+    if np.any(weights[start:] < 0):
+        raise ValueError("目标权重不能为负（股票账户不支持做空）")
+
+    close = data.prices(order_book_ids, "close", "none") if n else np.empty((rows_total, 0))
+    last = pd.DataFrame(close).ffill().fillna(0.0).to_numpy()
+    volume = np.column_stack([data.raw(o, "volume") for o in order_book_ids]) if n else close
+    limit_up = np.column_stack([data.raw(o, "limit_up") for o in order_book_ids]) if n else close
+    limit_down = np.column_stack([data.raw(o, "limit_down") for o in order_book_ids]) if n else close
+    # rqalpha rejects orders on days without a bar, and fills neither buys at limit-up nor sells at limit-down
+    orderable = np.isfinite(weights) & np.isfinite(close) & (volume != 0)
+    with np.errstate(invalid="ignore"):
+        at_limit_up = close >= limit_up
+        at_limit_down = close <= limit_down
+
+    # row -> [(instrument, ...)]: corporate actions only cost time on the days they happen
+    splits: Dict[int, List[tuple]] = {}
+    dividends: Dict[int, List[tuple]] = {}
+    delists: Dict[int, List[int]] = {}
+    event_rows = set((start + np.flatnonzero(orderable[start:].any(axis=1))).tolist())
+    for i, (order_book_id, ins) in enumerate(zip(order_book_ids, instruments)):
+        split_rows, dividend_rows = _corporate_actions(data, order_book_id, costs)
+        for row, ratio in split_rows.items():
+            splits.setdefault(row, []).append((i, ratio))
+        for row, (per_share, pay_row) in dividend_rows.items():
+            dividends.setdefault(row, []).append((i, per_share, pay_row))
+            event_rows.add(pay_row)
+        delist_row = _delist_row(data, ins)
+        if delist_row is not None:
+            delists.setdefault(delist_row, []).append(i)
+    event_rows.update(splits, dividends, delists)
+    event_rows = sorted(row for row in event_rows if start <= row < rows_total)
+
+    # The event loop works on Python floats: per order, numpy scalars cost more than the arithmetic.
+    positions: Dict[int, float] = {}  # instrument -> quantity, open positions only
+    receivable: List[tuple] = []  # (payable row, amount)
+    snap_quantity = np.zeros((len(event_rows), n))
+    snap_cash = np.zeros(len(event_rows))
+    snap_receivable = np.zeros(len(event_rows))
+    trades = []
+    for k, row in enumerate(event_rows):
+        day = int(data.dates[row])
+        # before trading, in rqalpha's order: ex-dividend, dividends paid, splits
+        for i, per_share, pay_row in dividends.get(row, ()):
+            if i in positions:
+                receivable.append((pay_row, positions[i] * per_share))
+        if receivable:
+            cash += sum(amount for pay_row, amount in receivable if pay_row <= row)
+            receivable = [item for item in receivable if item[0] > row]
+        receivable_value = sum(amount for _, amount in receivable)
+        for i, ratio in splits.get(row, ()):
+            if i in positions:
+                positions[i] = float((Decimal(positions[i]) * ratio).quantize(Decimal("1"), ROUND_HALF_UP))
+
+        # at the close: exits, then reductions, then buys, so that buys can use the freed cash
+        prices = last[row].tolist()
+        columns = np.flatnonzero(orderable[row]).tolist()
+        if columns:
+            targets_row = weights[row].tolist()
+            held_value = sum(quantity * prices[i] for i, quantity in positions.items())
+            total_value = cash + receivable_value + held_value
+            orders = sorted(
+                (total_value * targets_row[i] >= positions.get(i, 0.0) * prices[i], targets_row[i] != 0, i)
+                for i in columns
+            )
+            for _, _, i in orders:
+                ins, price, target = instruments[i], prices[i], targets_row[i]
+                quantity = positions.get(i, 0.0)
+                if target == 0:
+                    amount = -quantity
+                else:
+                    delta = (cash + receivable_value + held_value) * target - quantity * price
+                    if delta > 0:
+                        budget = min(delta, cash)
+                        amount = _round_quantity(ins, min(int(budget / price), int(cash / price)))
+                        round_lot = int(ins.get("round_lot") or 1)
+                        while amount > 0 and amount * price + costs.commission(amount * price) > budget:
+                            amount -= round_lot
+                    else:
+                        amount = max(int(delta / price), -quantity)
+                        if -amount != quantity:
+                            amount = -_round_quantity(ins, -amount)
+                if amount == 0 or (amount > 0 and at_limit_up[row, i]) or (amount < 0 and at_limit_down[row, i]):
+                    continue
+                fill = price * (1 + costs.slippage) if amount > 0 else price * (1 - costs.slippage)
+                value = abs(amount) * fill
+                commission = costs.commission(value)
+                tax = costs.tax(value, day, ins["type"] == "CS") if amount < 0 else 0.0
+                cash -= amount * fill + commission + tax
+                held_value += amount * price
+                if quantity + amount:
+                    positions[i] = quantity + amount
+                else:
+                    del positions[i]
+                trades.append((day, order_book_ids[i], ins.get("symbol", ""), amount, fill, commission, tax))
+
+        # after the close: delisted positions are returned as cash
+        for i in delists.get(row, ()):
+            if i in positions:
+                cash += positions.pop(i) * prices[i]
+
+        if positions:
+            snap_quantity[k, list(positions)] = list(positions.values())
+        snap_cash[k] = cash
+        snap_receivable[k] = sum(amount for _, amount in receivable)
+
+    return _result(data, starting_cash, order_book_ids, event_rows, snap_quantity, snap_cash, snap_receivable,
+                   last, trades, benchmark)
+
+
+def _result(data: VectorData, starting_cash: float, order_book_ids, event_rows, snap_quantity, snap_cash,
+            snap_receivable, last, trades, benchmark) -> dict:
+    start = data.start
+    rows = np.arange(start, len(data.dates))
+    at = np.searchsorted(np.asarray(event_rows, dtype=np.int64), rows, side="right") - 1
+    has = at >= 0
+    quantity = np.where(has[:, None], snap_quantity[np.maximum(at, 0)], 0.0)
+    cash = np.where(has, snap_cash[np.maximum(at, 0)], starting_cash)
+    receivable = np.where(has, snap_receivable[np.maximum(at, 0)], 0.0)
+    market_value = (quantity * last[start:]).sum(axis=1) if len(order_book_ids) else np.zeros(len(rows))
+    total_value = cash + receivable + market_value
+    return _package(data, starting_cash, total_value, cash, market_value, trades, benchmark)
+
+
+def _package(data, starting_cash, total_value, cash, market_value, trades, benchmark) -> dict:
+    index = pd.to_datetime(data.dates[data.start:].astype(str), format="%Y%m%d")
+    unit_net_value = total_value / starting_cash
+    returns = np.diff(unit_net_value, prepend=1.0) / np.concatenate([[1.0], unit_net_value[:-1]])
+    portfolio = pd.DataFrame({
+        "cash": cash,
+        "total_value": total_value,
+        "market_value": market_value,
+        "unit_net_value": unit_net_value,
+        "units": starting_cash,
+        "static_unit_net_value": np.concatenate([[1.0], unit_net_value[:-1]]),
+        "returns": returns,
+    }, index=index)
+    portfolio.index.name = "date"
+
+    summary = {
+        "strategy_name": "strategy",
+        "engine": "vector",
+        "run_type": "BACKTEST",
+        "start_date": str(index[0].date()),
+        "end_date": str(index[-1].date()),
+        "starting_cash": float(starting_cash),
+        **risk_metrics(unit_net_value, returns),
+    }
+    summary.update({"total_value": float(total_value[-1]), "cash": float(cash[-1])})
+    result = {"summary": summary, "portfolio": portfolio, "trades": _trades_frame(trades)}
+
+    if benchmark:
+        try:
+            benchmark_close = pd.Series(data.prices(benchmark, "close", "none")).ffill().to_numpy()
+        except ValueError:
+            benchmark_close = None
+        if benchmark_close is not None and np.isfinite(benchmark_close[data.start:]).any():
+            base = benchmark_close[data.start - 1] if data.start > 0 else np.nan
+            if not np.isfinite(base):
+                base = benchmark_close[data.start:][np.isfinite(benchmark_close[data.start:])][0]
+            benchmark_nav = benchmark_close[data.start:] / base
+            result["benchmark_portfolio"] = pd.DataFrame({"unit_net_value": benchmark_nav}, index=index)
+            benchmark_returns = np.diff(benchmark_nav, prepend=1.0) / np.concatenate([[1.0], benchmark_nav[:-1]])
+            bench = risk_metrics(benchmark_nav, np.nan_to_num(benchmark_returns))
+            summary["benchmark"] = benchmark
+            summary["benchmark_total_returns"] = bench["total_returns"]
+            summary["benchmark_annualized_returns"] = bench["annualized_returns"]
+    return result
+
+
+def risk_metrics(unit_net_value: np.ndarray, returns: np.ndarray) -> dict:
+    """Return and risk figures of a daily net value series."""
+    days = len(returns)
+    total_returns = float(unit_net_value[-1] - 1.0)
+    annualized = (1 + total_returns) ** (TRADING_DAYS_A_YEAR / days) - 1 if total_returns > -1 else -1.0
+    volatility = float(np.std(returns, ddof=1) * np.sqrt(TRADING_DAYS_A_YEAR)) if days > 1 else 0.0
+    peak = np.maximum.accumulate(np.concatenate([[1.0], unit_net_value]))[1:]
+    return {
+        "total_returns": total_returns,
+        "annualized_returns": float(annualized),
+        "unit_net_value": float(unit_net_value[-1]),
+        "max_drawdown": float(np.max(1 - unit_net_value / peak)),
+        "volatility": volatility,
+        # risk-free rate taken as 0
+        "sharpe": float(np.mean(returns) / np.std(returns, ddof=1) * np.sqrt(TRADING_DAYS_A_YEAR))
+        if days > 1 and np.std(returns, ddof=1) > 0 else 0.0,
+    }
+
+
+def _trades_frame(trades) -> pd.DataFrame:
+    columns = ["datetime", "trading_datetime", "order_book_id", "symbol", "side", "position_effect",
+               "exec_id", "tax", "commission", "last_quantity", "last_price", "order_id", "transaction_cost"]
+    records = []
+    for n, (day, order_book_id, symbol, amount, price, commission, tax) in enumerate(trades, start=1):
+        dt = f"{day // 10000:04d}-{day // 100 % 100:02d}-{day % 100:02d} 15:00:00"
+        records.append({
+            "datetime": dt,
+            "trading_datetime": dt,
+            "order_book_id": order_book_id,
+            "symbol": symbol,
+            "side": "BUY" if amount > 0 else "SELL",
+            "position_effect": "OPEN" if amount > 0 else "CLOSE",
+            "exec_id": n,
+            "tax": tax,
+            "commission": commission,
+            "last_quantity": abs(amount),
+            "last_price": price,
+            "order_id": n,
+            "transaction_cost": commission + tax,
+        })
+    frame = pd.DataFrame(records, columns=columns)
+    if len(frame):
+        frame.index = pd.to_datetime(frame["datetime"])
+    return frame
+
+
+def load_strategy_hook(strategy_path: Union[str, Path]):
+    path = Path(strategy_path)
+    scope = {"__name__": "strategy", "__file__": str(path)}
+    exec(compile(path.read_text(encoding="utf-8"), str(path), "exec"), scope)
+    hook = scope.get(HOOK_NAME)
+    if not callable(hook):
+        raise ValueError(f"策略未定义 {HOOK_NAME}(data)，不能用 engine=vector 运行")
+    return hook
+
+
+def run_file(strategy_path: Union[str, Path], config: dict) -> dict:
+    """Run a strategy file with a config.yml-shaped dict; writes sys_analyser.output_file if set."""
+    base = config.get("base") or {}
+    mods = config.get("mod") or {}
+    if str(base.get("frequency", "1d")) != "1d":
+        raise ValueError("engine=vector 仅支持日线回测")
+    accounts = base.get("accounts") or {}
+    cash = float(accounts.get("STOCK") or 0)
+    if cash <= 0:
+        raise ValueError("engine=vector 需要股票账户初始资金 (base.accounts.STOCK)")
+    started = time.monotonic()
+    bundle = BundleBars(base["data_bundle_path"], (mods.get("shared_bundle") or {}).get("cache_root"))
+    lookback = int((config.get("vector") or {}).get("lookback_days", 0))
+    data = VectorData(bundle, base["start_date"], base["end_date"], lookback)
+    print(f"vector: {len(data) - data.start} 个交易日（另含 {data.start} 个回看交易日）")
+
+    targets = load_strategy_hook(strategy_path)(data)
+    if not isinstance(targets, dict):
+        raise TypeError(f"{HOOK_NAME} 应返回 dict（order_book_id -> 目标权重数组）")
+    benchmark = base.get("benchmark")
+    benchmark = None if benchmark in (None, "", "None", "null") else str(benchmark)
+    result = simulate(data, targets, cash, Costs.from_config(config), benchmark)
+    print(f"vector: {len(targets)} 个合约，{len(result['trades'])} 笔成交，"
+          f"耗时 {time.monotonic() - started:.2f}s")
+
+    output_file = (mods.get("sys_analyser") or {}).get("output_file")
+    if output_file:
+        with open(output_file, "wb") as f:
+            pickle.dump(result, f)
+    return result
+
+
+def _parse_cli_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run a vector_targets(data) strategy over bundle day bars.")
+    parser.add_argument("-f", "--strategy-file", required=True, help="strategy file path")
+    parser.add_argument("--config", required=True, help="config.yml of the job")
+    return parser.parse_args(argv)
+
+
+def _cli_main(argv: Optional[List[str]] = None) -> int:
+    import yaml
+
+    args = _parse_cli_args(argv)
+    try:
+        config = yaml.safe_load(Path(args.config).read_text(encoding="utf-8")) or {}
+        result = run_file(args.strategy_file, config)
+    except Exception:
+        traceback.print_exc()
+        return 1
+    print(json.dumps(result["summary"], ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_cli_main())
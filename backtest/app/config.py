@@ -79,7 +79,32 @@ class Config:
     BACKTEST_COMPILE_TIMEOUT = _int_from_env("BACKTEST_COMPILE_TIMEOUT", 10)
     BACKTEST_KEEP_DAYS = _int_from_env("BACKTEST_KEEP_DAYS", 30)
     BACKTEST_IDEMPOTENCY_WINDOW_SECONDS = _int_from_env("BACKTEST_IDEMPOTENCY_WINDOW_SECONDS", 30)
-    BACKTEST_ALLOWED_FREQUENCIES = _list_from_env("BACKTEST_ALLOWED_FREQUENCIES", ("1d",))
+    BACKTEST_ALLOWED_FREQUENCIES = _list_from_env("BACKTEST_ALLOWED_FREQUENCIES", ("1d", "1m"))
+    # 1m backtests read dbbardata through the minute_bars mod: trading days fetched per
+    # query, and the row bound of the decoded-window LRU inside each job.
+    BACKTEST_MINUTE_PREFETCH_DAYS = _int_from_env("BACKTEST_MINUTE_PREFETCH_DAYS", 5)
+    BACKTEST_MINUTE_CACHE_ROWS = _int_from_env("BACKTEST_MINUTE_CACHE_ROWS", 1_000_000)
+    # Serve day bars to rqalpha jobs from the shared memory-mapped bar cache (falls back to HDF5).
+    BACKTEST_SHARED_BUNDLE = _bool_from_env("BACKTEST_SHARED_BUNDLE", True)
+    # Export the incremental indicator() / rolling_history_bars() APIs to strategies.
+    BACKTEST_INDICATORS = _bool_from_env("BACKTEST_INDICATORS", True)
+    # Call the strategy's optional precompute(context, data) hook once before the 1d event loop,
+    # with this many trading days of warm-up history before the start date.
+    BACKTEST_PRECOMPUTE = _bool_from_env("BACKTEST_PRECOMPUTE", True)
+    BACKTEST_PRECOMPUTE_LOOKBACK_DAYS = _int_from_env("BACKTEST_PRECOMPUTE_LOOKBACK_DAYS", 250)
+    # Trading days of history before the start date handed to vector_targets(data) in engine=vector runs.
+    BACKTEST_VECTOR_LOOKBACK_DAYS = _int_from_env("BACKTEST_VECTOR_LOOKBACK_DAYS", 250)
+    # Checkpoint rqalpha runs to <job_dir>/checkpoint.pkl at the first settlement after this many
+    # seconds (and at the end), so jobs can be continued to a later end_date or resumed after a restart.
+    BACKTEST_CHECKPOINT = _bool_from_env("BACKTEST_CHECKPOINT", True)
+    BACKTEST_CHECKPOINT_INTERVAL_SECONDS = _int_from_env("BACKTEST_CHECKPOINT_INTERVAL_SECONDS", 60)
+    # Append equity points and trades of rqalpha runs to <job_dir>/stream while they run (partial results).
+    BACKTEST_RESULT_STREAM = _bool_from_env("BACKTEST_RESULT_STREAM", True)
+    # Frequencies whose result is the stream itself (summary.json from the stream tables, no
+    # sys_analyser result.pkl), so memory does not grow with the number of bars and trades.
+    BACKTEST_STREAMING_RESULT_FREQUENCIES = _list_from_env("BACKTEST_STREAMING_RESULT_FREQUENCIES", ("1m",))
+    # On startup, rerun jobs left QUEUED/RUNNING by a previous process from their last checkpoint.
+    BACKTEST_AUTO_RESUME = _bool_from_env("BACKTEST_AUTO_RESUME", True)
     # Market data database path (default: <BACKTEST_BASE_DIR>/market_data.sqlite3).
     MARKET_DATA_DB_PATH = _str_from_env("MARKET_DATA_DB_PATH", "")
     # Database configuration (SQLite or MariaDB)
@@ -91,6 +116,8 @@ class Config:
     DB_PASSWORD = _str_from_env("DB_PASSWORD", "")
     # VnPy futures bar data table
     DB_TABLE = _str_from_env("DB_TABLE", "dbbardata")
+    # Upper bound on bars held by the in-process /api/market-data/bars LRU cache.
+    MARKET_DATA_BARS_CACHE_ROWS = _int_from_env("MARKET_DATA_BARS_CACHE_ROWS", 2_000_000)
     # Research workbench storage and notebook session settings.
     # RESEARCH_PUBLIC_BASE_URL is optional; when empty, request.host_url is used.
     RESEARCH_PUBLIC_BASE_URL = _str_from_env("RESEARCH_PUBLIC_BASE_URL", "")
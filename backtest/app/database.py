@@ -289,6 +289,27 @@ class DatabaseConnection:
             query = f"REPLACE INTO {table} ({cols}) VALUES ({placeholders})"
         return self.execute(query, values)
 
+    def replace_many(self, table: str, columns: list[str], rows: list[tuple]) -> Any:
+        """Batch variant of replace_into() for many rows sharing one column list.
+
+        Args:
+            table: Table name
+            columns: List of column names
+            rows: List of value tuples
+
+        Returns:
+            Cursor object, or None when rows is empty
+        """
+        if not rows:
+            return None
+        cols = ', '.join(columns)
+        placeholders = ', '.join(['?'] * len(columns))
+        if self.config.db_type == 'sqlite':
+            query = f"INSERT OR REPLACE INTO {table} ({cols}) VALUES ({placeholders})"
+        else:
+            query = f"REPLACE INTO {table} ({cols}) VALUES ({placeholders})"
+        return self.executemany(query, rows)
+
     def upsert(self, table: str, insert_cols: list[str], insert_vals: tuple,
                conflict_col: str, update_cols: list[str]) -> Any:
         """Cross-database compatible UPSERT.
@@ -1,14 +1,35 @@
 """Bundle data analyzer."""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional, Set, Tuple
 
 from app.database import get_db_connection
+from app.market_data.bundle_store import RESERVED_NAMES
+from app.market_data.columnar import build_columnar_cache
+
+# Bar data files (one dataset per instrument) -> market_data_stats count column
+_BAR_FILES = {
+    'stocks.h5': 'stock_count',
+    'funds.h5': 'fund_count',
+    'futures.h5': 'futures_count',
+    'indexes.h5': 'index_count',
+    'bonds.h5': 'bond_count',
+}
+_PARSE_CHUNK_SIZE = 2000
+_PARSE_MAX_WORKERS = 4
 
 
 def analyze_bundle(task_id: str, bundle_path: Path, db_config_dict: dict):
     """Analyze RQAlpha bundle data.
 
+    The analysis is incremental: the file scan is diffed against the
+    market_data_files rows of the previous run, and only bar files that changed
+    (or have no coverage rows yet) are re-parsed for per-instrument coverage
+    and converted into the columnar bar cache.
+
     Args:
         task_id: Task ID for progress updates
         bundle_path: Path to bundle directory
@@ -23,17 +44,39 @@ def analyze_bundle(task_id: str, bundle_path: Path, db_config_dict: dict):
     tm.update_progress(task_id, 0, 'analyze', '开始分析...')
 
     try:
-        # 1. Scan files
+        # 1. Scan files and diff against the previous run
         tm.update_progress(task_id, 10, 'analyze', '正在扫描文件...')
         file_stats = _scan_files(bundle_path)
+        previous_files, covered_sources = _load_previous_manifest(db_config_dict)
+        diff = _diff_manifest(previous_files, file_stats['files'])
+        tm.log(
+            task_id, 'INFO',
+            f"文件 {file_stats['total_files']} 个：新增 {len(diff['added'])}，"
+            f"变更 {len(diff['changed'])}，删除 {len(diff['removed'])}"
+        )
 
-        # 2. Parse bundle data
-        tm.update_progress(task_id, 30, 'analyze', '正在解析行情数据...')
-        data_counts = _parse_bundle_data(bundle_path, tm, task_id)
-
-        # 3. Save to database
+        # 2. Parse per-instrument coverage of changed bar files
+        current_paths = {f['path'] for f in file_stats['files']}
+        touched = {f['path'] for f in diff['added'] + diff['changed']}
+        to_parse = [
+            name for name in _BAR_FILES
+            if name in current_paths and (name in touched or name not in covered_sources)
+        ]
+        dropped = [name for name in covered_sources if name not in current_paths]
+        tm.update_progress(task_id, 30, 'analyze', f"正在解析行情数据: {', '.join(to_parse) or '无变更'}")
+        coverage = _parse_coverage(bundle_path, to_parse, tm, task_id)
+
+        # 3. Rebuild the columnar cache of bar files changed since its last build
+        tm.update_progress(task_id, 75, 'analyze', '正在更新列式缓存...')
+        _refresh_columnar_cache(bundle_path, [name for name in _BAR_FILES if name in current_paths], tm, task_id)
+
+        # 4. Save to database
         tm.update_progress(task_id, 90, 'analyze', '正在写入数据库...')
-        _save_stats(db_config_dict, bundle_path, file_stats, data_counts)
+        summary = _save_stats(db_config_dict, bundle_path, file_stats, diff, coverage, dropped)
+        tm.log(
+            task_id, 'INFO',
+            f"合约覆盖：更新 {summary['coverage_upserted']} 条，删除 {summary['coverage_deleted']} 条"
+        )
 
         tm.update_progress(task_id, 100, 'analyze', '分析完成')
         tm.log(task_id, 'INFO', '数据分析任务完成')
@@ -79,10 +122,10 @@ def ensure_bundle_analysis_task(bundle_path: Path, db_config_dict: dict | None =
 
 
 def _scan_files(bundle_path: Path) -> Dict:
-    """Scan files and collect statistics."""
+    """Scan files and collect statistics (one stat() per file)."""
     total_files = 0
     total_size = 0
-    last_modified = None
+    last_mtime = None
     files_list = []
 
     if not bundle_path.exists():
@@ -93,151 +136,264 @@ def _scan_files(bundle_path: Path) -> Dict:
             'files': []
         }
 
-    for file_path in bundle_path.rglob('*'):
-        if file_path.is_file():
-            total_files += 1
-            file_size = file_path.stat().st_size
-            total_size += file_size
-            mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
-
-            # Collect file info
-            relative_path = file_path.relative_to(bundle_path)
-            files_list.append({
-                'name': file_path.name,
-                'path': str(relative_path),
-                'size': file_size,
-                'modified': mtime.isoformat()
-            })
-
-            if last_modified is None or mtime > last_modified:
-                last_modified = mtime
+    pending = [(bundle_path, '')]
+    while pending:
+        directory, prefix = pending.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not prefix and entry.name in RESERVED_NAMES:
+                    continue
+                relative_path = f'{prefix}{entry.name}'
+                if entry.is_dir():
+                    pending.append((entry.path, f'{relative_path}/'))
+                    continue
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                total_files += 1
+                total_size += st.st_size
+                files_list.append({
+                    'name': entry.name,
+                    'path': relative_path,
+                    'size': st.st_size,
+                    'modified': datetime.fromtimestamp(st.st_mtime).isoformat(),
+                })
+                if last_mtime is None or st.st_mtime > last_mtime:
+                    last_mtime = st.st_mtime
 
     return {
         'total_files': total_files,
         'total_size_bytes': total_size,
-        'last_modified': last_modified.isoformat() if last_modified else None,
+        'last_modified': datetime.fromtimestamp(last_mtime).isoformat() if last_mtime else None,
         'files': files_list
     }
 
 
-def _parse_bundle_data(bundle_path: Path, tm, task_id: str) -> Dict:
-    """Parse bundle data and count records by type."""
-    counts = {
-        'stock_count': 0,
-        'fund_count': 0,
-        'futures_count': 0,
-        'index_count': 0,
-        'bond_count': 0
-    }
+def _normalize_modified(value) -> str:
+    """Normalize a stored or scanned mtime to second precision for comparison."""
+    if value is None:
+        return ''
+    return str(value).replace('T', ' ')[:19]
 
-    if not bundle_path.exists():
-        return counts
+
+def _load_previous_manifest(db_config_dict: dict) -> Tuple[Dict[str, dict], Set[str]]:
+    """Return market_data_files rows by path, and the bar files that have coverage rows."""
+    with get_db_connection(config_dict=db_config_dict) as db:
+        rows = db.fetchall("SELECT file_id, file_path, file_size, modified_at FROM market_data_files")
+        sources = db.fetchall("SELECT DISTINCT source_file FROM market_data_instrument_coverage")
+    return {row['file_path']: row for row in rows}, {row['source_file'] for row in sources}
+
+
+def _diff_manifest(previous: Dict[str, dict], files: List[dict]) -> Dict[str, list]:
+    """Diff the current scan against the previous market_data_files rows."""
+    added, changed = [], []
+    seen = set()
+    for f in files:
+        seen.add(f['path'])
+        old = previous.get(f['path'])
+        if old is None:
+            added.append(f)
+        elif (old.get('file_size') != f['size']
+              or _normalize_modified(old.get('modified_at')) != _normalize_modified(f['modified'])):
+            changed.append({**f, 'file_id': old['file_id']})
+    removed = [row for path, row in previous.items() if path not in seen]
+    return {'added': added, 'changed': changed, 'removed': removed}
+
+
+def _format_bar_date(value) -> Optional[str]:
+    text = str(int(value))[:8]
+    if len(text) != 8:
+        return None
+    return f'{text[:4]}-{text[4:6]}-{text[6:8]}'
+
+
+def _read_coverage_chunk(h5_path: str, keys: List[str]) -> List[tuple]:
+    """Read (order_book_id, first_date, last_date, bar_count) for a batch of datasets.
+
+    Bundle bar datasets are sorted by datetime, so only the first and last rows
+    are read. Runs in a worker process.
+    """
+    import h5py
+
+    rows = []
+    with h5py.File(h5_path, 'r') as f:
+        for key in keys:
+            ds = f[key]
+            if not isinstance(ds, h5py.Dataset) or not ds.shape:
+                continue
+            count = int(ds.shape[0])
+            first_date = last_date = None
+            if count and ds.dtype.names and 'datetime' in ds.dtype.names:
+                first_date = _format_bar_date(ds[0]['datetime'])
+                last_date = _format_bar_date(ds[count - 1]['datetime'])
+            rows.append((key, first_date, last_date, count))
+    return rows
+
+
+def _parse_coverage(bundle_path: Path, file_names: List[str], tm, task_id: str) -> Dict[str, List[tuple]]:
+    """Parse per-instrument coverage of the given bar files in a process pool."""
+    coverage: Dict[str, List[tuple]] = {name: [] for name in file_names}
+    if not file_names:
+        return coverage
 
     try:
-        # Try to use h5py to parse HDF5 data files
+        import h5py
+    except ImportError:
+        return {}
+
+    jobs = []
+    for name in file_names:
+        h5_path = str(bundle_path / name)
         try:
-            import h5py
-        except ImportError:
-            return counts
-
-        # Stock data
-        tm.update_progress(task_id, 40, 'analyze', '正在解析股票数据...')
-        stock_file = bundle_path / 'stocks.h5'
-        if stock_file.exists():
-            try:
-                with h5py.File(str(stock_file), 'r') as f:
-                    counts['stock_count'] = len(list(f.keys()))
-            except Exception:
-                pass
-
-        # Fund data
-        tm.update_progress(task_id, 50, 'analyze', '正在解析基金数据...')
-        fund_file = bundle_path / 'funds.h5'
-        if fund_file.exists():
-            try:
-                with h5py.File(str(fund_file), 'r') as f:
-                    counts['fund_count'] = len(list(f.keys()))
-            except Exception:
-                pass
-
-        # Futures data
-        tm.update_progress(task_id, 60, 'analyze', '正在解析期货数据...')
-        futures_file = bundle_path / 'futures.h5'
-        if futures_file.exists():
-            try:
-                with h5py.File(str(futures_file), 'r') as f:
-                    counts['futures_count'] = len(list(f.keys()))
-            except Exception:
-                pass
-
-        # Index data
-        tm.update_progress(task_id, 70, 'analyze', '正在解析指数数据...')
-        index_file = bundle_path / 'indexes.h5'
-        if index_file.exists():
-            try:
-                with h5py.File(str(index_file), 'r') as f:
-                    counts['index_count'] = len(list(f.keys()))
-            except Exception:
-                pass
-
-        # Bond data (if exists)
-        tm.update_progress(task_id, 80, 'analyze', '正在解析债券数据...')
-        bond_file = bundle_path / 'bonds.h5'
-        if bond_file.exists():
-            try:
-                with h5py.File(str(bond_file), 'r') as f:
-                    counts['bond_count'] = len(list(f.keys()))
-            except Exception:
-                pass
-
-    except Exception:
-        pass
-
-    return counts
-
-
-def _save_stats(db_config_dict: dict, bundle_path: Path, file_stats: Dict, data_counts: Dict):
-    """Save statistics to database (idempotent).
+            with h5py.File(h5_path, 'r') as f:
+                keys = list(f.keys())
+        except Exception as e:
+            tm.log(task_id, 'WARNING', f'无法读取 {name}: {e}')
+            coverage.pop(name, None)
+            continue
+        for i in range(0, len(keys), _PARSE_CHUNK_SIZE):
+            jobs.append((name, h5_path, keys[i:i + _PARSE_CHUNK_SIZE]))
+
+    if not jobs:
+        return coverage
+
+    # Spawn instead of fork: this runs inside a worker thread of the web process.
+    workers = max(1, min(_PARSE_MAX_WORKERS, os.cpu_count() or 1, len(jobs)))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(_read_coverage_chunk, h5_path, keys): name for name, h5_path, keys in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            coverage[futures[future]].extend(future.result())
+            tm.update_progress(task_id, 30 + int(45 * done / len(jobs)), 'analyze',
+                               f'正在解析行情数据 ({done}/{len(jobs)})')
+    return coverage
+
+
+def _refresh_columnar_cache(bundle_path: Path, file_names: List[str], tm, task_id: str) -> None:
+    """Rebuild stale columnar cache tables; a failed build leaves the analysis result intact."""
+    try:
+        import h5py  # noqa: F401
+    except ImportError:
+        return
+
+    def progress(done, total):
+        tm.update_progress(task_id, 75 + int(15 * done / total), 'analyze',
+                           f'正在更新列式缓存 ({done}/{total})')
+
+    try:
+        built = build_columnar_cache(bundle_path, file_names, progress=progress)
+    except Exception as e:
+        tm.log(task_id, 'WARNING', f'列式缓存更新失败: {e}')
+        return
+    for result in built:
+        tm.log(
+            task_id, 'INFO',
+            f"列式缓存 {result['source']}：{result['instruments']} 个合约，{result['rows']} 行"
+            f"（复用 {result['reused_rows']} 行，读取 {result['read_rows']} 行）"
+        )
+
+
+def _save_stats(db_config_dict: dict, bundle_path: Path, file_stats: Dict, diff: Dict,
+                coverage: Dict[str, List[tuple]], dropped_sources: List[str]) -> Dict:
+    """Apply the file diff and coverage changes, then refresh the stats row (idempotent).
 
     Args:
         db_config_dict: Serialized DatabaseConfig dict for background-thread connection.
         bundle_path: Path to the bundle directory.
         file_stats: File scan results from _scan_files().
-        data_counts: Instrument counts from _parse_bundle_data().
-    """
-    stats_cols = [
-        'id', 'bundle_path', 'last_modified', 'total_files', 'total_size_bytes',
-        'analyzed_at', 'stock_count', 'fund_count', 'futures_count',
-        'index_count', 'bond_count',
-    ]
-    stats_vals = (
-        1,
-        str(bundle_path),
-        file_stats['last_modified'],
-        file_stats['total_files'],
-        file_stats['total_size_bytes'],
-        datetime.utcnow().isoformat(),
-        data_counts['stock_count'],
-        data_counts['fund_count'],
-        data_counts['futures_count'],
-        data_counts['index_count'],
-        data_counts['bond_count'],
-    )
+        diff: Manifest diff from _diff_manifest().
+        coverage: Re-parsed coverage rows by bar file name from _parse_coverage().
+        dropped_sources: Bar files that disappeared from the bundle.
 
-    file_rows = [
-        (f['name'], f['path'], f['size'], f['modified'])
-        for f in file_stats.get('files', [])
-    ]
+    Returns:
+        dict with the number of coverage rows upserted and deleted
+    """
+    now = datetime.utcnow().isoformat()
+    coverage_cols = ['source_file', 'order_book_id', 'first_date', 'last_date', 'bar_count', 'updated_at']
+    upserted = deleted = 0
 
     with get_db_connection(config_dict=db_config_dict) as db:
-        # Idempotent upsert for the single-row stats table
-        db.replace_into('market_data_stats', stats_cols, stats_vals)
-
-        # Refresh file records
-        db.execute("DELETE FROM market_data_files")
-        if file_rows:
+        # File manifest: only touch rows that changed
+        if diff['removed']:
+            db.executemany(
+                "DELETE FROM market_data_files WHERE file_id = ?",
+                [(row['file_id'],) for row in diff['removed']],
+            )
+        if diff['changed']:
+            db.executemany(
+                "UPDATE market_data_files SET file_size = ?, modified_at = ? WHERE file_id = ?",
+                [(f['size'], f['modified'], f['file_id']) for f in diff['changed']],
+            )
+        if diff['added']:
             db.executemany(
                 "INSERT INTO market_data_files (file_name, file_path, file_size, modified_at) "
                 "VALUES (?, ?, ?, ?)",
-                file_rows,
+                [(f['name'], f['path'], f['size'], f['modified']) for f in diff['added']],
+            )
+
+        # Per-instrument coverage: upsert changed rows, delete vanished instruments
+        for source_file, rows in coverage.items():
+            existing = {
+                row['order_book_id']: (
+                    str(row['first_date']) if row['first_date'] else None,
+                    str(row['last_date']) if row['last_date'] else None,
+                    int(row['bar_count']),
+                )
+                for row in db.fetchall(
+                    "SELECT order_book_id, first_date, last_date, bar_count "
+                    "FROM market_data_instrument_coverage WHERE source_file = ?",
+                    (source_file,),
+                )
+            }
+            changed_rows = [
+                (source_file, key, first_date, last_date, count, now)
+                for key, first_date, last_date, count in rows
+                if existing.get(key) != (first_date, last_date, count)
+            ]
+            db.replace_many('market_data_instrument_coverage', coverage_cols, changed_rows)
+            upserted += len(changed_rows)
+
+            vanished = set(existing) - {row[0] for row in rows}
+            if vanished:
+                db.executemany(
+                    "DELETE FROM market_data_instrument_coverage WHERE source_file = ? AND order_book_id = ?",
+                    [(source_file, key) for key in vanished],
+                )
+                deleted += len(vanished)
+
+        for source_file in dropped_sources:
+            row = db.fetchone(
+                "SELECT COUNT(*) AS count FROM market_data_instrument_coverage WHERE source_file = ?",
+                (source_file,),
             )
+            db.execute("DELETE FROM market_data_instrument_coverage WHERE source_file = ?", (source_file,))
+            deleted += row['count'] if row else 0
+
+        counts = {column: 0 for column in _BAR_FILES.values()}
+        for row in db.fetchall(
+            "SELECT source_file, COUNT(*) AS count FROM market_data_instrument_coverage GROUP BY source_file"
+        ):
+            if row['source_file'] in _BAR_FILES:
+                counts[_BAR_FILES[row['source_file']]] = row['count']
+
+        stats_cols = [
+            'id', 'bundle_path', 'last_modified', 'total_files', 'total_size_bytes',
+            'analyzed_at', 'stock_count', 'fund_count', 'futures_count',
+            'index_count', 'bond_count',
+        ]
+        stats_vals = (
+            1,
+            str(bundle_path),
+            file_stats['last_modified'],
+            file_stats['total_files'],
+            file_stats['total_size_bytes'],
+            now,
+            counts['stock_count'],
+            counts['fund_count'],
+            counts['futures_count'],
+            counts['index_count'],
+            counts['bond_count'],
+        )
+        # Idempotent upsert for the single-row stats table
+        db.replace_into('market_data_stats', stats_cols, stats_vals)
+
+    return {'coverage_upserted': upserted, 'coverage_deleted': deleted}
@@ -0,0 +1,108 @@
+"""Storage layout of the vnpy bar table on MariaDB.
+
+The managed layout differs from vnpy's default table in three ways:
+
+- The clustered PRIMARY KEY is (symbol, exchange, interval, datetime), so the
+  bars of one series are stored together and a range read is a single
+  sequential walk of the primary key instead of a secondary-index lookup per
+  row. ``id`` stays AUTO_INCREMENT behind a plain KEY because vnpy's
+  DbBarData model still selects it.
+- The table is RANGE COLUMNS partitioned by ``datetime`` into yearly
+  partitions plus a catch-all ``pmax``. Reads covering one year touch one
+  partition, and bulk loads append into the newest, smaller B-trees.
+- Page compression (``PAGE_COMPRESSED=1``) is optional. InnoDB applies it per
+  table, not per partition, and it mostly pays off for the cold yearly
+  partitions that are read far more often than they are written.
+
+``scripts/migrate_dbbardata_layout.py`` converts an existing table online.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+FIRST_PARTITION_YEAR = 2010
+MAX_PARTITION = 'pmax'
+
+_COLUMNS_DDL = """
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    symbol VARCHAR(255) NOT NULL,
+    exchange VARCHAR(255) NOT NULL,
+    datetime DATETIME NOT NULL,
+    `interval` VARCHAR(255) NOT NULL,
+    volume DOUBLE NOT NULL,
+    turnover DOUBLE NOT NULL,
+    open_interest DOUBLE NOT NULL,
+    open_price DOUBLE NOT NULL,
+    high_price DOUBLE NOT NULL,
+    low_price DOUBLE NOT NULL,
+    close_price DOUBLE NOT NULL,
+    PRIMARY KEY (symbol, exchange, `interval`, datetime),
+    KEY idx_{table}_id (id)"""
+
+BAR_COLUMNS = ('id', 'symbol', 'exchange', 'datetime', 'interval', 'volume', 'turnover',
+               'open_interest', 'open_price', 'high_price', 'low_price', 'close_price')
+
+
+def _year_partition(year: int) -> str:
+    # Partition pYYYY holds the bars of year YYYY.
+    return f"PARTITION p{year} VALUES LESS THAN ('{year + 1}-01-01')"
+
+
+def partitions_clause(first_year: int, last_year: int) -> str:
+    """Yearly partitions for [first_year, last_year]; older bars go to the first one."""
+    parts = [_year_partition(year) for year in range(first_year, last_year + 1)]
+    parts.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return "PARTITION BY RANGE COLUMNS(datetime) (\n    " + ",\n    ".join(parts) + "\n)"
+
+
+def bar_table_ddl(table: str, first_year: int = FIRST_PARTITION_YEAR,
+                  last_year: Optional[int] = None, compressed: bool = False,
+                  if_not_exists: bool = True) -> str:
+    """CREATE TABLE statement for the managed bar table layout."""
+    last_year = last_year or datetime.now().year + 1
+    options = "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci"
+    if compressed:
+        options += " PAGE_COMPRESSED=1"
+    exists = "IF NOT EXISTS " if if_not_exists else ""
+    return (
+        f"CREATE TABLE {exists}`{table}` ({_COLUMNS_DDL.format(table=table)}\n) {options}\n"
+        f"{partitions_clause(first_year, last_year)}"
+    )
+
+
+def list_partitions(db, table: str) -> list[str]:
+    """Partition names of ``table`` in order; empty when it is not partitioned."""
+    rows = db.fetchall(
+        "SELECT PARTITION_NAME AS name FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ? AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION",
+        (table,),
+    )
+    return [r['name'] for r in rows]
+
+
+def ensure_future_partitions(db, table: str, years_ahead: int = 1) -> list[str]:
+    """Split yearly partitions off ``pmax`` up to ``years_ahead`` years from now.
+
+    ``pmax`` stays empty as long as this runs ahead of the data, which keeps
+    the reorganization a metadata-only change. Returns the partitions added.
+    """
+    if db.config.db_type != 'mariadb':
+        return []
+    partitions = list_partitions(db, table)
+    if MAX_PARTITION not in partitions:
+        return []
+    years = [int(name[1:]) for name in partitions if name[1:].isdigit()]
+    if not years:
+        return []
+    target = datetime.now().year + years_ahead
+    new_years = list(range(max(years) + 1, target + 1))
+    if not new_years:
+        return []
+    parts = [_year_partition(year) for year in new_years]
+    parts.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    db.execute(
+        f"ALTER TABLE `{table}` REORGANIZE PARTITION {MAX_PARTITION} INTO (" + ", ".join(parts) + ")"
+    )
+    return [f'p{year}' for year in new_years]
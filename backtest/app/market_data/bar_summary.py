@@ -0,0 +1,204 @@
+"""Per-series summary of the vnpy bar table.
+
+``vnpy_bar_summary`` keeps one row per (symbol, exchange, interval) with the
+bar count and the first/last bar time. Importers update the rows of the
+series they write as they merge each batch, so the ``vnpy_stats`` cache is a
+roll-up of this small table instead of a GROUP BY over every bar.
+
+Every query against the bar table here is a range scan on its unique
+(symbol, exchange, interval, datetime) key. ``verify_summary`` recounts every
+series that way to reconcile the summary with the bar table.
+"""
+from __future__ import annotations
+
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+SUMMARY_TABLE = 'vnpy_bar_summary'
+SUMMARY_COLUMNS = ['symbol', 'exchange', '`interval`', 'bar_count',
+                   'first_datetime', 'last_datetime', 'updated_at']
+
+_SERIES_WHERE = "symbol = ? AND exchange = ? AND `interval` = ?"
+
+
+def _dt(value) -> Optional[str]:
+    """Bar times as 'YYYY-mm-dd HH:MM:SS' on both backends."""
+    if value is None:
+        return None
+    return str(value).replace('T', ' ')[:19]
+
+
+def _now() -> str:
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def load_series_summary(db, symbol: str, exchange: str, interval: str) -> Optional[dict]:
+    row = db.fetchone(
+        f"SELECT bar_count, first_datetime, last_datetime FROM {SUMMARY_TABLE} WHERE {_SERIES_WHERE}",
+        (symbol, exchange, interval),
+    )
+    if not row:
+        return None
+    return {
+        'bar_count': int(row['bar_count'] or 0),
+        'first_datetime': _dt(row['first_datetime']),
+        'last_datetime': _dt(row['last_datetime']),
+    }
+
+
+def count_series(db, table: str, symbol: str, exchange: str, interval: str,
+                 since: Optional[str] = None) -> dict:
+    """Bar count and first/last bar of one series (from ``since`` on, inclusive)."""
+    query = (f"SELECT COUNT(*) AS bar_count, MIN(datetime) AS first_dt, MAX(datetime) AS last_dt "
+             f"FROM {table} WHERE {_SERIES_WHERE}")
+    params = (symbol, exchange, interval)
+    if since is not None:
+        query += " AND datetime >= ?"
+        params += (since,)
+    row = db.fetchone(query, params) or {}
+    return {
+        'bar_count': int(row.get('bar_count') or 0),
+        'first_datetime': _dt(row.get('first_dt')),
+        'last_datetime': _dt(row.get('last_dt')),
+    }
+
+
+def write_series_summary(db, symbol: str, exchange: str, interval: str, summary: dict) -> None:
+    if not summary['bar_count']:
+        db.execute(f"DELETE FROM {SUMMARY_TABLE} WHERE {_SERIES_WHERE}", (symbol, exchange, interval))
+        return
+    db.replace_into(
+        SUMMARY_TABLE, SUMMARY_COLUMNS,
+        (symbol, exchange, interval, summary['bar_count'],
+         summary['first_datetime'], summary['last_datetime'], _now()),
+    )
+
+
+def refresh_series(db, table: str, symbol: str, exchange: str, interval: str) -> dict:
+    """Recount one series from the bar table and store its summary row."""
+    summary = count_series(db, table, symbol, exchange, interval)
+    write_series_summary(db, symbol, exchange, interval, summary)
+    return summary
+
+
+@contextmanager
+def tracking_appends(db, table: str, symbol: str, exchange: str, intervals: Iterable[str]):
+    """Keep the summary rows of one series in step with the writes made in the block.
+
+    Writes may insert or replace bars at or after each interval's last
+    summarized bar (appends, and rewrites of the last, partial bucket). Only
+    that tail is counted before and after the block. Series without a summary
+    row yet are counted in full once.
+    """
+    before = {}
+    for interval in intervals:
+        summary = load_series_summary(db, symbol, exchange, interval)
+        if summary is None or summary['last_datetime'] is None:
+            before[interval] = None
+            continue
+        since = summary['last_datetime']
+        before[interval] = (summary, since, count_series(db, table, symbol, exchange, interval, since))
+    yield
+    for interval, state in before.items():
+        if state is None:
+            refresh_series(db, table, symbol, exchange, interval)
+            continue
+        summary, since, tail_before = state
+        tail_after = count_series(db, table, symbol, exchange, interval, since)
+        write_series_summary(db, symbol, exchange, interval, {
+            'bar_count': summary['bar_count'] - tail_before['bar_count'] + tail_after['bar_count'],
+            'first_datetime': summary['first_datetime'],
+            'last_datetime': tail_after['last_datetime'] or summary['last_datetime'],
+        })
+
+
+def rollup_stats(db) -> dict:
+    """Aggregate the summary into the ``vnpy_stats`` cache row and return it."""
+    by_exchange = db.fetchall(
+        f"SELECT exchange, COUNT(DISTINCT symbol) AS contracts, SUM(bar_count) AS `rows`, "
+        f"MIN(first_datetime) AS min_dt, MAX(last_datetime) AS max_dt "
+        f"FROM {SUMMARY_TABLE} GROUP BY exchange ORDER BY `rows` DESC"
+    )
+    total_rows = sum(int(r['rows'] or 0) for r in by_exchange)
+    contract_count = sum(r['contracts'] for r in by_exchange)
+    exchange_count = len(by_exchange)
+    min_date = min((_dt(r['min_dt']) for r in by_exchange if r['min_dt']), default=None)
+    max_date = max((_dt(r['max_dt']) for r in by_exchange if r['max_dt']), default=None)
+    by_exchange_out = [
+        {'exchange': r['exchange'], 'contracts': r['contracts'], 'rows': int(r['rows'] or 0)}
+        for r in by_exchange
+    ]
+
+    db.upsert(
+        "vnpy_stats",
+        ["id", "total_rows", "contract_count", "exchange_count", "min_date", "max_date", "by_exchange"],
+        (1, total_rows, contract_count, exchange_count, min_date, max_date, json.dumps(by_exchange_out)),
+        "id",
+        ["total_rows", "contract_count", "exchange_count", "min_date", "max_date", "by_exchange"],
+    )
+    return {
+        'total_rows': total_rows,
+        'contract_count': contract_count,
+        'exchange_count': exchange_count,
+        'min_date': min_date,
+        'max_date': max_date,
+        'by_exchange': by_exchange_out,
+    }
+
+
+def summary_is_empty(db, table: str) -> bool:
+    """True when the bar table has rows but no series has been summarized yet."""
+    if db.fetchone(f"SELECT 1 AS x FROM {SUMMARY_TABLE} LIMIT 1"):
+        return False
+    return db.fetchone(f"SELECT 1 AS x FROM {table} LIMIT 1") is not None
+
+
+def verify_summary(db, table: str, fix: bool = True,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   should_stop: Optional[Callable[[], bool]] = None) -> dict:
+    """Recount every series and compare it with its summary row.
+
+    Series come from a DISTINCT over the key prefix (a loose index scan on
+    MariaDB) plus the summary itself, and each is recounted with its own range
+    scan, so the check never holds one long scan over the whole table. With
+    ``fix`` mismatched, missing and stale rows are corrected.
+    """
+    keys = {
+        (r['symbol'], r['exchange'], r['interval'])
+        for r in db.fetchall(f"SELECT DISTINCT symbol, exchange, `interval` FROM {table}")
+    }
+    summarized = {
+        (r['symbol'], r['exchange'], r['interval']): r
+        for r in db.fetchall(
+            f"SELECT symbol, exchange, `interval`, bar_count, first_datetime, last_datetime FROM {SUMMARY_TABLE}"
+        )
+    }
+    keys |= set(summarized)
+
+    result = {'checked': 0, 'mismatched': 0, 'missing': 0, 'stale': 0, 'fixed': 0}
+    ordered = sorted(keys)
+    for index, (symbol, exchange, interval) in enumerate(ordered, start=1):
+        if should_stop is not None and should_stop():
+            break
+        actual = count_series(db, table, symbol, exchange, interval)
+        stored = summarized.get((symbol, exchange, interval))
+        result['checked'] += 1
+        if stored is None:
+            problem = 'missing'
+        elif not actual['bar_count']:
+            problem = 'stale'
+        elif (int(stored['bar_count'] or 0), _dt(stored['first_datetime']), _dt(stored['last_datetime'])) != (
+                actual['bar_count'], actual['first_datetime'], actual['last_datetime']):
+            problem = 'mismatched'
+        else:
+            problem = None
+        if problem:
+            result[problem] += 1
+            if fix:
+                write_series_summary(db, symbol, exchange, interval, actual)
+                result['fixed'] += 1
+        if progress is not None:
+            progress(index, len(ordered))
+    return result
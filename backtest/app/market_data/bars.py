@@ -0,0 +1,287 @@
+"""Bar data queries over the vnpy dbbardata table.
+
+Reads are keyset-paginated range scans on (symbol, exchange, interval, datetime),
+which is served by the unique bar key created by db/init.sql and the importers.
+Results are kept in a process-local LRU cache keyed by the query and an import
+version token, so repeated chart loads do not go back to the database until new
+bars have been imported.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+# Output column name -> dbbardata column name
+BAR_COLUMNS = (
+    ('datetime', 'datetime'),
+    ('open', 'open_price'),
+    ('high', 'high_price'),
+    ('low', 'low_price'),
+    ('close', 'close_price'),
+    ('volume', 'volume'),
+    ('turnover', 'turnover'),
+    ('open_interest', 'open_interest'),
+)
+
+DEFAULT_LIMIT = 2000
+MAX_LIMIT = 20000
+IMPORT_VERSION_TABLE = 'vnpy_import_version'
+
+_DATETIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%Y%m%d')
+_VERSION_TTL_SECONDS = 5
+
+
+def normalize_bar_datetime(raw: Optional[str], *, end_of_day: bool = False) -> Optional[str]:
+    """Parse a user supplied datetime into 'YYYY-MM-DD HH:MM:SS'.
+
+    Date-only values expand to the start of the day, or to 23:59:59 when
+    end_of_day is set so that `end=2024-01-31` includes that whole day.
+    """
+    if raw is None:
+        return None
+    value = str(raw).strip()
+    if not value:
+        return None
+    for fmt in _DATETIME_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if end_of_day and fmt in ('%Y-%m-%d', '%Y%m%d'):
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed.strftime('%Y-%m-%d %H:%M:%S')
+    raise ValueError(f'无法解析的时间: {value}')
+
+
+def _format_dt(value) -> str:
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value).replace('T', ' ')[:19]
+
+
+def fetch_bars(db, table: str, *, symbol: str, exchange: str, interval: str,
+               start: Optional[str] = None, end: Optional[str] = None,
+               after: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> dict:
+    """Fetch one page of bars as columnar arrays.
+
+    `after` is the keyset cursor (datetime of the last bar of the previous page);
+    one extra row is requested to know whether another page exists.
+    """
+    conditions = ['symbol = ?', 'exchange = ?', '`interval` = ?']
+    params: list = [symbol, exchange, interval]
+    if start:
+        conditions.append('datetime >= ?')
+        params.append(start)
+    if end:
+        conditions.append('datetime <= ?')
+        params.append(end)
+    if after:
+        conditions.append('datetime > ?')
+        params.append(after)
+    params.append(limit + 1)
+
+    select_cols = ', '.join(source for _, source in BAR_COLUMNS)
+    rows = db.fetchall(
+        f"SELECT {select_cols} FROM {table} "
+        f"WHERE {' AND '.join(conditions)} "
+        f"ORDER BY datetime ASC LIMIT ?",
+        tuple(params),
+    )
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    columns: dict[str, list] = {name: [] for name, _ in BAR_COLUMNS}
+    for row in rows:
+        columns['datetime'].append(_format_dt(row['datetime']))
+        for name, source in BAR_COLUMNS[1:]:
+            value = row[source]
+            columns[name].append(float(value) if value is not None else None)
+
+    return {
+        'symbol': symbol,
+        'exchange': exchange,
+        'interval': interval,
+        'count': len(rows),
+        'columns': columns,
+        'next_cursor': columns['datetime'][-1] if has_more and rows else None,
+    }
+
+
+def series_exists(db, table: str, symbol: str, exchange: str, interval: str) -> bool:
+    """True when the bar table holds at least one bar of the series (one key probe)."""
+    row = db.fetchone(
+        f"SELECT 1 AS found FROM {table} "
+        f"WHERE symbol = ? AND exchange = ? AND `interval` = ? LIMIT 1",
+        (symbol, exchange, interval),
+    )
+    return row is not None
+
+
+def encode_bars_binary(page: dict) -> bytes:
+    """Encode a columnar page as contiguous little-endian float64 columns.
+
+    Column order follows BAR_COLUMNS; datetime is encoded as epoch seconds
+    (naive, exchange local time). Clients can map the body directly onto a
+    Float64Array of length count * len(BAR_COLUMNS).
+    """
+    columns = page['columns']
+    count = page['count']
+    if count:
+        timestamps = np.array(columns['datetime'], dtype='datetime64[s]').astype('<i8').astype('<f8')
+    else:
+        timestamps = np.empty(0, dtype='<f8')
+    parts = [timestamps.tobytes()]
+    for name, _ in BAR_COLUMNS[1:]:
+        parts.append(np.asarray(columns[name], dtype='<f8').tobytes())
+    return b''.join(parts)
+
+
+def get_import_version(db) -> str:
+    """Return a token that changes whenever bars are written.
+
+    Every writer of the bar table (the API imports, resampling and the CLI
+    import scripts) bumps the ``vnpy_import_version`` counter in the same
+    transaction as its bars.
+    """
+    try:
+        row = db.fetchone(f"SELECT version FROM {IMPORT_VERSION_TABLE} WHERE id = 1")
+    except Exception:
+        return ''
+    if not row or row.get('version') is None:
+        return ''
+    return str(row['version'])
+
+
+def bump_import_version(db) -> None:
+    """Mark the bars as changed, invalidating cached pages in every process."""
+    db.execute(f"UPDATE {IMPORT_VERSION_TABLE} SET version = version + 1 WHERE id = 1")
+
+
+class BarQueryCache:
+    """Thread-safe LRU of bar pages, bounded by the total number of cached rows."""
+
+    def __init__(self, max_rows: int = 2_000_000):
+        self.max_rows = max_rows
+        self._entries: OrderedDict = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[dict]:
+        with self._lock:
+            page = self._entries.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key: tuple, page: dict) -> None:
+        size = int(page.get('count') or 0)
+        if size > self.max_rows:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._rows -= int(old.get('count') or 0)
+            self._entries[key] = page
+            self._rows += size
+            while self._rows > self.max_rows and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._rows -= int(evicted.get('count') or 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+            self._version = None
+            self._version_checked_at = 0.0
+
+    def current_version(self, db) -> str:
+        """Return the import version, re-reading it at most every few seconds.
+
+        Entries cached under an older version are dropped when it changes.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < _VERSION_TTL_SECONDS:
+                return self._version
+        version = get_import_version(db)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._rows = 0
+            self._version = version
+            self._version_checked_at = now
+        return version
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'rows': self._rows,
+                'max_rows': self.max_rows,
+                'hits': self.hits,
+                'misses': self.misses,
+                'version': self._version,
+            }
+
+
+_bar_cache: Optional[BarQueryCache] = None
+_bar_cache_lock = threading.Lock()
+
+
+def get_bar_cache(max_rows: int = 2_000_000) -> BarQueryCache:
+    """Get the process-wide bar query cache singleton."""
+    global _bar_cache
+    with _bar_cache_lock:
+        if _bar_cache is None:
+            _bar_cache = BarQueryCache(max_rows=max_rows)
+        return _bar_cache
+
+
+def query_bars_cached(db, table: str, *, symbol: str, exchange: str, interval: str,
+                      start: Optional[str] = None, end: Optional[str] = None,
+                      after: Optional[str] = None, limit: int = DEFAULT_LIMIT,
+                      cache: Optional[BarQueryCache] = None,
+                      trading_dates: Optional[np.ndarray] = None) -> dict:
+    """Fetch a page of bars through the LRU cache.
+
+    Intervals with no stored bars for the series are resampled from 1m bars,
+    using `trading_dates` (the bundle calendar) for daily buckets.
+    """
+    cache = cache or get_bar_cache()
+    version = cache.current_version(db)
+    key = (table, symbol, exchange, interval, start, end, after, limit, version)
+    page = cache.get(key)
+    if page is not None:
+        return {**page, 'cached': True}
+    page = fetch_bars(
+        db, table,
+        symbol=symbol, exchange=exchange, interval=interval,
+        start=start, end=end, after=after, limit=limit,
+    )
+    if page['count'] == 0:
+        from app.market_data.resample import RESAMPLE_INTERVALS, resample_on_the_fly
+
+        # An empty page of a materialized interval (e.g. the end of a keyset
+        # walk) is a real answer; only missing intervals are built from 1m bars.
+        if interval in RESAMPLE_INTERVALS and not series_exists(db, table, symbol, exchange, interval):
+            page = resample_on_the_fly(
+                db, table,
+                symbol=symbol, exchange=exchange, interval=interval,
+                start=start, end=end, after=after, limit=limit,
+                trading_dates=trading_dates,
+            )
+    page['version'] = version
+    cache.put(key, page)
+    return {**page, 'cached': False}
@@ -0,0 +1,365 @@
+"""Versioned rqalpha bundle store.
+
+The bundle directory (``RQALPHA_BUNDLE_PATH``, usually a volume mount) keeps
+its public layout, but every top-level entry is a relative symlink through a
+single ``.current`` link into an immutable version directory::
+
+    bundle/
+      .versions/rqbundle_202402-20240305T101500/   extracted bundle
+      .versions/.staging-<id>/                     extraction in progress
+      .current -> .versions/rqbundle_202402-20240305T101500
+      .leases/<owner>.json                         versions in use by jobs
+      .downloads/                                  resumable partial archives
+      .columnar/                                   memory-mapped bar cache (columnar.py)
+      futures.h5 -> .current/futures.h5
+      instruments.pk -> .current/instruments.pk
+      ...
+
+A new version is extracted into a staging directory on the same filesystem,
+renamed into ``.versions`` and activated by atomically replacing ``.current``,
+so readers never see a half-written bundle and nothing is copied. Versions
+that are neither current nor leased by a running job are garbage-collected.
+
+Versions are never written in place. Incremental updates run against a clone
+(copy-on-write reflinks where the filesystem supports them, plain copies
+otherwise) and files the update left unchanged are then hardlinked back to the
+base version, so consecutive versions share storage for unchanged files.
+"""
+from __future__ import annotations
+
+import filecmp
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+VERSIONS_DIR = '.versions'
+CURRENT_LINK = '.current'
+LEASES_DIR = '.leases'
+DOWNLOADS_DIR = '.downloads'
+COLUMNAR_DIR = '.columnar'
+RESERVED_NAMES = frozenset({VERSIONS_DIR, CURRENT_LINK, LEASES_DIR, DOWNLOADS_DIR, COLUMNAR_DIR})
+
+STAGING_PREFIX = '.staging-'
+LEGACY_VERSION_PREFIX = 'legacy'
+LEASE_TTL_SECONDS = 24 * 3600
+STALE_STAGING_SECONDS = 24 * 3600
+
+_lock = threading.RLock()
+
+# ioctl(FICLONE): share extents copy-on-write (btrfs, XFS with reflink, ...)
+_FICLONE = 0x40049409
+
+
+def _version_stamp() -> str:
+    return datetime.now().strftime('%Y%m%dT%H%M%S')
+
+
+def _clone_file(src: str, dst: str) -> None:
+    """Reflink ``src`` to ``dst`` when possible, otherwise copy it."""
+    if fcntl is not None:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+                cloned = True
+            except OSError:
+                cloned = False
+        if cloned:
+            shutil.copystat(src, dst)
+            return
+    shutil.copy2(src, dst)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class BundleStore:
+    """Versioned layout of one bundle directory."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root).expanduser()
+        self.versions_dir = self.root / VERSIONS_DIR
+        self.current_link = self.root / CURRENT_LINK
+        self.leases_dir = self.root / LEASES_DIR
+        self.downloads_dir = self.root / DOWNLOADS_DIR
+
+    @contextmanager
+    def _locked(self):
+        """Serialize lease and GC decisions across threads and processes sharing the bundle."""
+        with _lock:
+            if fcntl is None:
+                yield
+                return
+            self.leases_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.leases_dir / '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    # -- versions -----------------------------------------------------------
+
+    @property
+    def is_versioned(self) -> bool:
+        return self.current_link.is_symlink()
+
+    def current_version(self) -> Optional[str]:
+        """Name of the active version, or None for a plain (unversioned) bundle."""
+        try:
+            return Path(os.readlink(self.current_link)).name
+        except OSError:
+            return None
+
+    def version_path(self, version: str) -> Path:
+        return self.versions_dir / version
+
+    def list_versions(self) -> list[str]:
+        if not self.versions_dir.is_dir():
+            return []
+        return sorted(
+            entry.name for entry in os.scandir(self.versions_dir)
+            if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.')
+        )
+
+    def create_staging(self) -> Path:
+        """Empty directory on the bundle filesystem to extract a new version into."""
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        staging = self.versions_dir / f'{STAGING_PREFIX}{uuid.uuid4().hex}'
+        staging.mkdir()
+        return staging
+
+    def commit_staging(self, staging: Path, name: str) -> str:
+        """Rename a filled staging directory into an immutable version."""
+        base = f'{name or "bundle"}-{_version_stamp()}'
+        version = base
+        suffix = 1
+        while self.version_path(version).exists():
+            suffix += 1
+            version = f'{base}-{suffix}'
+        os.rename(staging, self.version_path(version))
+        return version
+
+    def _replace_symlink(self, link: Path, target: str) -> None:
+        """Atomically point ``link`` at ``target`` (a path relative to the link)."""
+        tmp = self.versions_dir / f'.link-{uuid.uuid4().hex}'
+        os.symlink(target, tmp)
+        try:
+            os.replace(tmp, link)
+        except OSError:
+            tmp.unlink()
+            raise
+
+    def _adopt_legacy(self) -> Optional[str]:
+        """Move a plain bundle's entries into a version so it can be swapped like any other."""
+        entries = [
+            entry for entry in os.scandir(self.root)
+            if entry.name not in RESERVED_NAMES and not entry.is_symlink()
+        ]
+        if not entries:
+            return None
+        staging = self.create_staging()
+        for entry in entries:
+            os.rename(entry.path, staging / entry.name)
+        version = self.commit_staging(staging, LEGACY_VERSION_PREFIX)
+        self._link_version(version)
+        return version
+
+    def _link_version(self, version: str) -> None:
+        self._replace_symlink(self.current_link, f'{VERSIONS_DIR}/{version}')
+        names = {
+            entry.name for entry in os.scandir(self.version_path(version))
+            if entry.name not in RESERVED_NAMES
+        }
+        for name in sorted(names):
+            path = self.root / name
+            target = f'{CURRENT_LINK}/{name}'
+            if path.is_symlink() and os.readlink(path) == target:
+                continue
+            if path.is_dir() and not path.is_symlink():
+                # Stray real directory written outside the store: replace it.
+                shutil.rmtree(path)
+            self._replace_symlink(path, target)
+        for entry in os.scandir(self.root):
+            if entry.name in RESERVED_NAMES or entry.name in names or not entry.is_symlink():
+                continue
+            if os.readlink(entry.path).startswith(f'{CURRENT_LINK}/'):
+                os.unlink(entry.path)
+
+    def activate(self, version: str) -> Optional[str]:
+        """Make ``version`` current; returns the previously current version."""
+        if not self.version_path(version).is_dir():
+            raise FileNotFoundError(f'bundle 版本不存在: {version}')
+        with self._locked():
+            self.root.mkdir(parents=True, exist_ok=True)
+            previous = self.current_version()
+            if previous is None:
+                previous = self._adopt_legacy()
+            self._link_version(version)
+            return previous
+
+    def ensure_versioned(self) -> Optional[str]:
+        """Convert a plain bundle into the versioned layout; returns the current version."""
+        with self._locked():
+            current = self.current_version()
+            if current is None and self.root.is_dir():
+                current = self._adopt_legacy()
+            return current
+
+    def clone_version(self, version: str, dest: Path) -> int:
+        """Writable clone of a version (reflink or copy per file); returns the file count."""
+        source = self.version_path(version)
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(source):
+            relative = os.path.relpath(dirpath, source)
+            target_dir = Path(dest) / relative if relative != '.' else Path(dest)
+            target_dir.mkdir(parents=True, exist_ok=True)
+            for name in filenames:
+                _clone_file(os.path.join(dirpath, name), str(target_dir / name))
+                count += 1
+        return count
+
+    def link_unchanged(self, directory: Path, base_version: str) -> tuple[int, int]:
+        """Replace files identical to ``base_version`` with hardlinks to it.
+
+        Returns (files linked, bytes shared).
+        """
+        base = self.version_path(base_version)
+        linked = 0
+        shared = 0
+        for dirpath, _dirnames, filenames in os.walk(directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                original = base / os.path.relpath(path, directory)
+                try:
+                    st = os.stat(path)
+                    base_st = os.stat(original)
+                except OSError:
+                    continue
+                if st.st_ino == base_st.st_ino or st.st_size != base_st.st_size:
+                    continue
+                if not filecmp.cmp(path, original, shallow=False):
+                    continue
+                tmp = f'{path}.link-{uuid.uuid4().hex}'
+                os.link(original, tmp)
+                os.replace(tmp, path)
+                linked += 1
+                shared += st.st_size
+        return linked, shared
+
+    # -- leases -------------------------------------------------------------
+
+    def _lease_path(self, owner: str) -> Path:
+        return self.leases_dir / f'{owner}.json'
+
+    def acquire_lease(self, owner: str, version: Optional[str] = None) -> Optional[str]:
+        """Pin a version (default: current) for ``owner`` until released.
+
+        Returns None when the bundle is not versioned or ``version`` no longer exists.
+        """
+        if not self.is_versioned:
+            return None
+        with self._locked():
+            version = version or self.current_version()
+            if version is None or not self.version_path(version).is_dir():
+                return None
+            payload = {
+                'version': version,
+                'host': socket.gethostname(),
+                'pid': os.getpid(),
+                'acquired_at': time.time(),
+            }
+            tmp = self.leases_dir / f'.{owner}.{uuid.uuid4().hex}.tmp'
+            tmp.write_text(json.dumps(payload), encoding='utf-8')
+            os.replace(tmp, self._lease_path(owner))
+            return version
+
+    def release_lease(self, owner: str) -> None:
+        try:
+            self._lease_path(owner).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _lease_is_stale(self, payload: dict, now: float) -> bool:
+        if now - float(payload.get('acquired_at', 0)) > LEASE_TTL_SECONDS:
+            return True
+        # Process liveness can only be checked for leases taken on this host.
+        if payload.get('host') == socket.gethostname() and payload.get('pid'):
+            return not _pid_alive(int(payload['pid']))
+        return False
+
+    def leased_versions(self) -> dict[str, list[str]]:
+        """Version -> owners holding a live lease; stale leases are removed."""
+        leased: dict[str, list[str]] = {}
+        if not self.leases_dir.is_dir():
+            return leased
+        now = time.time()
+        for path in self.leases_dir.glob('*.json'):
+            try:
+                payload = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            if self._lease_is_stale(payload, now):
+                path.unlink(missing_ok=True)
+                continue
+            leased.setdefault(str(payload.get('version')), []).append(path.stem)
+        return leased
+
+    # -- garbage collection ---------------------------------------------------
+
+    def collect_garbage(self) -> list[str]:
+        """Delete versions that are neither current nor leased, and stale staging dirs."""
+        if not self.versions_dir.is_dir():
+            return []
+        with self._locked():
+            current = self.current_version()
+            leased = self.leased_versions()
+            removed = []
+            now = time.time()
+            for entry in os.scandir(self.versions_dir):
+                if entry.name.startswith(STAGING_PREFIX):
+                    if now - entry.stat(follow_symlinks=False).st_mtime > STALE_STAGING_SECONDS:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    continue
+                if entry.name.startswith('.link-'):
+                    os.unlink(entry.path)
+                    continue
+                if entry.name == current or entry.name in leased:
+                    continue
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed.append(entry.name)
+            return sorted(removed)
+
+    def status(self) -> dict:
+        return {
+            'versioned': self.is_versioned,
+            'current': self.current_version(),
+            'versions': self.list_versions(),
+            'leases': self.leased_versions(),
+        }
+
+
+def get_bundle_store(path: Optional[Path] = None) -> BundleStore:
+    """Store for ``path`` (default: ``RQALPHA_BUNDLE_PATH``)."""
+    if path is None:
+        path = Path(os.environ.get('RQALPHA_BUNDLE_PATH', '/data/rqalpha/bundle'))
+    return BundleStore(path)
@@ -0,0 +1,472 @@
+"""Memory-mapped columnar cache of the bundle's bar files.
+
+Each bar file (``futures.h5``, ``stocks.h5`` ...) is converted into one
+``.npy`` file per field, with every instrument's bars stored contiguously,
+plus an index of order_book_id -> (offset, count)::
+
+    bundle/.columnar/futures/
+      current -> g-20240305T101500-ab12cd34
+      g-20240305T101500-ab12cd34/
+        index.json          source fingerprint, fields, per-instrument offsets
+        datetime.npy  open.npy  close.npy  ...
+        records.npy         the same bars as rows, in the bundle's record dtype
+
+Readers ``np.load(..., mmap_mode='r')`` the columns, so slicing an
+instrument and date range returns views into the page cache: no HDF5, no
+copy. ``records.npy`` serves consumers that expect rqalpha's structured
+bar arrays (the shared_bundle rqalpha mod); every process mapping it shares
+the same physical pages.
+
+The analyze task rebuilds a file's cache when the bar file changed since the
+last build. Instruments whose leading bars are unchanged (an update that
+only appended bars) are copied from the previous generation and only their
+new rows are read from HDF5. A build writes a new generation directory and
+switches ``current`` atomically; readers that already mapped the previous
+generation keep valid views until they reopen.
+"""
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.market_data.bundle_store import COLUMNAR_DIR
+
+CURRENT_LINK = 'current'
+INDEX_FILE = 'index.json'
+RECORDS_FILE = 'records.npy'
+GENERATION_PREFIX = 'g-'
+BUILDING_PREFIX = '.building-'
+STALE_BUILD_SECONDS = 24 * 3600
+_BUILD_MAX_WORKERS = 4
+
+
+def cache_root(bundle_path: Path) -> Path:
+    return Path(bundle_path) / COLUMNAR_DIR
+
+
+def _table_name(source: str) -> str:
+    """'futures.h5' and 'futures' both name the futures table."""
+    return source[:-3] if source.endswith('.h5') else source
+
+
+def _source_fingerprint(path: Path) -> dict:
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _current_generation(table_dir: Path) -> Optional[Path]:
+    try:
+        return table_dir / os.readlink(table_dir / CURRENT_LINK)
+    except OSError:
+        return None
+
+
+def _read_index(generation: Path) -> Optional[dict]:
+    try:
+        return json.loads((generation / INDEX_FILE).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def needs_build(bundle_path: Path, source: str) -> bool:
+    """True when ``source`` has no cache yet or changed since it was built."""
+    generation = _current_generation(cache_root(bundle_path) / _table_name(source))
+    index = _read_index(generation) if generation else None
+    if index is None:
+        return True
+    return index.get('fingerprint') != _source_fingerprint(Path(bundle_path) / source)
+
+
+# -- build -------------------------------------------------------------------
+
+
+def _load_columns(generation: Path, index: dict) -> Dict[str, np.ndarray]:
+    if not index.get('rows'):
+        return {field: np.empty(0, dtype=index['dtypes'][field]) for field in index['fields']}
+    return {
+        field: np.load(generation / f'{field}.npy', mmap_mode='r')
+        for field in index['fields']
+    }
+
+
+def _record_dtype(index: dict) -> np.dtype:
+    return np.dtype([(field, index['dtypes'][field]) for field in index['fields']])
+
+
+def _plan(f, previous: Optional[dict]) -> Tuple[List[tuple], List[str], Dict[str, str]]:
+    """Datasets to write as (key, count, reused leading rows), plus the field layout."""
+    import h5py
+
+    fields: List[str] = []
+    dtypes: Dict[str, str] = {}
+    plan = []
+    for key in f.keys():
+        ds = f[key]
+        if not isinstance(ds, h5py.Dataset) or not ds.shape or not ds.shape[0]:
+            continue
+        names = ds.dtype.names or ()
+        if 'datetime' not in names:
+            continue
+        if not fields:
+            fields = list(names)
+            dtypes = {name: ds.dtype[name].str for name in names}
+        plan.append((key, int(ds.shape[0])))
+
+    reusable = (
+        previous is not None
+        and previous['index']['fields'] == fields
+        and previous['index']['dtypes'] == dtypes
+    )
+    symbols = previous['index']['symbols'] if reusable else {}
+    planned = []
+    for key, count in plan:
+        reuse = 0
+        old = symbols.get(key)
+        if old is not None and 0 < old[1] <= count:
+            ds = f[key]
+            if (int(ds[0]['datetime']) == old[2]
+                    and int(ds[old[1] - 1]['datetime']) == old[3]):
+                reuse = old[1]
+        planned.append((key, count, reuse))
+    return planned, fields, dtypes
+
+
+def _replace_symlink(link: Path, target: str) -> None:
+    tmp = link.parent / f'.link-{uuid.uuid4().hex}'
+    os.symlink(target, tmp)
+    try:
+        os.replace(tmp, link)
+    except OSError:
+        tmp.unlink()
+        raise
+
+
+def _remove_old_generations(table_dir: Path, keep: str) -> None:
+    now = time.time()
+    for entry in os.scandir(table_dir):
+        if entry.name.startswith(GENERATION_PREFIX) and entry.name != keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.name.startswith(BUILDING_PREFIX):
+            if now - entry.stat(follow_symlinks=False).st_mtime > STALE_BUILD_SECONDS:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def build_columnar_file(bundle_path: str, source: str) -> dict:
+    """Convert one bar file into a new cache generation and make it current.
+
+    Runs in a worker process. Returns a summary of the build.
+    """
+    import h5py
+
+    table_dir = cache_root(Path(bundle_path)) / _table_name(source)
+    table_dir.mkdir(parents=True, exist_ok=True)
+    source_path = Path(bundle_path) / source
+    fingerprint = _source_fingerprint(source_path)
+
+    previous = None
+    current = _current_generation(table_dir)
+    index = _read_index(current) if current else None
+    if index is not None:
+        previous = {'index': index, 'columns': _load_columns(current, index)}
+
+    building = table_dir / f'{BUILDING_PREFIX}{uuid.uuid4().hex}'
+    building.mkdir()
+    reused_rows = read_rows = 0
+    try:
+        with h5py.File(source_path, 'r') as f:
+            plan, fields, dtypes = _plan(f, previous)
+            total = sum(count for _key, count, _reuse in plan)
+            if total:
+                columns = {
+                    field: np.lib.format.open_memmap(
+                        building / f'{field}.npy', mode='w+', dtype=np.dtype(dtypes[field]), shape=(total,)
+                    )
+                    for field in fields
+                }
+                records = np.lib.format.open_memmap(
+                    building / RECORDS_FILE, mode='w+',
+                    dtype=_record_dtype({'fields': fields, 'dtypes': dtypes}), shape=(total,)
+                )
+            else:
+                columns = {}
+                records = None
+            symbols = {}
+            offset = 0
+            for key, count, reuse in plan:
+                if reuse:
+                    old_offset = previous['index']['symbols'][key][0]
+                    for field in fields:
+                        columns[field][offset:offset + reuse] = \
+                            previous['columns'][field][old_offset:old_offset + reuse]
+                    reused_rows += reuse
+                if count > reuse:
+                    data = f[key][reuse:count]
+                    for field in fields:
+                        target = columns[field][offset + reuse:offset + count]
+                        if field in data.dtype.names:
+                            target[:] = data[field]
+                        else:
+                            target[:] = np.nan if target.dtype.kind == 'f' else 0
+                    read_rows += count - reuse
+                for field in fields:
+                    records[field][offset:offset + count] = columns[field][offset:offset + count]
+                dts = columns['datetime']
+                symbols[key] = [offset, count, int(dts[offset]), int(dts[offset + count - 1])]
+                offset += count
+            for column in columns.values():
+                column.flush()
+            if records is not None:
+                records.flush()
+            del columns, records
+
+        (building / INDEX_FILE).write_text(json.dumps({
+            'source': source,
+            'fingerprint': fingerprint,
+            'built_at': datetime.now().isoformat(),
+            'fields': fields,
+            'dtypes': dtypes,
+            'rows': total,
+            'symbols': symbols,
+        }), encoding='utf-8')
+
+        generation = f'{GENERATION_PREFIX}{datetime.now().strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        os.rename(building, table_dir / generation)
+    except BaseException:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+    _replace_symlink(table_dir / CURRENT_LINK, generation)
+    _remove_old_generations(table_dir, generation)
+    return {
+        'source': source,
+        'generation': generation,
+        'instruments': len(symbols),
+        'rows': total,
+        'reused_rows': reused_rows,
+        'read_rows': read_rows,
+    }
+
+
+def build_columnar_cache(bundle_path: Path, sources: Iterable[str],
+                         progress: Optional[Callable[[int, int], None]] = None) -> List[dict]:
+    """Rebuild the cache of every bar file in ``sources`` that changed since its last build.
+
+    Cache tables of bar files not in ``sources`` are removed. Files are built
+    in parallel worker processes; returns one summary per rebuilt file.
+    """
+    sources = list(sources)
+    root = cache_root(bundle_path)
+    if root.is_dir():
+        wanted = {_table_name(source) for source in sources}
+        for entry in os.scandir(root):
+            if entry.is_dir(follow_symlinks=False) and entry.name not in wanted:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    stale = [source for source in sources if needs_build(bundle_path, source)]
+    if not stale:
+        return []
+
+    # Spawn instead of fork: this runs inside a worker thread of the web process.
+    workers = max(1, min(_BUILD_MAX_WORKERS, os.cpu_count() or 1, len(stale)))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(build_columnar_file, str(bundle_path), source) for source in stale]
+        for done, future in enumerate(as_completed(futures), start=1):
+            results.append(future.result())
+            if progress is not None:
+                progress(done, len(futures))
+    return sorted(results, key=lambda r: r['source'])
+
+
+# -- read --------------------------------------------------------------------
+
+
+def bar_time(value, end: bool = False) -> int:
+    """Bundle datetime (YYYYmmddHHMMSS int) of a date, datetime, int or string bound.
+
+    Dates without a time of day cover the whole day when used as ``end``.
+    """
+    if isinstance(value, datetime):
+        return int(value.strftime('%Y%m%d%H%M%S'))
+    if isinstance(value, date):
+        value = int(value.strftime('%Y%m%d'))
+    elif isinstance(value, str):
+        digits = ''.join(ch for ch in value if ch.isdigit())
+        if len(digits) not in (8, 14):
+            raise ValueError(f'无法解析的时间: {value}')
+        value = int(digits)
+    value = int(value)
+    if value < 100_000_000:
+        return value * 1_000_000 + (235959 if end else 0)
+    return value
+
+
+class BarTable:
+    """The cached columns of one bar file, memory-mapped read-only."""
+
+    def __init__(self, generation: Path):
+        index = _read_index(generation)
+        if index is None:
+            raise FileNotFoundError(f'列式缓存不存在: {generation}')
+        self.generation = generation.name
+        self.source = index['source']
+        self.fingerprint = index.get('fingerprint')
+        self.fields: List[str] = index['fields']
+        self.built_at = index.get('built_at')
+        self._symbols: Dict[str, Tuple[int, int]] = {
+            key: (entry[0], entry[1]) for key, entry in index['symbols'].items()
+        }
+        self._columns = _load_columns(generation, index)
+        self.records_dtype = _record_dtype(index)
+        if not index.get('rows'):
+            self._records = np.empty(0, dtype=self.records_dtype)
+        elif (generation / RECORDS_FILE).exists():
+            self._records = np.load(generation / RECORDS_FILE, mmap_mode='r')
+        else:
+            self._records = None
+
+    def __contains__(self, order_book_id: str) -> bool:
+        return order_book_id in self._symbols
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def symbols(self) -> List[str]:
+        return list(self._symbols)
+
+    def bounds(self, order_book_id: str, start=None, end=None) -> Tuple[int, int]:
+        """Row range [lo, hi) of ``order_book_id`` bars within [start, end]."""
+        offset, count = self._symbols[order_book_id]
+        lo, hi = offset, offset + count
+        dts = self._columns['datetime'][lo:hi]
+        if start is not None:
+            lo = offset + int(np.searchsorted(dts, bar_time(start), side='left'))
+        if end is not None:
+            hi = offset + int(np.searchsorted(dts, bar_time(end, end=True), side='right'))
+        return lo, max(lo, hi)
+
+    def matches(self, source_path: Path) -> bool:
+        """Whether this table was built from the bar file at ``source_path``."""
+        try:
+            return self.fingerprint == _source_fingerprint(Path(source_path))
+        except OSError:
+            return False
+
+    @property
+    def has_records(self) -> bool:
+        return self._records is not None
+
+    def date_range(self, order_book_id: str) -> Tuple[int, int]:
+        """First and last bar datetime of ``order_book_id``."""
+        offset, count = self._symbols[order_book_id]
+        dts = self._columns['datetime']
+        return int(dts[offset]), int(dts[offset + count - 1])
+
+    def records(self, order_book_id: str, start=None, end=None) -> np.ndarray:
+        """Bars of ``order_book_id`` within [start, end] as a read-only structured view."""
+        if self._records is None:
+            raise LookupError(f'{self.source} 的列式缓存没有行存储数据')
+        lo, hi = self.bounds(order_book_id, start, end)
+        return self._records[lo:hi]
+
+    def get(self, order_book_id: str, start=None, end=None,
+            fields: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Bars of ``order_book_id`` within [start, end] as read-only column views.
+
+        Raises KeyError for an instrument that is not in this table.
+        """
+        lo, hi = self.bounds(order_book_id, start, end)
+        names = self.fields if fields is None else list(fields)
+        return {name: self._columns[name][lo:hi] for name in names}
+
+
+class ColumnarBarCache:
+    """Reader over every cached bar file of one bundle.
+
+    Tables are opened once per generation; a rebuilt file is picked up on the
+    next lookup.
+    """
+
+    def __init__(self, bundle_path: Path):
+        self.root = cache_root(bundle_path)
+        self._tables: Dict[str, BarTable] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_root(cls, root: Path) -> 'ColumnarBarCache':
+        """Reader over a cache directory given directly rather than by its bundle."""
+        cache = cls(Path(root).parent)
+        cache.root = Path(root)
+        return cache
+
+    def sources(self) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(
+            entry.name for entry in os.scandir(self.root)
+            if entry.is_dir(follow_symlinks=False) and (Path(entry.path) / CURRENT_LINK).is_symlink()
+        )
+
+    def table(self, source: str) -> Optional[BarTable]:
+        """Current table of ``source`` ('futures' or 'futures.h5'), or None when not built."""
+        name = _table_name(source)
+        table_dir = self.root / name
+        for _attempt in range(2):
+            generation = _current_generation(table_dir)
+            if generation is None:
+                return None
+            with self._lock:
+                table = self._tables.get(name)
+                if table is not None and table.generation == generation.name:
+                    return table
+            try:
+                table = BarTable(generation)
+            except FileNotFoundError:
+                # Replaced by a newer build between readlink and open; look again.
+                continue
+            with self._lock:
+                self._tables[name] = table
+            return table
+        return None
+
+    def find(self, order_book_id: str) -> Optional[BarTable]:
+        """Table holding ``order_book_id``, if any."""
+        for source in self.sources():
+            table = self.table(source)
+            if table is not None and order_book_id in table:
+                return table
+        return None
+
+    def get(self, order_book_id: str, start=None, end=None,
+            fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, np.ndarray]]:
+        """Bars of ``order_book_id`` from whichever table holds it; None when not cached."""
+        table = self.find(order_book_id)
+        if table is None:
+            return None
+        return table.get(order_book_id, start, end, fields)
+
+
+_caches: Dict[str, ColumnarBarCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_columnar_cache(bundle_path: Optional[Path] = None) -> ColumnarBarCache:
+    """Shared reader for ``bundle_path`` (default: ``RQALPHA_BUNDLE_PATH``)."""
+    if bundle_path is None:
+        bundle_path = Path(os.environ.get('RQALPHA_BUNDLE_PATH', '/data/rqalpha/bundle'))
+    key = str(Path(bundle_path).expanduser())
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = ColumnarBarCache(Path(key))
+        return cache
@@ -3,6 +3,7 @@ import sqlite3
 from pathlib import Path
 
 from app.database import DatabaseConnection
+from app.market_data.bar_storage import bar_table_ddl
 
 # SQLite DDL statements (existing schema)
 _SQLITE_DDL = [
@@ -81,6 +82,18 @@ _SQLITE_DDL = [
     """,
     "CREATE INDEX IF NOT EXISTS idx_files_name ON market_data_files(file_name)",
     """
+    CREATE TABLE IF NOT EXISTS market_data_instrument_coverage (
+        source_file TEXT NOT NULL,
+        order_book_id TEXT NOT NULL,
+        first_date TEXT,
+        last_date TEXT,
+        bar_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (source_file, order_book_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_coverage_order_book_id ON market_data_instrument_coverage(order_book_id)",
+    """
     CREATE TABLE IF NOT EXISTS python_packages (
         package_name TEXT PRIMARY KEY,
         version TEXT NOT NULL,
@@ -88,6 +101,47 @@ _SQLITE_DDL = [
     )
     """,
     "CREATE INDEX IF NOT EXISTS idx_packages_updated ON python_packages(updated_at DESC)",
+    """
+    CREATE TABLE IF NOT EXISTS vnpy_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_rows INTEGER DEFAULT 0,
+        contract_count INTEGER DEFAULT 0,
+        exchange_count INTEGER DEFAULT 0,
+        min_date TEXT,
+        max_date TEXT,
+        by_exchange TEXT,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Bumped by every write to the bar table; keys the bar query cache (see bars.py)
+    """
+    CREATE TABLE IF NOT EXISTS vnpy_import_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT OR IGNORE INTO vnpy_import_version (id, version) VALUES (1, 0)",
+    """
+    CREATE TABLE IF NOT EXISTS vnpy_bar_summary (
+        symbol TEXT NOT NULL,
+        exchange TEXT NOT NULL,
+        `interval` TEXT NOT NULL,
+        bar_count INTEGER NOT NULL DEFAULT 0,
+        first_datetime TEXT,
+        last_datetime TEXT,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (symbol, exchange, `interval`)
+    )
+    """,
+    # Scheduler leader lease (MariaDB uses GET_LOCK instead, see leader.py)
+    """
+    CREATE TABLE IF NOT EXISTS market_data_leader_leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        renewed_at REAL NOT NULL
+    )
+    """,
 ]
 
 # MariaDB DDL statements (tables already created by db/init.sql at container startup;
@@ -178,6 +232,18 @@ _MARIADB_DDL = [
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
     """,
     """
+    CREATE TABLE IF NOT EXISTS market_data_instrument_coverage (
+        source_file VARCHAR(100) NOT NULL,
+        order_book_id VARCHAR(64) NOT NULL,
+        first_date DATE NULL,
+        last_date DATE NULL,
+        bar_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (source_file, order_book_id),
+        INDEX idx_coverage_order_book_id (order_book_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
     CREATE TABLE IF NOT EXISTS python_packages (
         package_name VARCHAR(255) PRIMARY KEY,
         version VARCHAR(100) NOT NULL,
@@ -212,26 +278,29 @@ _MARIADB_DDL = [
         INDEX idx_created (created_at DESC)
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
     """,
+    # vnpy bar table in the managed layout (see bar_storage.py)
+    bar_table_ddl('dbbardata'),
     """
-    CREATE TABLE IF NOT EXISTS dbbardata (
-        id int(11) NOT NULL AUTO_INCREMENT,
-        symbol varchar(255) NOT NULL,
-        exchange varchar(255) NOT NULL,
-        datetime datetime NOT NULL,
-        `interval` varchar(255) NOT NULL,
-        volume double NOT NULL,
-        turnover double NOT NULL,
-        open_interest double NOT NULL,
-        open_price double NOT NULL,
-        high_price double NOT NULL,
-        low_price double NOT NULL,
-        close_price double NOT NULL,
-        PRIMARY KEY (id),
-        UNIQUE KEY dbbardata_symbol_exchange_interval_datetime (symbol, exchange, `interval`, datetime),
-        KEY idx_dbbardata_exchange (exchange)
+    CREATE TABLE IF NOT EXISTS vnpy_bar_summary (
+        symbol VARCHAR(255) NOT NULL,
+        exchange VARCHAR(255) NOT NULL,
+        `interval` VARCHAR(255) NOT NULL,
+        bar_count BIGINT NOT NULL DEFAULT 0,
+        first_datetime DATETIME NULL,
+        last_datetime DATETIME NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (symbol, exchange, `interval`),
+        INDEX idx_bar_summary_exchange (exchange)
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
     """,
     """
+    CREATE TABLE IF NOT EXISTS vnpy_import_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version BIGINT NOT NULL DEFAULT 0
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    "INSERT IGNORE INTO vnpy_import_version (id, version) VALUES (1, 0)",
+    """
     CREATE TABLE IF NOT EXISTS vnpy_stats (
         id INTEGER PRIMARY KEY CHECK (id = 1),
         total_rows BIGINT DEFAULT 0,
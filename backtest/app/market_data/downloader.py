@@ -0,0 +1,525 @@
+"""Native rqalpha bundle downloader.
+
+Replaces ``rqalpha download-bundle`` for full downloads:
+
+* candidate monthly bundle URLs are probed concurrently with HEAD requests;
+* the archive is fetched with several HTTP range connections into a
+  preallocated ``.part`` file whose finished chunks are recorded in a JSON
+  sidecar, so an interrupted download resumes where it stopped;
+* while chunks arrive, the contiguous prefix of the file is fed through bz2
+  decompression (``lbzip2``/``pbzip2`` across cores when installed, the
+  ``bz2`` module otherwise) straight into a streaming tar extractor;
+* the byte count and, when the server exposes one, the MD5 (ETag or
+  Content-MD5) are verified before the extraction is accepted.
+"""
+from __future__ import annotations
+
+import base64
+import bz2
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tarfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+DEFAULT_URL_BASE = 'http://bundle.assets.ricequant.com/bundles_v4'
+DEFAULT_CONNECTIONS = 4
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+PROBE_TIMEOUT_SECONDS = 5
+REQUEST_TIMEOUT_SECONDS = 30
+RETRY_TIMES = 5
+RETRY_INTERVAL_SECONDS = 3
+READ_BLOCK_SIZE = 1024 * 1024
+
+ProgressCallback = Callable[[int, int, int], None]
+
+
+class DownloadCancelled(Exception):
+    """Raised when the caller asks the download to stop."""
+
+
+@dataclass(frozen=True)
+class BundleSource:
+    """A probed bundle archive."""
+
+    url: str
+    size: int
+    accept_ranges: bool = False
+    etag: str = ''
+    md5: str = ''
+
+    @property
+    def name(self) -> str:
+        match = re.search(r'rqbundle_\d+', self.url)
+        return match.group(0) if match else ''
+
+
+def bundle_url_candidates(base: str = DEFAULT_URL_BASE, months: int = 12,
+                          now: Optional[datetime] = None) -> list[str]:
+    """Monthly bundle URLs, newest first (Beijing time decides the month)."""
+    base = base.strip().rstrip('/')
+    if not base:
+        return []
+    if now is None:
+        now = datetime.now(timezone(timedelta(hours=8)))
+    year, month = now.year, now.month
+    candidates = []
+    for _ in range(months):
+        candidates.append(f'{base}/rqbundle_{year}{month:02d}.tar.bz2')
+        month -= 1
+        if month <= 0:
+            month = 12
+            year -= 1
+    return candidates
+
+
+def _expected_md5(headers) -> str:
+    """MD5 advertised by the server, if any.
+
+    Object stores return the MD5 as ETag for single-part uploads; multipart
+    ETags (``<hex>-<parts>``) and weak ETags are not content hashes.
+    """
+    content_md5 = headers.get('Content-MD5')
+    if content_md5:
+        try:
+            return base64.b64decode(content_md5).hex()
+        except ValueError:
+            pass
+    etag = (headers.get('ETag') or '').strip('"')
+    if re.fullmatch(r'[0-9a-fA-F]{32}', etag):
+        return etag.lower()
+    return ''
+
+
+def _probe(url: str, timeout: float) -> Optional[BundleSource]:
+    request = urllib.request.Request(url, method='HEAD')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            headers = response.headers
+    except Exception:
+        return None
+    length = headers.get('Content-Length')
+    if not length or int(length) <= 0:
+        return None
+    return BundleSource(
+        url=url,
+        size=int(length),
+        accept_ranges=headers.get('Accept-Ranges', '').lower() == 'bytes',
+        etag=headers.get('ETag') or '',
+        md5=_expected_md5(headers),
+    )
+
+
+def probe_bundle_sources(candidates: Iterable[str], timeout: float = PROBE_TIMEOUT_SECONDS,
+                         max_workers: Optional[int] = None) -> Optional[BundleSource]:
+    """HEAD all candidates concurrently and return the first available one in order."""
+    candidates = list(candidates)
+    if not candidates:
+        return None
+    with ThreadPoolExecutor(max_workers=max_workers or len(candidates)) as pool:
+        results = list(pool.map(lambda url: _probe(url, timeout), candidates))
+    for source in results:
+        if source is not None:
+            return source
+    return None
+
+
+class _PartFile:
+    """Preallocated partial download plus a sidecar recording finished chunks.
+
+    ``prefix`` is the length of the contiguous downloaded head of the file;
+    the extractor may read up to it while later chunks are still in flight.
+    """
+
+    def __init__(self, path: Path, source: BundleSource, chunk_size: int):
+        self.path = path
+        self.state_path = path.with_name(path.name + '.json')
+        self.source = source
+        self.chunk_size = chunk_size
+        self.chunk_count = max(1, -(-source.size // chunk_size))
+        self.done: set[int] = set()
+        self.prefix = 0
+        self.error: Optional[BaseException] = None
+        self.closed = False
+        self._cond = threading.Condition()
+        self._load_state()
+
+    def _identity(self) -> dict:
+        return {
+            'url': self.source.url,
+            'size': self.source.size,
+            'etag': self.source.etag,
+            'chunk_size': self.chunk_size,
+        }
+
+    def _load_state(self) -> None:
+        state = None
+        if self.state_path.exists() and self.path.exists():
+            try:
+                state = json.loads(self.state_path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                state = None
+        if (state and all(state.get(k) == v for k, v in self._identity().items())
+                and self.path.stat().st_size == self.source.size):
+            self.done = {int(i) for i in state.get('done', []) if 0 <= int(i) < self.chunk_count}
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'wb') as f:
+                f.truncate(self.source.size)
+            self.done = set()
+            self._save_state()
+        self._advance_prefix()
+
+    def _save_state(self) -> None:
+        payload = dict(self._identity(), done=sorted(self.done))
+        tmp = self.state_path.with_name(self.state_path.name + '.tmp')
+        tmp.write_text(json.dumps(payload), encoding='utf-8')
+        os.replace(tmp, self.state_path)
+
+    def _advance_prefix(self) -> None:
+        index = self.prefix // self.chunk_size if self.prefix < self.source.size else self.chunk_count
+        while index in self.done:
+            index += 1
+        self.prefix = min(index * self.chunk_size, self.source.size)
+
+    def chunk_range(self, index: int) -> tuple[int, int]:
+        start = index * self.chunk_size
+        return start, min(start + self.chunk_size, self.source.size) - 1
+
+    def pending_chunks(self) -> list[int]:
+        return [i for i in range(self.chunk_count) if i not in self.done]
+
+    @property
+    def downloaded(self) -> int:
+        with self._cond:
+            return sum(self.chunk_range(i)[1] - self.chunk_range(i)[0] + 1 for i in self.done)
+
+    def mark_done(self, index: int) -> None:
+        with self._cond:
+            self.done.add(index)
+            self._save_state()
+            self._advance_prefix()
+            self._cond.notify_all()
+
+    def mark_prefix(self, offset: int) -> None:
+        """Sequential download: everything before ``offset`` is on disk."""
+        with self._cond:
+            for index in range(self.prefix // self.chunk_size, offset // self.chunk_size):
+                self.done.add(index)
+            if offset >= self.source.size:
+                self.done.update(range(self.chunk_count))
+            self._save_state()
+            self.prefix = max(self.prefix, min(offset, self.source.size))
+            self._cond.notify_all()
+
+    def fail(self, error: BaseException) -> None:
+        with self._cond:
+            if self.error is None:
+                self.error = error
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def wait_for(self, offset: int) -> int:
+        """Block until the contiguous prefix passes ``offset``; return the prefix."""
+        with self._cond:
+            while self.prefix <= offset and self.error is None and not self.closed:
+                self._cond.wait(timeout=1)
+            if self.error is not None:
+                raise self.error
+            if self.closed and self.prefix <= offset:
+                raise DownloadCancelled('下载已停止')
+            return self.prefix
+
+    def remove(self) -> None:
+        for path in (self.path, self.state_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class _PrefixReader:
+    """File-like reader over the downloaded prefix that also hashes what it reads."""
+
+    def __init__(self, part: _PartFile):
+        self._part = part
+        self._file = open(part.path, 'rb')
+        self._offset = 0
+        self.md5 = hashlib.md5()
+
+    def read(self, size: int = -1) -> bytes:
+        total = self._part.source.size
+        if self._offset >= total:
+            return b''
+        if size is None or size < 0:
+            size = total - self._offset
+        available = self._part.wait_for(self._offset)
+        size = min(size, available - self._offset)
+        self._file.seek(self._offset)
+        data = self._file.read(size)
+        self._offset += len(data)
+        self.md5.update(data)
+        return data
+
+    def drain(self) -> None:
+        """Read (and hash) whatever the decompressor left behind."""
+        while self.read(READ_BLOCK_SIZE):
+            pass
+
+    @property
+    def offset(self) -> int:
+        return self._offset
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _parallel_bz2_command() -> Optional[list[str]]:
+    for name in ('lbzip2', 'pbzip2'):
+        path = shutil.which(name)
+        if path:
+            return [path, '-d', '-c']
+    return None
+
+
+def _open_request(url: str, start: Optional[int] = None, end: Optional[int] = None):
+    headers = {}
+    if start is not None:
+        headers['Range'] = f'bytes={start}-' + ('' if end is None else str(end))
+    request = urllib.request.Request(url, headers=headers)
+    return urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_SECONDS)
+
+
+def _with_retries(func, part: _PartFile, should_stop):
+    for attempt in range(RETRY_TIMES):
+        if part.error is not None or part.closed or should_stop():
+            return
+        try:
+            return func()
+        except (OSError, urllib.error.URLError):
+            if attempt == RETRY_TIMES - 1:
+                raise
+            time.sleep(RETRY_INTERVAL_SECONDS)
+
+
+def _download_chunk(part: _PartFile, fd: int, index: int, should_stop) -> None:
+    start, end = part.chunk_range(index)
+
+    def fetch():
+        with _open_request(part.source.url, start, end) as response:
+            if response.status != 206:
+                raise urllib.error.URLError(f'服务器未返回分段内容: HTTP {response.status}')
+            offset = start
+            while offset <= end:
+                if part.closed or should_stop():
+                    return
+                data = response.read(min(READ_BLOCK_SIZE, end - offset + 1))
+                if not data:
+                    raise urllib.error.URLError(f'分段 {index} 数据不完整')
+                os.pwrite(fd, data, offset)
+                offset += len(data)
+        part.mark_done(index)
+
+    _with_retries(fetch, part, should_stop)
+
+
+def _download_sequential(part: _PartFile, fd: int, should_stop) -> None:
+    """Single-connection fallback for servers without range support."""
+
+    def fetch():
+        offset = part.prefix
+        with _open_request(part.source.url, offset if offset else None) as response:
+            if offset and response.status != 206:
+                offset = 0
+            while offset < part.source.size:
+                if part.closed or should_stop():
+                    return
+                data = response.read(READ_BLOCK_SIZE)
+                if not data:
+                    raise urllib.error.URLError('数据包下载不完整')
+                os.pwrite(fd, data, offset)
+                offset += len(data)
+                part.mark_prefix(offset)
+
+    _with_retries(fetch, part, should_stop)
+
+
+def _run_downloads(part: _PartFile, connections: int, should_stop) -> None:
+    fd = os.open(part.path, os.O_WRONLY)
+    try:
+        if part.source.accept_ranges and connections > 1:
+            pending = iter(part.pending_chunks())
+            lock = threading.Lock()
+
+            def worker():
+                while part.error is None and not part.closed and not should_stop():
+                    with lock:
+                        index = next(pending, None)
+                    if index is None:
+                        return
+                    _download_chunk(part, fd, index, should_stop)
+
+            with ThreadPoolExecutor(max_workers=connections) as pool:
+                futures = [pool.submit(worker) for _ in range(connections)]
+                for future in futures:
+                    future.result()
+        else:
+            _download_sequential(part, fd, should_stop)
+        if should_stop():
+            raise DownloadCancelled('下载已取消')
+    except BaseException as e:
+        part.fail(e)
+    finally:
+        os.close(fd)
+
+
+def _safe_extract(tar: tarfile.TarFile, dest: Path, on_member) -> None:
+    kwargs = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+    for member in tar:
+        if not kwargs:
+            target = (dest / member.name).resolve()
+            if not str(target).startswith(str(dest.resolve())) or member.issym() or member.islnk():
+                continue
+        tar.extract(member, dest, **kwargs)
+        on_member(member)
+
+
+def _extract_stream(reader: _PrefixReader, dest: Path, on_member) -> None:
+    command = _parallel_bz2_command()
+    if command is None:
+        with bz2.BZ2File(reader) as decompressed:
+            with tarfile.open(fileobj=decompressed, mode='r|') as tar:
+                _safe_extract(tar, dest, on_member)
+        return
+
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    feed_error: list[BaseException] = []
+
+    def feed():
+        try:
+            while True:
+                data = reader.read(READ_BLOCK_SIZE)
+                if not data:
+                    break
+                process.stdin.write(data)
+        except BaseException as e:
+            feed_error.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        with tarfile.open(fileobj=process.stdout, mode='r|') as tar:
+            _safe_extract(tar, dest, on_member)
+        # Let the decompressor consume the tar padding it still holds.
+        process.stdout.read()
+    except Exception:
+        # A failed download starves the decompressor; report the root cause.
+        feeder.join()
+        if feed_error:
+            raise feed_error[0]
+        raise
+    finally:
+        feeder.join()
+        process.stdout.close()
+        returncode = process.wait()
+    if feed_error:
+        raise feed_error[0]
+    if returncode != 0:
+        raise RuntimeError(f'{Path(command[0]).name} 解压失败，退出码: {returncode}')
+
+
+def download_and_extract(source: BundleSource, dest: Path, part_path: Path,
+                         connections: int = DEFAULT_CONNECTIONS,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         progress: Optional[ProgressCallback] = None,
+                         should_stop: Optional[Callable[[], bool]] = None) -> dict:
+    """Download ``source`` into ``part_path`` and extract it into ``dest`` on the fly.
+
+    ``progress(downloaded_bytes, total_bytes, extracted_bytes)`` is called as
+    chunks and tar members complete. The partial file and its sidecar survive
+    failures so the next call resumes; both are removed once the archive has
+    been verified and extracted.
+    """
+    should_stop = should_stop or (lambda: False)
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    part = _PartFile(Path(part_path), source, chunk_size)
+    resumed = part.downloaded
+    extracted = 0
+    lock = threading.Lock()
+
+    def report():
+        if progress is not None:
+            progress(part.downloaded, source.size, extracted)
+
+    def on_member(member):
+        nonlocal extracted
+        with lock:
+            extracted += member.size
+        report()
+
+    downloader = threading.Thread(target=_run_downloads,
+                                  args=(part, connections, should_stop), daemon=True)
+    downloader.start()
+    reporter_stop = threading.Event()
+
+    def reporter():
+        while not reporter_stop.wait(1):
+            report()
+
+    reporter_thread = threading.Thread(target=reporter, daemon=True)
+    reporter_thread.start()
+
+    reader = _PrefixReader(part)
+    try:
+        _extract_stream(reader, dest, on_member)
+        reader.drain()
+    except BaseException:
+        part.close()
+        raise
+    finally:
+        reader.close()
+        reporter_stop.set()
+        downloader.join()
+        reporter_thread.join()
+
+    if part.error is not None:
+        raise part.error
+    if reader.offset != source.size:
+        raise RuntimeError(f'数据包大小不一致: 期望 {source.size} 字节，实际 {reader.offset} 字节')
+    md5 = reader.md5.hexdigest()
+    if source.md5 and md5 != source.md5:
+        part.remove()
+        raise RuntimeError(f'数据包校验失败: 期望 MD5 {source.md5}，实际 {md5}')
+
+    part.remove()
+    report()
+    return {
+        'url': source.url,
+        'size': source.size,
+        'resumed_bytes': resumed,
+        'extracted_bytes': extracted,
+        'md5': md5,
+        'verified': bool(source.md5),
+    }
@@ -0,0 +1,142 @@
+"""Leader election for background jobs shared by every gunicorn worker.
+
+Each worker (on every host) runs ``create_app`` and competes for leadership;
+only the leader runs scheduled jobs. MariaDB uses a named advisory lock
+(``GET_LOCK``) held on a dedicated connection, so leadership moves as soon as
+the leader's connection dies. SQLite has no such lock and uses a lease row
+that the leader renews; another process takes over once the lease expires.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Optional
+
+from app.database import DatabaseConfig, DatabaseConnection, get_db_connection
+
+LEADER_TTL_SECONDS = 30.0
+
+
+def _default_owner() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class LeaderElection:
+    """One participant in the election for ``name``.
+
+    ``try_acquire`` both acquires and renews, and is meant to be called
+    periodically (well within ``ttl``) and right before doing leader-only work.
+    """
+
+    def __init__(self, db_config_dict: dict, name: str,
+                 ttl: float = LEADER_TTL_SECONDS, owner: Optional[str] = None):
+        self.db_config_dict = db_config_dict
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or _default_owner()
+        self.is_leader = False
+        self._lock = threading.Lock()
+        self._lock_conn: Optional[DatabaseConnection] = None
+
+    @property
+    def _db_type(self) -> str:
+        return self.db_config_dict.get('db_type', 'sqlite')
+
+    def try_acquire(self) -> bool:
+        """Acquire or renew leadership; returns whether this process is the leader."""
+        with self._lock:
+            try:
+                if self._db_type == 'mariadb':
+                    self.is_leader = self._hold_advisory_lock()
+                else:
+                    self.is_leader = self._renew_lease()
+            except Exception:
+                self._drop_lock_conn()
+                self.is_leader = False
+            return self.is_leader
+
+    def release(self) -> None:
+        """Give up leadership so another process can take over immediately."""
+        with self._lock:
+            try:
+                if self._db_type == 'mariadb':
+                    if self._lock_conn is not None:
+                        self._lock_conn.execute("SELECT RELEASE_LOCK(?)", (self.name,))
+                else:
+                    with get_db_connection(config_dict=self.db_config_dict) as db:
+                        db.execute(
+                            "DELETE FROM market_data_leader_leases WHERE name = ? AND owner = ?",
+                            (self.name, self.owner)
+                        )
+            except Exception:
+                pass
+            finally:
+                self._drop_lock_conn()
+                self.is_leader = False
+
+    def current_leader(self) -> Optional[str]:
+        """Identity of the current leader, if any (connection id on MariaDB)."""
+        with get_db_connection(config_dict=self.db_config_dict) as db:
+            if self._db_type == 'mariadb':
+                row = db.fetchone("SELECT IS_USED_LOCK(?) AS holder", (self.name,))
+                return str(row['holder']) if row and row.get('holder') is not None else None
+            row = db.fetchone(
+                "SELECT owner, expires_at FROM market_data_leader_leases WHERE name = ?",
+                (self.name,)
+            )
+            if row and float(row['expires_at']) > time.time():
+                return row['owner']
+            return None
+
+    # -- MariaDB: advisory lock on a long-lived connection ---------------------
+
+    def _hold_advisory_lock(self) -> bool:
+        if self._lock_conn is not None:
+            row = self._lock_conn.fetchone(
+                "SELECT IS_USED_LOCK(?) = CONNECTION_ID() AS mine", (self.name,)
+            )
+            if row and row.get('mine') == 1:
+                return True
+            self._drop_lock_conn()
+        conn = DatabaseConnection(DatabaseConfig.from_dict(self.db_config_dict))
+        conn.connect()
+        row = conn.fetchone("SELECT GET_LOCK(?, 0) AS got", (self.name,))
+        if row and row.get('got') == 1:
+            self._lock_conn = conn
+            return True
+        conn.close()
+        return False
+
+    def _drop_lock_conn(self) -> None:
+        if self._lock_conn is not None:
+            try:
+                self._lock_conn.close()
+            except Exception:
+                pass
+            self._lock_conn = None
+
+    # -- SQLite: lease row ---------------------------------------------------
+
+    def _renew_lease(self) -> bool:
+        now = time.time()
+        with get_db_connection(config_dict=self.db_config_dict) as db:
+            db.begin_transaction()
+            try:
+                row = db.fetchone(
+                    "SELECT owner, expires_at FROM market_data_leader_leases WHERE name = ?",
+                    (self.name,)
+                )
+                if row and row['owner'] != self.owner and float(row['expires_at']) > now:
+                    db.commit()
+                    return False
+                db.replace_into(
+                    'market_data_leader_leases',
+                    ['name', 'owner', 'expires_at', 'renewed_at'],
+                    (self.name, self.owner, now + self.ttl, now)
+                )
+                db.commit()
+                return True
+            except Exception:
+                db.rollback()
+                raise
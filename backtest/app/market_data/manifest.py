@@ -0,0 +1,204 @@
+"""In-memory manifest of the rqalpha bundle directory.
+
+Status endpoints (bundle-status polling, login, update checks) only need a
+few aggregate facts about the bundle: total size, newest mtime, file count and
+whether the required top-level files are present. Walking the whole tree on
+every request is expensive, so the manifest is built once and kept in memory.
+
+Change detection is a cheap top-level check: the directory itself and its
+direct entries are stat'ed (at most every CHECK_INTERVAL_SECONDS), and the
+full walk only runs again when that signature differs. rqalpha writes bundle
+files at the top level, and files created or removed in subdirectories change
+the subdirectory mtime, which is part of the signature.
+
+For a versioned bundle (see ``bundle_store``) the store's own entries are
+skipped; the top-level symlinks are followed into the active version, and the
+``.current`` link target is part of the signature so a swap is seen at once.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from app.market_data.bundle_store import CURRENT_LINK, RESERVED_NAMES
+
+CHECK_INTERVAL_SECONDS = 2.0
+
+
+@dataclass(frozen=True)
+class BundleManifest:
+    """Aggregate facts about a bundle directory."""
+
+    path: str
+    exists: bool
+    total_size: int = 0
+    file_count: int = 0
+    newest_mtime: Optional[float] = None
+    version: str = ''
+    top_level_sizes: dict = field(default_factory=dict)
+    built_at: float = 0.0
+
+    def has_files(self, names) -> bool:
+        """True when every name is a non-empty top-level file."""
+        return all(self.top_level_sizes.get(name, 0) > 0 for name in names)
+
+    def to_dict(self) -> dict:
+        return {
+            'path': self.path,
+            'exists': self.exists,
+            'total_size': self.total_size,
+            'file_count': self.file_count,
+            'newest_mtime': self.newest_mtime,
+            'version': self.version,
+        }
+
+
+def _top_level_signature(path: Path) -> Optional[tuple]:
+    """Stat the directory and its direct entries; None when it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isdir(path):
+        return ('file', st.st_ino, st.st_size, st.st_mtime_ns)
+
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name in RESERVED_NAMES:
+                    continue
+                try:
+                    est = entry.stat(follow_symlinks=True)
+                except OSError:
+                    continue
+                entries.append((entry.name, est.st_ino, est.st_size, est.st_mtime_ns))
+    except OSError:
+        return None
+    entries.sort()
+    try:
+        current = os.readlink(path / CURRENT_LINK)
+    except OSError:
+        current = None
+    return ('dir', st.st_ino, st.st_mtime_ns, current, tuple(entries))
+
+
+def _build_manifest(path: Path) -> BundleManifest:
+    """Walk the directory once and aggregate size, count, newest mtime and a version hash."""
+    now = time.time()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return BundleManifest(path=str(path), exists=False, built_at=now)
+
+    if not os.path.isdir(path):
+        version = hashlib.sha1(f'{st.st_size}:{st.st_mtime_ns}'.encode()).hexdigest()
+        return BundleManifest(
+            path=str(path), exists=True, total_size=st.st_size, file_count=1,
+            newest_mtime=st.st_mtime, version=version,
+            top_level_sizes={path.name: st.st_size}, built_at=now,
+        )
+
+    total_size = 0
+    file_count = 0
+    newest_mtime = None
+    top_level_sizes: dict[str, int] = {}
+    records = []
+
+    pending = [(str(path), '')]
+    while pending:
+        directory, prefix = pending.pop()
+        try:
+            it = os.scandir(directory)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if not prefix and entry.name in RESERVED_NAMES:
+                    continue
+                relative = f'{prefix}{entry.name}'
+                try:
+                    if entry.is_dir():
+                        pending.append((entry.path, f'{relative}/'))
+                        continue
+                    if not entry.is_file():
+                        continue
+                    est = entry.stat()
+                except OSError:
+                    continue
+                total_size += est.st_size
+                file_count += 1
+                if newest_mtime is None or est.st_mtime > newest_mtime:
+                    newest_mtime = est.st_mtime
+                if not prefix:
+                    top_level_sizes[entry.name] = est.st_size
+                records.append(f'{relative}\0{est.st_size}\0{est.st_mtime_ns}')
+
+    records.sort()
+    digest = hashlib.sha1('\n'.join(records).encode('utf-8', 'surrogateescape')).hexdigest()
+    return BundleManifest(
+        path=str(path), exists=True, total_size=total_size, file_count=file_count,
+        newest_mtime=newest_mtime, version=digest, top_level_sizes=top_level_sizes,
+        built_at=now,
+    )
+
+
+class BundleManifestService:
+    """Process-wide cache of directory manifests keyed by path."""
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL_SECONDS):
+        self.check_interval = check_interval
+        self._entries: dict[str, tuple[Optional[tuple], float, BundleManifest]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> BundleManifest:
+        key = str(Path(path).expanduser())
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is not None and now - cached[1] < self.check_interval:
+            return cached[2]
+
+        signature = _top_level_signature(Path(key))
+        if cached is not None and cached[0] == signature:
+            manifest = cached[2]
+        else:
+            manifest = _build_manifest(Path(key))
+        with self._lock:
+            self._entries[key] = (signature, now, manifest)
+        return manifest
+
+    def invalidate(self, path: Optional[Path] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(Path(path).expanduser()), None)
+
+
+_service: Optional[BundleManifestService] = None
+_service_lock = threading.Lock()
+
+
+def get_manifest_service() -> BundleManifestService:
+    """Get the process-wide manifest service singleton."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = BundleManifestService()
+        return _service
+
+
+def get_bundle_manifest(path: Path) -> BundleManifest:
+    """Return the (cached) manifest for a bundle or work directory."""
+    return get_manifest_service().get(path)
+
+
+def invalidate_bundle_manifest(path: Optional[Path] = None) -> None:
+    """Drop cached manifests after the bundle has been rewritten."""
+    get_manifest_service().invalidate(path)
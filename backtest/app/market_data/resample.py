@@ -0,0 +1,321 @@
+"""Bar resampling engine for dbbardata (1m -> 5m/15m/30m/1h/d).
+
+Aggregation is vectorized with NumPy over columnar bars (the page format
+produced by app.market_data.bars): open=first, high=max, low=min, close=last,
+volume/turnover=sum, open_interest=last.
+
+Bucketing is session aware for Chinese futures:
+  - Intraday buckets are clock aligned and labelled by their start time, the
+    same convention vnpy uses for 1m bars. Every session boundary (10:15,
+    10:30, 11:30, 13:30, 15:00, 21:00, 23:00, 01:00, 02:30) falls on a
+    15-minute mark, so no 5m/15m bucket spans two sessions. Wider buckets
+    can: the 10:00 30m and 1h buckets cover the 10:15-10:30 break and
+    aggregate the bars on both sides of it.
+  - Daily buckets use the trading day: bars from the night session (at or
+    after 18:00, including the after-midnight part on a weekend) belong to
+    the next trading date, looked up in the bundle calendar when available.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+import numpy as np
+
+from app.market_data.bars import fetch_bars
+
+# Target interval -> bucket width in minutes (None = trading day)
+RESAMPLE_INTERVALS = {
+    '5m': 5,
+    '15m': 15,
+    '30m': 30,
+    '1h': 60,
+    'd': None,
+}
+# Intervals that may be written to the bar table. Its daily bars come from
+# the bundle import, so 'd' is only ever resampled on the fly.
+MATERIALIZABLE_INTERVALS = ('5m', '15m', '30m', '1h')
+DEFAULT_MATERIALIZED_INTERVALS = ('5m', '15m', '1h')
+SOURCE_INTERVAL = '1m'
+
+_NIGHT_SESSION_START_MINUTE = 18 * 60
+# A trading day starts on the previous trading date's evening, at most three
+# calendar days earlier (Friday night for Monday). Reload that far back when
+# recomputing the last, possibly partial, daily bucket.
+_DAILY_LOOKBACK = timedelta(days=4)
+_SOURCE_PAGE_SIZE = 100_000
+
+_PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'turnover', 'open_interest')
+_WRITE_COLUMNS = [
+    'symbol', 'exchange', 'datetime', '`interval`',
+    'volume', 'turnover', 'open_interest',
+    'open_price', 'high_price', 'low_price', 'close_price',
+]
+
+
+def load_trading_dates(bundle_path) -> Optional[np.ndarray]:
+    """Load the rqalpha bundle trading calendar as datetime64[D], if present."""
+    from pathlib import Path
+
+    path = Path(bundle_path) / 'trading_dates.npy'
+    if not path.exists():
+        return None
+    try:
+        raw = np.load(str(path))
+    except Exception:
+        return None
+    # rqalpha stores dates as YYYYMMDD integers
+    as_text = raw.astype(np.int64).astype(str)
+    return np.array(
+        [f'{s[:4]}-{s[4:6]}-{s[6:8]}' for s in as_text],
+        dtype='datetime64[D]',
+    )
+
+
+_trading_dates_cache: dict = {}
+_trading_dates_lock = threading.Lock()
+
+
+def get_trading_dates(bundle_path) -> Optional[np.ndarray]:
+    """Cached load_trading_dates, reloaded when the calendar file changes."""
+    path = os.path.join(str(bundle_path), 'trading_dates.npy')
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _trading_dates_lock:
+        cached = _trading_dates_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    trading_dates = load_trading_dates(bundle_path)
+    with _trading_dates_lock:
+        _trading_dates_cache[path] = (mtime, trading_dates)
+    return trading_dates
+
+
+def trading_days(timestamps: np.ndarray, trading_dates: Optional[np.ndarray] = None) -> np.ndarray:
+    """Map bar timestamps (datetime64) to their futures trading day."""
+    ts = timestamps.astype('datetime64[m]')
+    day = ts.astype('datetime64[D]')
+    minute_of_day = (ts - day.astype('datetime64[m]')).astype(np.int64)
+    candidate = day + (minute_of_day >= _NIGHT_SESSION_START_MINUTE).astype('timedelta64[D]')
+
+    if trading_dates is not None and len(trading_dates):
+        calendar = np.asarray(trading_dates, dtype='datetime64[D]')
+        idx = np.searchsorted(calendar, candidate, side='left')
+        in_range = idx < len(calendar)
+        result = np.busday_offset(candidate, 0, roll='forward')
+        result[in_range] = calendar[idx[in_range]]
+        return result
+    return np.busday_offset(candidate, 0, roll='forward')
+
+
+def bucket_labels(timestamps: np.ndarray, interval: str,
+                  trading_dates: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return the bucket label (datetime64[s]) for every source bar."""
+    if interval not in RESAMPLE_INTERVALS:
+        raise ValueError(f'不支持的重采样周期: {interval}')
+    width = RESAMPLE_INTERVALS[interval]
+    if width is None:
+        return trading_days(timestamps, trading_dates).astype('datetime64[s]')
+    minutes = timestamps.astype('datetime64[m]').astype(np.int64)
+    return ((minutes // width) * width).astype('datetime64[m]').astype('datetime64[s]')
+
+
+def resample_columns(columns: dict, interval: str,
+                     trading_dates: Optional[np.ndarray] = None) -> dict:
+    """Resample columnar bars sorted by datetime into `interval` buckets.
+
+    Args:
+        columns: dict of equally long sequences with keys 'datetime' and
+                 open/high/low/close/volume/turnover/open_interest
+        interval: target interval, one of RESAMPLE_INTERVALS
+        trading_dates: optional trading calendar used for daily buckets
+
+    Returns:
+        Columnar dict in the same layout, 'datetime' as 'YYYY-MM-DD HH:MM:SS'
+    """
+    count = len(columns.get('datetime') or [])
+    if count == 0:
+        return {name: [] for name in ('datetime',) + _PRICE_COLUMNS}
+
+    timestamps = np.array([str(v).replace('T', ' ') for v in columns['datetime']], dtype='datetime64[s]')
+    labels = bucket_labels(timestamps, interval, trading_dates)
+
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:] - 1, count - 1]
+
+    data = {name: np.asarray(columns[name], dtype=np.float64) for name in _PRICE_COLUMNS}
+    out_labels = labels[starts]
+    return {
+        'datetime': [s.replace('T', ' ') for s in np.datetime_as_string(out_labels, unit='s')],
+        'open': data['open'][starts].tolist(),
+        'high': np.maximum.reduceat(data['high'], starts).tolist(),
+        'low': np.minimum.reduceat(data['low'], starts).tolist(),
+        'close': data['close'][ends].tolist(),
+        'volume': np.add.reduceat(data['volume'], starts).tolist(),
+        'turnover': np.add.reduceat(data['turnover'], starts).tolist(),
+        'open_interest': data['open_interest'][ends].tolist(),
+    }
+
+
+def _load_source_columns(db, table: str, *, symbol: str, exchange: str,
+                         start: Optional[str], end: Optional[str] = None,
+                         max_rows: Optional[int] = None) -> tuple[dict, bool]:
+    """Read source bars page by page (keyset) into one columnar dict.
+
+    Returns (columns, truncated) where truncated means max_rows was hit.
+    """
+    merged: dict[str, list] = {}
+    after = None
+    total = 0
+    while True:
+        page_size = _SOURCE_PAGE_SIZE
+        if max_rows is not None:
+            page_size = min(page_size, max_rows - total)
+            if page_size <= 0:
+                return merged, True
+        page = fetch_bars(
+            db, table,
+            symbol=symbol, exchange=exchange, interval=SOURCE_INTERVAL,
+            start=start, end=end, after=after, limit=page_size,
+        )
+        for name, values in page['columns'].items():
+            merged.setdefault(name, []).extend(values)
+        total += page['count']
+        if not page['next_cursor']:
+            return merged, False
+        after = page['next_cursor']
+
+
+def resample_on_the_fly(db, table: str, *, symbol: str, exchange: str, interval: str,
+                        start: Optional[str], end: Optional[str], after: Optional[str],
+                        limit: int, max_source_rows: int = 300_000,
+                        trading_dates: Optional[np.ndarray] = None) -> dict:
+    """Build one page of `interval` bars from 1m bars without persisting them.
+
+    Returns a page in the app.market_data.bars format.
+    """
+    source_start = start
+    if after:
+        cursor = datetime.strptime(after, '%Y-%m-%d %H:%M:%S')
+        if RESAMPLE_INTERVALS[interval] is None:
+            cursor -= _DAILY_LOOKBACK
+        source_start = max(filter(None, [start, cursor.strftime('%Y-%m-%d %H:%M:%S')]))
+
+    source, truncated = _load_source_columns(
+        db, table, symbol=symbol, exchange=exchange,
+        start=source_start, end=end, max_rows=max_source_rows,
+    )
+    resampled = resample_columns(source, interval, trading_dates)
+
+    keep = [
+        i for i, label in enumerate(resampled['datetime'])
+        if (after is None or label > after) and (start is None or label >= start)
+    ]
+    if truncated and keep:
+        # The last bucket may be missing source bars past the read limit.
+        keep = keep[:-1]
+    has_more = len(keep) > limit or (truncated and bool(keep))
+    keep = keep[:limit]
+
+    columns = {name: [values[i] for i in keep] for name, values in resampled.items()}
+    return {
+        'symbol': symbol,
+        'exchange': exchange,
+        'interval': interval,
+        'count': len(keep),
+        'columns': columns,
+        'next_cursor': columns['datetime'][-1] if has_more and keep else None,
+        'resampled': True,
+    }
+
+
+def _high_water_mark(db, table: str, symbol: str, exchange: str, interval: str) -> Optional[str]:
+    row = db.fetchone(
+        f"SELECT MAX(datetime) AS max_dt FROM {table} "
+        f"WHERE symbol = ? AND exchange = ? AND `interval` = ?",
+        (symbol, exchange, interval),
+    )
+    if not row or not row.get('max_dt'):
+        return None
+    return str(row['max_dt']).replace('T', ' ')[:19]
+
+
+def parse_materialized_intervals(raw: Optional[str]) -> list[str]:
+    """Parse a MARKET_DATA_RESAMPLE_INTERVALS value; None means the defaults."""
+    if raw is None:
+        return list(DEFAULT_MATERIALIZED_INTERVALS)
+    intervals = [item.strip() for item in raw.split(',') if item.strip()]
+    unknown = [item for item in intervals if item not in MATERIALIZABLE_INTERVALS]
+    if unknown:
+        raise ValueError(f'不支持的重采样周期: {", ".join(unknown)}')
+    return intervals
+
+
+def materialize_series(db, table: str, *, symbol: str, exchange: str,
+                       intervals: Iterable[str] = DEFAULT_MATERIALIZED_INTERVALS,
+                       trading_dates: Optional[np.ndarray] = None) -> dict[str, int]:
+    """Incrementally persist resampled bars for one (symbol, exchange).
+
+    For every target interval the last stored bucket is recomputed (it may have
+    been built from a partial session) together with everything after it, so
+    each call only touches bars newer than the per-interval high-water mark.
+
+    Returns:
+        Mapping of interval -> number of bars written
+    """
+    intervals = [i for i in intervals if i in MATERIALIZABLE_INTERVALS]
+    if not intervals:
+        return {}
+
+    marks = {i: _high_water_mark(db, table, symbol, exchange, i) for i in intervals}
+    source_start = min(marks.values()) if all(marks.values()) else None
+
+    source, _ = _load_source_columns(db, table, symbol=symbol, exchange=exchange, start=source_start)
+    written: dict[str, int] = {}
+    for interval in intervals:
+        resampled = resample_columns(source, interval, trading_dates)
+        mark = marks[interval]
+        rows = [
+            (symbol, exchange, label, interval,
+             resampled['volume'][i], resampled['turnover'][i], resampled['open_interest'][i],
+             resampled['open'][i], resampled['high'][i], resampled['low'][i], resampled['close'][i])
+            for i, label in enumerate(resampled['datetime'])
+            if mark is None or label >= mark
+        ]
+        db.replace_many(table, _WRITE_COLUMNS, rows)
+        written[interval] = len(rows)
+    return written
+
+
+def list_source_series(db, table: str) -> list[dict]:
+    """List (symbol, exchange) pairs that have 1m bars, with their latest bar."""
+    rows = db.fetchall(
+        f"SELECT symbol, exchange, MAX(datetime) AS max_dt FROM {table} "
+        f"WHERE `interval` = ? GROUP BY symbol, exchange",
+        (SOURCE_INTERVAL,),
+    )
+    return [
+        {'symbol': r['symbol'], 'exchange': r['exchange'],
+         'max_dt': str(r['max_dt']).replace('T', ' ')[:19] if r['max_dt'] else None}
+        for r in rows
+    ]
+
+
+def is_series_current(db, table: str, series: dict, intervals: Iterable[str],
+                      trading_dates: Optional[np.ndarray] = None) -> bool:
+    """True when every target interval already covers the latest source bar."""
+    if not series.get('max_dt'):
+        return True
+    latest = np.array([series['max_dt']], dtype='datetime64[s]')
+    for interval in intervals:
+        mark = _high_water_mark(db, table, series['symbol'], series['exchange'], interval)
+        if mark is None:
+            return False
+        label = bucket_labels(latest, interval, trading_dates)[0]
+        if np.datetime64(mark) < label:
+            return False
+    return True
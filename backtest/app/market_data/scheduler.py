@@ -1,16 +1,35 @@
-"""Scheduler for cron jobs."""
+"""Scheduler for cron jobs.
+
+Every gunicorn worker starts a scheduler, but only the elected leader (see
+leader.py) keeps the market data cron job; the others just keep competing
+for leadership so one of them takes over if the leader goes away. The leader
+reloads the cron config from the database on every heartbeat, so changes
+saved through any worker take effect.
+"""
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from pathlib import Path
 from datetime import datetime
+import atexit
 import logging
+import os
 
 from app.database import DatabaseConfig, get_db_connection
+from app.market_data.leader import LEADER_TTL_SECONDS, LeaderElection
 
 logger = logging.getLogger(__name__)
 
 _scheduler = None
 
+CRON_JOB_ID = 'market_data_cron'
+HEARTBEAT_JOB_ID = 'market_data_leader_heartbeat'
+LEADER_LOCK_NAME = 'market_data_scheduler'
+
+_election: LeaderElection = None
+# Cron expression currently scheduled by this process (None: no cron job)
+_active_schedule = None
+
 # Serialized DB config stored at init_scheduler() time (Flask context).
 # APScheduler callbacks run in background threads without Flask context,
 # so this dict is used to reconnect without current_app.
@@ -37,7 +56,12 @@ def load_cron_config() -> dict:
 def cron_job_handler():
     """Cron job handler."""
     from app.market_data.task_manager import get_task_manager
-    from app.market_data.tasks import do_full_download, do_incremental_update
+    from app.market_data.tasks import submit_bundle_download
+
+    # Leadership may have moved since the tick was scheduled.
+    if _election is not None and not _election.try_acquire():
+        logger.info('Not the scheduler leader, skipping cron job')
+        return
 
     config = load_cron_config()
 
@@ -47,22 +71,17 @@ def cron_job_handler():
         return
 
     tm = get_task_manager()
+    task_type = config['task_type']
 
-    # Check for running tasks (mutex)
-    if tm._has_running_task():
+    # Skip when the download lane is already full
+    if tm._lane_is_full(task_type):
         logger.warning('Task already running, skipping cron job')
         _log_cron_run(None, 'skipped', '已有任务正在运行')
         return
 
-    # Submit task based on config
-    task_type = config['task_type']
+    # Submit task based on config (analysis is chained as a dependent task)
     try:
-        if task_type == 'full':
-            task_id = tm.submit_task('full', do_full_download, source='cron')
-        elif task_type == 'incremental':
-            task_id = tm.submit_task('incremental', do_incremental_update, source='cron')
-        else:
-            raise ValueError(f'Unknown task type: {task_type}')
+        task_id = submit_bundle_download(task_type, source='cron')
 
         logger.info(f'Cron job submitted task: {task_id}')
         _log_cron_run(task_id, 'success', f'已提交任务: {task_id}')
@@ -83,39 +102,91 @@ def _log_cron_run(task_id, status: str, message: str):
         )
 
 
-def update_cron_schedule(cron_expression: str):
-    """Update cron schedule."""
+def _apply_cron_schedule(cron_expression):
+    """Install (or with None, remove) the cron job in this process's scheduler."""
+    global _active_schedule
     scheduler = get_scheduler()
 
-    # Remove old jobs
-    scheduler.remove_all_jobs()
+    if scheduler.get_job(CRON_JOB_ID):
+        scheduler.remove_job(CRON_JOB_ID)
+    _active_schedule = cron_expression
 
-    # Add new job
     if cron_expression:
         trigger = CronTrigger.from_crontab(cron_expression)
         scheduler.add_job(
             cron_job_handler,
             trigger=trigger,
-            id='market_data_cron',
+            id=CRON_JOB_ID,
             replace_existing=True
         )
         logger.info(f'Cron schedule updated: {cron_expression}')
 
 
+def _configured_expression():
+    cron_config = load_cron_config()
+    if cron_config and cron_config['enabled'] and cron_config['cron_expression']:
+        return cron_config['cron_expression']
+    return None
+
+
+def leader_heartbeat():
+    """Renew or contend for leadership and keep the cron job on the leader only."""
+    was_leader = _election.is_leader
+    if _election.try_acquire():
+        if not was_leader:
+            logger.info(f'Scheduler leadership acquired: {_election.owner}')
+        try:
+            expression = _configured_expression()
+        except Exception as e:
+            logger.error(f'Failed to load cron config: {str(e)}')
+            return
+        scheduled = get_scheduler().get_job(CRON_JOB_ID) is not None
+        if expression != _active_schedule or (expression and not scheduled):
+            _apply_cron_schedule(expression)
+    else:
+        if was_leader:
+            logger.warning(f'Scheduler leadership lost: {_election.owner}')
+        if _active_schedule is not None or get_scheduler().get_job(CRON_JOB_ID):
+            _apply_cron_schedule(None)
+
+
+def update_cron_schedule(cron_expression: str):
+    """Update cron schedule.
+
+    Only the leader schedules the job; on other workers this is a no-op and
+    the leader picks the saved config up on its next heartbeat.
+    """
+    if _election is not None and not _election.try_acquire():
+        logger.info('Cron schedule saved; the scheduler leader will apply it')
+        return
+    _apply_cron_schedule(cron_expression)
+
+
 def init_scheduler():
     """Initialize scheduler on app startup.
 
     Must be called once within a Flask application context (e.g., from create_app).
     Stores the DB connection config so that APScheduler background threads can
-    connect without a Flask context.
+    connect without a Flask context, and joins the scheduler leader election.
     """
-    global _db_config_dict
+    global _db_config_dict, _election
 
     config = DatabaseConfig.from_flask_config('market_data')
     _db_config_dict = config.to_dict()
 
-    cron_config = load_cron_config()
-
-    if cron_config and cron_config['enabled'] and cron_config['cron_expression']:
-        update_cron_schedule(cron_config['cron_expression'])
-        logger.info(f'Cron schedule loaded: {cron_config["cron_expression"]}')
+    ttl = float(os.environ.get('MARKET_DATA_LEADER_TTL', LEADER_TTL_SECONDS))
+    _election = LeaderElection(_db_config_dict, LEADER_LOCK_NAME, ttl=ttl)
+    # Hand leadership over right away on a clean worker shutdown
+    atexit.register(_election.release)
+
+    leader_heartbeat()
+    get_scheduler().add_job(
+        leader_heartbeat,
+        trigger=IntervalTrigger(seconds=max(ttl / 3, 1)),
+        id=HEARTBEAT_JOB_ID,
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    if _election.is_leader and _active_schedule:
+        logger.info(f'Cron schedule loaded: {_active_schedule}')
@@ -1,12 +1,115 @@
-"""Task manager for market data operations."""
+"""Task manager for market data operations.
+
+Tasks run in named lanes with independent concurrency limits, so a long
+bundle analysis does not hold up a vnpy import. A task may depend on other
+tasks; it stays pending until they all succeed, and is cancelled when one of
+them fails or is cancelled.
+
+Cancellation is cooperative but prompt: cancelling a running task sets its
+cancel event, which task functions poll, and kills the process group of any
+child process the task started through ``spawn_process``. Cancellations made
+by another server process are picked up by polling the task table.
+"""
+import os
+import signal
+import subprocess
 import threading
+import time
 import uuid
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional, Callable
-from queue import Queue
 
 from app.database import DatabaseConfig, get_db_connection
 
+# Task types that touch the vnpy bar table; they are serialized among
+# themselves but may run alongside bundle download/analyze tasks.
+VNPY_TASK_TYPES = ('vnpy_import', 'vnpy_resample', 'vnpy_stats_verify')
+
+TASK_LANES = {
+    'full': 'download',
+    'incremental': 'download',
+    'vnpy_import': 'import',
+    'vnpy_resample': 'import',
+    'vnpy_stats_verify': 'import',
+    'analyze': 'analyze',
+}
+DEFAULT_LANE = 'maintenance'
+DEFAULT_LANE_LIMITS = {'download': 1, 'import': 1, 'analyze': 1, 'maintenance': 1}
+
+# Terminal statuses of finished tasks kept in memory for dependency checks
+_OUTCOME_CACHE_SIZE = 1000
+_WAIT_SAMPLES = 50
+
+# Seconds between checks for cancellations made by another server process
+CANCEL_POLL_SECONDS = 0.5
+# Seconds a child process group gets to exit on SIGTERM before SIGKILL
+PROCESS_KILL_GRACE_SECONDS = 5.0
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task once it has been cancelled."""
+
+
+def lane_for(task_type: str) -> str:
+    """Lane a task type runs in."""
+    return TASK_LANES.get(task_type, DEFAULT_LANE)
+
+
+def parse_lane_limits(value: Optional[str]) -> dict:
+    """Parse 'download=1,analyze=2' into a lane -> limit dict."""
+    limits = {}
+    for item in (value or '').split(','):
+        name, _, limit = item.partition('=')
+        name = name.strip()
+        if name and limit.strip().isdigit() and int(limit) > 0:
+            limits[name] = int(limit)
+    return limits
+
+
+def kill_process_group(process: subprocess.Popen, grace: float = PROCESS_KILL_GRACE_SECONDS) -> None:
+    """Terminate ``process`` and everything it spawned; SIGKILL after ``grace`` seconds."""
+    if process.poll() is not None:
+        return
+    try:
+        pgid = os.getpgid(process.pid)
+    except ProcessLookupError:
+        return
+    for sig, timeout in ((signal.SIGTERM, grace), (signal.SIGKILL, None)):
+        try:
+            os.killpg(pgid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            process.wait(timeout)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
+
+@dataclass
+class _QueuedTask:
+    task_id: str
+    task_type: str
+    lane: str
+    func: Callable
+    args: tuple
+    depends_on: tuple = ()
+    submitted_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+
+
+@dataclass
+class _Lane:
+    name: str
+    limit: int
+    queue: deque = field(default_factory=deque)
+    running: dict = field(default_factory=dict)
+    waits: deque = field(default_factory=lambda: deque(maxlen=_WAIT_SAMPLES))
+    cancel_times: deque = field(default_factory=lambda: deque(maxlen=_WAIT_SAMPLES))
+
 
 class TaskManager:
     """Lightweight task manager for market data operations.
@@ -15,14 +118,18 @@ class TaskManager:
     can connect to the database without a Flask application context.
     """
 
-    def __init__(self, db_config_dict: dict, max_workers: int = 1):
+    def __init__(self, db_config_dict: dict, lane_limits: Optional[dict] = None):
         self.db_config_dict = db_config_dict
-        self.max_workers = max_workers
-        self.task_queue = Queue()
-        self.workers = []
+        self.lane_limits = {**DEFAULT_LANE_LIMITS, **(lane_limits or {})}
         self.lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._lanes = {name: _Lane(name, limit) for name, limit in self.lane_limits.items()}
+        self._outcomes: dict[str, str] = {}
+        self._cancel_events: dict[str, threading.Event] = {}
+        self._cancel_requested_at: dict[str, float] = {}
+        self._processes: dict[str, list] = {}
+        self._watcher: Optional[threading.Thread] = None
         self._init_db()
-        self._start_workers()
 
     def _get_db_connection(self):
         """Return a context manager for a database connection.
@@ -38,65 +145,307 @@ class TaskManager:
         with self._get_db_connection() as db:
             init_database_with_connection(db)
 
-    def _start_workers(self):
-        """Start worker threads."""
-        for i in range(self.max_workers):
-            worker = threading.Thread(
-                target=self._worker_loop,
-                daemon=True,
-                name=f"TaskWorker-{i}"
-            )
-            worker.start()
-            self.workers.append(worker)
-
-    def _worker_loop(self):
-        """Worker thread main loop."""
-        while True:
-            task_id, task_func, task_args = self.task_queue.get()
-            try:
-                self._update_task_status(task_id, 'running', started_at=datetime.utcnow())
-                task_func(task_id, *task_args)
-                self._update_task_status(task_id, 'success', finished_at=datetime.utcnow())
-            except Exception as e:
-                self._update_task_status(
-                    task_id, 'failed',
-                    error=str(e),
-                    finished_at=datetime.utcnow()
-                )
-            finally:
-                self.task_queue.task_done()
+    def _lane(self, name: str) -> _Lane:
+        lane = self._lanes.get(name)
+        if lane is None:
+            lane = self._lanes[name] = _Lane(name, 1)
+        return lane
 
     def submit_task(self, task_type: str, task_func: Callable,
-                    task_args: tuple = (), source: str = 'manual') -> str:
-        """Submit a task for execution."""
+                    task_args: tuple = (), source: str = 'manual',
+                    depends_on: Optional[list] = None) -> str:
+        """Submit a task for execution.
+
+        ``depends_on`` lists task ids that must succeed before this task starts.
+        """
         with self.lock:
-            # Allow auto tasks to be submitted even when there's a running task
+            # Allow auto tasks to be submitted even when the lane is full
             # This is needed for chained tasks (e.g., download -> analyze)
-            if source != 'auto' and self._has_running_task(task_type):
+            if source != 'auto' and self._lane_is_full(task_type):
                 raise RuntimeError("已有任务正在运行，请等待完成后再试")
 
             task_id = str(uuid.uuid4())
             self._create_task(task_id, task_type, source)
-            self.task_queue.put((task_id, task_func, task_args))
+            task = _QueuedTask(task_id, task_type, lane_for(task_type), task_func,
+                               tuple(task_args), tuple(depends_on or ()))
+            if task.depends_on:
+                self.update_progress(task_id, 0, '等待', '等待前置任务完成...')
+            with self._cond:
+                self._lane(task.lane).queue.append(task)
+                self._dispatch_locked()
             return task_id
 
-    def _has_running_task(self, task_type: str = None) -> bool:
-        """Check if there is a running task of the same category.
+    def _dependency_status(self, task_id: str) -> str:
+        status = self._outcomes.get(task_id)
+        if status is not None:
+            return status
+        for lane in self._lanes.values():
+            if task_id in lane.running:
+                return 'running'
+            if any(t.task_id == task_id for t in lane.queue):
+                return 'pending'
+        row = self.get_task_status(task_id)
+        return row['status'] if row else 'failed'
+
+    def _record_outcome(self, task_id: str, status: str) -> None:
+        self._outcomes[task_id] = status
+        while len(self._outcomes) > _OUTCOME_CACHE_SIZE:
+            self._outcomes.pop(next(iter(self._outcomes)))
 
-        vnpy_import tasks are independent from other market data tasks.
+    def _dispatch_locked(self) -> None:
+        """Start every queued task whose dependencies succeeded, within lane limits.
+
+        Must be called with ``self._cond`` held. Tasks whose dependencies did
+        not succeed are cancelled, which may in turn unblock the decision for
+        their own dependents, so the scan repeats until nothing changes.
+        """
+        changed = True
+        while changed:
+            changed = False
+            for lane in self._lanes.values():
+                for task in list(lane.queue):
+                    statuses = [self._dependency_status(dep) for dep in task.depends_on]
+                    broken = [dep for dep, st in zip(task.depends_on, statuses)
+                              if st in ('failed', 'cancelled')]
+                    if broken:
+                        lane.queue.remove(task)
+                        self._update_task_status(
+                            task.task_id, 'cancelled',
+                            error=f'前置任务未成功: {", ".join(broken)}',
+                            finished_at=datetime.utcnow(),
+                        )
+                        self._record_outcome(task.task_id, 'cancelled')
+                        changed = True
+                        continue
+                    if len(lane.running) >= lane.limit:
+                        continue
+                    if any(st != 'success' for st in statuses):
+                        continue
+                    lane.queue.remove(task)
+                    self._start_locked(lane, task)
+                    changed = True
+
+    def _start_locked(self, lane: _Lane, task: _QueuedTask) -> None:
+        task.started_at = time.monotonic()
+        lane.waits.append(task.started_at - task.submitted_at)
+        lane.running[task.task_id] = task
+        self._cancel_events[task.task_id] = threading.Event()
+        worker = threading.Thread(
+            target=self._run_task,
+            args=(lane, task),
+            daemon=True,
+            name=f"TaskWorker-{lane.name}-{task.task_id[:8]}"
+        )
+        worker.start()
+        if self._watcher is None:
+            self._watcher = threading.Thread(
+                target=self._watch_cancellations, daemon=True, name="TaskCancelWatcher"
+            )
+            self._watcher.start()
+
+    def _is_cancelled(self, task_id: str) -> bool:
+        row = self.get_task_status(task_id)
+        return bool(row and row['status'] == 'cancelled')
+
+    def is_cancel_requested(self, task_id: str) -> bool:
+        """Whether ``task_id`` has been cancelled; cheap enough to poll in tight loops."""
+        event = self._cancel_events.get(task_id)
+        if event is not None:
+            return event.is_set()
+        return self._is_cancelled(task_id)
+
+    def check_cancelled(self, task_id: str) -> None:
+        """Raise TaskCancelled if ``task_id`` has been cancelled."""
+        if self.is_cancel_requested(task_id):
+            raise TaskCancelled('任务已取消')
+
+    @contextmanager
+    def spawn_process(self, task_id: str, cmd: list, **popen_kwargs):
+        """Start ``cmd`` in its own process group, killed as a whole on cancel.
+
+        On exit the process group is killed if still running, and TaskCancelled
+        is raised if the task was cancelled meanwhile.
+        """
+        self.check_cancelled(task_id)
+        process = subprocess.Popen(cmd, start_new_session=True, **popen_kwargs)
+        with self._cond:
+            self._processes.setdefault(task_id, []).append(process)
+        try:
+            # A cancel that raced with the start would have missed the process.
+            if self.is_cancel_requested(task_id):
+                kill_process_group(process)
+            yield process
+        except Exception as e:
+            # Errors from a killed child (broken pipe, exit code) mean "cancelled".
+            if self.is_cancel_requested(task_id):
+                raise TaskCancelled('任务已取消') from e
+            raise
+        finally:
+            kill_process_group(process)
+            with self._cond:
+                processes = self._processes.get(task_id, [])
+                if process in processes:
+                    processes.remove(process)
+        self.check_cancelled(task_id)
+
+    def _interrupt(self, task_id: str, requested_at: Optional[float] = None) -> None:
+        """Signal a running task to stop and kill its child process groups."""
+        with self._cond:
+            event = self._cancel_events.get(task_id)
+            if event is None or event.is_set():
+                return
+            self._cancel_requested_at[task_id] = requested_at or time.monotonic()
+            event.set()
+            processes = list(self._processes.get(task_id, ()))
+        for process in processes:
+            threading.Thread(target=kill_process_group, args=(process,), daemon=True,
+                             name=f"TaskKiller-{task_id[:8]}").start()
+
+    def _watch_cancellations(self) -> None:
+        """Poll the task table for running tasks cancelled by another server process."""
+        while True:
+            with self._cond:
+                running = [task_id for lane in self._lanes.values() for task_id in lane.running]
+                if not running:
+                    self._watcher = None
+                    return
+            pending = [task_id for task_id in running
+                       if not self._cancel_events.get(task_id, threading.Event()).is_set()]
+            if pending:
+                try:
+                    with self._get_db_connection() as db:
+                        placeholders = ', '.join('?' for _ in pending)
+                        rows = db.fetchall(
+                            "SELECT task_id, finished_at FROM market_data_tasks "
+                            f"WHERE status = 'cancelled' AND task_id IN ({placeholders})",
+                            tuple(pending)
+                        )
+                except Exception:
+                    rows = []
+                for row in rows:
+                    self._interrupt(row['task_id'], self._requested_at_from(row.get('finished_at')))
+            time.sleep(CANCEL_POLL_SECONDS)
+
+    @staticmethod
+    def _requested_at_from(cancelled_at) -> Optional[float]:
+        """Monotonic time of a cancel recorded (in UTC) by another process."""
+        try:
+            when = cancelled_at if isinstance(cancelled_at, datetime) else datetime.fromisoformat(str(cancelled_at))
+        except (TypeError, ValueError):
+            return None
+        age = (datetime.utcnow() - when).total_seconds()
+        return time.monotonic() - max(age, 0.0)
+
+    def _run_task(self, lane: _Lane, task: _QueuedTask):
+        """Worker thread body for one task."""
+        status = 'cancelled'
+        try:
+            if not self._is_cancelled(task.task_id):
+                self._update_task_status(task.task_id, 'running', started_at=datetime.utcnow())
+                task.func(task.task_id, *task.args)
+                # Cooperatively cancelled tasks return normally; keep 'cancelled'
+                if not self._is_cancelled(task.task_id):
+                    status = 'success'
+                    self._update_task_status(task.task_id, 'success', finished_at=datetime.utcnow())
+        except Exception as e:
+            if not isinstance(e, TaskCancelled) and not self._is_cancelled(task.task_id):
+                status = 'failed'
+                self._update_task_status(
+                    task.task_id, 'failed',
+                    error=str(e),
+                    finished_at=datetime.utcnow()
+                )
+        finally:
+            with self._cond:
+                requested_at = self._cancel_requested_at.pop(task.task_id, None)
+                self._cancel_events.pop(task.task_id, None)
+                self._processes.pop(task.task_id, None)
+            if status == 'cancelled' and requested_at is not None:
+                self._report_cancel(lane, task.task_id, time.monotonic() - requested_at)
+            with self._cond:
+                lane.running.pop(task.task_id, None)
+                self._record_outcome(task.task_id, status)
+                self._dispatch_locked()
+                self._cond.notify_all()
+
+    def _report_cancel(self, lane: _Lane, task_id: str, elapsed: float) -> None:
+        lane.cancel_times.append(elapsed)
+        try:
+            self._update_task_status(task_id, 'cancelled', finished_at=datetime.utcnow(),
+                                     message=f'任务已取消（{elapsed:.2f}s 内停止）')
+            self.log(task_id, 'WARNING', f'任务已停止，取消耗时 {elapsed:.2f}s')
+        except Exception:
+            pass
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Block until no task is queued or running; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while any(lane.queue or lane.running for lane in self._lanes.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def lane_stats(self) -> dict:
+        """Per-lane limit, running and queued tasks and queue wait times (seconds)."""
+        now = time.monotonic()
+        stats = {}
+        with self._cond:
+            for lane in self._lanes.values():
+                queued = list(lane.queue)
+                stats[lane.name] = {
+                    'limit': lane.limit,
+                    'running': len(lane.running),
+                    'queued': len(queued),
+                    'waiting_on_dependencies': sum(1 for t in queued if t.depends_on),
+                    'oldest_wait_seconds': round(max((now - t.submitted_at for t in queued), default=0.0), 3),
+                    'avg_wait_seconds': round(sum(lane.waits) / len(lane.waits), 3) if lane.waits else 0.0,
+                    'avg_cancel_seconds': (
+                        round(sum(lane.cancel_times) / len(lane.cancel_times), 3) if lane.cancel_times else None
+                    ),
+                    'running_tasks': [
+                        {'task_id': t.task_id, 'task_type': t.task_type,
+                         'running_seconds': round(now - t.started_at, 3)}
+                        for t in lane.running.values()
+                    ],
+                    'queued_tasks': [
+                        {'task_id': t.task_id, 'task_type': t.task_type,
+                         'wait_seconds': round(now - t.submitted_at, 3),
+                         'depends_on': list(t.depends_on)}
+                        for t in queued
+                    ],
+                }
+        return stats
+
+    def _lane_is_full(self, task_type: str) -> bool:
+        """Check if the task's lane already holds ``limit`` pending or running tasks.
+
+        Tasks beyond the lane limit would only wait in the queue, so manual
+        submissions are refused once the lane is full instead.
         """
+        lane = lane_for(task_type)
+        lane_types = tuple(t for t, name in TASK_LANES.items() if name == lane)
         with self._get_db_connection() as db:
-            if task_type == 'vnpy_import':
+            if lane_types:
+                placeholders = ', '.join('?' for _ in lane_types)
                 row = db.fetchone(
                     "SELECT COUNT(*) as count FROM market_data_tasks "
-                    "WHERE status IN ('pending', 'running') AND task_type = 'vnpy_import'"
+                    f"WHERE status IN ('pending', 'running') AND task_type IN ({placeholders})",
+                    lane_types
                 )
             else:
+                mapped_types = tuple(TASK_LANES)
+                placeholders = ', '.join('?' for _ in mapped_types)
                 row = db.fetchone(
                     "SELECT COUNT(*) as count FROM market_data_tasks "
-                    "WHERE status IN ('pending', 'running') AND task_type != 'vnpy_import'"
+                    f"WHERE status IN ('pending', 'running') AND task_type NOT IN ({placeholders})",
+                    mapped_types
                 )
-            return (row['count'] if row else 0) > 0
+        with self._cond:
+            limit = self._lane(lane).limit
+        return (row['count'] if row else 0) >= limit
 
     def _create_task(self, task_id: str, task_type: str, source: str):
         """Create task record."""
@@ -174,7 +523,12 @@ class TaskManager:
             )
 
     def cancel_task(self, task_id: str) -> bool:
-        """Cancel a pending or running task by marking it as cancelled."""
+        """Cancel a pending or running task by marking it as cancelled.
+
+        A queued task is dropped from its lane (and its dependents cancelled);
+        a running task gets its cancel event set and its child processes killed.
+        """
+        requested_at = time.monotonic()
         with self._get_db_connection() as db:
             row = db.fetchone(
                 "SELECT status FROM market_data_tasks WHERE task_id = ?",
@@ -186,7 +540,16 @@ class TaskManager:
                 "UPDATE market_data_tasks SET status = 'cancelled', finished_at = ? WHERE task_id = ?",
                 (datetime.utcnow().isoformat(), task_id)
             )
-            return True
+        with self._cond:
+            for lane in self._lanes.values():
+                for task in list(lane.queue):
+                    if task.task_id == task_id:
+                        lane.queue.remove(task)
+                        self._record_outcome(task_id, 'cancelled')
+            self._dispatch_locked()
+            self._cond.notify_all()
+        self._interrupt(task_id, requested_at)
+        return True
 
 
 # Global singleton
@@ -207,5 +570,6 @@ def get_task_manager() -> TaskManager:
         # Ensure SQLite parent directory exists before handing off to TaskManager
         if config.db_type == 'sqlite' and config.sqlite_path:
             config.sqlite_path.parent.mkdir(parents=True, exist_ok=True)
-        _task_manager = TaskManager(config.to_dict(), max_workers=1)
+        lane_limits = parse_lane_limits(os.environ.get('MARKET_DATA_LANE_LIMITS'))
+        _task_manager = TaskManager(config.to_dict(), lane_limits=lane_limits)
     return _task_manager
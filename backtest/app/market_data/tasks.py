@@ -1,289 +1,216 @@
 """Task functions for market data operations."""
-import re
 import subprocess
 import os
 from pathlib import Path
 
+from app.market_data.manifest import invalidate_bundle_manifest
+
 
 def do_incremental_update(task_id: str):
-    """Execute incremental update task."""
-    from app.market_data.task_manager import get_task_manager
-    from app.market_data.analyzer import analyze_bundle
+    """Execute incremental update task.
+
+    rqalpha update-bundle rewrites h5 files in place, so it runs against a
+    clone of the current version; the result becomes a new version and files
+    it did not change are hardlinked back to the base version.
+    """
+    from app.market_data.task_manager import TaskCancelled, get_task_manager
+    from app.market_data.bundle_store import get_bundle_store
+    import shutil
 
     tm = get_task_manager()
     bundle_path = Path(os.environ.get('RQALPHA_BUNDLE_PATH', '/data/rqalpha/bundle'))
-    db_config_dict = tm.db_config_dict
+    store = get_bundle_store(bundle_path)
+    lease_owner = f'update-{task_id}'
+    staging = None
 
     try:
         tm.log(task_id, 'INFO', '开始增量更新任务')
         tm.update_progress(task_id, 0, 'download', '开始增量更新...')
 
+        base_version = store.ensure_versioned()
+        if base_version is None:
+            raise RuntimeError(f'bundle 目录为空，请先执行全量下载: {bundle_path}')
+        store.acquire_lease(lease_owner, base_version)
+
+        # Writable snapshot of the current version; rqalpha writes to <dir>/bundle
+        staging = store.create_staging()
+        work_bundle = staging / 'bundle'
+        tm.update_progress(task_id, 5, 'download', f'准备快照 {base_version}...')
+        cloned = store.clone_version(base_version, work_bundle)
+        tm.log(task_id, 'INFO', f'已基于版本 {base_version} 创建快照（{cloned} 个文件）')
+
         # Execute rqalpha update-bundle
-        cmd = ['rqalpha', 'update-bundle']
+        cmd = ['rqalpha', 'update-bundle', '-d', str(staging)]
         env = os.environ.copy()
-        env['RQALPHA_BUNDLE_PATH'] = str(bundle_path)
+        env['RQALPHA_BUNDLE_PATH'] = str(work_bundle)
 
-        process = subprocess.Popen(
-            cmd, env=env,
+        # Own process group: cancelling the task kills rqalpha and its children
+        with tm.spawn_process(
+            task_id, cmd, env=env,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True
-        )
-
-        # Read output silently
-        for line in process.stdout:
-            if 'Downloading' in line:
-                tm.update_progress(task_id, 50, 'download', '正在下载更新...')
-
-        process.wait()
+        ) as process:
+            # Read output silently
+            for line in process.stdout:
+                if 'Downloading' in line:
+                    tm.update_progress(task_id, 50, 'download', '正在下载更新...')
+            process.wait()
 
         if process.returncode != 0:
             raise RuntimeError(f'rqalpha update-bundle 失败，退出码: {process.returncode}')
+        tm.check_cancelled(task_id)
+
+        linked, shared = store.link_unchanged(work_bundle, base_version)
+        tm.log(task_id, 'INFO', f'未变更文件 {linked} 个与上一版本共享存储（{shared / (1024*1024):.1f}MB）')
+        version = store.commit_staging(work_bundle, 'update')
+        store.activate(version)
+        invalidate_bundle_manifest(bundle_path)
+        tm.log(task_id, 'INFO', f'已切换到版本 {version}')
 
         tm.update_progress(task_id, 100, 'download', '增量更新完成')
         tm.log(task_id, 'INFO', '增量更新任务完成')
 
-        # Auto-trigger analysis
-        analyze_task_id = tm.submit_task('analyze', analyze_bundle,
-                                         task_args=(bundle_path, db_config_dict),
-                                         source='auto')
-        tm.log(task_id, 'INFO', f'已自动触发数据分析任务: {analyze_task_id}')
-
-    except Exception as e:
-        tm.log(task_id, 'ERROR', f'增量更新失败: {str(e)}')
+    except TaskCancelled:
+        tm.log(task_id, 'WARNING', '增量更新已取消，已终止 rqalpha 进程并丢弃快照')
         raise
-
     except Exception as e:
         tm.log(task_id, 'ERROR', f'增量更新失败: {str(e)}')
         raise
+    finally:
+        if staging is not None and staging.exists():
+            shutil.rmtree(staging, ignore_errors=True)
+        store.release_lease(lease_owner)
+        removed = store.collect_garbage()
+        if removed:
+            tm.log(task_id, 'INFO', f'已清理旧版本: {", ".join(removed)}')
 
 
 def do_full_download(task_id: str):
-    """Execute full download task using rqalpha download-bundle command."""
-    from app.market_data.task_manager import get_task_manager
-    from app.market_data.analyzer import analyze_bundle
-    import tempfile
+    """Execute full download task with the native ranged bundle downloader."""
+    from app.market_data.task_manager import TaskCancelled, get_task_manager
+    from app.market_data import downloader
+    from app.market_data.bundle_store import get_bundle_store
     import shutil
-    import threading
     import time
 
     tm = get_task_manager()
     bundle_path = Path(os.environ.get('RQALPHA_BUNDLE_PATH', '/data/rqalpha/bundle'))
-    db_config_dict = tm.db_config_dict
-    temp_dir = None
-    stop_monitoring = threading.Event()
-    download_url = None
-    total_bytes = 0
-
-    def _dir_size_bytes(path: Path) -> int:
-        """Calculate directory size in bytes."""
-        if not path.exists():
-            return 0
-        if path.is_file():
-            try:
-                return path.stat().st_size
-            except OSError:
-                return 0
-        total = 0
-        for root, _dirs, files in os.walk(path):
-            for name in files:
-                try:
-                    total += (Path(root) / name).stat().st_size
-                except OSError:
-                    continue
-        return total
-
-    def _get_bundle_info():
-        """Get bundle URL and total size from HTTP HEAD request."""
-        nonlocal download_url, total_bytes
-        import urllib.request
-        from datetime import datetime, timezone, timedelta
-
-        # Generate URL candidates
-        base = os.environ.get('RQALPHA_BUNDLE_URL_BASE',
-                             'http://bundle.assets.ricequant.com/bundles_v4').strip()
-        if not base:
-            return
-
-        # Use Beijing time (UTC+8) to determine the correct bundle month
-        beijing_tz = timezone(timedelta(hours=8))
-        now = datetime.now(beijing_tz)
-        year = now.year
-        month = now.month
-        candidates = []
-        for _ in range(12):
-            candidates.append(f"{base}/rqbundle_{year}{month:02d}.tar.bz2")
-            month -= 1
-            if month <= 0:
-                month = 12
-                year -= 1
-
-        # Try each URL
-        for url in candidates:
-            try:
-                request = urllib.request.Request(url, method='HEAD')
-                with urllib.request.urlopen(request, timeout=5) as response:
-                    length = response.headers.get('Content-Length')
-                if length:
-                    download_url = url
-                    total_bytes = int(length)
-                    tm.log(task_id, 'INFO', f'下载地址: {url}')
-                    tm.log(task_id, 'INFO', f'数据包大小: {total_bytes / (1024*1024):.1f}MB')
-                    return
-            except Exception:
-                continue
-
-    def monitor_progress():
-        """Monitor download progress in background thread."""
-        last_downloaded = 0
-        last_extracted = 0
-        download_complete = False
-        _m = re.search(r'rqbundle_\d+', download_url or '')
-        _bundle_prefix = (_m.group(0) + ': ') if _m else ''
-
-        while not stop_monitoring.is_set():
-            try:
-                # Check /tmp/rq.bundle for downloaded size
-                temp_bundle_download = Path('/tmp/rq.bundle')
-                downloaded_bytes = _dir_size_bytes(temp_bundle_download)
-
-                # Check temp_dir for extracted size
-                if temp_dir:
-                    temp_bundle = Path(temp_dir) / 'bundle'
-                    extracted_bytes = _dir_size_bytes(temp_bundle)
-                else:
-                    extracted_bytes = 0
-
-                # Determine current phase
-                if total_bytes > 0:
-                    if downloaded_bytes < total_bytes * 0.99:
-                        # Phase 1: Downloading
-                        if downloaded_bytes != last_downloaded:
-                            percent = (downloaded_bytes / total_bytes) * 100
-                            tm.update_progress(
-                                task_id, int(percent), '一、下载',
-                                f'{_bundle_prefix}{downloaded_bytes/(1024*1024):.1f}MB / {total_bytes/(1024*1024):.1f}MB ({percent:.1f}%)'
-                            )
-                            last_downloaded = downloaded_bytes
-                    elif not download_complete:
-                        # Download just completed
-                        download_complete = True
-                        tm.update_progress(task_id, 100, '一、下载', f'{_bundle_prefix}{total_bytes/(1024*1024):.1f}MB / {total_bytes/(1024*1024):.1f}MB (100.0%)')
-                        tm.log(task_id, 'INFO', '下载完成，开始解压')
-                        tm.update_progress(task_id, 90, '二、解压', '解压中: 0.0MB')
-                    elif extracted_bytes > 0:
-                        # Phase 2: Extracting
-                        if extracted_bytes != last_extracted:
-                            tm.update_progress(
-                                task_id, 90, '二、解压',
-                                f'解压中: {extracted_bytes/(1024*1024):.1f}MB'
-                            )
-                            last_extracted = extracted_bytes
-
-                time.sleep(2)  # Update every 2 seconds
-            except Exception:
-                time.sleep(2)
+    store = get_bundle_store(bundle_path)
+    download_dir = Path(os.environ.get('RQALPHA_BUNDLE_DOWNLOAD_DIR') or store.downloads_dir)
+    connections = int(os.environ.get('RQALPHA_BUNDLE_DOWNLOAD_CONNECTIONS', downloader.DEFAULT_CONNECTIONS))
+    staging = None
+    last_report = 0.0
 
     try:
         tm.log(task_id, 'INFO', '开始全量下载任务')
 
-        # Get bundle info first
+        # Probe all monthly candidates concurrently and take the newest available one
         tm.update_progress(task_id, 0, '准备', '准备下载环境...')
-        _get_bundle_info()
-        _m = re.search(r'rqbundle_\d+', download_url or '')
-        _bundle_name = _m.group(0) if _m else ''
-        if _bundle_name:
-            tm.update_progress(task_id, 0, '准备', f'准备下载 {_bundle_name}...')
-
-        # Use temporary directory for download
-        temp_dir = tempfile.mkdtemp(prefix='rqalpha-bundle-')
-
-        # Start progress monitoring thread
-        monitor_thread = threading.Thread(target=monitor_progress, daemon=True)
-        monitor_thread.start()
-
-        # Download to temporary directory
-        tm.log(task_id, 'INFO', '阶段一：开始下载数据包')
-        _start_msg = f'开始下载 {_bundle_name}...' if _bundle_name else '开始下载数据包...'
-        tm.update_progress(task_id, 0, '一、下载', _start_msg)
-
-        cmd = ['rqalpha', 'download-bundle', '-d', temp_dir]
-        env = os.environ.copy()
-
-        process = subprocess.Popen(
-            cmd, env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-
-        # Read output silently
-        for line in process.stdout:
-            pass
-
-        process.wait()
-
-        # Stop progress monitoring
-        stop_monitoring.set()
-        monitor_thread.join(timeout=5)
-
-        if process.returncode != 0:
-            raise RuntimeError(f'rqalpha download-bundle 失败，退出码: {process.returncode}')
-
-        tm.log(task_id, 'INFO', '阶段一：下载完成')
-
-        # Copy from temp directory to target bundle path
-        temp_bundle = Path(temp_dir) / 'bundle'
-
-        if not temp_bundle.exists():
-            raise RuntimeError(f'下载的 bundle 目录不存在: {temp_bundle}')
-
-        # Calculate total size to copy
-        total_copy_size = _dir_size_bytes(temp_bundle)
-        tm.update_progress(task_id, 100, '二、解压', f'解压完成: {total_copy_size/(1024*1024):.1f}MB')
-        tm.log(task_id, 'INFO', f'阶段二：解压完成，数据大小 {total_copy_size/(1024*1024):.1f}MB')
-
-        # Phase 3: Copy files to target
-        tm.log(task_id, 'INFO', '阶段三：开始复制文件到目标位置')
-        tm.update_progress(task_id, 98, '三、复制', '正在复制文件到目标位置...')
-
-        # Clear target directory contents
-        if bundle_path.exists():
-            for item in bundle_path.iterdir():
-                if item.is_dir():
-                    shutil.rmtree(item)
-                else:
-                    item.unlink()
-        else:
-            bundle_path.mkdir(parents=True, exist_ok=True)
-
-        # Copy files from temp to target
-        for item in temp_bundle.iterdir():
-            dest = bundle_path / item.name
-            if item.is_dir():
-                shutil.copytree(item, dest, dirs_exist_ok=True)
+        base = os.environ.get('RQALPHA_BUNDLE_URL_BASE', downloader.DEFAULT_URL_BASE)
+        source = downloader.probe_bundle_sources(downloader.bundle_url_candidates(base))
+        if source is None:
+            raise RuntimeError('未找到可用的数据包下载地址')
+        tm.log(task_id, 'INFO', f'下载地址: {source.url}')
+        tm.log(task_id, 'INFO', f'数据包大小: {source.size / (1024*1024):.1f}MB')
+        _bundle_prefix = f'{source.name}: ' if source.name else ''
+        tm.update_progress(task_id, 0, '准备', f'准备下载 {source.name or "数据包"}...')
+
+        # Partial downloads of other months can never be resumed
+        part_path = download_dir / f'{source.name or "rqbundle"}.tar.bz2.part'
+        if download_dir.exists():
+            for stale in download_dir.glob('*.part*'):
+                if not stale.name.startswith(part_path.name):
+                    stale.unlink(missing_ok=True)
+
+        # Extract next to the live bundle so the new version can be renamed into place
+        staging = store.create_staging()
+
+        def on_progress(downloaded: int, total: int, extracted: int):
+            nonlocal last_report
+            now = time.monotonic()
+            if now - last_report < 2 and downloaded < total:
+                return
+            last_report = now
+            if downloaded < total:
+                percent = downloaded / total * 100
+                tm.update_progress(
+                    task_id, int(percent), '一、下载',
+                    f'{_bundle_prefix}{downloaded/(1024*1024):.1f}MB / {total/(1024*1024):.1f}MB '
+                    f'({percent:.1f}%)，已解压 {extracted/(1024*1024):.1f}MB'
+                )
             else:
-                shutil.copy2(item, dest)
+                tm.update_progress(task_id, 90, '二、解压', f'解压中: {extracted/(1024*1024):.1f}MB')
+
+        # Phases 1 and 2 overlap: the archive is decompressed and untarred as bytes arrive
+        tm.log(task_id, 'INFO', f'阶段一：开始下载数据包（{connections} 个连接，边下载边解压）')
+        tm.update_progress(task_id, 0, '一、下载', f'开始下载 {source.name or "数据包"}...')
+        result = downloader.download_and_extract(
+            source, staging, part_path,
+            connections=connections, progress=on_progress, should_stop=lambda: tm.is_cancel_requested(task_id),
+        )
+        if result['resumed_bytes']:
+            tm.log(task_id, 'INFO', f'断点续传：复用已下载 {result["resumed_bytes"]/(1024*1024):.1f}MB')
+        tm.log(task_id, 'INFO', '阶段一：下载完成，' + ('MD5 校验通过' if result['verified'] else '大小校验通过'))
+
+        extracted_size = result['extracted_bytes']
+        tm.update_progress(task_id, 100, '二、解压', f'解压完成: {extracted_size/(1024*1024):.1f}MB')
+        tm.log(task_id, 'INFO', f'阶段二：解压完成，数据大小 {extracted_size/(1024*1024):.1f}MB')
+
+        # Phase 3: Switch the live bundle to the new version atomically
+        tm.check_cancelled(task_id)
+        tm.log(task_id, 'INFO', '阶段三：切换到新版本数据')
+        tm.update_progress(task_id, 98, '三、切换', '正在切换到新版本数据...')
+        version = store.commit_staging(staging, source.name)
+        staging = None
+        previous = store.activate(version)
+        invalidate_bundle_manifest(bundle_path)
+        tm.log(task_id, 'INFO', f'阶段三：已切换到版本 {version}' + (f'（原版本 {previous}）' if previous else ''))
+
+        removed = store.collect_garbage()
+        if removed:
+            tm.log(task_id, 'INFO', f'已清理旧版本: {", ".join(removed)}')
+        leased = {v: owners for v, owners in store.leased_versions().items() if v != version}
+        if leased:
+            tm.log(task_id, 'INFO', f'旧版本仍被运行中的任务使用，暂不清理: {", ".join(leased)}')
 
-        tm.log(task_id, 'INFO', '阶段三：复制完成')
         tm.update_progress(task_id, 100, '完成', '下载完成，准备分析数据...')
         tm.log(task_id, 'INFO', '全量下载任务完成')
 
-        # Auto-trigger analysis
-        analyze_task_id = tm.submit_task('analyze', analyze_bundle,
-                                         task_args=(bundle_path, db_config_dict),
-                                         source='auto')
-        tm.log(task_id, 'INFO', f'已自动触发数据分析任务: {analyze_task_id}')
-
+    except (downloader.DownloadCancelled, TaskCancelled):
+        tm.log(task_id, 'WARNING', '全量下载已取消，已下载部分保留用于断点续传')
+        raise
     except Exception as e:
-        stop_monitoring.set()
         tm.log(task_id, 'ERROR', f'全量下载失败: {str(e)}')
         raise
     finally:
-        # Clean up temporary directory
-        if temp_dir and Path(temp_dir).exists():
+        # Drop a half-extracted version; the partial archive is kept for resume
+        if staging is not None and staging.exists():
             try:
-                shutil.rmtree(temp_dir)
+                shutil.rmtree(staging)
             except Exception as e:
                 tm.log(task_id, 'WARNING', f'清理临时目录失败: {str(e)}')
+
+
+def submit_bundle_download(task_type: str, source: str = 'manual') -> str:
+    """Queue a bundle download (``full`` or ``incremental``) followed by an analysis.
+
+    The analysis is declared as a dependent task, so it starts as soon as the
+    download succeeds and is cancelled if the download fails.
+    """
+    from app.market_data.task_manager import get_task_manager
+    from app.market_data.analyzer import analyze_bundle
+
+    task_funcs = {'full': do_full_download, 'incremental': do_incremental_update}
+    if task_type not in task_funcs:
+        raise ValueError(f'Unknown task type: {task_type}')
+
+    tm = get_task_manager()
+    bundle_path = Path(os.environ.get('RQALPHA_BUNDLE_PATH', '/data/rqalpha/bundle'))
+    task_id = tm.submit_task(task_type, task_funcs[task_type], source=source)
+    analyze_task_id = tm.submit_task('analyze', analyze_bundle,
+                                     task_args=(bundle_path, tm.db_config_dict),
+                                     source='auto', depends_on=[task_id])
+    tm.log(task_id, 'INFO', f'下载完成后自动执行数据分析任务: {analyze_task_id}')
+    return task_id
+
@@ -22,16 +22,9 @@ def get_bundle_update_status(bundle_path: Path) -> Tuple[bool, Optional[str]]:
     Returns (True, message) if a local bundle exists; (False, None) otherwise.
     No CDN probing — the actual download will resolve the latest available package.
     """
-    if not bundle_path.exists():
-        return False, None
-
-    latest_mtime = None
-    for file_path in bundle_path.rglob('*'):
-        if file_path.is_file():
-            mtime = file_path.stat().st_mtime
-            if latest_mtime is None or mtime > latest_mtime:
-                latest_mtime = mtime
+    from app.market_data.manifest import get_bundle_manifest
 
+    latest_mtime = get_bundle_manifest(bundle_path).newest_mtime
     if latest_mtime is None:
         return False, None
 
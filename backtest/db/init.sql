@@ -90,6 +90,17 @@ CREATE TABLE IF NOT EXISTS market_data_files (
     INDEX idx_files_name (file_name)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+CREATE TABLE IF NOT EXISTS market_data_instrument_coverage (
+    source_file VARCHAR(100) NOT NULL,
+    order_book_id VARCHAR(64) NOT NULL,
+    first_date DATE NULL,
+    last_date DATE NULL,
+    bar_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_file, order_book_id),
+    INDEX idx_coverage_order_book_id (order_book_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 CREATE TABLE IF NOT EXISTS python_packages (
     package_name VARCHAR(255) PRIMARY KEY,
     version VARCHAR(100) NOT NULL,
@@ -147,8 +158,11 @@ ON DUPLICATE KEY UPDATE id=id;
 -- 5. VnPy Futures Bar Data (in backquant database)
 -- ============================================================================
 
+-- Clustered on the series key and partitioned by year (see
+-- app/market_data/bar_storage.py); yearly partitions are added ahead of the
+-- data by the importers. id is kept for vnpy's DbBarData model.
 CREATE TABLE IF NOT EXISTS dbbardata (
-    id int(11) NOT NULL AUTO_INCREMENT,
+    id BIGINT NOT NULL AUTO_INCREMENT,
     symbol varchar(255) NOT NULL,
     exchange varchar(255) NOT NULL,
     datetime datetime NOT NULL,
@@ -160,9 +174,43 @@ CREATE TABLE IF NOT EXISTS dbbardata (
     high_price double NOT NULL,
     low_price double NOT NULL,
     close_price double NOT NULL,
-    PRIMARY KEY (id),
-    UNIQUE KEY dbbardata_symbol_exchange_interval_datetime (symbol, exchange, `interval`, datetime),
-    KEY idx_dbbardata_exchange (exchange)
+    PRIMARY KEY (symbol, exchange, `interval`, datetime),
+    KEY idx_dbbardata_id (id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+PARTITION BY RANGE COLUMNS(datetime) (
+    PARTITION p2010 VALUES LESS THAN ('2011-01-01'),
+    PARTITION p2011 VALUES LESS THAN ('2012-01-01'),
+    PARTITION p2012 VALUES LESS THAN ('2013-01-01'),
+    PARTITION p2013 VALUES LESS THAN ('2014-01-01'),
+    PARTITION p2014 VALUES LESS THAN ('2015-01-01'),
+    PARTITION p2015 VALUES LESS THAN ('2016-01-01'),
+    PARTITION p2016 VALUES LESS THAN ('2017-01-01'),
+    PARTITION p2017 VALUES LESS THAN ('2018-01-01'),
+    PARTITION p2018 VALUES LESS THAN ('2019-01-01'),
+    PARTITION p2019 VALUES LESS THAN ('2020-01-01'),
+    PARTITION p2020 VALUES LESS THAN ('2021-01-01'),
+    PARTITION p2021 VALUES LESS THAN ('2022-01-01'),
+    PARTITION p2022 VALUES LESS THAN ('2023-01-01'),
+    PARTITION p2023 VALUES LESS THAN ('2024-01-01'),
+    PARTITION p2024 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p2025 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p2026 VALUES LESS THAN ('2027-01-01'),
+    PARTITION p2027 VALUES LESS THAN ('2028-01-01'),
+    PARTITION pmax VALUES LESS THAN (MAXVALUE)
+);
+
+-- Per-series summary of dbbardata, maintained by the importers and rolled up
+-- into vnpy_stats without scanning dbbardata
+CREATE TABLE IF NOT EXISTS vnpy_bar_summary (
+    symbol VARCHAR(255) NOT NULL,
+    exchange VARCHAR(255) NOT NULL,
+    `interval` VARCHAR(255) NOT NULL,
+    bar_count BIGINT NOT NULL DEFAULT 0,
+    first_datetime DATETIME NULL,
+    last_datetime DATETIME NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (symbol, exchange, `interval`),
+    INDEX idx_bar_summary_exchange (exchange)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- ============================================================================
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""Benchmark range scans and bulk loads on the legacy and managed dbbardata layouts.
+
+Range scan: samples random series from vnpy_bar_summary and reads one year of
+bars of each from every table in --tables (e.g. the migrated table and the
+`__layout_old` copy kept by migrate_dbbardata_layout.py), reporting the
+median/p95 latency and rows/s. Every table reads the same series and windows.
+
+Load: generates synthetic 1m bars, then times LOAD DATA LOCAL INFILE (the
+vnpy importer's path) and batched REPLACE (the resample path) into scratch
+tables created with the legacy and the managed DDL. Scratch tables are
+dropped afterwards.
+
+Usage:
+    # After migrating: compare the new table with the kept old one
+    python benchmark_dbbardata_layout.py --tables dbbardata,dbbardata__layout_old
+
+    # Before migrating: only the load benchmark, 2M rows
+    python benchmark_dbbardata_layout.py --tables "" --load-rows 2000000 --json before.json
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.market_data.bar_storage import bar_table_ddl  # noqa: E402
+
+# vnpy's default table: auto-increment clustered key, series key as a secondary index.
+LEGACY_DDL = """
+CREATE TABLE `{table}` (
+    id BIGINT NOT NULL AUTO_INCREMENT,
+    symbol VARCHAR(255) NOT NULL,
+    exchange VARCHAR(255) NOT NULL,
+    datetime DATETIME NOT NULL,
+    `interval` VARCHAR(255) NOT NULL,
+    volume DOUBLE NOT NULL,
+    turnover DOUBLE NOT NULL,
+    open_interest DOUBLE NOT NULL,
+    open_price DOUBLE NOT NULL,
+    high_price DOUBLE NOT NULL,
+    low_price DOUBLE NOT NULL,
+    close_price DOUBLE NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE KEY `{table}_symbol_exchange_interval_datetime` (symbol, exchange, `interval`, datetime),
+    KEY `idx_{table}_exchange` (exchange)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci
+"""
+
+LOAD_COLUMNS = ("symbol", "exchange", "datetime", "interval", "volume", "turnover", "open_interest",
+                "open_price", "high_price", "low_price", "close_price")
+
+RANGE_QUERY = (
+    "SELECT datetime, open_price, high_price, low_price, close_price, volume, turnover, open_interest "
+    "FROM `{table}` WHERE symbol = %s AND exchange = %s AND `interval` = %s "
+    "AND datetime >= %s AND datetime <= %s ORDER BY datetime"
+)
+
+
+def _get_conn(args: argparse.Namespace):
+    import pymysql
+
+    return pymysql.connect(
+        host=args.host,
+        port=args.port,
+        user=args.user,
+        password=args.password,
+        database=args.database,
+        charset="utf8mb4",
+        autocommit=True,
+        local_infile=True,
+    )
+
+
+def _p95(values: list[float]) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+
+def sample_series(cur, interval: str, count: int) -> list[tuple]:
+    cur.execute(
+        "SELECT symbol, exchange, last_datetime FROM vnpy_bar_summary "
+        "WHERE `interval` = %s AND bar_count > 0 ORDER BY RAND() LIMIT %s",
+        (interval, count),
+    )
+    return list(cur.fetchall())
+
+
+def bench_range_scans(cur, tables: list[str], series: list[tuple], interval: str,
+                      window_days: int) -> dict:
+    results = {}
+    for table in tables:
+        latencies, rows = [], 0
+        for symbol, exchange, last_dt in series:
+            start = last_dt - timedelta(days=window_days)
+            began = time.perf_counter()
+            cur.execute(RANGE_QUERY.format(table=table), (symbol, exchange, interval, start, last_dt))
+            rows += len(cur.fetchall())
+            latencies.append(time.perf_counter() - began)
+        total = sum(latencies)
+        results[table] = {
+            "queries": len(latencies),
+            "rows": rows,
+            "median_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(_p95(latencies) * 1000, 2),
+            "rows_per_s": round(rows / total) if total else 0,
+        }
+    return results
+
+
+def write_synthetic_csv(path: str, rows: int, series: int) -> int:
+    per_series = max(rows // series, 1)
+    base = datetime(2024, 1, 2, 9, 0)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        for s in range(series):
+            price = 3000.0 + s
+            for i in range(per_series):
+                dt = base + timedelta(minutes=i)
+                writer.writerow((f"BENCH{s:03d}", "BENCH", dt.strftime("%Y-%m-%d %H:%M:%S"), "1m",
+                                 100, 300000.0, 5000, price, price + 2, price - 2, price + 1))
+    return per_series * series
+
+
+def _timed(fn) -> float:
+    began = time.perf_counter()
+    fn()
+    return time.perf_counter() - began
+
+
+def bench_loads(conn, csv_path: str, rows: int, batch_size: int, compress: bool) -> dict:
+    layouts = {
+        "legacy": lambda t: LEGACY_DDL.format(table=t),
+        "managed": lambda t: bar_table_ddl(t, 2020, compressed=compress, if_not_exists=False),
+    }
+    with open(csv_path, newline="") as f:
+        batch_rows = [tuple(r) for r in csv.reader(f)]
+    cols = ", ".join(f"`{c}`" for c in LOAD_COLUMNS)
+    placeholders = ", ".join(["%s"] * len(LOAD_COLUMNS))
+
+    results = {}
+    with conn.cursor() as cur:
+        for name, ddl in layouts.items():
+            table = f"dbbardata__bench_{name}"
+            cur.execute(f"DROP TABLE IF EXISTS `{table}`")
+            cur.execute(ddl(table))
+            try:
+                load_s = _timed(lambda: cur.execute(
+                    f"LOAD DATA LOCAL INFILE %s INTO TABLE `{table}` CHARACTER SET utf8mb4 "
+                    f"FIELDS TERMINATED BY ',' LINES TERMINATED BY '\\n' ({cols})",
+                    (csv_path,),
+                ))
+                cur.execute(f"TRUNCATE TABLE `{table}`")
+
+                def replace_batches():
+                    for i in range(0, len(batch_rows), batch_size):
+                        cur.executemany(
+                            f"REPLACE INTO `{table}` ({cols}) VALUES ({placeholders})",
+                            batch_rows[i:i + batch_size],
+                        )
+
+                replace_s = _timed(replace_batches)
+            finally:
+                cur.execute(f"DROP TABLE IF EXISTS `{table}`")
+            results[name] = {
+                "rows": rows,
+                "load_data_s": round(load_s, 2),
+                "load_data_rows_per_s": round(rows / load_s) if load_s else 0,
+                "replace_s": round(replace_s, 2),
+                "replace_rows_per_s": round(rows / replace_s) if replace_s else 0,
+            }
+    return results
+
+
+def _print_table(title: str, results: dict) -> None:
+    print(f"\n{title}")
+    for name, stats in results.items():
+        print(f"  {name:32s} " + "  ".join(f"{k}={v}" for k, v in stats.items()))
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark dbbardata storage layouts.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--host", default=os.environ.get("DB_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("DB_PORT", "3306")))
+    parser.add_argument("--database", default=os.environ.get("DB_NAME", "backquant"))
+    parser.add_argument("--user", default=os.environ.get("DB_USER", "backquant_user"))
+    parser.add_argument("--password", default=os.environ.get("DB_PASSWORD", ""))
+    parser.add_argument("--tables", default=os.environ.get("DB_TABLE", "dbbardata"),
+                        help="Comma-separated tables to range-scan (empty to skip)")
+    parser.add_argument("--interval", default="1m", help="Bar interval of the sampled series")
+    parser.add_argument("--series", type=int, default=50, help="Series sampled for range scans")
+    parser.add_argument("--window-days", type=int, default=365, help="Days read per range scan")
+    parser.add_argument("--load-rows", type=int, default=500_000, help="Synthetic rows to load (0 to skip)")
+    parser.add_argument("--load-series", type=int, default=20, help="Series the synthetic rows span")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per REPLACE batch")
+    parser.add_argument("--compress", action="store_true", help="Load into a PAGE_COMPRESSED managed table")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+    results = {"range_scan": {}, "load": {}}
+
+    conn = _get_conn(args)
+    try:
+        if tables:
+            with conn.cursor() as cur:
+                series = sample_series(cur, args.interval, args.series)
+                if not series:
+                    print(f"No summarized {args.interval} series, skipping range scans")
+                else:
+                    # Warm each table once so the first table is not penalised for a cold buffer pool.
+                    bench_range_scans(cur, tables, series[:5], args.interval, args.window_days)
+                    results["range_scan"] = bench_range_scans(cur, tables, series, args.interval,
+                                                              args.window_days)
+                    _print_table(f"Range scan ({len(series)} series x {args.window_days} days of "
+                                 f"{args.interval})", results["range_scan"])
+
+        if args.load_rows > 0:
+            with tempfile.TemporaryDirectory(prefix="bar_bench_") as tmp:
+                csv_path = os.path.join(tmp, "bars.csv")
+                rows = write_synthetic_csv(csv_path, args.load_rows, args.load_series)
+                results["load"] = bench_loads(conn, csv_path, rows, args.batch_size, args.compress)
+            _print_table(f"Bulk load ({rows} rows)", results["load"])
+    finally:
+        conn.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Per-bar cost of recomputing indicators over a window vs updating them incrementally.
+
+"window" is the pattern of the built-in golden_cross_demo strategy: copy the
+last --window closes (what history_bars hands back) and run MACD over all of
+them on every bar. talib is used when it is installed, otherwise an
+equivalent numpy implementation. "incremental" feeds each bar once to the
+indicators of app/backtest/mods/indicators, and "rolling" compares a copied
+slice with the ring buffer view behind rolling_history_bars().
+
+Runs in-process on a synthetic price series; no bundle or rqalpha run needed.
+
+Usage:
+    python benchmark_indicators.py --bars 20000 --window 100
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.backtest.mods.indicators.indicators import ATR, MACD, RSI, SMA, RingBuffer  # noqa: E402
+
+try:
+    import talib
+except ImportError:  # pragma: no cover - optional
+    talib = None
+
+
+def _ema(values: np.ndarray, period: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if len(values) < period:
+        return out
+    out[period - 1] = values[:period].mean()
+    k = 2.0 / (period + 1)
+    for i in range(period, len(values)):
+        out[i] = out[i - 1] + k * (values[i] - out[i - 1])
+    return out
+
+
+def _numpy_macd(closes: np.ndarray, fast: int, slow: int, signal: int):
+    line = _ema(closes, fast) - _ema(closes, slow)
+    sig = np.full(len(line), np.nan)
+    sig[slow - 1:] = _ema(line[slow - 1:], signal)
+    return line, sig, line - sig
+
+
+def _bars(n: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    bars = np.zeros(n, dtype=[("high", "<f8"), ("low", "<f8"), ("close", "<f8")])
+    bars["close"] = 100 + np.cumsum(rng.normal(0, 1, n))
+    bars["high"] = bars["close"] + rng.uniform(0, 1, n)
+    bars["low"] = bars["close"] - rng.uniform(0, 1, n)
+    return bars
+
+
+def _per_bar_us(func, bars: np.ndarray, start: int) -> float:
+    began = time.perf_counter()
+    for i in range(start, len(bars)):
+        func(i)
+    return (time.perf_counter() - began) / (len(bars) - start) * 1e6
+
+
+def run(args: argparse.Namespace) -> dict:
+    bars = _bars(args.bars)
+    closes = bars["close"]
+    window = args.window
+    macd_window = talib.MACD if talib else _numpy_macd
+    results = {}
+
+    def window_macd(i):
+        prices = np.array(closes[i - window + 1:i + 1])
+        macd_window(prices, 12, 26, 9)
+
+    macd = MACD(12, 26, 9)
+    for i in range(window - 1):
+        macd.update(bars[i])
+    results["macd_window"] = _per_bar_us(window_macd, bars, window - 1)
+    results["macd_incremental"] = _per_bar_us(lambda i: macd.update(bars[i]), bars, window - 1)
+
+    indicators = [SMA(20), RSI(14), ATR(14)]
+    results["sma_rsi_atr_incremental"] = _per_bar_us(
+        lambda i: [ind.update(bars[i]) for ind in indicators], bars, 0)
+
+    ring = RingBuffer(window)
+    results["history_slice_copy"] = _per_bar_us(
+        lambda i: np.array(closes[max(i - window + 1, 0):i + 1]), bars, 0)
+    results["history_ring_view"] = _per_bar_us(lambda i: (ring.append(closes[i]), ring.view()), bars, 0)
+    return {k: round(v, 2) for k, v in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-bar cost of window recomputation vs incremental indicators.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--bars", type=int, default=20000, help="Bars in the synthetic series")
+    parser.add_argument("--window", type=int, default=100, help="history_bars window of the window pattern")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    print(f"MACD over the window computed with {'talib' if talib else 'numpy (talib not installed)'}")
+    results = run(args)
+    for name, us in results.items():
+        print(f"  {name:26s} {us:10.2f} us/bar")
+    print(f"  speedup (MACD)             {results['macd_window'] / results['macd_incremental']:10.1f}x")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
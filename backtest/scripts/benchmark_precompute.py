@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Wall time of a moving-average crossover strategy, event-driven vs precompute.
+
+Both strategies trade the same --symbols stocks over --start..--end:
+
+  plain       handle_bar calls history_bars(..., slow + 1, '1d', 'close') for
+              every symbol and recomputes both averages on every bar
+  precompute  precompute(context, data) computes the crossings of all symbols
+              once with NumPy (app/backtest/mods/precompute); handle_bar only
+              calls precomputed('cross', order_book_id)
+
+Each mode is one `rqalpha run` with the sys_analyser result written to a
+temporary file; the total return and the number of trades are printed next
+to the timings so that the two modes can be checked against each other.
+
+Usage:
+    python benchmark_precompute.py --bundle /data/rqalpha/bundle --symbols 300 \
+        --start 2018-01-01 --end 2023-12-31
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.market_data.bundle_store import get_bundle_store  # noqa: E402
+
+_COMMON = """\
+from rqalpha.apis import *
+
+FAST, SLOW = {fast}, {slow}
+
+def init(context):
+    context.stocks = [i.order_book_id for i in all_instruments("CS").itertuples()][:{symbols}]
+    context.weight = 1.0 / max(len(context.stocks), 1)
+
+def _trade(context, order_book_id, cross):
+    if cross > 0:
+        order_target_percent(order_book_id, context.weight)
+    elif cross < 0 and context.portfolio.positions[order_book_id].quantity > 0:
+        order_target_percent(order_book_id, 0)
+"""
+
+STRATEGIES = {
+    "plain": """
+import numpy as np
+
+def handle_bar(context, bar_dict):
+    for order_book_id in context.stocks:
+        close = history_bars(order_book_id, SLOW + 1, "1d", "close")
+        if close is None or len(close) < SLOW + 1:
+            continue
+        now = close[-FAST:].mean() - close[-SLOW:].mean()
+        before = close[-FAST - 1:-1].mean() - close[-SLOW - 1:-1].mean()
+        _trade(context, order_book_id, np.sign(now) - np.sign(before) if now * before <= 0 else 0)
+""",
+    "precompute": """
+import numpy as np
+
+def _mean(close, n):
+    csum = np.cumsum(np.nan_to_num(close), axis=0)
+    out = np.full(close.shape, np.nan)
+    out[n - 1:] = csum[n - 1:]
+    out[n:] -= csum[:-n]
+    return out / n
+
+def precompute(context, data):
+    close = data.prices(context.stocks)
+    diff = _mean(close, FAST) - _mean(close, SLOW)
+    # like len(history_bars(...)) < SLOW + 1 in the plain version: no signal before SLOW bars exist
+    diff[np.cumsum(~np.isnan(close), axis=0) < SLOW] = np.nan
+    cross = np.zeros(diff.shape)
+    before = diff[:-1]
+    now = diff[1:]
+    cross[1:] = np.where(now * before <= 0, np.sign(now) - np.sign(before), 0)
+    cross[np.isnan(cross)] = 0
+    return {"cross": {order_book_id: cross[:, i] for i, order_book_id in enumerate(context.stocks)}}
+
+def handle_bar(context, bar_dict):
+    for order_book_id in context.stocks:
+        cross = precomputed("cross", order_book_id)
+        if cross:
+            _trade(context, order_book_id, cross)
+""",
+}
+
+
+def _config(bundle_path: Path, result_file: Path, args: argparse.Namespace, mode: str) -> dict:
+    config = {
+        "version": "0.1.6",
+        "whitelist": ["base", "extra", "validator", "mod"],
+        "base": {
+            "start_date": args.start,
+            "end_date": args.end,
+            "frequency": "1d",
+            "data_bundle_path": str(bundle_path),
+            "benchmark": None,
+            "accounts": {"STOCK": 10_000_000},
+        },
+        "extra": {"log_level": "error"},
+        "mod": {
+            "sys_analyser": {"enabled": True, "plot": False, "output_file": str(result_file)},
+            "sys_progress": {"enabled": False},
+        },
+    }
+    if mode == "precompute":
+        config["mod"]["precompute"] = {
+            "enabled": True,
+            "lib": "app.backtest.mods.precompute",
+            "lookback_days": args.slow + 1,
+        }
+    return config
+
+
+def run_mode(mode: str, bundle_path: Path, args: argparse.Namespace) -> dict:
+    import yaml
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    with tempfile.TemporaryDirectory(prefix=f"precompute_{mode}_") as tmp:
+        job_dir = Path(tmp)
+        result_file = job_dir / "result.pkl"
+        strategy = _COMMON.format(fast=args.fast, slow=args.slow, symbols=args.symbols) + STRATEGIES[mode]
+        (job_dir / "strategy.py").write_text(strategy, encoding="utf-8")
+        (job_dir / "config.yml").write_text(
+            yaml.safe_dump(_config(bundle_path, result_file, args, mode)), encoding="utf-8"
+        )
+        started = time.monotonic()
+        completed = subprocess.run(
+            [sys.executable, "-m", "rqalpha", "run", "-f", "strategy.py", "--config", "config.yml"],
+            cwd=job_dir, env=env, capture_output=True, text=True,
+        )
+        elapsed = time.monotonic() - started
+        if completed.returncode != 0 or not result_file.exists():
+            raise SystemExit(f"[{mode}] rqalpha run failed:\n{(completed.stdout + completed.stderr)[-3000:]}")
+        with open(result_file, "rb") as f:
+            result = pickle.load(f)
+
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total_returns": round(float(result["summary"]["total_returns"]), 6),
+        "trades": len(result.get("trades", [])),
+    }
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Event-driven vs precompute wall time of a crossover strategy.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--bundle", default=os.environ.get("RQALPHA_BUNDLE_PATH", "/data/rqalpha/bundle"))
+    parser.add_argument("--symbols", type=int, default=300, help="Number of stocks traded")
+    parser.add_argument("--start", default="2018-01-01")
+    parser.add_argument("--end", default="2023-12-31")
+    parser.add_argument("--fast", type=int, default=5)
+    parser.add_argument("--slow", type=int, default=20)
+    parser.add_argument("--modes", default="plain,precompute", help="Comma-separated: plain, precompute")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    bundle_root = Path(args.bundle).expanduser()
+    store = get_bundle_store(bundle_root)
+    version = store.current_version()
+    bundle_path = store.version_path(version) if version else bundle_root
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+
+    results = {}
+    for mode in modes:
+        print(f"Running {mode} ({args.symbols} symbols, {args.start} .. {args.end}) ...")
+        results[mode] = run_mode(mode, bundle_path, args)
+
+    print()
+    for mode, stats in results.items():
+        print(f"  {mode:10s} " + "  ".join(f"{k}={v}" for k, v in stats.items()))
+    if "plain" in results and "precompute" in results:
+        print(f"  speedup    {results['plain']['elapsed_s'] / results['precompute']['elapsed_s']:.1f}x")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
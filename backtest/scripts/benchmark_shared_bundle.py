@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Measure memory of N concurrent rqalpha jobs with and without the shared bar cache.
+
+Each mode starts --jobs identical `rqalpha run` processes at once and samples
+/proc/<pid>/smaps_rollup of every job until all have exited:
+
+  RSS  resident pages of one job, shared pages counted in full
+  PSS  resident pages with each shared page split between the processes mapping it
+
+"hdf5" is rqalpha's default data source, "shared" enables the shared_bundle
+mod (app/backtest/mods/shared_bundle), which maps day bars from
+<bundle>/.columnar. Total PSS is what N concurrent jobs actually cost; with
+the shared mod the bar pages are counted once across all jobs. Linux only.
+
+Usage:
+    python benchmark_shared_bundle.py --bundle /data/rqalpha/bundle --jobs 8 \
+        --start 2020-01-01 --end 2023-12-31
+
+    # Custom strategy, only the shared mode
+    python benchmark_shared_bundle.py --strategy my_strategy.py --modes shared
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.market_data.bundle_store import get_bundle_store  # noqa: E402
+from app.market_data.columnar import build_columnar_cache, cache_root  # noqa: E402
+
+# Reads a year of daily history of a few hundred stocks every bar, so every job
+# touches the same large set of instruments.
+DEFAULT_STRATEGY = textwrap.dedent(
+    """\
+    from rqalpha.apis import *
+
+    def init(context):
+        context.universe = [i.order_book_id for i in all_instruments("CS").itertuples()][:300]
+
+    def handle_bar(context, bar_dict):
+        for order_book_id in context.universe:
+            history_bars(order_book_id, 250, "1d", "close")
+    """
+)
+
+DAY_BAR_FILES = ("stocks.h5", "indexes.h5", "futures.h5", "funds.h5")
+
+
+def _config(bundle_path: Path, args: argparse.Namespace, shared: bool) -> dict:
+    config = {
+        "version": "0.1.6",
+        "whitelist": ["base", "extra", "validator", "mod"],
+        "base": {
+            "start_date": args.start,
+            "end_date": args.end,
+            "frequency": "1d",
+            "data_bundle_path": str(bundle_path),
+            "benchmark": None,
+            "accounts": {"STOCK": 1_000_000},
+        },
+        "extra": {"log_level": "error"},
+        "mod": {"sys_analyser": {"enabled": False}, "sys_progress": {"enabled": False}},
+    }
+    if shared:
+        config["mod"]["shared_bundle"] = {
+            "enabled": True,
+            "lib": "app.backtest.mods.shared_bundle",
+            "cache_root": str(cache_root(Path(args.bundle))),
+        }
+    return config
+
+
+def _memory_kb(pid: int) -> tuple[int, int] | None:
+    """(RSS, PSS) of a process in kB, or None once it has exited."""
+    try:
+        text = Path(f"/proc/{pid}/smaps_rollup").read_text()
+    except OSError:
+        return None
+    values = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0] in ("Rss:", "Pss:"):
+            values[parts[0]] = int(parts[1])
+    return values.get("Rss:", 0), values.get("Pss:", 0)
+
+
+def run_mode(name: str, bundle_path: Path, strategy: Path, args: argparse.Namespace) -> dict:
+    import yaml
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    procs = []
+    with tempfile.TemporaryDirectory(prefix=f"shared_bundle_{name}_") as tmp:
+        for i in range(args.jobs):
+            job_dir = Path(tmp) / f"job{i}"
+            job_dir.mkdir()
+            (job_dir / "config.yml").write_text(
+                yaml.safe_dump(_config(bundle_path, args, shared=(name == "shared"))), encoding="utf-8"
+            )
+            log = open(job_dir / "run.log", "w")
+            procs.append((subprocess.Popen(
+                [sys.executable, "-m", "rqalpha", "run", "-f", str(strategy), "--config", "config.yml"],
+                cwd=job_dir, env=env, stdout=log, stderr=subprocess.STDOUT,
+            ), log, job_dir))
+
+        started = time.monotonic()
+        peak_rss = [0] * len(procs)
+        peak_pss = [0] * len(procs)
+        peak_total_rss = peak_total_pss = 0
+        while any(proc.poll() is None for proc, _log, _dir in procs):
+            total_rss = total_pss = 0
+            for i, (proc, _log, _dir) in enumerate(procs):
+                sample = _memory_kb(proc.pid) if proc.poll() is None else None
+                if sample is None:
+                    continue
+                rss, pss = sample
+                peak_rss[i] = max(peak_rss[i], rss)
+                peak_pss[i] = max(peak_pss[i], pss)
+                total_rss += rss
+                total_pss += pss
+            peak_total_rss = max(peak_total_rss, total_rss)
+            peak_total_pss = max(peak_total_pss, total_pss)
+            time.sleep(args.interval)
+        elapsed = time.monotonic() - started
+
+        failed = []
+        for proc, log, job_dir in procs:
+            log.close()
+            if proc.returncode != 0:
+                failed.append((job_dir / "run.log").read_text(encoding="utf-8", errors="replace")[-2000:])
+
+    if failed:
+        print(f"[{name}] {len(failed)} job(s) failed, last log:\n{failed[-1]}")
+    mb = 1024.0
+    return {
+        "jobs": args.jobs,
+        "failed": len(failed),
+        "elapsed_s": round(elapsed, 1),
+        "rss_per_job_mb": round(max(peak_rss) / mb, 1),
+        "pss_per_job_mb": round(max(peak_pss) / mb, 1),
+        "total_rss_mb": round(peak_total_rss / mb, 1),
+        "total_pss_mb": round(peak_total_pss / mb, 1),
+    }
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Memory of concurrent rqalpha jobs with and without the shared bar cache.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--bundle", default=os.environ.get("RQALPHA_BUNDLE_PATH", "/data/rqalpha/bundle"))
+    parser.add_argument("--strategy", default=None, help="Strategy file (default: built-in history reader)")
+    parser.add_argument("--jobs", type=int, default=8, help="Concurrent jobs per mode")
+    parser.add_argument("--start", default="2022-01-01")
+    parser.add_argument("--end", default="2022-12-31")
+    parser.add_argument("--modes", default="hdf5,shared", help="Comma-separated: hdf5, shared")
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between memory samples")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    return parser.parse_args()
+
+
+def main():
+    if not Path("/proc/self/smaps_rollup").exists():
+        raise SystemExit("ERROR: /proc/<pid>/smaps_rollup is required (Linux 4.14+)")
+    args = _parse_args()
+    bundle_root = Path(args.bundle).expanduser()
+    store = get_bundle_store(bundle_root)
+    version = store.current_version()
+    bundle_path = store.version_path(version) if version else bundle_root
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+
+    if "shared" in modes:
+        sources = [name for name in DAY_BAR_FILES if (bundle_root / name).exists()]
+        built = build_columnar_cache(bundle_root, sources)
+        for result in built:
+            print(f"Built cache for {result['source']}: {result['rows']} rows")
+
+    with tempfile.TemporaryDirectory(prefix="shared_bundle_strategy_") as tmp:
+        strategy = Path(args.strategy).resolve() if args.strategy else Path(tmp) / "strategy.py"
+        if not args.strategy:
+            strategy.write_text(DEFAULT_STRATEGY, encoding="utf-8")
+        results = {}
+        for mode in modes:
+            print(f"Running {args.jobs} concurrent jobs ({mode}) ...")
+            results[mode] = run_mode(mode, bundle_path, strategy, args)
+
+    print()
+    for mode, stats in results.items():
+        print(f"  {mode:8s} " + "  ".join(f"{k}={v}" for k, v in stats.items()))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Run the built-in demo strategies with rqalpha and with engine=vector, and compare.
+
+For each strategy the built-in code (runner._BUILTIN_STRATEGIES) is run with
+`rqalpha run`, and an equivalent vector_targets(data) version is run with
+app.backtest.services.vector over the same bundle, dates and cash:
+
+  demo               order_percent(1.0) on 000001.XSHE while flat
+  golden_cross_demo  MACD(12, 26, 9) over the last 100 closes, all-in on a
+                     cross above the signal line, flat on a cross below; the
+                     vector version computes the MACD of every 100-bar window
+                     at once, seeded like talib
+
+Printed per strategy: total return, number of trades, the largest difference
+of the daily unit net values and whether the trades (day, side, quantity)
+are identical. golden_cross_demo needs talib for the rqalpha side.
+
+Usage:
+    python crosscheck_vector_engine.py --bundle /data/rqalpha/bundle \
+        --start 2018-01-01 --end 2023-12-31
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.backtest.services import vector  # noqa: E402
+from app.backtest.services.runner import _BUILTIN_STRATEGIES  # noqa: E402
+from app.market_data.bundle_store import get_bundle_store  # noqa: E402
+
+VECTOR_STRATEGIES = {
+    "demo": """
+import numpy as np
+
+def vector_targets(data):
+    close = data.prices("000001.XSHE")
+    weights = np.full(len(close), np.nan)
+    tradable = data.start + np.flatnonzero(~np.isnan(close[data.start:]))
+    if len(tradable):
+        weights[tradable[0]] = 1.0
+    return {"000001.XSHE": weights}
+""",
+    "golden_cross_demo": """
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+SHORTPERIOD, LONGPERIOD, SMOOTHPERIOD, OBSERVATION = 12, 26, 9, 100
+
+def _ema(windows, period, seed_at):
+    out = np.full(windows.shape, np.nan)
+    out[:, seed_at] = windows[:, seed_at - period + 1:seed_at + 1].mean(axis=1)
+    k = 2.0 / (period + 1)
+    for i in range(seed_at + 1, windows.shape[1]):
+        out[:, i] = out[:, i - 1] + k * (windows[:, i] - out[:, i - 1])
+    return out
+
+def vector_targets(data):
+    close = data.prices("000001.XSHE")
+    weights = np.full(len(close), np.nan)
+    if len(close) < OBSERVATION:
+        return {"000001.XSHE": weights}
+    windows = sliding_window_view(close, OBSERVATION)
+    macd = _ema(windows, SHORTPERIOD, LONGPERIOD - 1) - _ema(windows, LONGPERIOD, LONGPERIOD - 1)
+    signal = _ema(macd, SMOOTHPERIOD, LONGPERIOD + SMOOTHPERIOD - 2)
+    now, before = (macd - signal)[:, -1], (macd - signal)[:, -2]
+    rows = np.arange(OBSERVATION - 1, len(close))
+    weights[rows[(now < 0) & (before > 0)]] = 0.0
+    weights[rows[(now > 0) & (before < 0)]] = 1.0
+    return {"000001.XSHE": weights}
+""",
+}
+
+
+def _config(bundle_path: Path, result_file: Path, args: argparse.Namespace) -> dict:
+    return {
+        "version": "0.1.6",
+        "whitelist": ["base", "extra", "validator", "mod"],
+        "base": {
+            "start_date": args.start,
+            "end_date": args.end,
+            "frequency": "1d",
+            "data_bundle_path": str(bundle_path),
+            "benchmark": None,
+            "accounts": {"STOCK": args.cash},
+        },
+        "extra": {"log_level": "error"},
+        "mod": {
+            "sys_analyser": {"enabled": True, "plot": False, "output_file": str(result_file)},
+            "sys_progress": {"enabled": False},
+        },
+        "vector": {"lookback_days": 250},
+    }
+
+
+def _trades(result) -> list:
+    trades = result.get("trades")
+    if trades is None or len(trades) == 0:
+        return []
+    return [
+        (str(row["trading_datetime"])[:10], row["side"], int(row["last_quantity"]))
+        for _, row in trades.iterrows()
+    ]
+
+
+def _run_rqalpha(name: str, job_dir: Path, config: dict) -> tuple:
+    import yaml
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get("PYTHONPATH")]))
+    (job_dir / "strategy.py").write_text(_BUILTIN_STRATEGIES[name], encoding="utf-8")
+    rq_config = {key: value for key, value in config.items() if key != "vector"}
+    (job_dir / "config.yml").write_text(yaml.safe_dump(rq_config), encoding="utf-8")
+    started = time.monotonic()
+    completed = subprocess.run(
+        [sys.executable, "-m", "rqalpha", "run", "-f", "strategy.py", "--config", "config.yml"],
+        cwd=job_dir, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.monotonic() - started
+    result_file = Path(config["mod"]["sys_analyser"]["output_file"])
+    if completed.returncode != 0 or not result_file.exists():
+        raise SystemExit(f"[{name}] rqalpha run failed:\n{(completed.stdout + completed.stderr)[-3000:]}")
+    with open(result_file, "rb") as f:
+        return pickle.load(f), elapsed
+
+
+def crosscheck(name: str, bundle_path: Path, args: argparse.Namespace) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"crosscheck_{name}_") as tmp:
+        job_dir = Path(tmp)
+        config = _config(bundle_path, job_dir / "result.pkl", args)
+        rq_result, rq_elapsed = _run_rqalpha(name, job_dir, config)
+
+        strategy_file = job_dir / "vector_strategy.py"
+        strategy_file.write_text(VECTOR_STRATEGIES[name], encoding="utf-8")
+        config["mod"]["sys_analyser"]["output_file"] = None
+        started = time.monotonic()
+        vec_result = vector.run_file(strategy_file, config)
+        vec_elapsed = time.monotonic() - started
+
+    rq_nav = rq_result["portfolio"]["unit_net_value"]
+    vec_nav = vec_result["portfolio"]["unit_net_value"].reindex(rq_nav.index)
+    return {
+        "rqalpha_total_returns": round(float(rq_result["summary"]["total_returns"]), 6),
+        "vector_total_returns": round(float(vec_result["summary"]["total_returns"]), 6),
+        "rqalpha_trades": len(_trades(rq_result)),
+        "vector_trades": len(_trades(vec_result)),
+        "trades_identical": _trades(rq_result) == _trades(vec_result),
+        "max_nav_diff": float((rq_nav - vec_nav).abs().max()),
+        "rqalpha_s": round(rq_elapsed, 2),
+        "vector_s": round(vec_elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cross-check engine=vector against rqalpha on the built-in demo strategies.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--bundle", default=os.environ.get("RQALPHA_BUNDLE_PATH", "/data/rqalpha/bundle"))
+    parser.add_argument("--start", default="2018-01-01")
+    parser.add_argument("--end", default="2023-12-31")
+    parser.add_argument("--cash", type=float, default=100000)
+    parser.add_argument("--strategies", default=",".join(VECTOR_STRATEGIES), help="Comma-separated demo ids")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    bundle_root = Path(args.bundle).expanduser()
+    store = get_bundle_store(bundle_root)
+    version = store.current_version()
+    bundle_path = store.version_path(version) if version else bundle_root
+
+    results = {}
+    for name in [s.strip() for s in args.strategies.split(",") if s.strip()]:
+        print(f"Running {name} ({args.start} .. {args.end}) ...")
+        results[name] = crosscheck(name, bundle_path, args)
+
+    print()
+    for name, stats in results.items():
+        print(f"  {name:18s} " + "  ".join(f"{k}={v}" for k, v in stats.items()))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if not all(stats["trades_identical"] for stats in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""Convert dbbardata to the managed storage layout online.
+
+The managed layout (app/market_data/bar_storage.py) clusters bars on
+(symbol, exchange, interval, datetime), partitions them by year and can
+enable page compression. The conversion keeps the table readable and
+writable throughout:
+
+  1. create `<table>__layout_new` in the managed layout;
+  2. add triggers on <table> that mirror every insert/update/delete into it;
+  3. copy the existing rows in id-ordered chunks (INSERT IGNORE, so rows the
+     triggers already mirrored are left alone);
+  4. compare row counts, then atomically
+     RENAME <table> TO <table>__layout_old, <table>__layout_new TO <table>
+     and drop the triggers.
+
+The old table is kept as `<table>__layout_old` unless --drop-old is given.
+Requires the TRIGGER privilege.
+
+Usage:
+    # Print the plan and the new table DDL
+    python migrate_dbbardata_layout.py --dry-run
+
+    # Convert with page compression, 100k rows per chunk, 0.2s pause between chunks
+    python migrate_dbbardata_layout.py --compress --chunk-size 100000 --sleep 0.2
+
+    # Continue an interrupted copy from the last id printed
+    python migrate_dbbardata_layout.py --resume-from 123456789
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.market_data.bar_storage import BAR_COLUMNS, FIRST_PARTITION_YEAR, bar_table_ddl  # noqa: E402
+
+NEW_SUFFIX = "__layout_new"
+OLD_SUFFIX = "__layout_old"
+KEY_COLUMNS = ("symbol", "exchange", "interval", "datetime")
+
+
+def _q(name: str) -> str:
+    return f"`{name}`"
+
+
+def _trigger_names(table: str) -> dict[str, str]:
+    return {event: f"{table}__layout_{event.lower()}" for event in ("INSERT", "UPDATE", "DELETE")}
+
+
+def _trigger_sql(table: str, new_table: str) -> list[str]:
+    cols = ", ".join(_q(c) for c in BAR_COLUMNS)
+    new_values = ", ".join(f"NEW.{_q(c)}" for c in BAR_COLUMNS)
+    old_key = " AND ".join(f"{_q(c)} = OLD.{_q(c)}" for c in KEY_COLUMNS)
+    names = _trigger_names(table)
+    replace = f"REPLACE INTO {_q(new_table)} ({cols}) VALUES ({new_values})"
+    delete = f"DELETE FROM {_q(new_table)} WHERE {old_key}"
+    return [
+        f"CREATE TRIGGER {_q(names['INSERT'])} AFTER INSERT ON {_q(table)} FOR EACH ROW {replace}",
+        f"CREATE TRIGGER {_q(names['UPDATE'])} AFTER UPDATE ON {_q(table)} FOR EACH ROW "
+        f"BEGIN {delete}; {replace}; END",
+        f"CREATE TRIGGER {_q(names['DELETE'])} AFTER DELETE ON {_q(table)} FOR EACH ROW {delete}",
+    ]
+
+
+def _table_exists(cur, table: str) -> bool:
+    cur.execute(
+        "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,),
+    )
+    return cur.fetchone() is not None
+
+
+def _primary_key(cur, table: str) -> list[str]:
+    cur.execute(
+        "SELECT COLUMN_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = 'PRIMARY' "
+        "ORDER BY SEQ_IN_INDEX",
+        (table,),
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def _year_range(cur, table: str, first_year: int | None) -> tuple[int, int]:
+    """Partition years to create; bar time range comes from the bar summary when available."""
+    last_year = time.localtime().tm_year + 1
+    if first_year:
+        return first_year, last_year
+    low = None
+    if _table_exists(cur, "vnpy_bar_summary"):
+        cur.execute("SELECT MIN(first_datetime) FROM vnpy_bar_summary")
+        low = cur.fetchone()[0]
+    if low is None:
+        print("  vnpy_bar_summary is empty, scanning for the oldest bar ...")
+        cur.execute(f"SELECT MIN(datetime) FROM {_q(table)}")
+        low = cur.fetchone()[0]
+    first = max(low.year, FIRST_PARTITION_YEAR) if low is not None else FIRST_PARTITION_YEAR
+    return first, last_year
+
+
+def _get_conn(args: argparse.Namespace):
+    import pymysql
+
+    return pymysql.connect(
+        host=args.host,
+        port=args.port,
+        user=args.user,
+        password=args.password,
+        database=args.database,
+        charset="utf8mb4",
+        autocommit=True,
+    )
+
+
+def _copy_chunks(cur, table: str, new_table: str, start_id: int, max_id: int,
+                 chunk_size: int, sleep: float) -> int:
+    cols = ", ".join(_q(c) for c in BAR_COLUMNS)
+    copied = 0
+    started = time.monotonic()
+    low = start_id
+    while low <= max_id:
+        high = low + chunk_size
+        cur.execute(
+            f"INSERT IGNORE INTO {_q(new_table)} ({cols}) "
+            f"SELECT {cols} FROM {_q(table)} WHERE id >= %s AND id < %s",
+            (low, high),
+        )
+        copied += cur.rowcount or 0
+        elapsed = max(time.monotonic() - started, 1e-6)
+        done = min(high, max_id + 1) - start_id
+        total = max_id + 1 - start_id
+        print(f"  copied ids < {high} ({done * 100 / max(total, 1):.1f}%), "
+              f"rows={copied}, {copied / elapsed:,.0f} rows/s")
+        low = high
+        if sleep:
+            time.sleep(sleep)
+    return copied
+
+
+def migrate(args: argparse.Namespace) -> None:
+    table = args.table
+    new_table = table + NEW_SUFFIX
+    old_table = table + OLD_SUFFIX
+
+    conn = _get_conn(args)
+    try:
+        with conn.cursor() as cur:
+            if not _table_exists(cur, table):
+                raise SystemExit(f"ERROR: table `{table}` does not exist")
+            if _primary_key(cur, table) == list(KEY_COLUMNS):
+                print(f"`{table}` already uses the managed layout, nothing to do")
+                return
+
+            first_year, last_year = _year_range(cur, table, args.first_year)
+            ddl = bar_table_ddl(new_table, first_year, last_year, compressed=args.compress)
+            cur.execute(f"SELECT MIN(id), MAX(id) FROM {_q(table)}")
+            min_id, max_id = cur.fetchone()
+            print(f"  source ids      : {min_id} .. {max_id}")
+            print(f"  partitions      : p{first_year} .. p{last_year} + pmax")
+            print(f"  page compression: {'on' if args.compress else 'off'}")
+
+            if args.dry_run:
+                print("\n" + ddl + ";\n")
+                for sql in _trigger_sql(table, new_table):
+                    print(sql + ";")
+                return
+
+            if _table_exists(cur, new_table):
+                if args.resume_from is None:
+                    raise SystemExit(
+                        f"ERROR: `{new_table}` already exists; pass --resume-from <id> to continue "
+                        f"an interrupted copy, or drop it to start over"
+                    )
+            else:
+                print(f"Creating `{new_table}` ...")
+                cur.execute(ddl)
+
+            cur.execute(
+                "SELECT TRIGGER_NAME FROM information_schema.TRIGGERS "
+                "WHERE TRIGGER_SCHEMA = DATABASE() AND EVENT_OBJECT_TABLE = %s",
+                (table,),
+            )
+            existing = {row[0] for row in cur.fetchall()}
+            for name, sql in zip(_trigger_names(table).values(), _trigger_sql(table, new_table)):
+                if name not in existing:
+                    cur.execute(sql)
+            print("Mirroring writes through triggers")
+
+            if min_id is not None:
+                start_id = args.resume_from if args.resume_from is not None else min_id
+                print(f"Copying rows in chunks of {args.chunk_size} ids ...")
+                _copy_chunks(cur, table, new_table, start_id, max_id, args.chunk_size, args.sleep)
+
+            cur.execute(f"SELECT COUNT(*) FROM {_q(table)}")
+            source_rows = cur.fetchone()[0]
+            cur.execute(f"SELECT COUNT(*) FROM {_q(new_table)}")
+            new_rows = cur.fetchone()[0]
+            print(f"Row counts: `{table}`={source_rows}, `{new_table}`={new_rows}")
+            if source_rows != new_rows:
+                raise SystemExit("ERROR: row counts differ; triggers are left in place, re-run with --resume-from")
+
+            print("Swapping tables ...")
+            cur.execute(f"RENAME TABLE {_q(table)} TO {_q(old_table)}, {_q(new_table)} TO {_q(table)}")
+            for name in _trigger_names(table).values():
+                cur.execute(f"DROP TRIGGER IF EXISTS {_q(name)}")
+            if args.drop_old:
+                cur.execute(f"DROP TABLE {_q(old_table)}")
+                print(f"Dropped `{old_table}`")
+            else:
+                print(f"Previous table kept as `{old_table}`")
+            print("Migration finished")
+    finally:
+        conn.close()
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Convert dbbardata to the partitioned, clustered storage layout online.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("--table", default=os.environ.get("DB_TABLE", "dbbardata"))
+    parser.add_argument("--host", default=os.environ.get("DB_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("DB_PORT", "3306")))
+    parser.add_argument("--database", default=os.environ.get("DB_NAME", "backquant"))
+    parser.add_argument("--user", default=os.environ.get("DB_USER", "backquant_user"))
+    parser.add_argument("--password", default=os.environ.get("DB_PASSWORD", ""))
+    parser.add_argument("--compress", action="store_true", help="Create the table with PAGE_COMPRESSED=1")
+    parser.add_argument("--first-year", type=int, default=None,
+                        help="First yearly partition (default: oldest bar, at least %d)" % FIRST_PARTITION_YEAR)
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="Ids copied per statement")
+    parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between chunks")
+    parser.add_argument("--resume-from", type=int, default=None, help="Continue copying from this id")
+    parser.add_argument("--drop-old", action="store_true", help="Drop the previous table after the swap")
+    parser.add_argument("--dry-run", action="store_true", help="Print the plan without changing anything")
+    args = parser.parse_args()
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", args.table):
+        parser.error("--table must be a simple table name")
+    return args
+
+
+def main():
+    args = _parse_args()
+    print("dbbardata storage layout migration")
+    print(f"  MariaDB target  : {args.user}@{args.host}:{args.port}/{args.database}")
+    print(f"  table           : {args.table}")
+    migrate(args)
+
+
+if __name__ == "__main__":
+    main()
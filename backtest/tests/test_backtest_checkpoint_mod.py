@@ -0,0 +1,122 @@
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import jsonpickle
+import numpy as np
+from rqalpha.const import PERSIST_MODE
+from rqalpha.core.events import EVENT
+
+from app.backtest.mods.checkpoint.mod import CheckpointMod, CheckpointProvider
+from app.backtest.mods.checkpoint.store import read_checkpoint, write_checkpoint
+
+
+class CheckpointStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmpdir.name) / "checkpoint.pkl"
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_write_replaces_the_checkpoint_atomically(self):
+        self.assertIsNone(read_checkpoint(self.path))
+        write_checkpoint(self.path, day="2024-01-05", start_date="2024-01-02", states={"portfolio": b"1"})
+        write_checkpoint(self.path, day="2024-01-08", start_date="2024-01-02", states={"portfolio": b"2"},
+                         last_prices={("000001.XSHE", "LONG"): 10.5})
+
+        checkpoint = read_checkpoint(self.path)
+        self.assertEqual(checkpoint["date"], "2024-01-08")
+        self.assertEqual(checkpoint["states"], {"portfolio": b"2"})
+        self.assertEqual(checkpoint["last_prices"], {("000001.XSHE", "LONG"): 10.5})
+        self.assertEqual([p.name for p in self.path.parent.iterdir()], ["checkpoint.pkl"])
+
+    def test_unreadable_checkpoints_are_ignored(self):
+        self.path.write_bytes(b"\x80\x04garbage")
+        self.assertIsNone(read_checkpoint(self.path))
+
+
+class CheckpointModTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmpdir.name) / "checkpoint.pkl"
+        self.env = SimpleNamespace(
+            config=SimpleNamespace(base=SimpleNamespace(
+                start_date=date(2024, 1, 2), end_date=date(2024, 3, 29), persist=False, persist_mode=None,
+            )),
+            set_persist_provider=Mock(),
+            event_bus=Mock(),
+        )
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _start(self, resume=True):
+        mod = CheckpointMod()
+        mod.start_up(self.env, SimpleNamespace(path=str(self.path), interval_seconds=60, resume=resume))
+        return mod
+
+    def _listened(self):
+        return [c.args[0] for c in self.env.event_bus.add_listener.call_args_list]
+
+    def test_fresh_run_persists_on_normal_exit(self):
+        self._start()
+        base = self.env.config.base
+        self.assertEqual(base.start_date, date(2024, 1, 2))
+        self.assertTrue(base.persist)
+        self.assertEqual(base.persist_mode, PERSIST_MODE.ON_NORMAL_EXIT)
+        provider = self.env.set_persist_provider.call_args.args[0]
+        self.assertFalse(provider.should_resume())
+        self.assertNotIn(EVENT.POST_SYSTEM_RESTORED, self._listened())
+
+    def test_resume_starts_after_the_checkpoint_without_the_executor_state(self):
+        write_checkpoint(self.path, day="2024-02-08", start_date="2024-01-02",
+                         states={"portfolio": b"p", "executor": b"e"})
+        self._start()
+
+        self.assertEqual(self.env.config.base.start_date, date(2024, 2, 9))
+        provider = self.env.set_persist_provider.call_args.args[0]
+        self.assertTrue(provider.should_resume())
+        self.assertEqual(provider.states(), {"portfolio": b"p"})
+        self.assertIn(EVENT.POST_SYSTEM_RESTORED, self._listened())
+
+    def test_resume_ignores_checkpoints_it_cannot_continue(self):
+        write_checkpoint(self.path, day="2024-03-29", start_date="2024-01-02", states={"portfolio": b"p"})
+        self._start()
+        self.assertEqual(self.env.config.base.start_date, date(2024, 1, 2))
+        self.assertFalse(self.env.set_persist_provider.call_args.args[0].should_resume())
+
+        write_checkpoint(self.path, day="2024-02-08", start_date="2023-01-03", states={"portfolio": b"p"})
+        with self.assertRaises(RuntimeError):
+            self._start()
+        self.env.config.base.start_date = date(2024, 1, 2)
+        self._start(resume=False)
+        self.assertEqual(self.env.config.base.start_date, date(2024, 1, 2))
+
+    def test_benchmark_records_of_the_checkpointed_days_are_restored(self):
+        saved_returns = [0.01, -0.02, 0.03]
+        mod = CheckpointMod()
+        mod._provider = CheckpointProvider({
+            "mod_sys_analyser": jsonpickle.dumps({"benchmark_daily_returns": saved_returns}).encode("utf-8"),
+        })
+        # restored portfolio records of the first two days; the resumed range has one more
+        analyser = SimpleNamespace(
+            _total_portfolios=[{"date": date(2024, 1, 2)}, {"date": date(2024, 1, 3)}],
+            _benchmark_daily_returns=np.array([0.1]),
+            _total_benchmark_portfolios={"date": [date(2024, 1, 4)], "unit_net_value": [1.1]},
+        )
+        mod._env = SimpleNamespace(mod_dict={"sys_analyser": analyser})
+        mod._merge_benchmark()
+
+        np.testing.assert_allclose(analyser._benchmark_daily_returns, [0.01, -0.02, 0.1])
+        self.assertEqual(analyser._total_benchmark_portfolios["date"],
+                         [date(2024, 1, 2), date(2024, 1, 3), date(2024, 1, 4)])
+        np.testing.assert_allclose(analyser._total_benchmark_portfolios["unit_net_value"],
+                                   [1.01, 1.01 * 0.98, 1.01 * 0.98 * 1.1])
+
+
+if __name__ == "__main__":
+    unittest.main()
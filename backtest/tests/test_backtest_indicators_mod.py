@@ -0,0 +1,155 @@
+import unittest
+
+import numpy as np
+
+from app.backtest.mods.indicators.indicators import ATR, EMA, MACD, RSI, SMA, RingBuffer
+from app.backtest.mods.indicators.mod import IndicatorCache
+
+BAR_DTYPE = np.dtype([("datetime", "<u8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8")])
+
+
+def _bars(n: int, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    bars = np.zeros(n, dtype=BAR_DTYPE)
+    bars["datetime"] = 20240101000000 + np.arange(n) * 1_000_000
+    bars["close"] = 100 + np.cumsum(rng.normal(0, 1, n))
+    bars["high"] = bars["close"] + rng.uniform(0, 1, n)
+    bars["low"] = bars["close"] - rng.uniform(0, 1, n)
+    return bars
+
+
+def _ema(values: np.ndarray, period: int, seed_at: int = None) -> np.ndarray:
+    """Full-window EMA seeded, like talib, with the SMA of the `period` inputs up to seed_at."""
+    seed_at = period - 1 if seed_at is None else seed_at
+    out = np.full(len(values), np.nan)
+    out[seed_at] = values[seed_at - period + 1:seed_at + 1].mean()
+    k = 2.0 / (period + 1)
+    for i in range(seed_at + 1, len(values)):
+        out[i] = out[i - 1] + k * (values[i] - out[i - 1])
+    return out
+
+
+def _wilder(values: np.ndarray, period: int) -> np.ndarray:
+    """Wilder smoothing of values[1:], first output at index `period`."""
+    out = np.full(len(values), np.nan)
+    out[period] = values[1:period + 1].mean()
+    for i in range(period + 1, len(values)):
+        out[i] = (out[i - 1] * (period - 1) + values[i]) / period
+    return out
+
+
+def _feed(indicator, bars):
+    return np.array([indicator.update(bar) for bar in bars])
+
+
+class IndicatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bars = _bars(300)
+        self.close = self.bars["close"]
+
+    def test_sma_and_ema_match_full_window_computation(self):
+        expected = np.convolve(self.close, np.ones(20) / 20, mode="full")[:len(self.close)]
+        expected[:19] = np.nan
+        np.testing.assert_allclose(_feed(SMA(20), self.bars), expected)
+        np.testing.assert_allclose(_feed(EMA(20), self.bars), _ema(self.close, 20))
+
+    def test_macd_matches_full_window_computation(self):
+        macd = MACD(12, 26, 9, maxlen=300)
+        _feed(macd, self.bars)
+        line = _ema(self.close, 12, seed_at=25) - _ema(self.close, 26)
+        signal = np.full(len(line), np.nan)
+        signal[25:] = _ema(line[25:], 9)
+        line[:33] = np.nan
+
+        np.testing.assert_allclose(macd.values.view(), line)
+        np.testing.assert_allclose(macd.signal.view(), signal)
+        np.testing.assert_allclose(macd.hist.view(), line - signal)
+        self.assertEqual(macd.lookback, 33)
+        self.assertTrue(np.isnan(macd.values[32]) and not np.isnan(macd.values[33]))
+
+    def test_rsi_and_atr_use_wilder_smoothing(self):
+        change = np.diff(self.close, prepend=np.nan)
+        gain = _wilder(np.where(change > 0, change, 0.0), 14)
+        loss = _wilder(np.where(change < 0, -change, 0.0), 14)
+        np.testing.assert_allclose(_feed(RSI(14, maxlen=300), self.bars), 100 * gain / (gain + loss))
+
+        prev_close = np.roll(self.close, 1)
+        true_range = np.maximum(self.bars["high"], prev_close) - np.minimum(self.bars["low"], prev_close)
+        np.testing.assert_allclose(_feed(ATR(14), self.bars), _wilder(true_range, 14))
+
+    def test_ring_buffer_views_are_contiguous_and_read_only(self):
+        ring = RingBuffer(4)
+        for value in range(10):
+            ring.append(value)
+        window = ring.view()
+        self.assertEqual(window.tolist(), [6, 7, 8, 9])
+        self.assertEqual(ring.view(2).tolist(), [8, 9])
+        self.assertTrue(window.flags.c_contiguous)
+        self.assertFalse(window.flags.writeable)
+        self.assertIs(window.base, ring.view().base)
+
+
+class IndicatorCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bars = _bars(200)
+        self.now = 0
+        self.requested = []
+        self.ex_dividend = None
+
+    def _history(self, order_book_id, bar_count, frequency, fields):
+        self.requested.append(bar_count)
+        available = self.bars[:self.now + 1].copy()
+        if self.ex_dividend is not None and self.now >= self.ex_dividend:
+            # pre-adjusted to the current day, like history_bars(adjust_type='pre')
+            for name in ("high", "low", "close"):
+                available[name][:self.ex_dividend] *= 0.5
+        window = available[max(len(available) - bar_count, 0):]
+        return window if fields is None else window[list(fields)]
+
+    def test_indicators_are_fed_only_new_bars(self):
+        cache = IndicatorCache(self._history, warmup_bars=50)
+        expected = MACD(12, 26, 9)
+        _feed(expected, self.bars[:50])
+        for self.now in range(49, 200):
+            macd = cache.indicator("000001.XSHE", "macd", 12, 26, 9)
+            if self.now > 49:
+                expected.update(self.bars[self.now])
+            self.assertEqual(macd.values.view().tolist(), expected.values.view().tolist())
+        self.assertEqual(macd.count, 200)
+        self.assertEqual(self.requested[0], 50)
+        self.assertTrue(all(count == 2 for count in self.requested[1:]))
+
+        with self.assertRaises(ValueError):
+            cache.indicator("000001.XSHE", "KDJ")
+
+    def test_rolling_history_matches_history_bars(self):
+        cache = IndicatorCache(self._history)
+        for self.now in range(10, 200, 3):
+            closes = cache.history("000001.XSHE", 20, "1d", "close")
+            expected = self._history("000001.XSHE", 20, "1d", ["close"])["close"]
+            self.assertEqual(closes.tolist(), expected.tolist())
+            self.assertFalse(closes.flags.writeable)
+
+        bars = cache.history("000001.XSHE", 5, "1d", ["high", "low"])
+        self.assertEqual(bars.dtype.names, ("high", "low"))
+        self.assertEqual(bars["low"].tolist(), self.bars["low"][self.now - 4:self.now + 1].tolist())
+
+    def test_ex_dividend_in_the_window_rebuilds_on_the_new_basis(self):
+        self.ex_dividend = 120
+        cache = IndicatorCache(self._history, warmup_bars=50)
+        for self.now in range(60, 200):
+            closes = cache.history("000001.XSHE", 20, "1d", "close")
+            ema = cache.indicator("000001.XSHE", "EMA", 10)
+            window = self._history("000001.XSHE", 20, "1d", ["close"])["close"]
+            self.assertEqual(closes.tolist(), window.tolist())
+            if self.now < self.ex_dividend:
+                continue
+            # from the ex-dividend day on, the indicator matches one warmed up on adjusted bars
+            fresh = EMA(10)
+            _feed(fresh, self._history("000001.XSHE", 50 + self.now - self.ex_dividend, "1d", ["close"]))
+            self.assertAlmostEqual(ema.value, fresh.value)
+        self.assertEqual(closes.tolist(), self.bars["close"][180:].tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,10 +6,18 @@ from pathlib import Path
 from unittest.mock import Mock, patch
 
 import jwt
+import yaml
 from flask import Flask
 
-from app.api.backtest_api import bp_backtest
+from app.api.backtest_api import _run_job, bp_backtest, resume_interrupted_jobs
+from app.market_data.bundle_store import BundleStore
+from app.backtest.mods.checkpoint.store import write_checkpoint
+from app.backtest.mods.result_stream.stream import EQUITY_COLUMNS, TRADE_COLUMNS, StreamTable, write_summary
 from app.backtest.services.runner import (
+    acquire_job_lock,
+    locate_job_dir,
+    read_status,
+    release_job_lock,
     save_strategy,
     update_job_index,
     write_job_index,
@@ -297,6 +305,37 @@ class BacktestJobsApiTestCase(unittest.TestCase):
             self.assertEqual(thread_cls.call_count, 1)
             self.assertEqual(thread_instance.start.call_count, 1)
 
+    def test_run_pins_bundle_snapshot_in_config_meta_and_fingerprint(self):
+        bundle_root = self.base_dir / "bundle"
+        bundle_root.mkdir()
+        (bundle_root / "instruments.pk").write_bytes(b"v1")
+        store = BundleStore(bundle_root)
+        first_version = store.ensure_versioned()
+        self.app.config["RQALPHA_BUNDLE_PATH"] = str(bundle_root)
+        self._save_strategy("demo", "def init(context):\n    pass\n")
+        body = self._valid_run_body("demo")
+
+        with patch("app.api.backtest_api.threading.Thread"):
+            first = self.client.post("/api/backtest/run", json=body, headers=self._auth_headers())
+            job_id = first.get_json()["job_id"]
+
+            staging = store.create_staging()
+            (staging / "instruments.pk").write_bytes(b"v2")
+            store.activate(store.commit_staging(staging, "update"))
+            # The new snapshot changes the fingerprint, so the run is not deduplicated.
+            second = self.client.post("/api/backtest/run", json=body, headers=self._auth_headers())
+            self.assertNotEqual(second.get_json()["job_id"], job_id)
+
+        with self.app.app_context():
+            job_dir = locate_job_dir(job_id)
+        config = (job_dir / "config.yml").read_text(encoding="utf-8")
+        self.assertIn(f"data_bundle_path: {store.version_path(first_version).resolve()}", config)
+        meta = json.loads((job_dir / "job_meta.json").read_text(encoding="utf-8"))
+        self.assertEqual(meta["bundle_version"], first_version)
+        # The pinned snapshot survives garbage collection until the job releases it.
+        store.collect_garbage()
+        self.assertEqual((store.version_path(first_version) / "instruments.pk").read_bytes(), b"v1")
+
     def test_run_accepts_cjk_and_mixed_strategy_id(self):
         strategy_id = "ETF_轮动-2026"
         self._save_strategy(strategy_id, "def init(context):\n    pass\n")
@@ -343,6 +382,37 @@ class BacktestJobsApiTestCase(unittest.TestCase):
         self.assertEqual(payload["error"]["code"], "INVALID_ARGUMENT")
         self.assertIn("frequency", payload["error"]["message"])
 
+    def test_run_selects_engine_per_run(self):
+        self._save_strategy("demo", "def vector_targets(data):\n    return {}\n")
+        self.app.config["BACKTEST_ALLOWED_FREQUENCIES"] = ("1d", "1m")
+        body = self._valid_run_body("demo")
+        for engine, frequency, message in [("pandas", "1d", "engine must be one of"),
+                                           ("vector", "1m", "engine=vector only supports frequency 1d")]:
+            with self.subTest(engine=engine):
+                resp = self.client.post(
+                    "/api/backtest/run", json=dict(body, engine=engine, frequency=frequency),
+                    headers=self._auth_headers(),
+                )
+                self.assertEqual(resp.status_code, 400)
+                self.assertIn(message, resp.get_json()["error"]["message"])
+
+        with patch("app.api.backtest_api.threading.Thread") as thread_cls:
+            first = self.client.post("/api/backtest/run", json=body, headers=self._auth_headers())
+            second = self.client.post(
+                "/api/backtest/run", json=dict(body, engine="vector"), headers=self._auth_headers()
+            )
+        job_id = second.get_json()["job_id"]
+        # Same strategy and parameters on another engine is another run, not a duplicate.
+        self.assertNotEqual(first.get_json()["job_id"], job_id)
+        self.assertEqual(thread_cls.call_args.kwargs["args"][3], "vector")
+
+        with self.app.app_context():
+            job_dir = locate_job_dir(job_id)
+        meta = json.loads((job_dir / "job_meta.json").read_text(encoding="utf-8"))
+        self.assertEqual(meta["engine"], "vector")
+        config = yaml.safe_load((job_dir / "config.yml").read_text(encoding="utf-8"))
+        self.assertIn("lookback_days", config["vector"])
+
     def test_run_rejects_end_date_earlier_than_start_date(self):
         self._save_strategy("demo", "def init(context):\n    pass\n")
         body = self._valid_run_body("demo")
@@ -577,6 +647,214 @@ class BacktestJobsApiTestCase(unittest.TestCase):
         second_payload = second.get_json()
         self.assertEqual(second_payload["error"]["code"], "NOT_FOUND")
 
+    def _seed_checkpoint(self, job_dir: Path, day: str = "2020-12-31") -> None:
+        write_checkpoint(job_dir / "checkpoint.pkl", day=day, start_date="2020-01-01", states={"portfolio": b"{}"})
+
+    def test_continue_job_reruns_from_checkpoint_to_later_end_date(self):
+        job_dir = self._seed_strategy_job(
+            job_id="job_continue", strategy_id="demo", status="FINISHED",
+            created_at="2026-02-16T00:00:00+00:00", updated_at="2026-02-16T00:00:00+00:00",
+        )
+        url = "/api/backtest/jobs/job_continue/continue"
+
+        resp = self.client.post(url, json={"end_date": "2021-03-31"}, headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 409)
+        self.assertIn("checkpoint", resp.get_json()["error"]["message"])
+
+        self._seed_checkpoint(job_dir)
+        for end_date, message in [("2021/03/31", "YYYY-MM-DD"), ("2020-06-30", "later than 2020-12-31")]:
+            with self.subTest(end_date=end_date):
+                resp = self.client.post(url, json={"end_date": end_date}, headers=self._auth_headers())
+                self.assertEqual(resp.status_code, 400)
+                self.assertIn(message, resp.get_json()["error"]["message"])
+
+        with patch("app.api.backtest_api.threading.Thread") as thread_cls:
+            resp = self.client.post(url, json={"end_date": "2021-03-31"}, headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json(), {
+            "job_id": "job_continue", "resume_from": "2020-12-31", "end_date": "2021-03-31",
+        })
+        args = thread_cls.call_args.kwargs["args"]
+        self.assertEqual(args[1:4], ("job_continue", job_dir, "rqalpha"))
+        self.assertIsNotNone(args[4])
+
+        config = yaml.safe_load((job_dir / "config.yml").read_text(encoding="utf-8"))
+        self.assertEqual(str(config["base"]["start_date"]), "2020-01-01")
+        self.assertEqual(str(config["base"]["end_date"]), "2021-03-31")
+        self.assertTrue(config["mod"]["checkpoint"]["resume"])
+        meta = json.loads((job_dir / "job_meta.json").read_text(encoding="utf-8"))
+        self.assertEqual((meta["start_date"], meta["end_date"]), ("2020-01-01", "2021-03-31"))
+        status = self.client.get("/api/backtest/jobs/job_continue", headers=self._auth_headers())
+        self.assertEqual(status.get_json()["status"], "QUEUED")
+
+        # The queued run holds the job lock until it finishes.
+        write_status(job_dir, "FINISHED")
+        resp = self.client.post(url, json={"end_date": "2021-06-30"}, headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.get_json()["error"]["message"], "job is running")
+        release_job_lock(args[4])
+
+    def test_continue_job_requires_a_finished_job(self):
+        job_dir = self._seed_strategy_job(
+            job_id="job_failed", strategy_id="demo", status="FAILED",
+            created_at="2026-02-16T00:00:00+00:00", updated_at="2026-02-16T00:00:00+00:00",
+            error={"code": "RQALPHA_EXIT_NONZERO", "message": "rqalpha exit code=1"},
+        )
+        self._seed_checkpoint(job_dir)
+        resp = self.client.post(
+            "/api/backtest/jobs/job_failed/continue", json={"end_date": "2021-03-31"}, headers=self._auth_headers()
+        )
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.get_json()["error"]["message"], "only finished jobs can be continued")
+
+        resp = self.client.post(
+            "/api/backtest/jobs/job_missing/continue", json={"end_date": "2021-03-31"}, headers=self._auth_headers()
+        )
+        self.assertEqual(resp.status_code, 404)
+
+    def test_resume_interrupted_jobs_skips_jobs_still_running(self):
+        seeded = {}
+        for job_id, status in [("job_a", "RUNNING"), ("job_b", "RUNNING"), ("job_c", "QUEUED"), ("job_d", "FINISHED")]:
+            seeded[job_id] = self._seed_strategy_job(
+                job_id=job_id, strategy_id="demo", status=status,
+                created_at="2026-02-16T00:00:00+00:00", updated_at="2026-02-16T00:00:00+00:00",
+            )
+        self._seed_checkpoint(seeded["job_a"], day="2020-06-30")
+        live_run = acquire_job_lock(seeded["job_b"])
+
+        with patch("app.api.backtest_api.threading.Thread") as thread_cls:
+            resumed = resume_interrupted_jobs(self.app)
+        release_job_lock(live_run)
+
+        self.assertEqual(resumed, ["job_a", "job_c"])
+        self.assertEqual(thread_cls.call_count, 2)
+        for call in thread_cls.call_args_list:
+            release_job_lock(call.kwargs["args"][4])
+        with self.app.app_context():
+            statuses = {job_id: read_status(job_dir)["status"] for job_id, job_dir in seeded.items()}
+        self.assertEqual(statuses, {"job_a": "QUEUED", "job_b": "RUNNING", "job_c": "QUEUED", "job_d": "FINISHED"})
+        # Resumed as they were: same end date, checkpoint or not
+        config = yaml.safe_load((seeded["job_c"] / "config.yml").read_text(encoding="utf-8"))
+        self.assertEqual(str(config["base"]["end_date"]), "2020-12-31")
+
+    @staticmethod
+    def _seed_stream(job_dir: Path) -> None:
+        StreamTable(job_dir / "stream" / "equity", EQUITY_COLUMNS).append({
+            "date": [20200102, 20200103, 20200106], "total_value": [100000.0, 100500.0, 99800.0],
+            "unit_net_value": [1.0, 1.005, 0.998], "returns": [0.0, 0.005, -0.00697], "cash": [0.0] * 3,
+            "market_value": [0.0] * 3, "daily_pnl": [0.0, 500.0, -700.0], "benchmark_nav": [1.0, 1.01, 1.02],
+        })
+        StreamTable(job_dir / "stream" / "trades", TRADE_COLUMNS).append({
+            "datetime": [20200102150000 + i for i in range(3)], "trading_datetime": [20200102150000] * 3,
+            "order_book_id": [b"000001.XSHE"] * 3, "symbol": [b"PAYH"] * 3, "side": [b"BUY", b"SELL", b"BUY"],
+            "position_effect": [b"OPEN", b"CLOSE", b"OPEN"], "exec_id": [1, 2, 3], "tax": [0.0] * 3,
+            "commission": [5.0] * 3, "last_quantity": [100.0] * 3, "last_price": [10.0] * 3,
+            "order_id": [1, 2, 3], "transaction_cost": [5.0] * 3,
+        })
+
+    def test_live_equity_and_trades_of_a_running_job(self):
+        job_dir = self._create_job_dir("job_live")
+        write_status(job_dir, "RUNNING")
+        url = "/api/backtest/jobs/job_live/live"
+
+        resp = self.client.get(f"{url}/equity", headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()["equity"]["dates"], [])
+        self.assertEqual(resp.get_json()["next_offset"], 0)
+
+        self._seed_stream(job_dir)
+
+        payload = self.client.get(f"{url}/equity?offset=1", headers=self._auth_headers()).get_json()
+        self.assertEqual(payload["status"], "RUNNING")
+        self.assertEqual(payload["equity"]["dates"], ["2020-01-03", "2020-01-06"])
+        self.assertEqual(payload["equity"]["nav"], [100500.0, 99800.0])
+        self.assertEqual(payload["equity"]["benchmark_nav"], [1.01, 1.02])
+        self.assertEqual((payload["offset"], payload["next_offset"], payload["total"]), (1, 3, 3))
+
+        payload = self.client.get(f"{url}/trades?offset=1&limit=1", headers=self._auth_headers()).get_json()
+        self.assertEqual([t["side"] for t in payload["trades"]], ["SELL"])
+        self.assertEqual(payload["trades"][0]["datetime"], "2020-01-02 15:00:01")
+        self.assertEqual((payload["offset"], payload["next_offset"], payload["total"]), (1, 2, 3))
+
+        resp = self.client.get(f"{url}/trades?limit=0", headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get("/api/backtest/jobs/job_missing/live/equity", headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 404)
+
+    def test_job_result_is_read_from_the_stream_of_a_streamed_job(self):
+        job_dir = self._create_job_dir("job_streamed")
+        self._seed_stream(job_dir)
+        write_summary(job_dir / "stream", {"sharpe": 1.2, "total_returns": -0.002})
+        with patch("app.api.backtest_api.run_rqalpha", return_value=0), patch(
+            "app.api.backtest_api.extract_result"
+        ) as extract:
+            _run_job(self.app, "job_streamed", job_dir)
+        extract.assert_not_called()
+        with self.app.app_context():
+            self.assertEqual(read_status(job_dir)["status"], "FINISHED")
+
+        url = "/api/backtest/jobs/job_streamed/result"
+        data = self.client.get(url, headers=self._auth_headers()).get_json()
+        self.assertEqual(data["summary"], {"sharpe": 1.2, "total_returns": -0.002})
+        self.assertEqual(data["equity"]["nav"], [100000.0, 100500.0, 99800.0])
+        self.assertEqual(data["equity"]["benchmark_nav"], [1.0, 1.01, 1.02])
+        self.assertEqual(data["trades_total"], 3)
+        self.assertEqual(data["trade_columns"][:2], ["datetime", "trading_datetime"])
+
+        data = self.client.get(f"{url}?page=2&page_size=2", headers=self._auth_headers()).get_json()
+        self.assertEqual([t["exec_id"] for t in data["trades"]], [3])
+        self.assertEqual((data["trades_total"], data["page"], data["page_size"]), (3, 2, 2))
+        resp = self.client.get(f"{url}?page=0", headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 400)
+
+    def test_recost_reapplies_costs_to_the_trades_of_a_finished_job(self):
+        job_dir = self._create_job_dir("job_recost")
+        write_status(job_dir, "RUNNING")
+        url = "/api/backtest/jobs/job_recost/recost"
+        resp = self.client.post(url, json={}, headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 409)
+
+        self._seed_stream(job_dir)
+        write_summary(job_dir / "stream", {"units": 100000.0})
+        (job_dir / "config.yml").write_text(
+            yaml.safe_dump({"mod": {"sys_transaction_cost": {"stock_min_commission": 5}}}), encoding="utf-8"
+        )
+        write_status(job_dir, "FINISHED")
+        for body in ({"slippage": 1.5}, {"commission_multiplier": -1}, {"pit_tax": "yes"}, {"benchmark": ""}, [1]):
+            resp = self.client.post(url, json=body, headers=self._auth_headers())
+            self.assertEqual(resp.status_code, 400, body)
+
+        resp = self.client.post(url, json={}, headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 200)
+        data = resp.get_json()
+        self.assertEqual(data["equity"]["nav"], [100000.0, 100500.0, 99800.0])
+        self.assertEqual(data["summary"]["commission"], 15.0)
+
+        # no minimum: 100 * 10 * 0.0008 per order instead of 5
+        data = self.client.post(url, json={"min_commission": 0}, headers=self._auth_headers()).get_json()
+        self.assertEqual(data["costs"]["min_commission"], 0.0)
+        self.assertAlmostEqual(data["summary"]["commission"], 2.4)
+        self.assertAlmostEqual(data["equity"]["nav"][-1], 99812.6)
+        self.assertEqual(data["original_summary"]["commission"], 15.0)
+
+    def test_cancel_job_only_stops_queued_or_running_jobs(self):
+        job_dir = self._create_job_dir("job_cancel")
+        write_status(job_dir, "RUNNING")
+        with patch("app.api.backtest_api.request_job_cancel", return_value="CANCELLED") as cancel:
+            resp = self.client.post("/api/backtest/jobs/job_cancel/cancel", headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.get_json()["data"]["cancel_requested"])
+        self.assertTrue(resp.get_json()["data"]["cancelled"])
+        cancel.assert_called_once_with(job_dir)
+
+        # no worker holds the run: the job is cancelled right away
+        resp = self.client.post("/api/backtest/jobs/job_cancel/cancel", headers=self._auth_headers())
+        self.assertEqual(resp.get_json()["data"]["status"], "CANCELLED")
+
+        write_status(job_dir, "FINISHED")
+        resp = self.client.post("/api/backtest/jobs/job_cancel/cancel", headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 409)
+
 
 if __name__ == "__main__":
     unittest.main()
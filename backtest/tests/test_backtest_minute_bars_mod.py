@@ -0,0 +1,131 @@
+import json
+import pickle
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import h5py
+import numpy as np
+from rqalpha.data.base_data_source import BaseDataSource
+
+from app.backtest.mods.minute_bars.mod import (
+    MinuteBarDataSource, WindowCache, assign_trading_dates,
+)
+from app.database import DatabaseConfig, DatabaseConnection
+
+TRADING_DATES = [20240102, 20240103, 20240104, 20240105, 20240108]
+
+# (datetime, close) of RB2405 1m bars, including night sessions of Tuesday and Friday.
+BARS = [
+    ("2024-01-02 09:01:00", 1.0),
+    ("2024-01-02 09:02:00", 2.0),
+    ("2024-01-02 21:01:00", 3.0),
+    ("2024-01-03 09:01:00", 4.0),
+    ("2024-01-04 09:01:00", 5.0),
+    ("2024-01-05 09:01:00", 6.0),
+    ("2024-01-05 21:01:00", 7.0),
+    ("2024-01-06 00:01:00", 8.0),
+    ("2024-01-08 09:01:00", 9.0),
+]
+
+
+def _write_bundle(path: Path) -> None:
+    """Smallest bundle rqalpha's BaseDataSource accepts."""
+    (path / "future_info.json").write_text(
+        json.dumps([{"underlying_symbol": "RB", "commission_type": "by_money", "margin_rate": 0.1}])
+    )
+    (path / "share_transformation.json").write_text("{}")
+    (path / "instruments.pk").write_bytes(pickle.dumps([]))
+    np.save(path / "trading_dates.npy", np.array(TRADING_DATES))
+    with h5py.File(path / "yield_curve.h5", "w") as f:
+        f.create_dataset("data", data=np.zeros(1, dtype=[("date", "<u4"), ("0S", "<f8")]))
+    for name in ("suspended_days.h5", "st_stock_days.h5", "stocks.h5", "indexes.h5", "funds.h5",
+                 "dividends.h5", "split_factor.h5", "ex_cum_factor.h5", "futures.h5"):
+        h5py.File(path / name, "w").close()
+
+
+def _write_bars(db_path: Path) -> None:
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE dbbardata (symbol TEXT, exchange TEXT, datetime TEXT, interval TEXT, "
+        "volume REAL, turnover REAL, open_interest REAL, open_price REAL, high_price REAL, "
+        "low_price REAL, close_price REAL)"
+    )
+    conn.executemany(
+        "INSERT INTO dbbardata VALUES ('rb2405', 'SHFE', ?, '1m', 10, 100, 5, ?, ?, ?, ?)",
+        [(dt, close, close + 1, close - 1, close) for dt, close in BARS],
+    )
+    conn.commit()
+    conn.close()
+
+
+class MinuteBarsModTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        tmp = Path(self._tmpdir.name)
+        (tmp / "bundle").mkdir()
+        _write_bundle(tmp / "bundle")
+        _write_bars(tmp / "market_data.sqlite3")
+
+        config = DatabaseConfig()
+        config.sqlite_path = tmp / "market_data.sqlite3"
+        self.db = DatabaseConnection(config)
+        self.db.connect()
+        self.inner = BaseDataSource(SimpleNamespace(data_bundle_path=str(tmp / "bundle")))
+        self.instrument = SimpleNamespace(order_book_id="RB2405", exchange="SHFE")
+
+    def tearDown(self):
+        self.db.close()
+        self._tmpdir.cleanup()
+
+    def _data_source(self, **kwargs) -> MinuteBarDataSource:
+        return MinuteBarDataSource(self.inner, self.db, **kwargs)
+
+    def test_night_session_bars_belong_to_next_trading_date(self):
+        times = np.array([20240102090100, 20240102210100, 20240105210100, 20240106000100], dtype="<u8")
+        self.assertEqual(
+            assign_trading_dates(times, np.array(TRADING_DATES)).tolist(),
+            [20240102, 20240103, 20240108, 20240108],
+        )
+
+    def test_bars_are_prefetched_per_chunk_of_trading_days(self):
+        data_source = self._data_source(prefetch_days=2)
+
+        bar = data_source.get_bar(self.instrument, datetime(2024, 1, 2, 21, 1), "1m")
+        self.assertEqual(bar["close"], 3.0)
+        self.assertEqual(bar["trading_date"], 20240103)
+        self.assertIsNone(data_source.get_bar(self.instrument, datetime(2024, 1, 2, 9, 30), "1m"))
+        queries = data_source.queries
+        # The same two trading days come from the cached window.
+        for dt in (datetime(2024, 1, 2, 9, 1), datetime(2024, 1, 2, 9, 2), datetime(2024, 1, 3, 9, 1)):
+            self.assertIsNotNone(data_source.get_bar(self.instrument, dt, "1m"))
+        self.assertEqual(data_source.queries, queries)
+
+        self.assertEqual(data_source.get_trading_minutes_for(self.instrument, datetime(2024, 1, 8)),
+                         [20240105210100, 20240106000100, 20240108090100])
+
+    def test_history_bars_span_chunks(self):
+        data_source = self._data_source(prefetch_days=1)
+        closes = data_source.history_bars(self.instrument, 5, "1m", "close", datetime(2024, 1, 5, 21, 1))
+        self.assertEqual(closes.tolist(), [3.0, 4.0, 5.0, 6.0, 7.0])
+
+        bars = data_source.history_bars(self.instrument, None, "1m", None, datetime(2024, 1, 3, 9, 1))
+        self.assertEqual(bars["close"].tolist(), [1.0, 2.0, 3.0, 4.0])
+
+        missing = SimpleNamespace(order_book_id="CU2405", exchange="SHFE")
+        self.assertEqual(len(data_source.history_bars(missing, 10, "1m", "close", datetime(2024, 1, 5))), 0)
+
+    def test_window_cache_is_bounded_by_rows(self):
+        cache = WindowCache(max_rows=3)
+        cache.put(("a", 0), np.zeros(2))
+        cache.put(("b", 0), np.zeros(2))
+        self.assertIsNone(cache.get(("a", 0)))
+        self.assertIsNotNone(cache.get(("b", 0)))
+        self.assertEqual(cache.rows, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from datetime import date, datetime
+
+import numpy as np
+from rqalpha.const import EXECUTION_PHASE
+
+from app.backtest.mods.precompute.mod import PrecomputeData, Precomputed
+
+DATES = np.array([20240102, 20240103, 20240104, 20240105, 20240108, 20240109])
+
+
+class _DataProxy:
+    """history_bars over fixed daily closes; 000002.XSHE is suspended on 0104 and listed from 0103."""
+
+    def __init__(self):
+        self.bars = {
+            "000001.XSHE": (DATES, np.arange(1.0, 7.0)),
+            "000002.XSHE": (DATES[[1, 3, 4, 5]], np.array([20.0, 21.0, 22.0, 23.0])),
+        }
+
+    def history_bars(self, order_book_id, bar_count, frequency, fields, dt, skip_suspended=True,
+                     include_now=False, adjust_type="pre", adjust_orig=None):
+        if order_book_id not in self.bars:
+            raise KeyError(order_book_id)
+        days, closes = self.bars[order_book_id]
+        bars = np.zeros(len(days), dtype=[("datetime", "<u8"), ("close", "<f8")])
+        bars["datetime"] = days * 1_000_000
+        bars["close"] = closes
+        return bars[-bar_count:][list(fields)]
+
+
+class PrecomputeDataTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data = PrecomputeData(_DataProxy(), DATES, datetime(2024, 1, 9, 23, 59, 59))
+
+    def test_prices_are_aligned_on_trading_dates(self):
+        np.testing.assert_array_equal(self.data.prices("000001.XSHE"), np.arange(1.0, 7.0))
+        close = self.data.prices(["000001.XSHE", "000002.XSHE", "999999.XSHE"])
+        self.assertEqual(close.shape, (6, 3))
+        np.testing.assert_array_equal(close[:, 1], [np.nan, 20.0, np.nan, 21.0, 22.0, 23.0])
+        self.assertTrue(np.isnan(close[:, 2]).all())
+
+    def test_index_of_maps_datetimes_onto_rows(self):
+        self.assertEqual(self.data.index_of(datetime(2024, 1, 4, 15, 0)), 2)
+        self.assertEqual(self.data.index_of(date(2024, 1, 6)), 3)
+        self.assertEqual(self.data.index_of(date(2024, 1, 1)), -1)
+
+
+class PrecomputedTestCase(unittest.TestCase):
+    def setUp(self):
+        data = PrecomputeData(_DataProxy(), DATES, datetime(2024, 1, 9, 23, 59, 59))
+        close = data.prices(["000001.XSHE", "000002.XSHE"])
+        self.precomputed = Precomputed(data, {
+            "close": {"000001.XSHE": close[:, 0], "000002.XSHE": close[:, 1]},
+            "breadth": np.nansum(close, axis=1),
+        })
+
+    def test_value_at_bar_offset_and_before_trading(self):
+        dt = datetime(2024, 1, 5, 15, 0)
+        self.assertEqual(self.precomputed.value("close", "000001.XSHE", dt), 4.0)
+        self.assertEqual(self.precomputed.value("close", "000001.XSHE", dt, offset=-1), 3.0)
+        self.assertEqual(self.precomputed.value("breadth", None, dt), 25.0)
+        self.assertEqual(
+            self.precomputed.value("close", "000001.XSHE", dt, phase=EXECUTION_PHASE.BEFORE_TRADING), 3.0)
+        self.assertTrue(np.isnan(self.precomputed.value("close", "000001.XSHE", dt, offset=5)))
+
+    def test_lookup_errors_name_the_signal(self):
+        dt = datetime(2024, 1, 5)
+        with self.assertRaisesRegex(KeyError, "breadth, close"):
+            self.precomputed.value("cross", None, dt)
+        with self.assertRaises(ValueError):
+            self.precomputed.value("close", None, dt)
+        with self.assertRaises(ValueError):
+            self.precomputed.value("breadth", "000001.XSHE", dt)
+
+
+if __name__ == "__main__":
+    unittest.main()
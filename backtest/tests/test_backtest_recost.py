@@ -0,0 +1,157 @@
+import json
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from app.backtest.mods.result_stream.stream import EQUITY_COLUMNS, TRADE_COLUMNS, StreamTable, write_summary
+from app.backtest.services.recost import (
+    _order_commission,
+    _trade_arrays,
+    benchmark_nav,
+    job_costs,
+    load_job_result,
+    recost,
+)
+from app.backtest.services.vector import Costs
+
+DATES = [20240102, 20240103, 20240104]
+
+
+def _result(trades, total_value=(100000.0, 100200.0, 100100.0)):
+    return {
+        "dates": np.array(DATES, dtype=np.int64),
+        "starting_value": 100000.0,
+        "total_value": np.array(total_value),
+        "benchmark_nav": np.array([1.0, 1.01, 1.02]),
+        "trades": _trade_arrays(*zip(*trades)) if trades else _trade_arrays([], [], [], [], [], [], [], []),
+    }
+
+
+# day, order_book_id, side, quantity, price, order_id, commission, tax (rqalpha's stock defaults)
+TRADES = [
+    (20240102, "000001.XSHE", "BUY", 1000, 10.0, 1, 8.0, 0.0),
+    (20240102, "000002.XSHE", "BUY", 100, 10.0, 2, 5.0, 0.0),
+    # one order filled in two trades: the minimum commission is charged once
+    (20240103, "000001.XSHE", "SELL", 300, 11.0, 3, 5.0, 1.65),
+    (20240103, "000001.XSHE", "SELL", 200, 11.0, 3, 0.0, 1.1),
+    (20240104, "IF2401", "BUY", 1, 3500.0, 4, 10.0, 0.0),
+]
+
+
+class RecostTestCase(unittest.TestCase):
+    def test_order_commission_charges_the_minimum_once_per_order(self):
+        costs = Costs()
+        commission = _order_commission(np.array([3, 1, 3, 2, 2]), np.array([3300.0, 10000, 2200, 30000, 20000]), costs)
+        np.testing.assert_allclose(commission, [5.0, 8.0, 0.0, 24.0, 16.0])
+
+    def test_original_costs_reproduce_the_result(self):
+        result = _result(TRADES)
+        payload = recost(result, Costs(), Costs())
+
+        np.testing.assert_allclose(payload["equity"]["nav"], result["total_value"])
+        self.assertAlmostEqual(payload["summary"]["commission"], 28.0)
+        self.assertAlmostEqual(payload["summary"]["tax"], 2.75)
+        self.assertAlmostEqual(payload["summary"]["total_returns"], payload["original_summary"]["total_returns"])
+        self.assertEqual((payload["summary"]["trades_recosted"], payload["summary"]["trades_kept"]), (4, 1))
+        self.assertAlmostEqual(payload["summary"]["benchmark_total_returns"], 0.02)
+
+    def test_lower_commission_shifts_the_nav_by_the_saved_costs(self):
+        payload = recost(_result(TRADES), Costs(commission_multiplier=0.5, min_commission=0), Costs())
+
+        # 4.0 + 0.4 instead of 8 + 5 on day one, 1.32 + 0.88 instead of 5 + 0 on day two; futures keep theirs
+        np.testing.assert_allclose(payload["equity"]["nav"], [100008.6, 100211.4, 100111.4])
+        self.assertAlmostEqual(payload["summary"]["commission"], 16.6)
+        self.assertAlmostEqual(payload["summary"]["tax"], 2.75)
+        self.assertAlmostEqual(payload["equity"]["returns"][0], 0.000086)
+        self.assertEqual(payload["costs"]["commission_multiplier"], 0.5)
+
+    def test_slippage_is_taken_off_the_recorded_prices_and_applied_again(self):
+        trades = [(20240102, "000001.XSHE", "BUY", 1000, 10.1, 1, 8.08, 0.0)]
+        payload = recost(_result(trades), Costs(slippage=0.0), Costs(slippage=0.01))
+
+        # filled at 10.0 before slippage: 100 saved on the price, 0.08 on commission
+        np.testing.assert_allclose(payload["equity"]["nav"], [100100.08, 100300.08, 100200.08])
+        self.assertAlmostEqual(payload["summary"]["slippage_cost"], 0.0)
+
+        payload = recost(_result(trades), Costs(slippage=0.02), Costs(slippage=0.01))
+        self.assertAlmostEqual(payload["summary"]["slippage_cost"], 200.0)
+
+    def test_job_costs_read_the_config_and_apply_overrides(self):
+        config = {"mod": {"sys_transaction_cost": {"stock_commission_multiplier": 2, "stock_min_commission": 1},
+                          "sys_simulation": {"slippage": 0.001}}}
+        costs = job_costs(config)
+        self.assertAlmostEqual(costs.commission_rate, 0.0016)
+        self.assertEqual((costs.min_commission, costs.slippage), (1.0, 0.001))
+
+        costs = job_costs(config, {"commission_multiplier": 0.5, "pit_tax": True})
+        self.assertAlmostEqual(costs.commission_rate, 0.0004)
+        self.assertEqual((costs.min_commission, costs.pit_tax), (1.0, True))
+
+
+class RecostJobFilesTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.job_dir = Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_results_are_read_from_the_stream_or_extracted_json(self):
+        self.assertIsNone(load_job_result(self.job_dir, "stream"))
+
+        (self.job_dir / "extracted.json").write_text(json.dumps({
+            "summary": {"units": 100000.0},
+            "equity": {"dates": ["2024-01-02", "2024-01-03"], "nav": [99990.0, 100100.0], "returns": [],
+                       "benchmark_nav": []},
+            "trades": [{"trading_datetime": "2024-01-02 15:00:00", "order_book_id": "000001.XSHE", "side": "BUY",
+                        "last_quantity": 1000, "last_price": 10.0, "order_id": 7, "commission": 8.0, "tax": 0.0}],
+        }), encoding="utf-8")
+        result = load_job_result(self.job_dir, "stream")
+        self.assertEqual(result["dates"].tolist(), [20240102, 20240103])
+        self.assertEqual(result["starting_value"], 100000.0)
+        self.assertTrue(np.isnan(result["benchmark_nav"]).all())
+        self.assertEqual(result["trades"]["day"].tolist(), [20240102])
+        self.assertEqual(result["trades"]["order_id"].tolist(), [7])
+
+        stream_dir = self.job_dir / "stream"
+        StreamTable(stream_dir / "equity", EQUITY_COLUMNS).append({
+            "date": [20240102], "total_value": [100500.0], "unit_net_value": [1.005], "returns": [0.005],
+            "cash": [0.0], "market_value": [0.0], "daily_pnl": [500.0], "benchmark_nav": [1.01],
+        })
+        StreamTable(stream_dir / "trades", TRADE_COLUMNS)
+        write_summary(stream_dir, {"total_returns": 0.005})
+        result = load_job_result(self.job_dir, "stream")
+        self.assertEqual(result["total_value"].tolist(), [100500.0])
+        # no units in the summary: from the first day's returns
+        self.assertAlmostEqual(result["starting_value"], 100000.0)
+        self.assertEqual(result["benchmark_nav"].tolist(), [1.01])
+        self.assertEqual(len(result["trades"]["day"]), 0)
+
+    def test_benchmark_nav_starts_from_the_previous_close(self):
+        bundle = self.job_dir / "bundle"
+        bundle.mkdir()
+        np.save(bundle / "trading_dates.npy", np.array([20231229] + DATES))
+        (bundle / "instruments.pk").write_bytes(pickle.dumps([{
+            "order_book_id": "000300.XSHG", "symbol": "CSI300", "type": "INDX", "round_lot": 1.0,
+            "listed_date": "2005-04-08", "de_listed_date": "0000-00-00",
+        }]))
+        bars = np.zeros(3, dtype=[("datetime", "<u8"), ("open", "<f8"), ("close", "<f8"), ("high", "<f8"),
+                                  ("low", "<f8"), ("volume", "<f8")])
+        # no bar on 2024-01-03: the previous close carries over
+        bars["datetime"] = np.array([20231229, 20240102, 20240104], dtype="<u8") * 1_000_000
+        bars["close"] = [100.0, 102.0, 99.0]
+        with h5py.File(bundle / "indexes.h5", "w") as f:
+            f.create_dataset("000300.XSHG", data=bars)
+
+        nav = benchmark_nav(bundle, "000300.XSHG", np.array(DATES))
+        np.testing.assert_allclose(nav, [1.02, 1.02, 0.99])
+        with self.assertRaises(ValueError):
+            benchmark_nav(bundle, "000905.XSHG", np.array(DATES))
+
+
+if __name__ == "__main__":
+    unittest.main()
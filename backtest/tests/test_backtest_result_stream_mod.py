@@ -0,0 +1,221 @@
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import numpy as np
+from rqalpha.const import EXIT_CODE, RUN_TYPE
+from rqrisk import DAILY, Risk
+
+from app.backtest.mods.result_stream.mod import ResultStreamMod
+from app.backtest.mods.result_stream.stream import (
+    EQUITY_COLUMNS,
+    POSITION_COLUMNS,
+    TRADE_COLUMNS,
+    StreamTable,
+    read_equity,
+    read_summary,
+    read_table,
+    read_trades,
+    write_summary,
+)
+from app.backtest.mods.result_stream.summary import build_summary
+
+
+def _equity_rows(days, values):
+    return {
+        "date": days, "total_value": values, "unit_net_value": np.asarray(values) / 100.0,
+        "returns": [0.0] * len(days), "cash": values, "market_value": [0.0] * len(days),
+        "daily_pnl": [0.0] * len(days), "benchmark_nav": [1.0] + [np.nan] * (len(days) - 1),
+    }
+
+
+def _trade_rows(trading_datetimes, order_book_id=b"000001.XSHE"):
+    n = len(trading_datetimes)
+    return {
+        "datetime": trading_datetimes, "trading_datetime": trading_datetimes,
+        "order_book_id": [order_book_id] * n, "symbol": ["平安银行".encode("utf-8")] * n,
+        "side": [b"BUY"] * n, "position_effect": [b"OPEN"] * n, "exec_id": range(n),
+        "tax": [0.0] * n, "commission": [5.0] * n, "last_quantity": [100.0] * n, "last_price": [10.5] * n,
+        "order_id": range(n), "transaction_cost": [5.0] * n,
+    }
+
+
+class StreamTableTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_append_read_and_truncate(self):
+        table = StreamTable(self.root / "equity", EQUITY_COLUMNS)
+        table.append(_equity_rows([20240102, 20240103], [100.0, 101.0]))
+        table.append(_equity_rows([20240104], [102.0]))
+        self.assertEqual(len(table), 3)
+
+        data, total = read_table(table.path, start=1)
+        self.assertEqual(total, 3)
+        self.assertEqual(data["date"].tolist(), [20240103, 20240104])
+
+        # reopening with the same schema keeps the rows
+        table = StreamTable(self.root / "equity", EQUITY_COLUMNS)
+        table.truncate(1)
+        self.assertEqual(read_table(table.path)[0]["total_value"].tolist(), [100.0])
+        with self.assertRaises(ValueError):
+            table.append({**_equity_rows([20240105], [1.0]), "cash": [1.0, 2.0]})
+
+    def test_readers_see_complete_rows_only(self):
+        table = StreamTable(self.root / "equity", EQUITY_COLUMNS)
+        table.append(_equity_rows([20240102], [100.0]))
+        # a writer that got one column ahead of the others
+        with (table.path / "date.bin").open("ab") as f:
+            f.write(np.array([20240103], dtype="<i4").tobytes())
+        self.assertEqual(read_table(table.path)[1], 1)
+        self.assertEqual(read_table(self.root / "missing"), ({}, 0))
+
+    def test_equity_and_trades_are_shaped_like_the_result(self):
+        StreamTable(self.root / "equity", EQUITY_COLUMNS).append(_equity_rows([20240102, 20240103], [100.0, 99.0]))
+        StreamTable(self.root / "trades", TRADE_COLUMNS).append(_trade_rows([20240102150000, 20240103150000]))
+
+        equity, total = read_equity(self.root)
+        self.assertEqual(total, 2)
+        self.assertEqual(equity, {
+            "dates": ["2024-01-02", "2024-01-03"], "nav": [100.0, 99.0], "returns": [0.0, 0.0],
+            "benchmark_nav": [1.0, None],
+        })
+        trades, total = read_trades(self.root, 1, 5)
+        self.assertEqual(total, 2)
+        self.assertEqual(len(trades), 1)
+        self.assertEqual(trades[0]["trading_datetime"], "2024-01-03 15:00:00")
+        self.assertEqual(trades[0]["symbol"], "平安银行")
+        self.assertEqual(trades[0]["side"], "BUY")
+        self.assertEqual(trades[0]["last_price"], 10.5)
+
+    def test_summary_is_replaced_atomically(self):
+        self.assertIsNone(read_summary(self.root))
+        write_summary(self.root, {"sharpe": 1.0})
+        write_summary(self.root, {"sharpe": 2.0, "start_date": date(2024, 1, 2)})
+        self.assertEqual(read_summary(self.root), {"sharpe": 2.0, "start_date": "2024-01-02"})
+        self.assertEqual([p.name for p in self.root.iterdir()], ["summary.json"])
+
+
+class ResultStreamModTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmpdir.name) / "stream"
+        StreamTable(self.root / "equity", EQUITY_COLUMNS).append(
+            _equity_rows([20240102, 20240103, 20240104], [100.0, 101.0, 102.0]))
+        StreamTable(self.root / "trades", TRADE_COLUMNS).append(
+            _trade_rows([20240102150000, 20240103093100, 20240104150000]))
+        StreamTable(self.root / "positions", POSITION_COLUMNS).append({
+            "date": [20240102, 20240103, 20240104], "order_book_id": [b"000001.XSHE"] * 3,
+            "symbol": [b"PAYH"] * 3, "direction": [b"LONG"] * 3, "quantity": [100.0] * 3,
+            "avg_price": [10.5] * 3, "last_price": [10.0, 11.0, 12.0], "market_value": [1000.0, 1100.0, 1200.0],
+            "pnl": [-50.0, 50.0, 150.0],
+        })
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _start(self, start_date, summary=False):
+        env = SimpleNamespace(config=SimpleNamespace(base=SimpleNamespace(start_date=start_date)), event_bus=Mock())
+        mod = ResultStreamMod()
+        mod.start_up(env, SimpleNamespace(path=str(self.root), summary=summary))
+        return mod
+
+    def test_resumed_run_keeps_the_rows_before_its_start(self):
+        write_summary(self.root, {"sharpe": 1.0})
+        mod = self._start(date(2024, 1, 4))
+        self.assertIsNone(read_summary(self.root))
+        self.assertEqual(read_equity(self.root)[0]["dates"], ["2024-01-02", "2024-01-03"])
+        self.assertEqual([t["trading_datetime"] for t in read_trades(self.root)[0]],
+                         ["2024-01-02 15:00:00", "2024-01-03 09:31:00"])
+        self.assertEqual(read_table(self.root / "positions")[0]["date"].tolist(), [20240102, 20240103])
+        # the benchmark series of the resumed range continues from the last kept day
+        self.assertEqual(mod._benchmark_base, 1.0)
+
+        self._start(date(2024, 1, 2))
+        self.assertEqual(read_equity(self.root)[1], 0)
+        self.assertEqual(read_trades(self.root)[1], 0)
+        self.assertEqual(read_table(self.root / "positions")[1], 0)
+
+    def test_summary_is_written_on_success_only(self):
+        mod = self._start(date(2024, 1, 2), summary=True)
+        mod._env.mod_dict = {}
+        mod._env.config.base.benchmark = None
+        with patch("app.backtest.mods.result_stream.mod.build_summary",
+                                 return_value={"sharpe": 1.5}) as build:
+            mod.tear_down(EXIT_CODE.EXIT_SUCCESS)  # nothing settled
+            StreamTable(self.root / "equity", EQUITY_COLUMNS).append(_equity_rows([20240102], [100.0]))
+            mod.tear_down(EXIT_CODE.EXIT_USER_ERROR)
+            self.assertIsNone(read_summary(self.root))
+            mod.tear_down(EXIT_CODE.EXIT_SUCCESS)
+        self.assertEqual(read_summary(self.root), {"sharpe": 1.5})
+        self.assertEqual(build.call_args.args[1:], (self.root, None))
+
+
+class StreamSummaryTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmpdir.name)
+        days = [20240102, 20240103, 20240104, 20240105, 20240108]
+        values = np.array([100.0, 102.0, 101.0, 104.0, 103.0])
+        self.returns = values / np.concatenate([[100.0], values[:-1]]) - 1
+        self.benchmark_nav = np.array([1.01, 1.0, 1.02, 1.03, 1.01])
+        StreamTable(self.root / "equity", EQUITY_COLUMNS).append({
+            "date": days, "total_value": values, "unit_net_value": values / 100.0, "returns": self.returns,
+            "cash": values - 50.0, "market_value": [50.0] * 5, "daily_pnl": np.diff(values, prepend=100.0),
+            "benchmark_nav": self.benchmark_nav,
+        })
+        StreamTable(self.root / "trades", TRADE_COLUMNS).append(_trade_rows([20240102150000, 20240105093100]))
+        portfolio = SimpleNamespace(total_value=103.0, cash=53.0, total_returns=0.03, annualized_returns=3.4,
+                                    unit_net_value=1.03, units=100.0)
+        self.env = SimpleNamespace(
+            config=SimpleNamespace(base=SimpleNamespace(
+                start_date=date(2024, 1, 2), end_date=date(2024, 1, 8), strategy_file="/jobs/j1/strategy.py",
+                run_type=RUN_TYPE.BACKTEST, accounts={"STOCK": 100},
+            )),
+            data_proxy=SimpleNamespace(
+                get_risk_free_rate=Mock(return_value=0.02),
+                instrument_not_none=Mock(return_value=SimpleNamespace(symbol="沪深300")),
+            ),
+            portfolio=portfolio,
+            trading_days_a_year=252,
+        )
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_summary_matches_the_risk_of_the_daily_columns(self):
+        summary = build_summary(self.env, self.root, [("000300.XSHG", 1.0)])
+        benchmark_returns = self.benchmark_nav / np.concatenate([[1.0], self.benchmark_nav[:-1]]) - 1
+        risk = Risk(self.returns, benchmark_returns, 0.02, period=DAILY, trading_days_a_year=252)
+
+        self.assertEqual(summary["strategy_name"], "strategy")
+        self.assertEqual(summary["benchmark_symbol"], "沪深300")
+        self.assertEqual(summary["STOCK"], 100)
+        self.assertAlmostEqual(summary["sharpe"], risk.sharpe)
+        self.assertAlmostEqual(summary["alpha"], risk.alpha)
+        self.assertAlmostEqual(summary["max_drawdown"], risk.max_drawdown)
+        self.assertAlmostEqual(summary["benchmark_total_returns"], 0.01)
+        self.assertAlmostEqual(summary["profit_loss_rate"], np.mean([2.0, 3.0]) / np.mean([1.0, 1.0]))
+        self.assertEqual(summary["total_value"], 103.0)
+        self.assertEqual(summary["max_drawdown_duration_start_date"], "2024-01-03")
+        # two trades of 100 @ 10.5 over a market value of 50
+        self.assertAlmostEqual(summary["turnover"], 2 * 1050.0 / 50.0 / 2)
+        self.assertIn("weekly_sharpe", summary)
+
+    def test_turnover_is_only_reported_for_equities(self):
+        StreamTable(self.root / "trades", TRADE_COLUMNS).append(_trade_rows([20240108093100], b"IF2401"))
+        summary = build_summary(self.env, self.root, None)
+        self.assertTrue(np.isnan(summary["turnover"]))
+        self.assertNotIn("benchmark", summary)
+        self.assertNotIn("excess_max_drawdown_duration", summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
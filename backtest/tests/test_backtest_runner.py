@@ -1,12 +1,27 @@
+import os
+import subprocess
 import sys
 import tempfile
+import threading
+import time
 import unittest
 from pathlib import Path
 from unittest.mock import Mock, patch
 
 from flask import Flask
 
-from app.backtest.services.runner import run_rqalpha
+import yaml
+
+from app.backtest.services.runner import (
+    RQALPHA_CANCELLED_EXIT_CODE,
+    acquire_job_lock,
+    build_config_yaml,
+    is_cancel_requested,
+    read_status,
+    request_job_cancel,
+    run_rqalpha,
+    write_status,
+)
 
 
 class BacktestRunnerTestCase(unittest.TestCase):
@@ -91,6 +106,194 @@ class BacktestRunnerTestCase(unittest.TestCase):
             ["custom-rqalpha", "--foo", "run", "-f", "strategy.py", "--config", "config.yml"],
         )
 
+    def test_run_rqalpha_puts_project_root_on_pythonpath(self):
+        job_dir = self._build_job_dir("job_env")
+        proc = self._build_proc()
+
+        with self.app.app_context(), patch.dict("os.environ", {"PYTHONPATH": "/opt/extra"}), patch(
+            "app.backtest.services.runner.subprocess.Popen", return_value=proc
+        ) as popen:
+            run_rqalpha("job_env", job_dir)
+
+        project_root = str(Path(__file__).resolve().parents[1])
+        self.assertEqual(popen.call_args.kwargs["env"]["PYTHONPATH"].split(os.pathsep), [project_root, "/opt/extra"])
+
+    def test_cancel_from_another_worker_stops_the_run_through_the_job_dir(self):
+        job_dir = self._build_job_dir("job_cancel")
+        self.app.config.update(RQALPHA_COMMAND=f"{sys.executable} -c 'import time; time.sleep(30)'", BACKTEST_TIMEOUT=60)
+        lock = acquire_job_lock(job_dir)
+        results = []
+
+        def run():
+            with self.app.app_context():
+                results.append(run_rqalpha("job_cancel", job_dir, lock=lock))
+
+        with self.app.app_context():
+            write_status(job_dir, "RUNNING")
+        thread = threading.Thread(target=run)
+        thread.start()
+        while not (job_dir / "run.pid").exists():
+            time.sleep(0.05)
+
+        # the worker that owns the run picks the request up; the status is its to write
+        self.assertEqual(request_job_cancel(job_dir, wait=0), "RUNNING")
+        self.assertTrue(is_cancel_requested(job_dir))
+        thread.join(timeout=10)
+        lock.close()
+        self.assertEqual(results, [RQALPHA_CANCELLED_EXIT_CODE])
+        self.assertFalse((job_dir / "run.pid").exists())
+
+    def test_cancel_of_a_job_without_a_live_run_marks_it_cancelled(self):
+        job_dir = self._build_job_dir("job_orphan")
+        with self.app.app_context():
+            write_status(job_dir, "RUNNING")
+            self.assertEqual(request_job_cancel(job_dir, wait=0), "CANCELLED")
+        self.assertEqual(read_status(job_dir)["error"]["code"], "JOB_CANCELLED")
+        self.assertFalse(is_cancel_requested(job_dir))
+
+        # a run whose worker died keeps the lock; it is stopped through its recorded pid
+        job_dir = self._build_job_dir("job_orphan_run")
+        lock = acquire_job_lock(job_dir)
+        proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"], pass_fds=(lock.fileno(),))
+        lock.close()
+        (job_dir / "run.pid").write_text(str(proc.pid), encoding="utf-8")
+        try:
+            with self.app.app_context():
+                write_status(job_dir, "RUNNING")
+                self.assertEqual(request_job_cancel(job_dir, wait=10), "CANCELLED")
+            self.assertIsNotNone(proc.poll())
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def _config(self, frequency: str = "1d", engine: str = "rqalpha", **overrides) -> dict:
+        self.app.config.update(overrides)
+        with self.app.app_context():
+            text = build_config_yaml(
+                start_date="2024-01-01",
+                end_date="2024-06-30",
+                cash=100000,
+                benchmark="000300.XSHG",
+                frequency=frequency,
+                output_file=str(self.base_dir / "result.pkl"),
+                data_bundle_path=Path("/data/bundle/.versions/v1"),
+                engine=engine,
+            )
+        return yaml.safe_load(text)
+
+    def test_config_enables_shared_bundle_mod(self):
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle")
+        self.assertEqual(config["base"]["data_bundle_path"], "/data/bundle/.versions/v1")
+        self.assertEqual(config["mod"]["shared_bundle"], {
+            "enabled": True,
+            "lib": "app.backtest.mods.shared_bundle",
+            "cache_root": "/data/bundle/.columnar",
+        })
+
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_SHARED_BUNDLE=False)
+        self.assertNotIn("shared_bundle", config["mod"])
+
+    def test_config_enables_indicators_mod(self):
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle")
+        self.assertEqual(config["mod"]["indicators"], {"enabled": True, "lib": "app.backtest.mods.indicators"})
+
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_INDICATORS=False)
+        self.assertNotIn("indicators", config["mod"])
+
+    def test_config_enables_precompute_mod(self):
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_PRECOMPUTE_LOOKBACK_DAYS=60)
+        self.assertEqual(config["mod"]["precompute"], {
+            "enabled": True,
+            "lib": "app.backtest.mods.precompute",
+            "lookback_days": 60,
+        })
+
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_PRECOMPUTE=False)
+        self.assertNotIn("precompute", config["mod"])
+
+    def test_config_enables_checkpoint_mod_for_rqalpha_runs(self):
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_CHECKPOINT_INTERVAL_SECONDS=30)
+        self.assertEqual(config["mod"]["checkpoint"], {
+            "enabled": True,
+            "lib": "app.backtest.mods.checkpoint",
+            "path": str(self.base_dir / "checkpoint.pkl"),
+            "interval_seconds": 30,
+            "resume": True,
+        })
+
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_CHECKPOINT=False)
+        self.assertNotIn("checkpoint", config["mod"])
+        config = self._config(engine="vector", RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_CHECKPOINT=True)
+        self.assertNotIn("checkpoint", config["mod"])
+
+    def test_config_enables_result_stream_mod_for_rqalpha_runs(self):
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle")
+        self.assertEqual(config["mod"]["result_stream"], {
+            "enabled": True,
+            "lib": "app.backtest.mods.result_stream",
+            "path": str(self.base_dir / "stream"),
+            "summary": False,
+        })
+        self.assertTrue(config["mod"]["sys_analyser"]["enabled"])
+
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_RESULT_STREAM=False)
+        self.assertNotIn("result_stream", config["mod"])
+        config = self._config(engine="vector", RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_RESULT_STREAM=True)
+        self.assertNotIn("result_stream", config["mod"])
+
+    def test_config_streams_the_result_of_streaming_frequencies(self):
+        config = self._config("1m", RQALPHA_BUNDLE_PATH="/data/bundle")
+        self.assertTrue(config["mod"]["result_stream"]["summary"])
+        self.assertFalse(config["mod"]["sys_analyser"]["enabled"])
+
+        config = self._config("1m", RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_STREAMING_RESULT_FREQUENCIES=("1d",))
+        self.assertFalse(config["mod"]["result_stream"]["summary"])
+        self.assertTrue(config["mod"]["sys_analyser"]["enabled"])
+        # without the stream sys_analyser writes the result
+        config = self._config(
+            "1d", RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_RESULT_STREAM=False,
+            BACKTEST_STREAMING_RESULT_FREQUENCIES=("1d",),
+        )
+        self.assertTrue(config["mod"]["sys_analyser"]["enabled"])
+
+    def test_config_enables_minute_bars_mod_for_1m(self):
+        config = self._config(RQALPHA_BUNDLE_PATH="/data/bundle")
+        self.assertNotIn("minute_bars", config["mod"])
+
+        config = self._config(
+            "1m", RQALPHA_BUNDLE_PATH="/data/bundle", DB_TYPE="mariadb", DB_HOST="db.local",
+            DB_PASSWORD="secret", DB_TABLE="dbbardata", BACKTEST_MINUTE_PREFETCH_DAYS=3,
+        )
+        minute_bars = config["mod"]["minute_bars"]
+        self.assertEqual(minute_bars["lib"], "app.backtest.mods.minute_bars")
+        self.assertEqual(minute_bars["table"], "dbbardata")
+        self.assertEqual(minute_bars["prefetch_days"], 3)
+        self.assertEqual(minute_bars["database"]["db_type"], "mariadb")
+        self.assertEqual(minute_bars["database"]["host"], "db.local")
+        self.assertNotIn("password", minute_bars["database"])
+        self.assertIn("shared_bundle", config["mod"])
+
+    def test_vector_engine_runs_vector_module_with_its_config_section(self):
+        job_dir = self._build_job_dir("job_vector")
+        proc = self._build_proc()
+
+        with self.app.app_context(), patch(
+            "app.backtest.services.runner.shutil.which",
+            return_value="/usr/local/bin/rqalpha",
+        ), patch("app.backtest.services.runner.subprocess.Popen", return_value=proc) as popen:
+            code = run_rqalpha("job_vector", job_dir, engine="vector")
+
+        self.assertEqual(code, 0)
+        self.assertEqual(
+            popen.call_args.args[0],
+            [sys.executable, "-m", "app.backtest.services.vector", "-f", "strategy.py", "--config", "config.yml"],
+        )
+
+        self.assertNotIn("vector", self._config(RQALPHA_BUNDLE_PATH="/data/bundle"))
+        config = self._config(engine="vector", RQALPHA_BUNDLE_PATH="/data/bundle", BACKTEST_VECTOR_LOOKBACK_DAYS=120)
+        self.assertEqual(config["vector"], {"lookback_days": 120})
+        self.assertEqual(config["mod"]["shared_bundle"]["cache_root"], "/data/bundle/.columnar")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,92 @@
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import h5py
+import numpy as np
+from rqalpha.const import INSTRUMENT_TYPE, MARKET
+from rqalpha.data.base_data_source.storages import FutureDayBarStore
+
+from app.backtest.mods.shared_bundle.mod import (
+    MappedDayBarStore, SharedBundleDataSource, default_cache_root,
+)
+from app.market_data.columnar import build_columnar_file
+
+
+def _future_bars(*dates):
+    data = np.zeros(len(dates), dtype=FutureDayBarStore.DEFAULT_DTYPE)
+    data["datetime"] = [d * 1_000_000 for d in dates]
+    data["close"] = [d % 100 for d in dates]
+    return data
+
+
+def _write_bundle(path: Path) -> None:
+    """Smallest bundle rqalpha's BaseDataSource accepts, with futures day bars."""
+    (path / "future_info.json").write_text(
+        json.dumps([{"underlying_symbol": "RB", "commission_type": "by_money", "margin_rate": 0.1}])
+    )
+    (path / "share_transformation.json").write_text("{}")
+    (path / "instruments.pk").write_bytes(pickle.dumps([]))
+    np.save(path / "trading_dates.npy", np.array([20240102, 20240103, 20240104]))
+    with h5py.File(path / "yield_curve.h5", "w") as f:
+        f.create_dataset("data", data=np.zeros(1, dtype=[("date", "<u4"), ("0S", "<f8")]))
+    for name in ("suspended_days.h5", "st_stock_days.h5", "stocks.h5", "indexes.h5", "funds.h5",
+                 "dividends.h5", "split_factor.h5", "ex_cum_factor.h5"):
+        h5py.File(path / name, "w").close()
+    with h5py.File(path / "futures.h5", "w") as f:
+        f.create_dataset("RB2405", data=_future_bars(20240102, 20240103, 20240104))
+
+
+class SharedBundleModTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.bundle = Path(self._tmpdir.name) / "bundle"
+        self.bundle.mkdir()
+        _write_bundle(self.bundle)
+        self.base_config = SimpleNamespace(data_bundle_path=str(self.bundle))
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_default_cache_root_of_pinned_version(self):
+        root = Path("/data/bundle")
+        self.assertEqual(default_cache_root(root / ".versions" / "v1"), root / ".columnar")
+        self.assertEqual(default_cache_root(root), root / ".columnar")
+
+    def test_day_bars_are_shared_read_only_views(self):
+        build_columnar_file(str(self.bundle), "futures.h5")
+        data_source = SharedBundleDataSource(self.base_config)
+        self.assertEqual(data_source.mapped_sources, ["futures.h5"])
+
+        store = data_source._day_bar_stores[INSTRUMENT_TYPE.FUTURE, MARKET.CN]
+        self.assertIsInstance(store, MappedDayBarStore)
+        bars = store.get_bars("RB2405")
+        self.assertEqual(bars.dtype, FutureDayBarStore.DEFAULT_DTYPE)
+        self.assertEqual(bars["close"].tolist(), [2.0, 3.0, 4.0])
+        self.assertIsInstance(bars.base, np.memmap)
+        self.assertFalse(bars.flags.writeable)
+        self.assertEqual(store.get_date_range("RB2405"), (20240102000000, 20240104000000))
+
+        missing = store.get_bars("CU2405")
+        self.assertEqual(len(missing), 0)
+        self.assertEqual(missing.dtype, FutureDayBarStore.DEFAULT_DTYPE)
+
+    def test_stale_or_missing_cache_falls_back_to_hdf5(self):
+        data_source = SharedBundleDataSource(self.base_config)
+        self.assertEqual(data_source.mapped_sources, [])
+
+        build_columnar_file(str(self.bundle), "futures.h5")
+        stat = os.stat(self.bundle / "futures.h5")
+        os.utime(self.bundle / "futures.h5", (stat.st_atime, stat.st_mtime + 10))
+        data_source = SharedBundleDataSource(self.base_config)
+        self.assertEqual(data_source.mapped_sources, [])
+        store = data_source._day_bar_stores[INSTRUMENT_TYPE.FUTURE, MARKET.CN]
+        self.assertIsInstance(store, FutureDayBarStore)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -413,6 +413,55 @@ class BacktestStrategiesApiTestCase(unittest.TestCase):
         self.assertEqual(payload["diagnostics"][0]["level"], "error")
         self.assertIn("not installed", payload["diagnostics"][0]["message"])
 
+    def test_compile_strategy_checks_precompute_hook(self):
+        self.client.post(
+            "/api/backtest/strategies/demo",
+            json={"code": "def init(context):\n    pass\n"},
+            headers=self._auth_headers(),
+        )
+
+        resp = self.client.post(
+            "/api/backtest/strategies/demo/compile",
+            json={"code": "def precompute(context, data):\n    return {}\n"},
+            headers=self._auth_headers(),
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("precompute hook check passed", resp.get_json()["stdout"])
+
+        resp = self.client.post(
+            "/api/backtest/strategies/demo/compile",
+            json={"code": "def precompute(context):\n    order_shares('000001.XSHE', 100)\n"},
+            headers=self._auth_headers(),
+        )
+        self.assertEqual(resp.status_code, 422)
+        payload = resp.get_json()
+        self.assertFalse(payload["ok"])
+        messages = [item["message"] for item in payload["diagnostics"]]
+        self.assertEqual(len(messages), 2)
+        self.assertIn("precompute must accept (context, data)", messages[0])
+        self.assertIn("cannot place orders ('order_shares')", messages[1])
+        self.assertEqual(payload["diagnostics"][1]["line"], 2)
+
+    def test_compile_strategy_checks_vector_targets_hook(self):
+        resp = self.client.post(
+            "/api/backtest/strategies/demo/compile",
+            json={"code": "def vector_targets(data):\n    return {}\n"},
+            headers=self._auth_headers(),
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("vector_targets hook check passed", resp.get_json()["stdout"])
+
+        resp = self.client.post(
+            "/api/backtest/strategies/demo/compile",
+            json={"code": "def vector_targets(context, data):\n    yield {}\n"},
+            headers=self._auth_headers(),
+        )
+        self.assertEqual(resp.status_code, 422)
+        messages = [item["message"] for item in resp.get_json()["diagnostics"]]
+        self.assertEqual(len(messages), 2)
+        self.assertIn("vector_targets must accept (data)", messages[0])
+        self.assertIn("vector_targets must return a dict of target weights, not yield", messages[1])
+
     def test_compile_strategy_invalid_code_type_returns_400(self):
         resp = self.client.post(
             "/api/backtest/strategies/demo/compile",
@@ -0,0 +1,175 @@
+import json
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from app.backtest.services.extractor import extract_result
+from app.backtest.services.vector import BundleBars, Costs, VectorData, run_file, simulate
+
+DATES = [20240102, 20240103, 20240104, 20240105, 20240108, 20240109, 20240110, 20240111, 20240112, 20240115]
+# 000001.XSHE splits 2-for-1 on 2024-01-10 and pays 0.5/share ex 2024-01-12, payable 2024-01-15.
+CLOSES = [10, 10, 10, 10, 12, 12, 6, 6, 6.5, 6]
+BAR_DTYPE = np.dtype([
+    ("datetime", "<u8"), ("open", "<f8"), ("close", "<f8"), ("high", "<f8"), ("low", "<f8"),
+    ("limit_up", "<f8"), ("limit_down", "<f8"), ("volume", "<f8"),
+])
+
+
+def _instrument(order_book_id, ins_type, listed_date):
+    return {
+        "order_book_id": order_book_id, "symbol": order_book_id[:6], "type": ins_type, "round_lot": 100.0,
+        "board_type": "MainBoard", "listed_date": listed_date, "de_listed_date": "0000-00-00",
+    }
+
+
+def _bars(dates, closes, limit_up=None):
+    bars = np.zeros(len(dates), dtype=BAR_DTYPE)
+    bars["datetime"] = np.asarray(dates, dtype="<u8") * 1_000_000
+    for field in ("open", "close", "high", "low"):
+        bars[field] = closes
+    bars["limit_up"] = np.asarray(closes) * 1.1 if limit_up is None else limit_up
+    bars["limit_down"] = np.asarray(closes) * 0.9
+    bars["volume"] = 1e6
+    return bars
+
+
+def _write_bundle(path: Path) -> None:
+    np.save(path / "trading_dates.npy", np.array(DATES))
+    (path / "instruments.pk").write_bytes(pickle.dumps([
+        _instrument("000001.XSHE", "CS", "2000-01-04"),
+        _instrument("000002.XSHE", "CS", "2024-01-05"),
+        _instrument("000300.XSHG", "INDX", "2005-04-08"),
+    ]))
+    second_closes = [20.0] * 7
+    with h5py.File(path / "stocks.h5", "w") as f:
+        f.create_dataset("000001.XSHE", data=_bars(DATES, CLOSES))
+        # listed on the 4th trading day, closes at the limit-up price on its 5th
+        f.create_dataset("000002.XSHE", data=_bars(DATES[3:], second_closes, limit_up=[22, 20, 22, 22, 22, 22, 22]))
+    with h5py.File(path / "indexes.h5", "w") as f:
+        f.create_dataset("000300.XSHG", data=_bars(DATES, np.arange(100.0, 110.0)))
+    with h5py.File(path / "split_factor.h5", "w") as f:
+        f.create_dataset("000001.XSHE", data=np.array(
+            [(20240110000000, 2.0)], dtype=[("ex_date", "<u8"), ("split_factor", "<f8")]))
+    with h5py.File(path / "ex_cum_factor.h5", "w") as f:
+        f.create_dataset("000001.XSHE", data=np.array(
+            [(0, 1.0), (20240110000000, 2.0)], dtype=[("start_date", "<u8"), ("ex_cum_factor", "<f8")]))
+    with h5py.File(path / "dividends.h5", "w") as f:
+        f.create_dataset("000001.XSHE", data=np.array(
+            [(20240111, 20240101, 5.0, 20240112, 20240115, 10.0)],
+            dtype=[("book_closure_date", "<u4"), ("announcement_date", "<u4"), ("dividend_cash_before_tax", "<f8"),
+                   ("ex_dividend_date", "<u4"), ("payable_date", "<u4"), ("round_lot", "<f8")]))
+
+
+class VectorEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmpdir.name)
+        (self.tmp / "bundle").mkdir()
+        _write_bundle(self.tmp / "bundle")
+        self.bundle = BundleBars(self.tmp / "bundle", cache_dir=self.tmp / "no_cache")
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _weights(self, data, rows):
+        weights = np.full(len(data), np.nan)
+        for row, weight in rows.items():
+            weights[row] = weight
+        return weights
+
+    def test_prices_are_aligned_on_trading_days_and_adjusted(self):
+        data = VectorData(self.bundle, "2024-01-04", "2024-01-15", lookback=1)
+        self.assertEqual(data.start, 1)
+        self.assertEqual(data.dates.tolist(), DATES[1:])
+        self.assertEqual(data.index_of("2024-01-07"), 2)
+
+        np.testing.assert_allclose(data.prices("000001.XSHE", adjust_type="none"), CLOSES[1:])
+        np.testing.assert_allclose(data.prices("000001.XSHE"), [5, 5, 5, 6, 6, 6, 6, 6.5, 6])
+        np.testing.assert_allclose(data.prices("000001.XSHE", adjust_type="post"), [10, 10, 10, 12, 12, 12, 12, 13, 12])
+
+        both = data.prices(["000001.XSHE", "000002.XSHE"], adjust_type="none")
+        self.assertEqual(both.shape, (9, 2))
+        self.assertTrue(np.isnan(both[:2, 1]).all())
+        self.assertEqual(both[2, 1], 20.0)
+
+    def test_orders_follow_order_target_percent_with_splits_and_dividends(self):
+        data = VectorData(self.bundle, "2024-01-02", "2024-01-15")
+        targets = {"000001.XSHE": self._weights(data, {0: 1.0, 9: 0.0})}
+        result = simulate(data, targets, 100000)
+
+        trades = result["trades"]
+        self.assertEqual(trades["side"].tolist(), ["BUY", "SELL"])
+        # 10000 shares do not fit once commission is added; rounded down a lot. The split doubles them.
+        self.assertEqual(trades["last_quantity"].tolist(), [9900, 19800])
+        np.testing.assert_allclose(trades["commission"], [79.2, 95.04])
+        np.testing.assert_allclose(trades["tax"], [0.0, 59.4])
+
+        portfolio = result["portfolio"]
+        # Ex-dividend day: 19800 * 0.5 is receivable until the payable date.
+        self.assertAlmostEqual(portfolio["total_value"].iloc[8], 920.8 + 9900 + 19800 * 6.5)
+        self.assertAlmostEqual(portfolio["total_value"].iloc[-1], 129466.36)
+        self.assertAlmostEqual(portfolio["cash"].iloc[-1], 129466.36)
+        self.assertAlmostEqual(result["summary"]["total_returns"], 0.2946636)
+        self.assertEqual(result["summary"]["engine"], "vector")
+
+    def test_orders_without_a_bar_or_at_the_limit_are_not_filled(self):
+        data = VectorData(self.bundle, "2024-01-02", "2024-01-15")
+        targets = {"000002.XSHE": self._weights(data, {1: 0.5, 4: 0.5})}
+        self.assertEqual(len(simulate(data, targets, 100000)["trades"]), 0)
+
+        targets = {"000002.XSHE": self._weights(data, {5: 0.5})}
+        costs = Costs.from_config({"mod": {"sys_simulation": {"slippage": 0.01},
+                                           "sys_transaction_cost": {"stock_min_commission": 0}}})
+        trades = simulate(data, targets, 100000, costs)["trades"]
+        self.assertEqual(trades["last_quantity"].tolist(), [2400])
+        np.testing.assert_allclose(trades["last_price"], [20.2])
+
+        with self.assertRaises(ValueError):
+            simulate(data, {"000001.XSHE": self._weights(data, {0: -0.5})}, 100000)
+        with self.assertRaises(ValueError):
+            simulate(data, {"000001.XSHE": np.ones(3)}, 100000)
+
+    def test_run_file_writes_a_result_the_extractor_reads(self):
+        strategy = self.tmp / "strategy.py"
+        strategy.write_text(
+            "import numpy as np\n\n"
+            "def vector_targets(data):\n"
+            "    weights = np.full(len(data.dates), np.nan)\n"
+            "    weights[data.start] = 1.0\n"
+            "    weights[-1] = 0.0\n"
+            "    return {'000001.XSHE': weights}\n",
+            encoding="utf-8",
+        )
+        config = {
+            "base": {
+                "start_date": "2024-01-02", "end_date": "2024-01-15", "frequency": "1d",
+                "data_bundle_path": str(self.tmp / "bundle"), "benchmark": "000300.XSHG",
+                "accounts": {"STOCK": 100000, "FUTURE": 100000},
+            },
+            "mod": {
+                "sys_analyser": {"output_file": str(self.tmp / "result.pkl")},
+                "shared_bundle": {"cache_root": str(self.tmp / "no_cache")},
+            },
+            "vector": {"lookback_days": 5},
+        }
+        run_file(strategy, config)
+        extracted = extract_result(self.tmp / "result.pkl", self.tmp / "extracted.json")
+
+        self.assertEqual(json.loads((self.tmp / "extracted.json").read_text(encoding="utf-8")), extracted)
+        self.assertEqual(extracted["equity"]["dates"][0], "2024-01-02")
+        self.assertEqual(len(extracted["equity"]["nav"]), len(DATES))
+        self.assertAlmostEqual(extracted["equity"]["benchmark_nav"][-1], 1.09)
+        self.assertEqual([trade["side"] for trade in extracted["trades"]], ["BUY", "SELL"])
+        self.assertAlmostEqual(extracted["summary"]["total_returns"], 0.2946636)
+
+        config["base"]["frequency"] = "1m"
+        with self.assertRaises(ValueError):
+            run_file(strategy, config)
+
+
+if __name__ == "__main__":
+    unittest.main()
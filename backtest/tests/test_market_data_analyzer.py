@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import h5py
+import numpy as np
+
+from app.database import get_db_connection
+from app.market_data.analyzer import analyze_bundle
+from app.market_data.db_init import init_database
+
+
+_BAR_DTYPE = np.dtype([("datetime", "<u8"), ("close", "<f8")])
+
+
+def _bars(*dates):
+    data = np.zeros(len(dates), dtype=_BAR_DTYPE)
+    data["datetime"] = [d * 1_000_000 for d in dates]
+    return data
+
+
+class IncrementalAnalyzerTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        root = Path(self._tmpdir.name)
+        self.bundle = root / "bundle"
+        self.bundle.mkdir()
+        db_path = root / "market_data.sqlite3"
+        init_database(db_path)
+        self.config = {"db_type": "sqlite", "sqlite_path": str(db_path)}
+
+        with h5py.File(self.bundle / "futures.h5", "w") as f:
+            f.create_dataset("RB2405", data=_bars(20240102, 20240103, 20240104))
+            f.create_dataset("CU2405", data=_bars(20240103))
+        (self.bundle / "trading_dates.npy").write_bytes(b"x")
+
+        self.tm = mock.Mock()
+        patcher = mock.patch("app.market_data.task_manager.get_task_manager", return_value=self.tm)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _coverage(self):
+        with get_db_connection(config_dict=self.config) as db:
+            rows = db.fetchall(
+                "SELECT order_book_id, first_date, last_date, bar_count, updated_at "
+                "FROM market_data_instrument_coverage ORDER BY order_book_id"
+            )
+            stats = db.fetchone("SELECT futures_count, total_files FROM market_data_stats WHERE id = 1")
+            files = db.fetchall("SELECT file_id, file_path FROM market_data_files ORDER BY file_path")
+        return {r["order_book_id"]: r for r in rows}, stats, files
+
+    def _logs(self):
+        return [c.args[2] for c in self.tm.log.call_args_list]
+
+    def test_first_run_records_per_instrument_coverage(self):
+        analyze_bundle("t1", self.bundle, self.config)
+        coverage, stats, files = self._coverage()
+        self.assertEqual(coverage["RB2405"]["first_date"], "2024-01-02")
+        self.assertEqual(coverage["RB2405"]["last_date"], "2024-01-04")
+        self.assertEqual(coverage["RB2405"]["bar_count"], 3)
+        self.assertEqual(stats["futures_count"], 2)
+        self.assertEqual([f["file_path"] for f in files], ["futures.h5", "trading_dates.npy"])
+
+    def test_rerun_only_touches_changed_files_and_rows(self):
+        analyze_bundle("t1", self.bundle, self.config)
+        coverage_before, _, files_before = self._coverage()
+
+        # Unchanged bundle: nothing is re-parsed or rewritten.
+        analyze_bundle("t2", self.bundle, self.config)
+        self.assertIn("合约覆盖：更新 0 条，删除 0 条", self._logs())
+        _, _, files_after = self._coverage()
+        self.assertEqual(files_before, files_after)
+
+        with h5py.File(self.bundle / "futures.h5", "a") as f:
+            del f["CU2405"]
+            del f["RB2405"]
+            f.create_dataset("RB2405", data=_bars(20240102, 20240103, 20240104, 20240105))
+        stat = os.stat(self.bundle / "futures.h5")
+        os.utime(self.bundle / "futures.h5", (stat.st_atime, stat.st_mtime + 10))
+        analyze_bundle("t3", self.bundle, self.config)
+
+        coverage, stats, files = self._coverage()
+        self.assertIn("合约覆盖：更新 1 条，删除 1 条", self._logs())
+        self.assertEqual(set(coverage), {"RB2405"})
+        self.assertEqual(coverage["RB2405"]["last_date"], "2024-01-05")
+        self.assertEqual(stats["futures_count"], 1)
+        # Unchanged files keep their rows.
+        self.assertEqual(files, files_before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from app.database import get_db_connection
+from app.market_data.bar_storage import (
+    MAX_PARTITION, bar_table_ddl, ensure_future_partitions, partitions_clause,
+)
+from app.market_data.db_init import _MARIADB_DDL
+
+
+class BarStorageTestCase(unittest.TestCase):
+    def test_partitions_clause_covers_each_year_and_catch_all(self):
+        clause = partitions_clause(2020, 2022)
+        self.assertTrue(clause.startswith("PARTITION BY RANGE COLUMNS(datetime)"))
+        self.assertIn("PARTITION p2020 VALUES LESS THAN ('2021-01-01')", clause)
+        self.assertIn("PARTITION p2022 VALUES LESS THAN ('2023-01-01')", clause)
+        self.assertNotIn("p2023", clause)
+        self.assertTrue(clause.rstrip(")\n").endswith(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE"))
+
+    def test_ddl_clusters_on_series_key(self):
+        ddl = bar_table_ddl("bars", 2015, 2016)
+        self.assertIn("CREATE TABLE IF NOT EXISTS `bars`", ddl)
+        self.assertIn("PRIMARY KEY (symbol, exchange, `interval`, datetime)", ddl)
+        self.assertIn("KEY idx_bars_id (id)", ddl)
+        self.assertIn("PARTITION p2016", ddl)
+        self.assertNotIn("PAGE_COMPRESSED", ddl)
+
+    def test_ddl_options(self):
+        ddl = bar_table_ddl("bars", 2015, compressed=True, if_not_exists=False)
+        self.assertIn("CREATE TABLE `bars`", ddl)
+        self.assertIn("PAGE_COMPRESSED=1", ddl)
+        self.assertIn(f"PARTITION p{datetime.now().year + 1} ", ddl)
+
+    def test_mariadb_schema_uses_managed_layout(self):
+        self.assertIn(bar_table_ddl("dbbardata"), _MARIADB_DDL)
+
+    def test_ensure_future_partitions_is_noop_on_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = {"db_type": "sqlite", "sqlite_path": str(Path(tmp) / "market_data.sqlite3")}
+            with get_db_connection(config_dict=config) as db:
+                self.assertEqual(ensure_future_partitions(db, "dbbardata"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.database import get_db_connection
+from app.market_data.bar_summary import (
+    count_series, load_series_summary, refresh_series, rollup_stats, summary_is_empty,
+    tracking_appends, verify_summary,
+)
+from app.market_data.db_init import init_database
+from app.market_data.resample import materialize_series
+
+_DDL = """
+CREATE TABLE dbbardata (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    exchange TEXT NOT NULL,
+    datetime TEXT NOT NULL,
+    `interval` TEXT NOT NULL,
+    volume REAL NOT NULL,
+    turnover REAL NOT NULL,
+    open_interest REAL NOT NULL,
+    open_price REAL NOT NULL,
+    high_price REAL NOT NULL,
+    low_price REAL NOT NULL,
+    close_price REAL NOT NULL,
+    UNIQUE (symbol, exchange, `interval`, datetime)
+)
+"""
+
+
+def _bar(symbol, exchange, dt, interval="1m", price=1.0):
+    return (symbol, exchange, dt, interval, 1.0, 1.0, 1.0, price, price, price, price)
+
+
+class BarSummaryTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        db_path = Path(self._tmpdir.name) / "market_data.sqlite3"
+        init_database(db_path)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(_DDL)
+        self.config = {"db_type": "sqlite", "sqlite_path": str(db_path)}
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _insert(self, db, bars):
+        db.replace_many(
+            "dbbardata",
+            ["symbol", "exchange", "datetime", "`interval`", "volume", "turnover", "open_interest",
+             "open_price", "high_price", "low_price", "close_price"],
+            bars,
+        )
+
+    def test_rollup_matches_a_full_scan_without_reading_bars(self):
+        with get_db_connection(config_dict=self.config) as db:
+            self._insert(db, [
+                _bar("RB2405", "SHFE", "2024-01-02 09:00:00"),
+                _bar("RB2405", "SHFE", "2024-01-02 09:01:00"),
+                _bar("RB2405", "SHFE", "2024-01-02 00:00:00", "d"),
+                _bar("IF2401", "CFFEX", "2024-01-03 09:30:00"),
+            ])
+            self.assertTrue(summary_is_empty(db, "dbbardata"))
+            result = verify_summary(db, "dbbardata")
+            self.assertEqual((result["checked"], result["missing"], result["fixed"]), (3, 3, 3))
+
+            db.execute("DROP TABLE dbbardata")
+            stats = rollup_stats(db)
+            cached = db.fetchone("SELECT total_rows, contract_count FROM vnpy_stats WHERE id = 1")
+
+        self.assertEqual(stats["total_rows"], 4)
+        self.assertEqual(stats["contract_count"], 2)
+        self.assertEqual(stats["exchange_count"], 2)
+        self.assertEqual(stats["min_date"], "2024-01-02 00:00:00")
+        self.assertEqual(stats["max_date"], "2024-01-03 09:30:00")
+        self.assertEqual(stats["by_exchange"][0], {"exchange": "SHFE", "contracts": 1, "rows": 3})
+        self.assertEqual((cached["total_rows"], cached["contract_count"]), (4, 2))
+
+    def test_tracked_appends_and_tail_rewrites_keep_counts_exact(self):
+        with get_db_connection(config_dict=self.config) as db:
+            self._insert(db, [_bar("RB2405", "SHFE", f"2024-01-02 09:0{i}:00") for i in range(3)])
+            refresh_series(db, "dbbardata", "RB2405", "SHFE", "1m")
+
+            with tracking_appends(db, "dbbardata", "RB2405", "SHFE", ["1m"]):
+                # Rewrites the last bar and appends two new ones.
+                self._insert(db, [_bar("RB2405", "SHFE", f"2024-01-02 09:0{i}:00", price=2.0)
+                                  for i in range(2, 5)])
+            summary = load_series_summary(db, "RB2405", "SHFE", "1m")
+            actual = count_series(db, "dbbardata", "RB2405", "SHFE", "1m")
+
+        self.assertEqual(summary, actual)
+        self.assertEqual(summary["bar_count"], 5)
+        self.assertEqual(summary["last_datetime"], "2024-01-02 09:04:00")
+
+    def test_materialized_bars_are_summarized(self):
+        with get_db_connection(config_dict=self.config) as db:
+            self._insert(db, [_bar("RB2405", "SHFE", f"2024-01-02 09:{i:02d}:00") for i in range(12)])
+            for _ in range(2):
+                with tracking_appends(db, "dbbardata", "RB2405", "SHFE", ["5m"]):
+                    materialize_series(db, "dbbardata", symbol="RB2405", exchange="SHFE", intervals=["5m"])
+            summary = load_series_summary(db, "RB2405", "SHFE", "5m")
+            self.assertEqual(summary["bar_count"], 3)
+            self.assertEqual(verify_summary(db, "dbbardata", fix=False)["missing"], 1)
+
+    def test_verify_repairs_drift_and_removes_stale_series(self):
+        with get_db_connection(config_dict=self.config) as db:
+            self._insert(db, [_bar("RB2405", "SHFE", "2024-01-02 09:00:00")])
+            verify_summary(db, "dbbardata")
+            db.execute("UPDATE vnpy_bar_summary SET bar_count = 7")
+            db.execute(
+                "INSERT INTO vnpy_bar_summary (symbol, exchange, `interval`, bar_count, updated_at) "
+                "VALUES ('GONE', 'SHFE', '1m', 3, '2024-01-01')"
+            )
+            result = verify_summary(db, "dbbardata")
+            self.assertEqual((result["mismatched"], result["stale"], result["fixed"]), (1, 1, 2))
+            self.assertEqual(verify_summary(db, "dbbardata", fix=False)["fixed"], 0)
+            self.assertIsNone(load_series_summary(db, "GONE", "SHFE", "1m"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import sqlite3
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask
+
+from app.api.market_data_api import bp_market_data
+from app.auth import generate_auth_token
+from app.database import get_db_connection
+from app.market_data import bars
+from app.market_data.db_init import init_database
+
+
+_DDL = """
+CREATE TABLE dbbardata (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    exchange TEXT NOT NULL,
+    datetime TEXT NOT NULL,
+    `interval` TEXT NOT NULL,
+    volume REAL NOT NULL,
+    turnover REAL NOT NULL,
+    open_interest REAL NOT NULL,
+    open_price REAL NOT NULL,
+    high_price REAL NOT NULL,
+    low_price REAL NOT NULL,
+    close_price REAL NOT NULL,
+    UNIQUE (symbol, exchange, `interval`, datetime)
+)
+"""
+
+
+class MarketDataBarsApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self._tmpdir.name) / "market_data.sqlite3"
+        conn = sqlite3.connect(str(self.db_path))
+        conn.execute(_DDL)
+        rows = []
+        for day in range(1, 6):
+            close = 3000.0 + day
+            rows.append(("RB2405", "SHFE", f"2024-01-0{day} 00:00:00", "d",
+                         100.0 * day, 0.0, 10.0, close - 1, close + 2, close - 3, close))
+        rows.append(("RB2405", "SHFE", "2024-01-02 09:00:00", "1m", 1.0, 0.0, 0.0, 1, 1, 1, 1))
+        conn.executemany(
+            "INSERT INTO dbbardata (symbol, exchange, datetime, `interval`, volume, turnover, "
+            "open_interest, open_price, high_price, low_price, close_price) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        conn.close()
+
+        app = Flask(__name__)
+        app.config.update(
+            BACKTEST_BASE_DIR=self._tmpdir.name,
+            MARKET_DATA_DB_PATH=str(self.db_path),
+            DB_TYPE="sqlite",
+            SECRET_KEY="test-secret",
+            TESTING=True,
+        )
+        app.register_blueprint(bp_market_data)
+        self.app = app
+        self.client = app.test_client()
+        bars.get_bar_cache().clear()
+
+    def tearDown(self):
+        bars.get_bar_cache().clear()
+        self._tmpdir.cleanup()
+
+    def _auth_headers(self) -> dict:
+        with self.app.app_context():
+            token = generate_auth_token(user_id=1, is_admin=True)
+        return {"Authorization": token}
+
+    def test_bars_are_returned_as_columns_with_keyset_cursor(self):
+        resp = self.client.get(
+            "/api/market-data/bars?symbol=RB2405&exchange=shfe&interval=d&limit=2",
+            headers=self._auth_headers(),
+        )
+        self.assertEqual(resp.status_code, 200)
+        page = resp.get_json()
+        self.assertEqual(page["count"], 2)
+        self.assertEqual(page["columns"]["datetime"], ["2024-01-01 00:00:00", "2024-01-02 00:00:00"])
+        self.assertEqual(page["columns"]["close"], [3001.0, 3002.0])
+        self.assertEqual(page["next_cursor"], "2024-01-02 00:00:00")
+
+        resp = self.client.get(
+            "/api/market-data/bars?symbol=RB2405&exchange=SHFE&interval=d&limit=10"
+            f"&cursor={page['next_cursor']}&end=2024-01-04",
+            headers=self._auth_headers(),
+        )
+        page = resp.get_json()
+        self.assertEqual(page["columns"]["datetime"], ["2024-01-03 00:00:00", "2024-01-04 00:00:00"])
+        self.assertIsNone(page["next_cursor"])
+
+    def test_repeated_query_is_served_from_cache(self):
+        url = "/api/market-data/bars?symbol=RB2405&exchange=SHFE&interval=d"
+        first = self.client.get(url, headers=self._auth_headers()).get_json()
+        second = self.client.get(url, headers=self._auth_headers()).get_json()
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(first["columns"], second["columns"])
+
+    def test_binary_format_packs_float64_columns(self):
+        resp = self.client.get(
+            "/api/market-data/bars?symbol=RB2405&exchange=SHFE&interval=d&limit=3&format=binary",
+            headers=self._auth_headers(),
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers["X-Bar-Count"], "3")
+        columns = resp.headers["X-Bar-Columns"].split(",")
+        values = struct.unpack(f"<{3 * len(columns)}d", resp.data)
+        close_offset = columns.index("close") * 3
+        self.assertEqual(values[close_offset:close_offset + 3], (3001.0, 3002.0, 3003.0))
+
+    def test_missing_symbol_is_rejected(self):
+        resp = self.client.get("/api/market-data/bars?exchange=SHFE", headers=self._auth_headers())
+        self.assertEqual(resp.status_code, 400)
+
+
+class BarQueryCacheTestCase(unittest.TestCase):
+    def test_eviction_is_bounded_by_rows(self):
+        cache = bars.BarQueryCache(max_rows=5)
+        cache.put(("a",), {"count": 3})
+        cache.put(("b",), {"count": 2})
+        cache.get(("a",))
+        cache.put(("c",), {"count": 2})
+        self.assertIsNotNone(cache.get(("a",)))
+        self.assertIsNone(cache.get(("b",)))
+        self.assertLessEqual(cache.stats()["rows"], 5)
+
+    def test_bumping_the_import_version_drops_cached_pages(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = Path(tmpdir) / "market_data.sqlite3"
+            init_database(db_path)
+            init_database(db_path)  # re-running keeps the counter
+            cache = bars.BarQueryCache()
+            with get_db_connection(config_dict={"db_type": "sqlite", "sqlite_path": str(db_path)}) as db, \
+                    mock.patch.object(bars, "_VERSION_TTL_SECONDS", 0):
+                self.assertEqual(cache.current_version(db), "0")
+                cache.put(("a",), {"count": 1})
+
+                bars.bump_import_version(db)
+                self.assertEqual(bars.get_import_version(db), "1")
+                self.assertEqual(cache.current_version(db), "1")
+                self.assertIsNone(cache.get(("a",)))
+
+
+if __name__ == "__main__":
+    unittest.main()
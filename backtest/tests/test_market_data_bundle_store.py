@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from app.market_data.bundle_store import BundleStore
+from app.market_data.manifest import BundleManifestService
+
+
+class BundleStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmpdir.name) / "bundle"
+        self.root.mkdir()
+        self.store = BundleStore(self.root)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _new_version(self, name, files):
+        staging = self.store.create_staging()
+        for relative, payload in files.items():
+            path = staging / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(payload)
+        return self.store.commit_staging(staging, name)
+
+    def test_legacy_bundle_is_adopted_and_swapped_without_copying(self):
+        (self.root / "futures.h5").write_bytes(b"old")
+        (self.root / "obsolete.pk").write_bytes(b"x")
+        version = self._new_version("rqbundle_202402", {"futures.h5": b"new", "h5/stocks.h5": b"s"})
+        inode = os.stat(self.store.version_path(version) / "futures.h5").st_ino
+
+        previous = self.store.activate(version)
+
+        self.assertTrue(previous.startswith("legacy-"))
+        self.assertEqual(self.store.current_version(), version)
+        self.assertTrue((self.root / "futures.h5").is_symlink())
+        self.assertEqual((self.root / "futures.h5").read_bytes(), b"new")
+        self.assertEqual(os.stat(self.root / "futures.h5").st_ino, inode)
+        self.assertEqual((self.root / "h5" / "stocks.h5").read_bytes(), b"s")
+        self.assertFalse((self.root / "obsolete.pk").exists())
+        self.assertEqual((self.store.version_path(previous) / "futures.h5").read_bytes(), b"old")
+
+    def test_leased_versions_survive_garbage_collection(self):
+        first = self._new_version("a", {"futures.h5": b"1"})
+        self.store.activate(first)
+        self.assertEqual(self.store.acquire_lease("backtest-job1"), first)
+
+        second = self._new_version("b", {"futures.h5": b"2"})
+        self.store.activate(second)
+        self.assertEqual(self.store.collect_garbage(), [])
+        self.assertEqual(self.store.leased_versions(), {first: ["backtest-job1"]})
+
+        self.store.release_lease("backtest-job1")
+        self.assertEqual(self.store.collect_garbage(), [first])
+        self.assertEqual(self.store.list_versions(), [second])
+
+    def test_stale_leases_are_dropped(self):
+        version = self._new_version("a", {"futures.h5": b"1"})
+        self.store.activate(version)
+        self.store.acquire_lease("dead")
+        lease = self.store.leases_dir / "dead.json"
+        payload = json.loads(lease.read_text())
+        payload["acquired_at"] = time.time() - 10 * 24 * 3600
+        lease.write_text(json.dumps(payload))
+        self.assertEqual(self.store.leased_versions(), {})
+        self.assertFalse(lease.exists())
+
+    def test_update_clone_shares_unchanged_files_and_never_touches_base(self):
+        base = self._new_version("a", {"futures.h5": b"old", "instruments.pk": b"abc"})
+        self.store.activate(base)
+
+        staging = self.store.create_staging()
+        work = staging / "bundle"
+        self.assertEqual(self.store.clone_version(base, work), 2)
+        # rqalpha truncates and rewrites files in place
+        with open(work / "futures.h5", "wb") as f:
+            f.write(b"new")
+        self.assertEqual((self.store.version_path(base) / "futures.h5").read_bytes(), b"old")
+
+        linked, shared = self.store.link_unchanged(work, base)
+        self.assertEqual((linked, shared), (1, 3))
+        version = self.store.commit_staging(work, "update")
+        self.store.activate(version)
+
+        new_dir = self.store.version_path(version)
+        base_dir = self.store.version_path(base)
+        self.assertEqual(os.stat(new_dir / "instruments.pk").st_ino, os.stat(base_dir / "instruments.pk").st_ino)
+        self.assertNotEqual(os.stat(new_dir / "futures.h5").st_ino, os.stat(base_dir / "futures.h5").st_ino)
+        self.assertEqual((self.root / "futures.h5").read_bytes(), b"new")
+
+    def test_lease_falls_back_when_version_was_reclaimed(self):
+        self.assertIsNone(self.store.acquire_lease("job"))
+        version = self._new_version("a", {"futures.h5": b"1"})
+        self.store.activate(version)
+        self.assertIsNone(self.store.acquire_lease("job", "gone-version"))
+        self.assertEqual(self.store.acquire_lease("job"), version)
+
+    def test_manifest_ignores_store_internals_and_sees_swaps(self):
+        service = BundleManifestService(check_interval=0)
+        self.store.activate(self._new_version("a", {"futures.h5": b"12", "instruments.pk": b"abc"}))
+        first = service.get(self.root)
+        self.assertEqual((first.file_count, first.total_size), (2, 5))
+        self.assertTrue(first.has_files(["instruments.pk"]))
+
+        self.store.activate(self._new_version("b", {"futures.h5": b"1234", "instruments.pk": b"abc"}))
+        second = service.get(self.root)
+        self.assertEqual((second.file_count, second.total_size), (2, 7))
+        self.assertNotEqual(second.version, first.version)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from app.market_data.columnar import (
+    ColumnarBarCache, bar_time, build_columnar_cache, build_columnar_file, needs_build,
+)
+
+
+_BAR_DTYPE = np.dtype([("datetime", "<u8"), ("open", "<f8"), ("close", "<f8"), ("volume", "<f8")])
+
+
+def _bars(*dates):
+    data = np.zeros(len(dates), dtype=_BAR_DTYPE)
+    data["datetime"] = [d * 1_000_000 for d in dates]
+    data["close"] = [d % 100 for d in dates]
+    return data
+
+
+class ColumnarCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.bundle = Path(self._tmpdir.name) / "bundle"
+        self.bundle.mkdir()
+        with h5py.File(self.bundle / "futures.h5", "w") as f:
+            f.create_dataset("RB2405", data=_bars(20240102, 20240103, 20240104))
+            f.create_dataset("CU2405", data=_bars(20240103))
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _rewrite(self, **datasets):
+        with h5py.File(self.bundle / "futures.h5", "a") as f:
+            for key, data in datasets.items():
+                if key in f:
+                    del f[key]
+                if data is not None:
+                    f.create_dataset(key, data=data)
+        stat = os.stat(self.bundle / "futures.h5")
+        os.utime(self.bundle / "futures.h5", (stat.st_atime, stat.st_mtime + 10))
+
+    def test_slices_are_read_only_views_of_the_mapped_columns(self):
+        result = build_columnar_file(str(self.bundle), "futures.h5")
+        self.assertEqual((result["instruments"], result["rows"], result["read_rows"]), (2, 4, 4))
+
+        table = ColumnarBarCache(self.bundle).table("futures.h5")
+        self.assertEqual(sorted(table.symbols()), ["CU2405", "RB2405"])
+        bars = table.get("RB2405", start="2024-01-03", end=20240104, fields=["datetime", "close"])
+        self.assertEqual(bars["close"].tolist(), [3.0, 4.0])
+        self.assertIsInstance(bars["close"].base, np.memmap)
+        self.assertFalse(bars["close"].flags.writeable)
+        self.assertEqual(len(table.get("RB2405", start=date(2024, 1, 5))["datetime"]), 0)
+        with self.assertRaises(KeyError):
+            table.get("AU2406")
+
+    def test_rebuild_reuses_unchanged_prefix_and_swaps_generation(self):
+        build_columnar_file(str(self.bundle), "futures.h5")
+        cache = ColumnarBarCache(self.bundle)
+        old = cache.table("futures")
+        old_view = old.get("RB2405")["close"]
+        self.assertFalse(needs_build(self.bundle, "futures.h5"))
+
+        # RB2405 gains a bar, CU2405 is rewritten with a different history.
+        self._rewrite(RB2405=_bars(20240102, 20240103, 20240104, 20240105), CU2405=_bars(20240105))
+        self.assertTrue(needs_build(self.bundle, "futures.h5"))
+        result = build_columnar_file(str(self.bundle), "futures.h5")
+        self.assertEqual((result["reused_rows"], result["read_rows"]), (3, 2))
+
+        table = cache.table("futures")
+        self.assertNotEqual(table.generation, old.generation)
+        self.assertEqual(table.get("RB2405")["close"].tolist(), [2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(cache.get("CU2405")["datetime"].tolist(), [20240105000000])
+        # Views taken before the swap stay valid.
+        self.assertEqual(old_view.tolist(), [2.0, 3.0, 4.0])
+        self.assertEqual(len(list((self.bundle / ".columnar" / "futures").glob("g-*"))), 1)
+
+    def test_build_skips_unchanged_files_and_drops_removed_ones(self):
+        build_columnar_file(str(self.bundle), "futures.h5")
+        self.assertEqual(build_columnar_cache(self.bundle, ["futures.h5"]), [])
+        self.assertEqual(build_columnar_cache(self.bundle, []), [])
+        self.assertIsNone(ColumnarBarCache(self.bundle).table("futures"))
+
+    def test_bar_time_bounds(self):
+        self.assertEqual(bar_time("2024-01-03"), 20240103000000)
+        self.assertEqual(bar_time(20240103, end=True), 20240103235959)
+        self.assertEqual(bar_time(20240103093000), 20240103093000)
+        with self.assertRaises(ValueError):
+            bar_time("2024-01")
+
+
+if __name__ == "__main__":
+    unittest.main()
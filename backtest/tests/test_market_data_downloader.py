@@ -0,0 +1,193 @@
+import bz2
+import hashlib
+import io
+import json
+import random
+import tarfile
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+from app.market_data import downloader
+from app.market_data.downloader import BundleSource
+
+
+def _make_archive():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name, payload in (
+            ("instruments.pk", b"instruments" * 1000),
+            ("trading_dates.npy", b"dates" * 500),
+            ("h5/futures.h5", random.Random(0).randbytes(100_000)),
+        ):
+            info = tarfile.TarInfo(name)
+            info.size = len(payload)
+            tar.addfile(info, io.BytesIO(payload))
+    raw = buf.getvalue()
+    # Two concatenated bz2 streams, as produced by parallel compressors.
+    half = len(raw) // 2
+    return bz2.compress(raw[:half]) + bz2.compress(raw[half:])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _resource(self):
+        return self.server.files.get(self.path)
+
+    def do_HEAD(self):
+        body = self._resource()
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"%s"' % self.server.etag)
+        self.end_headers()
+
+    def do_GET(self):
+        body = self._resource()
+        if body is None:
+            self.send_error(404)
+            return
+        range_header = self.headers.get("Range")
+        self.server.requests.append(range_header)
+        if range_header and self.server.ranges:
+            start, _, end = range_header[len("bytes="):].partition("-")
+            start = int(start)
+            end = int(end) if end else len(body) - 1
+            chunk = body[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        else:
+            chunk = body
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(chunk)))
+        self.end_headers()
+        self.wfile.write(chunk)
+
+
+class BundleDownloaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmpdir.name)
+        self.archive = _make_archive()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.files = {"/bundles/rqbundle_202402.tar.bz2": self.archive}
+        self.server.ranges = True
+        self.server.etag = hashlib.md5(self.archive).hexdigest()
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}/bundles"
+
+        patcher = mock.patch.object(downloader, "_parallel_bz2_command", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._tmpdir.cleanup()
+
+    def _source(self):
+        candidates = downloader.bundle_url_candidates(self.base, months=3, now=datetime(2024, 3, 5))
+        return downloader.probe_bundle_sources(candidates, timeout=2)
+
+    def _download(self, source, **kwargs):
+        kwargs.setdefault("chunk_size", 4096)
+        return downloader.download_and_extract(
+            source, self.root / "bundle", self.root / "dl" / "rqbundle.part", **kwargs
+        )
+
+    def test_probe_returns_newest_available_candidate(self):
+        source = self._source()
+        self.assertTrue(source.url.endswith("rqbundle_202402.tar.bz2"))
+        self.assertEqual(source.name, "rqbundle_202402")
+        self.assertEqual(source.size, len(self.archive))
+        self.assertTrue(source.accept_ranges)
+        self.assertEqual(source.md5, self.server.etag)
+
+    def test_ranged_download_extracts_and_verifies(self):
+        progress = []
+        result = self._download(self._source(), connections=3,
+                                progress=lambda *args: progress.append(args))
+
+        self.assertTrue(result["verified"])
+        self.assertEqual((self.root / "bundle" / "instruments.pk").read_bytes(), b"instruments" * 1000)
+        self.assertEqual(len((self.root / "bundle" / "h5" / "futures.h5").read_bytes()), 100_000)
+        self.assertGreater(len(self.server.requests), 1)
+        self.assertTrue(all(r and r.startswith("bytes=") for r in self.server.requests))
+        self.assertEqual(progress[-1][:2], (len(self.archive), len(self.archive)))
+        self.assertFalse((self.root / "dl" / "rqbundle.part").exists())
+
+    def test_resume_skips_finished_chunks(self):
+        source = self._source()
+        part = self.root / "dl" / "rqbundle.part"
+        part.parent.mkdir()
+        chunk = 4096
+        finished = [0, 1, 2]
+        content = bytearray(len(self.archive))
+        for index in finished:
+            content[index * chunk:(index + 1) * chunk] = self.archive[index * chunk:(index + 1) * chunk]
+        part.write_bytes(bytes(content))
+        Path(str(part) + ".json").write_text(json.dumps({
+            "url": source.url, "size": source.size, "etag": source.etag,
+            "chunk_size": chunk, "done": finished,
+        }))
+
+        result = self._download(source, connections=2, chunk_size=chunk)
+
+        self.assertEqual(result["resumed_bytes"], len(finished) * chunk)
+        self.assertNotIn(f"bytes=0-{chunk - 1}", self.server.requests)
+        self.assertTrue((self.root / "bundle" / "trading_dates.npy").exists())
+
+    def test_checksum_mismatch_is_rejected(self):
+        self.server.etag = "0" * 32
+        with self.assertRaisesRegex(RuntimeError, "校验失败"):
+            self._download(self._source(), connections=2)
+        self.assertFalse((self.root / "dl" / "rqbundle.part").exists())
+
+    def test_server_without_ranges_falls_back_to_single_stream(self):
+        self.server.ranges = False
+        source = self._source()
+        self.assertFalse(source.accept_ranges)
+        result = self._download(source, connections=4)
+        self.assertEqual(self.server.requests, [None])
+        self.assertEqual(result["extracted_bytes"], 11000 + 2500 + 100_000)
+
+    def test_cancel_keeps_partial_file(self):
+        source = BundleSource(url=self._source().url, size=len(self.archive), accept_ranges=True)
+        with self.assertRaises(downloader.DownloadCancelled):
+            self._download(source, connections=2, should_stop=lambda: True)
+        self.assertTrue((self.root / "dl" / "rqbundle.part.json").exists())
+
+    def test_cancelled_full_download_task_is_not_completed(self):
+        from app.market_data.tasks import do_full_download
+
+        tm = mock.Mock()
+        tm.is_cancel_requested.return_value = True
+        env = {"RQALPHA_BUNDLE_PATH": str(self.root / "live"), "RQALPHA_BUNDLE_DOWNLOAD_DIR": str(self.root / "dl")}
+        source = self._source()
+        with mock.patch.dict("os.environ", env), \
+                mock.patch("app.market_data.task_manager.get_task_manager", return_value=tm), \
+                mock.patch.object(downloader, "probe_bundle_sources", return_value=source):
+            with self.assertRaises(downloader.DownloadCancelled):
+                do_full_download("task-1")
+
+        self.assertNotIn(mock.call("task-1", 100, "完成", "下载完成，准备分析数据..."),
+                         tm.update_progress.call_args_list)
+        # the half-extracted staging directory is dropped
+        self.assertEqual(list((self.root / "live" / ".versions").iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
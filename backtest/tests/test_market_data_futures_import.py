@@ -0,0 +1,72 @@
+import importlib.util
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+_SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "import_rqalpha_futures_to_mariadb.py"
+_spec = importlib.util.spec_from_file_location("import_rqalpha_futures_to_mariadb", _SCRIPT)
+importer = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = importer
+_spec.loader.exec_module(importer)
+
+_BAR_DTYPE = [("datetime", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"),
+              ("volume", "<f8"), ("total_turnover", "<f8")]
+
+
+def _bars(dates):
+    data = np.zeros(len(dates), dtype=_BAR_DTYPE)
+    data["datetime"] = dates
+    data["open"] = data["high"] = data["low"] = data["close"] = np.arange(1, len(dates) + 1)
+    data["volume"] = 10
+    data["total_turnover"] = 100
+    return data
+
+
+class NormalizeDtColumnTestCase(unittest.TestCase):
+    def test_integer_dates_and_datetimes(self):
+        raw = np.array([20200102, 20200102093000, 20201231150000], dtype=np.int64)
+        self.assertEqual(importer.normalize_dt_column(raw).tolist(), [20200102, 20200102, 20201231])
+
+    def test_float_bytes_and_str_values(self):
+        self.assertEqual(importer.normalize_dt_column(np.array([20200102.0, 20200103000000.0])).tolist(),
+                         [20200102, 20200103])
+        self.assertEqual(importer.normalize_dt_column(np.array([b"20200102", b"20200103093000"])).tolist(),
+                         [20200102, 20200103])
+        self.assertEqual(importer.normalize_dt_column(np.array([" 20200102", "20200102 00:00", "2020-01-02"])).tolist(),
+                         [20200102, 20200102, 0])
+        objects = np.array([b"20200102", "20200103 09:00", 20200106, None], dtype=object)
+        self.assertEqual(importer.normalize_dt_column(objects).tolist(), [20200102, 20200103, 20200106, 0])
+
+    def test_invalid_month_day_and_short_values_become_zero(self):
+        raw = np.array([20201301, 20200001, 20200100, 20200132, 2020010, 0], dtype=np.int64)
+        self.assertEqual(importer.normalize_dt_column(raw).tolist(), [0] * 6)
+        self.assertEqual(importer.normalize_dt_column(np.array(["20201301", "2020010", ""])).tolist(), [0, 0, 0])
+
+
+class ExportDatasetFrameTestCase(unittest.TestCase):
+    def test_frame_layout_drops_invalid_dates(self):
+        frame = importer.export_dataset_frame("RB2405", _bars([20240102, 20241302, 20240103093000]), "SHFE")
+        self.assertEqual(frame["datetime"].tolist(), [20240102, 20240103])
+        self.assertEqual(frame["close_price"].tolist(), [1.0, 3.0])
+        self.assertEqual(frame["turnover"].tolist(), [100.0, 100.0])
+        self.assertEqual(frame["open_interest"].tolist(), [0.0, 0.0])
+        self.assertEqual(set(frame["interval"]), {"d"})
+        self.assertEqual(set(frame["exchange"]), {"SHFE"})
+
+    def test_after_ymd_keeps_only_newer_bars(self):
+        data = _bars([20240102, 20240103, 20240104])
+        frame = importer.export_dataset_frame("RB2405", data, "SHFE", after_ymd=20240103)
+        self.assertEqual(frame["datetime"].tolist(), [20240104])
+        self.assertIsNone(importer.export_dataset_frame("RB2405", data, "SHFE", after_ymd=20240104))
+
+    def test_missing_ohlc_columns_is_unusable(self):
+        data = np.zeros(2, dtype=[("datetime", "<i8"), ("open", "<f8"), ("high", "<f8"), ("close", "<f8")])
+        data["datetime"] = [20240102, 20240103]
+        self.assertIsNone(importer.export_dataset_frame("RB2405", data, "SHFE"))
+        self.assertIsNone(importer.export_dataset_frame("RB2405", np.zeros(2), "SHFE"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+_SCRIPT = Path(__file__).resolve().parents[2] / "script" / "import_1min_to_mariadb.py"
+_spec = importlib.util.spec_from_file_location("import_1min_to_mariadb", _SCRIPT)
+importer = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = importer
+_spec.loader.exec_module(importer)
+
+_CSV = "date,open,high,low,close,volume\n2024-01-02 09:00:00,1,2,0.5,1.5,10\n2024-01-02 09:01:00,1.5,2,1,1.8,5\n"
+
+
+class Import1minPlanningTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _write(self, rel_path: str, content: str = _CSV):
+        path = self.data_dir / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        return importer.infer_contract_file(path, self.data_dir)
+
+    def _entry(self, contract_file, content_hash="old-hash", rows=2):
+        size, mtime = importer.file_signature(contract_file.path)
+        return size, mtime, content_hash, rows
+
+    def test_manifest_diff_skips_unchanged_and_reports_removed_files(self):
+        unchanged = self._write("CZCE/FG/FG2409.csv")
+        changed = self._write("SHFE/rb/rb2405.csv")
+        new = self._write("DCE/i/i2409.csv")
+        filtered = self._write("DCE/j/j2409.csv")
+        manifest = {
+            "CZCE/FG/FG2409.csv": self._entry(unchanged),
+            "SHFE/rb/rb2405.csv": self._entry(changed, "rb-hash", 7),
+            "DCE/j/j2409.csv": self._entry(filtered),
+            "SHFE/hc/hc2405.csv": (100, 1.0, "gone", 3),
+        }
+        os.utime(changed.path, (0, 1_000_000))
+
+        tasks, skipped, removed = importer.plan_tasks([unchanged, changed, new], manifest, self.data_dir)
+
+        self.assertEqual(skipped, 1)
+        self.assertEqual([(rel, previous) for _, rel, previous in tasks],
+                         [("SHFE/rb/rb2405.csv", ("rb-hash", 7)), ("DCE/i/i2409.csv", None)])
+        # j2409 is only filtered out of this run; hc2405 is gone from disk
+        self.assertEqual(removed, ["SHFE/hc/hc2405.csv"])
+
+        tasks, skipped, removed = importer.plan_tasks([unchanged, changed, new], manifest, self.data_dir, force=True)
+        self.assertEqual(skipped, 0)
+        self.assertEqual([previous for _, _, previous in tasks], [None, None, None])
+        self.assertEqual(removed, ["SHFE/hc/hc2405.csv"])
+
+    def test_tasks_are_spread_over_workers_by_size(self):
+        tasks = []
+        for index, size in enumerate([10, 50, 30, 40, 20]):
+            contract_file = self._write(f"SHFE/rb/rb24{index:02d}.csv", "x" * size)
+            tasks.append((contract_file, contract_file.path.name, None))
+
+        buckets = importer.distribute_tasks(tasks, 2)
+        sizes = [[task[0].path.stat().st_size for task in bucket] for bucket in buckets]
+        self.assertEqual(sizes, [[50, 30, 10], [40, 20]])
+
+        buckets = importer.distribute_tasks(tasks[:2], 4)
+        self.assertEqual([len(bucket) for bucket in buckets], [1, 1])
+
+    def test_worker_merges_in_batches_and_records_the_manifest_per_batch(self):
+        files = [self._write(f"SHFE/rb/rb240{month}.csv") for month in range(1, 4)]
+        unchanged = self._write("SHFE/rb/rb2409.csv")
+        tasks = [(f, f.path.relative_to(self.data_dir).as_posix(), None) for f in files]
+        tasks.append((unchanged, "SHFE/rb/rb2409.csv", (importer.file_content_hash(unchanged.path), 9)))
+
+        merged, recorded = [], []
+        with mock.patch.object(importer, "get_connection"), \
+                mock.patch.object(importer, "create_stage_table"), \
+                mock.patch.object(importer, "drop_table"), \
+                mock.patch.object(importer, "table_exists", return_value=True), \
+                mock.patch.object(importer, "merge_batch",
+                                  side_effect=lambda conn, stage, frames, *flags: merged.append(
+                                      [frame["symbol"].iat[0] for frame in frames]) or 0), \
+                mock.patch.object(importer, "record_manifest",
+                                  side_effect=lambda conn, table, entries: recorded.append(
+                                      [(entry[0], entry[4]) for entry in entries])), \
+                mock.patch.object(importer, "MERGE_BATCH_FILES", 2):
+            stats = importer.import_worker(3, tasks)
+
+        self.assertEqual(merged, [["rb2401", "rb2402"], ["rb2403"]])
+        # the unchanged file only refreshes its manifest entry and keeps its row count
+        self.assertEqual(recorded, [[("SHFE/rb/rb2401.csv", 2), ("SHFE/rb/rb2402.csv", 2)],
+                                    [("SHFE/rb/rb2403.csv", 2), ("SHFE/rb/rb2409.csv", 9)]])
+        self.assertEqual((stats["files"], stats["unchanged"], stats["rows"]), (3, 1, 6))
+        self.assertEqual(stats["series"], [("rb2401", "SHFE"), ("rb2402", "SHFE"), ("rb2403", "SHFE")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.database import get_db_connection
+from app.market_data import scheduler
+from app.market_data.db_init import init_database
+from app.market_data.leader import LeaderElection
+
+
+class _SqliteTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        db_path = Path(self._tmpdir.name) / "market_data.sqlite3"
+        init_database(db_path)
+        self.config = {"db_type": "sqlite", "sqlite_path": str(db_path)}
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _election(self, owner, ttl=30):
+        return LeaderElection(self.config, "scheduler", ttl=ttl, owner=owner)
+
+
+class LeaderElectionTestCase(_SqliteTestCase):
+    def test_only_one_process_leads(self):
+        first, second = self._election("a"), self._election("b")
+        self.assertTrue(first.try_acquire())
+        self.assertFalse(second.try_acquire())
+        # Renewal keeps the lease with the current leader.
+        self.assertTrue(first.try_acquire())
+        self.assertEqual(second.current_leader(), "a")
+
+    def test_expired_lease_fails_over_and_old_leader_steps_down(self):
+        first, second = self._election("a", ttl=0.2), self._election("b", ttl=0.2)
+        self.assertTrue(first.try_acquire())
+        time.sleep(0.3)
+        self.assertTrue(second.try_acquire())
+        self.assertFalse(first.try_acquire())
+
+    def test_release_hands_over_immediately(self):
+        first, second = self._election("a"), self._election("b")
+        self.assertTrue(first.try_acquire())
+        first.release()
+        self.assertFalse(first.is_leader)
+        self.assertTrue(second.try_acquire())
+
+
+class SchedulerLeaderTestCase(_SqliteTestCase):
+    def setUp(self):
+        super().setUp()
+        with get_db_connection(config_dict=self.config) as db:
+            db.execute(
+                "INSERT INTO market_data_cron_config (id, enabled, cron_expression, task_type, updated_at) "
+                "VALUES (1, 1, '0 4 3 * *', 'full', '2024-01-01')"
+            )
+        self.scheduler = mock.MagicMock()
+        self.scheduler.get_job.return_value = None
+        for name, value in (("_db_config_dict", self.config), ("_active_schedule", None),
+                            ("_election", self._election("other"))):
+            patcher = mock.patch.object(scheduler, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(scheduler, "get_scheduler", return_value=self.scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_the_leader_schedules_and_fires_the_cron_job(self):
+        leader = self._election("leader")
+        self.assertTrue(leader.try_acquire())
+
+        scheduler.leader_heartbeat()
+        self.scheduler.add_job.assert_not_called()
+        with mock.patch("app.market_data.tasks.submit_bundle_download") as submit:
+            scheduler.cron_job_handler()
+        submit.assert_not_called()
+
+        leader.release()
+        scheduler.leader_heartbeat()
+        self.assertEqual(self.scheduler.add_job.call_args.kwargs["id"], scheduler.CRON_JOB_ID)
+        self.assertEqual(scheduler._active_schedule, "0 4 3 * *")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.market_data import manifest as manifest_module
+from app.market_data.manifest import BundleManifestService
+
+
+class BundleManifestServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.bundle = Path(self._tmpdir.name) / "bundle"
+        self.bundle.mkdir()
+        (self.bundle / "instruments.pk").write_bytes(b"abc")
+        (self.bundle / "sub").mkdir()
+        (self.bundle / "sub" / "data.bin").write_bytes(b"12345")
+        self.service = BundleManifestService(check_interval=0)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def test_aggregates_size_count_and_top_level_files(self):
+        manifest = self.service.get(self.bundle)
+        self.assertTrue(manifest.exists)
+        self.assertEqual(manifest.total_size, 8)
+        self.assertEqual(manifest.file_count, 2)
+        self.assertTrue(manifest.has_files(["instruments.pk"]))
+        self.assertFalse(manifest.has_files(["instruments.pk", "trading_dates.npy"]))
+        self.assertTrue(manifest.version)
+
+    def test_unchanged_directory_is_served_without_walking(self):
+        first = self.service.get(self.bundle)
+        with mock.patch.object(manifest_module, "_build_manifest") as build:
+            second = self.service.get(self.bundle)
+        build.assert_not_called()
+        self.assertIs(first, second)
+
+    def test_top_level_change_rebuilds_manifest(self):
+        first = self.service.get(self.bundle)
+        (self.bundle / "trading_dates.npy").write_bytes(b"xy")
+        second = self.service.get(self.bundle)
+        self.assertEqual(second.total_size, first.total_size + 2)
+        self.assertNotEqual(second.version, first.version)
+
+        stat = os.stat(self.bundle / "instruments.pk")
+        os.utime(self.bundle / "instruments.pk", (stat.st_atime, stat.st_mtime + 5))
+        third = self.service.get(self.bundle)
+        self.assertNotEqual(third.version, second.version)
+        self.assertEqual(third.newest_mtime, stat.st_mtime + 5)
+
+    def test_missing_directory(self):
+        manifest = self.service.get(self.bundle / "missing")
+        self.assertFalse(manifest.exists)
+        self.assertEqual(manifest.total_size, 0)
+        self.assertIsNone(manifest.newest_mtime)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from flask import Flask
+
+from app.api.market_data_api import bp_market_data
+from app.auth import generate_auth_token
+from app.database import get_db_connection
+from app.market_data import bars, resample
+from app.market_data.resample import materialize_series, parse_materialized_intervals, resample_columns
+
+
+_DDL = """
+CREATE TABLE dbbardata (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    exchange TEXT NOT NULL,
+    datetime TEXT NOT NULL,
+    `interval` TEXT NOT NULL,
+    volume REAL NOT NULL,
+    turnover REAL NOT NULL,
+    open_interest REAL NOT NULL,
+    open_price REAL NOT NULL,
+    high_price REAL NOT NULL,
+    low_price REAL NOT NULL,
+    close_price REAL NOT NULL,
+    UNIQUE (symbol, exchange, `interval`, datetime)
+)
+"""
+
+
+def _minute_bars(start: str, count: int, base: float = 100.0) -> list[tuple]:
+    first = datetime.strptime(start, "%Y-%m-%d %H:%M:%S")
+    rows = []
+    for i in range(count):
+        price = base + i
+        dt = (first + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append(("RB2405", "SHFE", dt, "1m", 1.0, 10.0, 500.0 + i,
+                     price, price + 0.5, price - 0.5, price + 0.25))
+    return rows
+
+
+def _columns(rows: list[tuple]) -> dict:
+    return {
+        "datetime": [r[2] for r in rows],
+        "volume": [r[4] for r in rows],
+        "turnover": [r[5] for r in rows],
+        "open_interest": [r[6] for r in rows],
+        "open": [r[7] for r in rows],
+        "high": [r[8] for r in rows],
+        "low": [r[9] for r in rows],
+        "close": [r[10] for r in rows],
+    }
+
+
+class ResampleColumnsTestCase(unittest.TestCase):
+    def test_five_minute_buckets_aggregate_ohlcv(self):
+        out = resample_columns(_columns(_minute_bars("2024-01-02 09:00:00", 10)), "5m")
+        self.assertEqual(out["datetime"], ["2024-01-02 09:00:00", "2024-01-02 09:05:00"])
+        self.assertEqual(out["open"], [100.0, 105.0])
+        self.assertEqual(out["high"], [104.5, 109.5])
+        self.assertEqual(out["low"], [99.5, 104.5])
+        self.assertEqual(out["close"], [104.25, 109.25])
+        self.assertEqual(out["volume"], [5.0, 5.0])
+        self.assertEqual(out["open_interest"], [504.0, 509.0])
+
+    def test_night_session_belongs_to_next_trading_day(self):
+        # Friday night and Monday day session form Monday's daily bar.
+        rows = (_minute_bars("2024-01-05 14:58:00", 2, base=1)
+                + _minute_bars("2024-01-05 21:00:00", 2, base=10)
+                + _minute_bars("2024-01-08 09:00:00", 2, base=20))
+        out = resample_columns(_columns(rows), "d")
+        self.assertEqual(out["datetime"], ["2024-01-05 00:00:00", "2024-01-08 00:00:00"])
+        self.assertEqual(out["open"], [1.0, 10.0])
+        self.assertEqual(out["close"], [2.25, 21.25])
+
+    def test_trading_calendar_skips_holidays(self):
+        calendar = np.array(["2024-02-08", "2024-02-19"], dtype="datetime64[D]")
+        rows = _minute_bars("2024-02-08 21:00:00", 1)
+        out = resample_columns(_columns(rows), "d", trading_dates=calendar)
+        self.assertEqual(out["datetime"], ["2024-02-19 00:00:00"])
+
+
+class MaterializeSeriesTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self._tmpdir.name) / "market_data.sqlite3"
+        conn = sqlite3.connect(str(self.db_path))
+        conn.execute(_DDL)
+        conn.commit()
+        conn.close()
+        self.config = {"db_type": "sqlite", "sqlite_path": str(self.db_path)}
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _insert(self, rows):
+        with get_db_connection(config_dict=self.config) as db:
+            db.executemany(
+                "INSERT INTO dbbardata (symbol, exchange, datetime, `interval`, volume, turnover, "
+                "open_interest, open_price, high_price, low_price, close_price) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def _stored(self, interval):
+        with get_db_connection(config_dict=self.config) as db:
+            return db.fetchall(
+                "SELECT datetime, volume, close_price FROM dbbardata "
+                "WHERE `interval` = ? ORDER BY datetime",
+                (interval,),
+            )
+
+    def test_incremental_run_recomputes_only_the_tail(self):
+        self._insert(_minute_bars("2024-01-02 09:00:00", 7))
+        with get_db_connection(config_dict=self.config) as db:
+            written = materialize_series(db, "dbbardata", symbol="RB2405", exchange="SHFE", intervals=["5m"])
+        self.assertEqual(written, {"5m": 2})
+        self.assertEqual([r["volume"] for r in self._stored("5m")], [5.0, 2.0])
+
+        # The partial 09:05 bucket is completed and only the tail is rewritten.
+        self._insert(_minute_bars("2024-01-02 09:07:00", 5, base=107))
+        with get_db_connection(config_dict=self.config) as db:
+            written = materialize_series(db, "dbbardata", symbol="RB2405", exchange="SHFE", intervals=["5m"])
+        self.assertEqual(written, {"5m": 2})
+        stored = self._stored("5m")
+        self.assertEqual([r["datetime"] for r in stored],
+                         ["2024-01-02 09:00:00", "2024-01-02 09:05:00", "2024-01-02 09:10:00"])
+        self.assertEqual([r["volume"] for r in stored], [5.0, 5.0, 2.0])
+
+    def test_daily_bars_are_never_materialized(self):
+        self._insert(_minute_bars("2024-01-02 09:00:00", 7))
+        with get_db_connection(config_dict=self.config) as db:
+            written = materialize_series(db, "dbbardata", symbol="RB2405", exchange="SHFE", intervals=["d", "5m"])
+        self.assertEqual(written, {"5m": 2})
+        self.assertEqual(self._stored("d"), [])
+
+    def test_configured_intervals_exclude_daily(self):
+        self.assertEqual(parse_materialized_intervals(None), ["5m", "15m", "1h"])
+        self.assertEqual(parse_materialized_intervals(" 5m, 30m "), ["5m", "30m"])
+        self.assertEqual(parse_materialized_intervals(""), [])
+        with self.assertRaises(ValueError):
+            parse_materialized_intervals("5m,d")
+
+
+class ResampleOnTheFlyApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        db_path = Path(self._tmpdir.name) / "market_data.sqlite3"
+        self.config = {"db_type": "sqlite", "sqlite_path": str(db_path)}
+        conn = sqlite3.connect(str(db_path))
+        conn.execute(_DDL)
+        conn.executemany(
+            "INSERT INTO dbbardata (symbol, exchange, datetime, `interval`, volume, turnover, "
+            "open_interest, open_price, high_price, low_price, close_price) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            _minute_bars("2024-01-02 09:00:00", 45),
+        )
+        conn.commit()
+        conn.close()
+
+        app = Flask(__name__)
+        app.config.update(
+            BACKTEST_BASE_DIR=self._tmpdir.name,
+            MARKET_DATA_DB_PATH=str(db_path),
+            DB_TYPE="sqlite",
+            SECRET_KEY="test-secret",
+            TESTING=True,
+        )
+        app.register_blueprint(bp_market_data)
+        self.app = app
+        self.client = app.test_client()
+        bars.get_bar_cache().clear()
+
+    def tearDown(self):
+        bars.get_bar_cache().clear()
+        self._tmpdir.cleanup()
+
+    def test_unmaterialized_interval_is_resampled_with_cursor(self):
+        with self.app.app_context():
+            headers = {"Authorization": generate_auth_token(user_id=1, is_admin=True)}
+        url = "/api/market-data/bars?symbol=RB2405&exchange=SHFE&interval=15m&limit=2"
+        page = self.client.get(url, headers=headers).get_json()
+        self.assertTrue(page["resampled"])
+        self.assertEqual(page["columns"]["datetime"], ["2024-01-02 09:00:00", "2024-01-02 09:15:00"])
+        self.assertEqual(page["columns"]["volume"], [15.0, 15.0])
+        self.assertEqual(page["next_cursor"], "2024-01-02 09:15:00")
+
+        page = self.client.get(f"{url}&cursor={page['next_cursor']}", headers=headers).get_json()
+        self.assertEqual(page["columns"]["datetime"], ["2024-01-02 09:30:00"])
+        self.assertIsNone(page["next_cursor"])
+
+    def test_materialized_interval_is_not_resampled_at_the_end_of_a_walk(self):
+        with get_db_connection(config_dict=self.config) as db:
+            materialize_series(db, "dbbardata", symbol="RB2405", exchange="SHFE", intervals=["15m"])
+        with self.app.app_context():
+            headers = {"Authorization": generate_auth_token(user_id=1, is_admin=True)}
+        url = "/api/market-data/bars?symbol=RB2405&exchange=SHFE&interval=15m&cursor=2024-01-02 09:30:00"
+        with mock.patch.object(resample, "resample_on_the_fly") as on_the_fly:
+            page = self.client.get(url, headers=headers).get_json()
+        on_the_fly.assert_not_called()
+        self.assertEqual(page["count"], 0)
+        self.assertNotIn("resampled", page)
+
+    def test_daily_bars_on_the_fly_use_the_bundle_calendar(self):
+        bundle = Path(self._tmpdir.name) / "bundle"
+        bundle.mkdir()
+        np.save(str(bundle / "trading_dates.npy"), np.array([20240208, 20240219]))
+        with get_db_connection(config_dict=self.config) as db:
+            db.executemany(
+                "INSERT INTO dbbardata (symbol, exchange, datetime, `interval`, volume, turnover, "
+                "open_interest, open_price, high_price, low_price, close_price) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                _minute_bars("2024-02-08 21:00:00", 3),
+            )
+        with self.app.app_context():
+            headers = {"Authorization": generate_auth_token(user_id=1, is_admin=True)}
+        url = "/api/market-data/bars?symbol=RB2405&exchange=SHFE&interval=d&start=2024-02-08"
+        with mock.patch.dict(os.environ, {"RQALPHA_BUNDLE_PATH": str(bundle)}):
+            page = self.client.get(url, headers=headers).get_json()
+        # the night session before the holiday belongs to the next trading date
+        self.assertEqual(page["columns"]["datetime"], ["2024-02-19 00:00:00"])
+        self.assertEqual(page["columns"]["volume"], [3.0])
+
+    def test_resample_task_rejects_daily_interval(self):
+        with self.app.app_context():
+            headers = {"Authorization": generate_auth_token(user_id=1, is_admin=True)}
+        resp = self.client.post("/api/market-data/vnpy/resample", json={"intervals": ["5m", "d"]}, headers=headers)
+        self.assertEqual(resp.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from app.market_data.db_init import init_database
+from app.market_data.task_manager import TaskManager, parse_lane_limits
+
+# Prints the pid of a grandchild in the same process group, then hangs.
+_SLOW_TREE = (
+    "import subprocess, sys, time\n"
+    "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+    "print(child.pid, flush=True)\n"
+    "time.sleep(60)\n"
+)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # Reaped zombies of the killed group still answer kill(0) until reaped by init.
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+class LaneTaskManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        db_path = Path(self._tmpdir.name) / "market_data.sqlite3"
+        init_database(db_path)
+        self.tm = TaskManager({"db_type": "sqlite", "sqlite_path": str(db_path)})
+
+    def tearDown(self):
+        self.tm.wait_idle(timeout=5)
+        self._tmpdir.cleanup()
+
+    def _status(self, task_id):
+        return self.tm.get_task_status(task_id)["status"]
+
+    def test_lanes_run_concurrently(self):
+        release = threading.Event()
+        import_started = threading.Event()
+
+        def slow_analyze(task_id):
+            release.wait(5)
+
+        def vnpy_import(task_id):
+            import_started.set()
+
+        analyze_id = self.tm.submit_task("analyze", slow_analyze)
+        self.tm.submit_task("vnpy_import", vnpy_import)
+        # The import is not stuck behind the running analysis.
+        self.assertTrue(import_started.wait(5))
+
+        stats = self.tm.lane_stats()
+        self.assertEqual(stats["analyze"]["running"], 1)
+        self.assertEqual(stats["analyze"]["running_tasks"][0]["task_id"], analyze_id)
+        with self.assertRaises(RuntimeError):
+            self.tm.submit_task("analyze", slow_analyze)
+
+        release.set()
+        self.assertTrue(self.tm.wait_idle(timeout=5))
+        self.assertEqual(self._status(analyze_id), "success")
+
+    def test_lane_limit_above_one_accepts_and_runs_that_many_tasks(self):
+        self.tm = TaskManager(self.tm.db_config_dict, lane_limits={"download": 2})
+        release = threading.Event()
+        started = threading.Semaphore(0)
+
+        def download(task_id):
+            started.release()
+            release.wait(5)
+
+        first = self.tm.submit_task("full", download)
+        second = self.tm.submit_task("incremental", download)
+        self.assertTrue(started.acquire(timeout=5) and started.acquire(timeout=5))
+        self.assertEqual(self.tm.lane_stats()["download"]["running"], 2)
+        # a third manual submission would only queue behind a full lane
+        with self.assertRaises(RuntimeError):
+            self.tm.submit_task("full", download)
+        queued = self.tm.submit_task("full", download, source="auto")
+        self.assertEqual(self.tm.lane_stats()["download"]["queued"], 1)
+
+        release.set()
+        self.assertTrue(self.tm.wait_idle(timeout=5))
+        self.assertEqual([self._status(t) for t in (first, second, queued)], ["success"] * 3)
+
+    def test_dependent_task_starts_after_dependency_succeeds(self):
+        order = []
+        release = threading.Event()
+
+        def download(task_id):
+            release.wait(5)
+            order.append("download")
+
+        def analyze(task_id):
+            order.append("analyze")
+
+        download_id = self.tm.submit_task("full", download)
+        analyze_id = self.tm.submit_task("analyze", analyze, source="auto", depends_on=[download_id])
+        stats = self.tm.lane_stats()
+        self.assertEqual(stats["analyze"]["queued"], 1)
+        self.assertEqual(stats["analyze"]["waiting_on_dependencies"], 1)
+        self.assertEqual(self.tm.get_task_status(analyze_id)["stage"], "等待")
+
+        release.set()
+        self.assertTrue(self.tm.wait_idle(timeout=5))
+        self.assertEqual(order, ["download", "analyze"])
+        self.assertEqual(self._status(analyze_id), "success")
+
+    def test_failed_dependency_cancels_the_chain(self):
+        def download(task_id):
+            raise RuntimeError("boom")
+
+        ran = []
+        download_id = self.tm.submit_task("full", download)
+        analyze_id = self.tm.submit_task("analyze", lambda t: ran.append(t), source="auto",
+                                         depends_on=[download_id])
+        import_id = self.tm.submit_task("vnpy_import", lambda t: ran.append(t), source="auto",
+                                        depends_on=[analyze_id])
+        self.assertTrue(self.tm.wait_idle(timeout=5))
+
+        self.assertEqual(self._status(download_id), "failed")
+        self.assertEqual(self._status(analyze_id), "cancelled")
+        self.assertEqual(self._status(import_id), "cancelled")
+        self.assertEqual(ran, [])
+
+    def test_cancelling_a_running_task_keeps_cancelled_status(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def download(task_id):
+            started.set()
+            release.wait(5)
+
+        download_id = self.tm.submit_task("full", download)
+        analyze_id = self.tm.submit_task("analyze", lambda t: None, source="auto", depends_on=[download_id])
+        self.assertTrue(started.wait(5))
+        self.assertTrue(self.tm.cancel_task(download_id))
+        release.set()
+        self.assertTrue(self.tm.wait_idle(timeout=5))
+        self.assertEqual(self._status(download_id), "cancelled")
+        self.assertEqual(self._status(analyze_id), "cancelled")
+
+    def _start_process_tree(self):
+        started = threading.Event()
+        pids = []
+
+        def update(task_id):
+            with self.tm.spawn_process(task_id, [sys.executable, "-c", _SLOW_TREE],
+                                       stdout=subprocess.PIPE, text=True) as proc:
+                pids.append(int(proc.stdout.readline()))
+                started.set()
+                proc.stdout.read()
+                proc.wait()
+            raise RuntimeError("process exited on its own")
+
+        task_id = self.tm.submit_task("incremental", update)
+        self.assertTrue(started.wait(10))
+        return task_id, pids[0]
+
+    def _assert_stopped(self, task_id, grandchild):
+        self.assertTrue(self.tm.wait_idle(timeout=10))
+        self.assertEqual(self._status(task_id), "cancelled")
+        self.assertFalse(_pid_alive(grandchild))
+        row = self.tm.get_task_status(task_id)
+        self.assertIn("任务已取消", row["message"])
+        self.assertEqual(self.tm.lane_stats()["download"]["running"], 0)
+        self.assertIsNotNone(self.tm.lane_stats()["download"]["avg_cancel_seconds"])
+
+    def test_cancel_kills_the_process_group_and_frees_the_lane(self):
+        task_id, grandchild = self._start_process_tree()
+        started = time.monotonic()
+        self.assertTrue(self.tm.cancel_task(task_id))
+        self._assert_stopped(task_id, grandchild)
+        self.assertLess(time.monotonic() - started, 5)
+        # The lane takes new work straight away.
+        next_id = self.tm.submit_task("full", lambda t: None)
+        self.assertTrue(self.tm.wait_idle(timeout=5))
+        self.assertEqual(self._status(next_id), "success")
+
+    def test_cancel_from_another_process_is_picked_up(self):
+        task_id, grandchild = self._start_process_tree()
+        # Another server worker only flips the row.
+        other = TaskManager(self.tm.db_config_dict)
+        self.assertTrue(other.cancel_task(task_id))
+        self._assert_stopped(task_id, grandchild)
+
+    def test_parse_lane_limits(self):
+        self.assertEqual(parse_lane_limits("download=2, analyze=3,bad,import=0"), {"download": 2, "analyze": 3})
+        self.assertEqual(parse_lane_limits(None), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from flask import Flask
+
+from app.api import market_data_api
+from app.market_data.db_init import init_database
+
+
+class VnpyImportModeTestCase(unittest.TestCase):
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self._tmpdir.name) / "market_data.sqlite3"
+        init_database(self.db_path)
+
+        app = Flask(__name__)
+        app.config.update(
+            BACKTEST_BASE_DIR=self._tmpdir.name,
+            MARKET_DATA_DB_PATH=str(self.db_path),
+            DB_TYPE="sqlite",
+            TESTING=True,
+        )
+        self.app = app
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _add_task(self, task_id, task_type, finished_at, status="success"):
+        conn = sqlite3.connect(str(self.db_path))
+        conn.execute(
+            "INSERT INTO market_data_tasks (task_id, task_type, status, source, created_at, finished_at) "
+            "VALUES (?, ?, ?, 'manual', ?, ?)",
+            (task_id, task_type, status, finished_at, finished_at),
+        )
+        conn.commit()
+        conn.close()
+
+    def _mode(self):
+        with self.app.app_context():
+            return market_data_api._choose_vnpy_import_mode()
+
+    def test_defaults_to_auto_without_history(self):
+        self.assertEqual(self._mode(), "auto")
+
+    def test_full_download_after_last_import_forces_rebuild(self):
+        self._add_task("imp", "vnpy_import", "2024-03-01T10:00:00")
+        self._add_task("dl", "full", "2024-03-02T10:00:00")
+        self.assertEqual(self._mode(), "full")
+
+    def test_import_after_full_download_is_incremental(self):
+        self._add_task("dl", "full", "2024-03-02T10:00:00")
+        self._add_task("imp", "vnpy_import", "2024-03-03T10:00:00")
+        self._add_task("dl2", "full", "2024-03-04T10:00:00", status="failed")
+        self.assertEqual(self._mode(), "auto")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,16 +4,35 @@
 from __future__ import annotations
 
 import csv
+import hashlib
 import os
 import re
+import sys
 import tempfile
+import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 import pymysql
 
+# 复用后端的表结构与分区管理：容器内后端代码在 /app，仓库中在 ../backtest
+BACKEND_ROOT = os.getenv("BACKEND_ROOT") or next(
+    (str(root) for root in (Path(__file__).resolve().parent.parent / "backtest", Path("/app"))
+     if (root / "app" / "market_data" / "bar_storage.py").exists()),
+    "/app",
+)
+sys.path.insert(0, BACKEND_ROOT)
+
+from app.database import get_db_connection  # noqa: E402
+from app.market_data.bar_storage import bar_table_ddl, ensure_future_partitions  # noqa: E402
+from app.market_data.bar_summary import tracking_appends  # noqa: E402
+from app.market_data.bars import bump_import_version as bump_backend_import_version  # noqa: E402
+from app.market_data.resample import SOURCE_INTERVAL, materialize_series, parse_materialized_intervals  # noqa: E402
+
 
 def _env_flag(name: str, default: bool = False) -> bool:
     value = os.getenv(name)
@@ -44,6 +63,17 @@ PRODUCT_CODES = {
     for code in PRODUCT_CODES_RAW.split(",")
     if code.strip()
 }
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+MERGE_BATCH_FILES = int(os.getenv("MERGE_BATCH_FILES", "20"))        # 每批合并的文件数
+MERGE_BATCH_ROWS = int(os.getenv("MERGE_BATCH_ROWS", "500000"))      # 每批合并的行数上限
+FORCE_REIMPORT = _env_flag("FORCE_REIMPORT", False)                  # True -> 忽略清单，全部重新导入
+MANIFEST_TABLE = os.getenv("MANIFEST_TABLE", f"{DB_TABLE}_import_manifest")
+# 导入后由 1m 生成的周期，与后端相同（默认 5m,15m,1h）；设为空字符串则不生成
+RESAMPLE_INTERVALS = parse_materialized_intervals(os.getenv("MARKET_DATA_RESAMPLE_INTERVALS"))
+# 按序列的K线汇总（见 app/market_data/bar_summary.py），每批合并后同步更新
+SUMMARY_TABLE = "vnpy_bar_summary"
+# 后端K线查询缓存按此计数失效（见 app/market_data/bars.py），每批合并时加一
+IMPORT_VERSION_TABLE = "vnpy_import_version"
 
 
 # 目录里的交易所代码 -> vn.py风格交易所值
@@ -87,30 +117,30 @@ def get_connection():
 
 
 def create_main_table_if_needed(conn, table_name: str) -> None:
-    sql = f"""
-    CREATE TABLE IF NOT EXISTS `{table_name}` (
-        `id` BIGINT NOT NULL AUTO_INCREMENT,
-        `symbol` VARCHAR(32) NOT NULL,
-        `exchange` VARCHAR(16) NOT NULL,
-        `datetime` DATETIME NOT NULL,
-        `interval` VARCHAR(8) NOT NULL,
-        `volume` DOUBLE NOT NULL DEFAULT 0,
-        `turnover` DOUBLE NOT NULL DEFAULT 0,
-        `open_interest` DOUBLE NOT NULL DEFAULT 0,
-        `open_price` DOUBLE NOT NULL,
-        `high_price` DOUBLE NOT NULL,
-        `low_price` DOUBLE NOT NULL,
-        `close_price` DOUBLE NOT NULL,
-        PRIMARY KEY (`id`),
-        UNIQUE KEY `uniq_bar` (`symbol`, `exchange`, `interval`, `datetime`),
-        KEY `idx_symbol_exchange_dt` (`symbol`, `exchange`, `datetime`)
-    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-    """
+    """按后端的分区表结构建主表（见 app/market_data/bar_storage.py），已存在时不改动。"""
     with conn.cursor() as cursor:
-        cursor.execute(sql)
+        cursor.execute(bar_table_ddl(table_name))
     conn.commit()
 
 
+def backend_db_config() -> dict:
+    """供后端 app.database.get_db_connection 使用的连接配置。"""
+    return {
+        "db_type": "mariadb",
+        "host": DB_HOST,
+        "port": DB_PORT,
+        "database": DB_NAME,
+        "user": DB_USER,
+        "password": DB_PASSWORD,
+    }
+
+
+def ensure_partitions(table_name: str) -> List[str]:
+    """导入前补齐到明年的年度分区，避免新数据落入 pmax；返回新增的分区。"""
+    with get_db_connection(config_dict=backend_db_config()) as db:
+        return ensure_future_partitions(db, table_name)
+
+
 def create_stage_table(conn, stage_table: str) -> None:
     sql = f"""
     CREATE TABLE IF NOT EXISTS `{stage_table}` (
@@ -138,6 +168,105 @@ def truncate_table(conn, table_name: str) -> None:
     conn.commit()
 
 
+def drop_table(conn, table_name: str) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`;")
+    conn.commit()
+
+
+def create_manifest_table_if_needed(conn, manifest_table: str) -> None:
+    """已导入文件清单：未变化的文件跳过，中断后重跑只处理未完成的文件。"""
+    sql = f"""
+    CREATE TABLE IF NOT EXISTS `{manifest_table}` (
+        `path` VARCHAR(512) NOT NULL,
+        `size` BIGINT NOT NULL,
+        `mtime` DOUBLE NOT NULL,
+        `content_hash` CHAR(64) NOT NULL,
+        `rows` BIGINT NOT NULL DEFAULT 0,
+        `imported_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (`path`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+    conn.commit()
+
+
+def load_manifest(conn, manifest_table: str) -> Dict[str, Tuple[int, float, str, int]]:
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT `path`, `size`, `mtime`, `content_hash`, `rows` FROM `{manifest_table}`")
+        return {row[0]: (int(row[1]), float(row[2]), row[3], int(row[4])) for row in cursor.fetchall()}
+
+
+def record_manifest(conn, manifest_table: str, entries: List[Tuple[str, int, float, str, int]]) -> None:
+    if not entries:
+        return
+    sql = f"""
+    INSERT INTO `{manifest_table}` (`path`, `size`, `mtime`, `content_hash`, `rows`, `imported_at`)
+    VALUES (%s, %s, %s, %s, %s, NOW())
+    ON DUPLICATE KEY UPDATE
+        `size` = VALUES(`size`), `mtime` = VALUES(`mtime`),
+        `content_hash` = VALUES(`content_hash`), `rows` = VALUES(`rows`),
+        `imported_at` = VALUES(`imported_at`)
+    """
+    with conn.cursor() as cursor:
+        cursor.executemany(sql, entries)
+    conn.commit()
+
+
+def table_exists(conn, table_name: str) -> bool:
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table_name,),
+        )
+        return cursor.fetchone() is not None
+
+
+def refresh_series_summary(conn, main_table: str, series: List[Tuple[str, str, str]]) -> None:
+    """按主表重算这些序列的汇总行。
+
+    INSERT IGNORE / REPLACE 合并时新旧数据可能重叠，无法按导入行数累加，
+    因此每个序列按主键前缀 (symbol, exchange, interval) 区间重新计数。
+    """
+    sql = f"""
+    REPLACE INTO `{SUMMARY_TABLE}` (`symbol`, `exchange`, `interval`, `bar_count`, `first_datetime`, `last_datetime`)
+    SELECT `symbol`, `exchange`, `interval`, COUNT(*), MIN(`datetime`), MAX(`datetime`)
+    FROM `{main_table}`
+    WHERE `symbol` = %s AND `exchange` = %s AND `interval` = %s
+    GROUP BY `symbol`, `exchange`, `interval`
+    """
+    with conn.cursor() as cursor:
+        for key in series:
+            cursor.execute(sql, key)
+
+
+def bump_import_version(conn) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute(f"UPDATE `{IMPORT_VERSION_TABLE}` SET `version` = `version` + 1 WHERE `id` = 1")
+
+
+def forget_manifest(conn, manifest_table: str, paths: List[str]) -> None:
+    if not paths:
+        return
+    with conn.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM `{manifest_table}` WHERE `path` = %s", [(path,) for path in paths])
+    conn.commit()
+
+
+def file_signature(path: Path) -> Tuple[int, float]:
+    st = path.stat()
+    return st.st_size, st.st_mtime
+
+
+def file_content_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 def extract_contract_year(symbol: str) -> Optional[int]:
     """
     从合约代码提取年份
@@ -359,37 +488,189 @@ def merge_stage_to_main(conn, stage_table: str, main_table: str, replace_duplica
     FROM `{stage_table}`
     """
     with conn.cursor() as cursor:
-        affected = cursor.execute(sql)
-    conn.commit()
-    return affected
+        return cursor.execute(sql)
 
 
-def import_one_file(conn, contract_file: ContractFile) -> int:
-    print(
-        f"[读取] {contract_file.path} "
-        f"-> symbol={contract_file.symbol}, exchange={contract_file.exchange}, year={contract_file.contract_year}"
-    )
+def frame_series(frames: List[pd.DataFrame]) -> List[Tuple[str, str, str]]:
+    """一批标准化数据中的 (symbol, exchange, interval) 序列；每个文件只含一个合约。"""
+    return sorted({
+        (frame["symbol"].iat[0], frame["exchange"].iat[0], frame["interval"].iat[0]) for frame in frames
+    })
 
-    df_raw = pd.read_csv(contract_file.path, encoding=CSV_ENCODING)
-    df_std = build_standard_dataframe(df_raw, contract_file.symbol, contract_file.exchange)
 
-    if df_std.empty:
-        print(f"[跳过] {contract_file.path.name}: 无有效数据")
-        return 0
+def merge_batch(conn, stage_table: str, frames: List[pd.DataFrame],
+                update_summary: bool = True, bump_version: bool = True) -> int:
+    """把一批文件的数据经 worker 自己的 stage 表一次性合并进主表。
 
-    stage_table = f"{DB_TABLE}_stage"
+    合并、这批序列的汇总行更新和导入版本号递增在同一事务中提交。
+    """
     truncate_table(conn, stage_table)
-
-    temp_csv_path = write_temp_csv_for_load(df_std)
+    temp_csv_path = write_temp_csv_for_load(pd.concat(frames, ignore_index=True))
     try:
         load_temp_csv_into_stage(conn, stage_table, temp_csv_path)
         affected = merge_stage_to_main(conn, stage_table, DB_TABLE, REPLACE_DUPLICATES)
+        if update_summary:
+            refresh_series_summary(conn, DB_TABLE, frame_series(frames))
+        if bump_version:
+            bump_import_version(conn)
+        conn.commit()
+        return affected
     finally:
         if os.path.exists(temp_csv_path):
             os.remove(temp_csv_path)
 
-    print(f"[写入] {contract_file.path.name}: 标准化 {len(df_std)} 条, 合并影响 {affected} 条")
-    return len(df_std)
+
+def import_worker(worker_id: int, tasks: List[Tuple[ContractFile, str, Optional[Tuple[str, int]]]]) -> Dict[str, float]:
+    """
+    在子进程中运行：解析分到的文件，按批次合并，并在每批合并后写入清单。
+
+    tasks 元素为 (合约文件, 清单中的相对路径, 清单中已有的 (内容哈希, 行数))。
+    """
+    stats = {"worker": worker_id, "files": 0, "unchanged": 0, "failed": 0, "rows": 0, "bytes": 0, "seconds": 0.0}
+    merged_series = set()
+    started = time.monotonic()
+    stage_table = f"{DB_TABLE}_stage_w{worker_id}"
+
+    conn = get_connection()
+    try:
+        create_stage_table(conn, stage_table)
+        # 汇总表和版本表由后端初始化；汇总表尚未创建时由后端首次刷新统计时从主表补建
+        update_summary = table_exists(conn, SUMMARY_TABLE)
+        bump_version = table_exists(conn, IMPORT_VERSION_TABLE)
+
+        frames: List[pd.DataFrame] = []
+        pending: List[Tuple[str, int, float, str, int]] = []
+        pending_rows = 0
+
+        def flush() -> None:
+            nonlocal frames, pending, pending_rows
+            if frames:
+                affected = merge_batch(conn, stage_table, frames, update_summary, bump_version)
+                merged_series.update((symbol, exchange) for symbol, exchange, _ in frame_series(frames))
+                print(f"[合并] worker={worker_id} 文件 {len(pending)} 个, 标准化 {pending_rows} 条, 合并影响 {affected} 条")
+            record_manifest(conn, MANIFEST_TABLE, pending)
+            frames, pending, pending_rows = [], [], 0
+
+        for contract_file, rel_path, previous in tasks:
+            try:
+                size, mtime = file_signature(contract_file.path)
+                content_hash = file_content_hash(contract_file.path)
+                if previous is not None and previous[0] == content_hash:
+                    # 内容未变，只是 mtime 变化：更新清单即可，保留上次导入的行数
+                    pending.append((rel_path, size, mtime, content_hash, previous[1]))
+                    stats["unchanged"] += 1
+                    continue
+
+                df_raw = pd.read_csv(contract_file.path, encoding=CSV_ENCODING)
+                df_std = build_standard_dataframe(df_raw, contract_file.symbol, contract_file.exchange)
+                if df_std.empty:
+                    print(f"[跳过] {contract_file.path.name}: 无有效数据")
+                else:
+                    frames.append(df_std)
+                    pending_rows += len(df_std)
+                pending.append((rel_path, size, mtime, content_hash, len(df_std)))
+                stats["files"] += 1
+                stats["rows"] += len(df_std)
+                stats["bytes"] += size
+            except Exception as exc:
+                stats["failed"] += 1
+                print(f"[失败] {contract_file.path}: {exc}")
+                continue
+
+            if len(pending) >= MERGE_BATCH_FILES or pending_rows >= MERGE_BATCH_ROWS:
+                try:
+                    flush()
+                except Exception as exc:
+                    conn.rollback()
+                    stats["failed"] += len(pending)
+                    print(f"[失败] worker={worker_id} 批次合并失败（{len(pending)} 个文件）: {exc}")
+                    frames, pending, pending_rows = [], [], 0
+
+        try:
+            flush()
+        except Exception as exc:
+            conn.rollback()
+            stats["failed"] += len(pending)
+            print(f"[失败] worker={worker_id} 批次合并失败（{len(pending)} 个文件）: {exc}")
+
+        drop_table(conn, stage_table)
+    finally:
+        conn.close()
+
+    stats["seconds"] = time.monotonic() - started
+    stats["series"] = sorted(merged_series)
+    print(format_throughput(f"worker={worker_id}", stats))
+    return stats
+
+
+def format_throughput(label: str, stats: Dict[str, float]) -> str:
+    seconds = max(stats["seconds"], 1e-6)
+    return (
+        f"[吞吐] {label} 文件 {int(stats['files'])} 个, 未变化 {int(stats['unchanged'])} 个, "
+        f"失败 {int(stats['failed'])} 个, {int(stats['rows'])} 条, 用时 {stats['seconds']:.1f}s, "
+        f"{stats['rows'] / seconds:.0f} 行/秒, {stats['bytes'] / 1024 / 1024 / seconds:.2f} MB/秒"
+    )
+
+
+def materialize_resampled_bars(series: List[Tuple[str, str]], intervals: List[str]) -> int:
+    """由本次合并过的 1m 序列增量生成多周期K线（与后端 /vnpy/resample 相同），返回写入根数。"""
+    written_total = 0
+    with get_db_connection(config_dict=backend_db_config()) as db:
+        track_summary = db.fetchone(
+            "SELECT 1 AS x FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ?",
+            (SUMMARY_TABLE,),
+        ) is not None
+        for index, (symbol, exchange) in enumerate(series, start=1):
+            tracking = (tracking_appends(db, DB_TABLE, symbol, exchange, intervals)
+                        if track_summary else nullcontext())
+            with tracking:
+                written = materialize_series(db, DB_TABLE, symbol=symbol, exchange=exchange, intervals=intervals)
+            if any(written.values()):
+                bump_backend_import_version(db)
+            written_total += sum(written.values())
+            print(f"[重采样] {symbol}.{exchange} ({index}/{len(series)}) 写入 {sum(written.values())} 根")
+    return written_total
+
+
+def plan_tasks(
+    contract_files: List[ContractFile],
+    manifest: Dict[str, Tuple[int, float, str, int]],
+    data_dir: Path,
+    force: bool = False,
+) -> Tuple[List[Tuple[ContractFile, str, Optional[Tuple[str, int]]]], int, List[str]]:
+    """对比清单，返回 (待处理任务, 未变化跳过的文件数, 已从目录删除的清单路径)。
+
+    大小和 mtime 都与清单一致的文件跳过；其余文件带上清单中的内容哈希和行数，
+    由 worker 判断内容是否真的变化。force 时全部重新导入。不在本次候选中、
+    磁盘上也已不存在的清单条目视为已删除（被 PRODUCT_CODES 等条件过滤掉的文件不算）。
+    """
+    tasks: List[Tuple[ContractFile, str, Optional[Tuple[str, int]]]] = []
+    skipped = 0
+    planned = set()
+    for contract_file in contract_files:
+        rel_path = contract_file.path.relative_to(data_dir).as_posix()
+        planned.add(rel_path)
+        entry = None if force else manifest.get(rel_path)
+        if entry is not None:
+            size, mtime = file_signature(contract_file.path)
+            if entry[0] == size and entry[1] == mtime:
+                skipped += 1
+                continue
+        tasks.append((contract_file, rel_path, (entry[2], entry[3]) if entry else None))
+    removed = sorted(
+        path for path in manifest
+        if path not in planned and not (data_dir / path).exists()
+    )
+    return tasks, skipped, removed
+
+
+def distribute_tasks(tasks: List[Tuple[ContractFile, str, Optional[Tuple[str, int]]]], workers: int):
+    """按文件大小从大到小轮流分配，尽量让各 worker 的数据量接近。"""
+    buckets: List[List[Tuple[ContractFile, str, Optional[Tuple[str, int]]]]] = [[] for _ in range(workers)]
+    ordered = sorted(tasks, key=lambda t: t[0].path.stat().st_size, reverse=True)
+    for index, task in enumerate(ordered):
+        buckets[index % workers].append(task)
+    return [bucket for bucket in buckets if bucket]
 
 
 def main() -> int:
@@ -428,6 +709,7 @@ def main() -> int:
 
     print(f"[配置] data_dir={data_dir}")
     print(f"[配置] mysql={DB_HOST}:{DB_PORT}/{DB_NAME} table={DB_TABLE} user={DB_USER}")
+    print(f"[配置] workers={IMPORT_WORKERS} merge_batch_files={MERGE_BATCH_FILES} manifest={MANIFEST_TABLE}")
     if PRODUCT_CODES:
         print(f"[配置] product_codes={','.join(sorted(PRODUCT_CODES))}")
     print(f"[发现] 共 {len(contract_files)} 个合约文件符合条件（年份 >= {MIN_CONTRACT_YEAR}）")
@@ -435,29 +717,51 @@ def main() -> int:
     conn = get_connection()
     try:
         create_main_table_if_needed(conn, DB_TABLE)
-        create_stage_table(conn, f"{DB_TABLE}_stage")
+        added = ensure_partitions(DB_TABLE)
+        if added:
+            print(f"[分区] {DB_TABLE} 新增分区: {', '.join(added)}")
+        create_manifest_table_if_needed(conn, MANIFEST_TABLE)
 
         if TRUNCATE_BEFORE_IMPORT:
             print(f"[清空] {DB_TABLE}")
             truncate_table(conn, DB_TABLE)
+            truncate_table(conn, MANIFEST_TABLE)
+            if table_exists(conn, SUMMARY_TABLE):
+                truncate_table(conn, SUMMARY_TABLE)
+
+        manifest = load_manifest(conn, MANIFEST_TABLE)
+        tasks, skipped, removed = plan_tasks(contract_files, manifest, data_dir, force=FORCE_REIMPORT)
+        # 只删除清单条目，已导入的K线保留；同名文件重新出现时会重新导入
+        forget_manifest(conn, MANIFEST_TABLE, removed)
+    finally:
+        conn.close()
 
-        total_files = 0
-        total_rows = 0
-
-        for contract_file in contract_files:
-            try:
-                inserted_rows = import_one_file(conn, contract_file)
-                total_files += 1
-                total_rows += inserted_rows
-            except Exception as exc:
-                conn.rollback()
-                print(f"[失败] {contract_file.path}: {exc}")
-
-        print(f"[完成] 成功处理 {total_files} 个文件，标准化导入 {total_rows} 条")
+    print(f"[清单] 已导入且未变化 {skipped} 个，待处理 {len(tasks)} 个，已删除的文件 {len(removed)} 个")
+    if not tasks:
+        print("[完成] 没有需要导入的文件")
         return 0
 
-    finally:
-        conn.close()
+    started = time.monotonic()
+    totals = {"files": 0, "unchanged": 0, "failed": 0, "rows": 0, "bytes": 0, "seconds": 0.0}
+    merged_series = set()
+    buckets = distribute_tasks(tasks, max(1, IMPORT_WORKERS))
+    with ProcessPoolExecutor(max_workers=len(buckets)) as pool:
+        futures = [pool.submit(import_worker, worker_id, bucket) for worker_id, bucket in enumerate(buckets)]
+        for future in as_completed(futures):
+            stats = future.result()
+            for key in ("files", "unchanged", "failed", "rows", "bytes"):
+                totals[key] += stats[key]
+            merged_series.update(stats["series"])
+    totals["seconds"] = time.monotonic() - started
+
+    print(format_throughput("合计", totals))
+    print(f"[完成] 成功处理 {int(totals['files'])} 个文件，标准化导入 {int(totals['rows'])} 条")
+
+    if INTERVAL_VALUE == SOURCE_INTERVAL and RESAMPLE_INTERVALS and merged_series:
+        print(f"[重采样] 合约 {len(merged_series)} 个，周期: {','.join(RESAMPLE_INTERVALS)}")
+        written = materialize_resampled_bars(sorted(merged_series), RESAMPLE_INTERVALS)
+        print(f"[重采样] 完成，写入 {written} 根K线")
+    return 0
 
 
 if __name__ == "__main__":
@@ -4,17 +4,29 @@
 import os
 import argparse
 import pickle
+import re
+import shutil
+import signal
+import sys
 import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import h5py
+import numpy as np
+import pandas as pd
 import pymysql
 
 
+# Per-series bar summary kept in step with every load (see app/market_data/bar_summary.py)
+SUMMARY_TABLE = "vnpy_bar_summary"
+# Counter the backend's bar query cache is keyed on (see app/market_data/bars.py)
+IMPORT_VERSION_TABLE = "vnpy_import_version"
+
 LOAD_COLUMNS = """
 symbol,
 exchange,
-datetime,
+@ymd,
 `interval`,
 volume,
 turnover,
@@ -51,21 +63,92 @@ def load_instrument_exchange_map(pk_path: str) -> dict[str, str]:
     return mapping
 
 
-def normalize_dt(raw_dt) -> str:
-    s = str(raw_dt).strip()
-    s = s[:8]
-    if len(s) != 8 or not s.isdigit():
-        raise ValueError(f"invalid datetime: {raw_dt}")
-    return f"{s[:4]}-{s[4:6]}-{s[6:8]} 00:00:00"
+def normalize_dt_column(raw) -> np.ndarray:
+    """Vectorized date parsing for a futures.h5 `datetime` column.
+
+    Numbers are YYYYMMDD or YYYYMMDDHHMMSS; strings and bytes contribute their
+    first 8 characters, which must be digits (so "20200102 00:00" parses).
+    Only the date part is kept (daily bars) and returned as YYYYMMDD int64.
+    Unparseable values become 0 so the caller can drop them.
+    """
+    values = np.asarray(raw)
+    if values.dtype.kind == "O":
+        values = np.array([v.decode() if isinstance(v, bytes) else str(v) for v in values], dtype=str)
+    if values.dtype.kind in "SU":
+        text = np.char.strip(values.astype(str))
+        head = text.astype("U8")
+        digits = (np.char.str_len(head) == 8) & np.char.isdigit(head)
+        ymd = np.zeros(len(text), dtype=np.int64)
+        ymd[digits] = head[digits].astype(np.int64)
+    else:
+        ymd = values.astype(np.int64)
+        while True:
+            over = ymd >= 100_000_000
+            if not over.any():
+                break
+            ymd = np.where(over, ymd // 10, ymd)
+
+    month = ymd // 100 % 100
+    day = ymd % 100
+    valid = (ymd >= 10_000_000) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    return np.where(valid, ymd, 0)
+
 
+def export_dataset_frame(symbol: str, data: np.ndarray, exchange: str,
+                         after_ymd: int = 0) -> pd.DataFrame | None:
+    """Convert one futures.h5 dataset into the LOAD_COLUMNS layout, or None if unusable.
 
-def export_h5_to_csv(h5_path: str, csv_path: str, exchange_map: dict[str, str]) -> tuple[int, int, int]:
+    Only bars dated after `after_ymd` (YYYYMMDD, 0 = all) are kept.
+    """
+    cols = data.dtype.names
+    if not cols or not {"datetime", "open", "high", "low", "close"}.issubset(cols):
+        return None
+
+    ymd = normalize_dt_column(data["datetime"])
+    valid = ymd > after_ymd
+    count = int(valid.sum())
+    if count == 0:
+        return None
+
+    def column(*names):
+        for name in names:
+            if name in cols:
+                return np.asarray(data[name])[valid]
+        return np.zeros(count)
+
+    return pd.DataFrame({
+        "symbol": symbol,
+        "exchange": exchange,
+        "datetime": ymd[valid],
+        "interval": "d",
+        "volume": column("volume"),
+        "turnover": column("total_turnover", "turnover"),
+        "open_interest": column("open_interest"),
+        "open_price": column("open"),
+        "high_price": column("high"),
+        "low_price": column("low"),
+        "close_price": column("close"),
+    })
+
+
+def export_chunk_to_csv(h5_path: str, symbols: list[str], exchange_map: dict[str, str],
+                        csv_path: str, high_water: dict[str, int] | None = None
+                        ) -> tuple[int, int, int, list[tuple]]:
+    """Export a batch of datasets to one CSV file. Runs in a worker process.
+
+    high_water maps symbol -> last imported YYYYMMDD for incremental imports.
+    Also returns (symbol, exchange, rows, first_ymd, last_ymd) per exported
+    dataset.
+    """
+    high_water = high_water or {}
     rows = 0
     datasets = 0
     missing_exchange = 0
+    frames = []
+    series = []
 
-    with h5py.File(h5_path, "r") as f, open(csv_path, "w", encoding="utf-8", newline="") as out:
-        for symbol in f.keys():
+    with h5py.File(h5_path, "r") as f:
+        for symbol in symbols:
             ds = f[symbol]
             if not isinstance(ds, h5py.Dataset):
                 continue
@@ -75,41 +158,49 @@ def export_h5_to_csv(h5_path: str, csv_path: str, exchange_map: dict[str, str])
             if not exchange:
                 missing_exchange += 1
 
-            data = ds[:]
-            cols = data.dtype.names
-            if not cols:
-                continue
+            frame = export_dataset_frame(symbol, ds[:], exchange, high_water.get(symbol, 0))
+            if frame is not None:
+                frames.append(frame)
+                rows += len(frame)
+                dates = frame["datetime"]
+                series.append((symbol, exchange, len(frame), int(dates.min()), int(dates.max())))
 
-            has_dt = "datetime" in cols
-            has_open = "open" in cols
-            has_high = "high" in cols
-            has_low = "low" in cols
-            has_close = "close" in cols
-            has_volume = "volume" in cols
-            has_turnover = "total_turnover" in cols or "turnover" in cols
-            has_oi = "open_interest" in cols
+    if frames:
+        pd.concat(frames, ignore_index=True).to_csv(
+            csv_path, header=False, index=False, lineterminator="\n",
+        )
+    return rows, datasets, missing_exchange, series
 
-            if not (has_dt and has_open and has_high and has_low and has_close):
-                continue
 
-            for r in data:
-                try:
-                    dt = normalize_dt(r["datetime"])
-                    volume = r["volume"] if has_volume else 0
-                    turnover = r["total_turnover"] if "total_turnover" in cols else (r["turnover"] if "turnover" in cols else 0)
-                    open_interest = r["open_interest"] if has_oi else 0
+def iter_exported_chunks(h5_path: str, exchange_map: dict[str, str], tmp_dir: str,
+                         workers: int, chunk_datasets: int,
+                         high_water: dict[tuple[str, str], int] | None = None):
+    """Export futures.h5 in parallel.
 
-                    line = (
-                        f"{symbol},{exchange},{dt},d,"
-                        f"{volume},{turnover},{open_interest},"
-                        f"{r['open']},{r['high']},{r['low']},{r['close']}\n"
-                    )
-                    out.write(line)
-                    rows += 1
-                except Exception:
-                    continue
+    Yields (csv_path, rows, datasets, missing_exchange, series, done_chunks, total_chunks).
 
-    return rows, datasets, missing_exchange
+    Chunks are yielded as soon as a worker finishes them so the caller can load
+    one chunk into MariaDB while the remaining ones are still being parsed.
+    """
+    with h5py.File(h5_path, "r") as f:
+        symbols = list(f.keys())
+    chunks = [symbols[i:i + chunk_datasets] for i in range(0, len(symbols), chunk_datasets)]
+
+    # Workers die on SIGTERM outright; only the main process needs to clean up.
+    with ProcessPoolExecutor(max_workers=workers, initializer=signal.signal,
+                             initargs=(signal.SIGTERM, signal.SIG_DFL)) as pool:
+        futures = {}
+        for index, chunk in enumerate(chunks):
+            csv_path = str(Path(tmp_dir) / f"chunk_{index:05d}.csv")
+            chunk_map = {s: exchange_map.get(s, "") for s in chunk}
+            chunk_marks = {
+                s: high_water[(s, chunk_map[s])]
+                for s in chunk if high_water and (s, chunk_map[s]) in high_water
+            }
+            futures[pool.submit(export_chunk_to_csv, h5_path, chunk, chunk_map, csv_path, chunk_marks)] = csv_path
+        for done, future in enumerate(as_completed(futures), start=1):
+            rows, datasets, missing_exchange, series = future.result()
+            yield futures[future], rows, datasets, missing_exchange, series, done, len(chunks)
 
 
 def get_conn():
@@ -138,31 +229,155 @@ def get_conn():
     )
 
 
-def truncate_table(conn, table: str) -> None:
+def _ymd_to_datetime(ymd: int) -> str:
+    return f"{ymd // 10000:04d}-{ymd // 100 % 100:02d}-{ymd % 100:02d} 00:00:00"
+
+
+def load_summarized_series(conn) -> set[tuple[str, str]]:
+    """(symbol, exchange) pairs whose daily bars already have a summary row."""
     with conn.cursor() as cur:
-        cur.execute(f"TRUNCATE TABLE `{table}`")
+        cur.execute(f"SELECT symbol, exchange FROM `{SUMMARY_TABLE}` WHERE `interval` = 'd'")
+        return {(symbol, exchange) for symbol, exchange in cur.fetchall()}
+
 
+def merge_summary(conn, table: str, series: list[tuple], summarized: set[tuple[str, str]]) -> None:
+    """Add appended daily bars to the summary rows of their series.
+
+    Incremental imports only load bars after each series' last bar, so counts
+    simply add up. Series that have no summary row yet are counted from the
+    table once (a range scan on the series' key).
+    """
+    appended = [
+        (symbol, exchange, count, _ymd_to_datetime(first), _ymd_to_datetime(last))
+        for symbol, exchange, count, first, last in series if (symbol, exchange) in summarized
+    ]
+    with conn.cursor() as cur:
+        if appended:
+            cur.executemany(
+                f"INSERT INTO `{SUMMARY_TABLE}` "
+                f"(symbol, exchange, `interval`, bar_count, first_datetime, last_datetime) "
+                f"VALUES (%s, %s, 'd', %s, %s, %s) "
+                f"ON DUPLICATE KEY UPDATE bar_count = bar_count + VALUES(bar_count), "
+                f"first_datetime = LEAST(first_datetime, VALUES(first_datetime)), "
+                f"last_datetime = GREATEST(last_datetime, VALUES(last_datetime))",
+                appended,
+            )
+        for symbol, exchange, *_ in series:
+            if (symbol, exchange) in summarized:
+                continue
+            cur.execute(
+                f"REPLACE INTO `{SUMMARY_TABLE}` "
+                f"(symbol, exchange, `interval`, bar_count, first_datetime, last_datetime) "
+                f"SELECT symbol, exchange, `interval`, COUNT(*), MIN(datetime), MAX(datetime) "
+                f"FROM `{table}` WHERE symbol = %s AND exchange = %s AND `interval` = 'd' "
+                f"GROUP BY symbol, exchange, `interval`",
+                (symbol, exchange),
+            )
+            summarized.add((symbol, exchange))
+
+
+def write_daily_summary(conn, series: list[tuple]) -> None:
+    """Set the summary rows of series whose daily bars were just reloaded."""
+    with conn.cursor() as cur:
+        cur.executemany(
+            f"REPLACE INTO `{SUMMARY_TABLE}` "
+            f"(symbol, exchange, `interval`, bar_count, first_datetime, last_datetime) "
+            f"VALUES (%s, %s, 'd', %s, %s, %s)",
+            [(symbol, exchange, count, _ymd_to_datetime(first), _ymd_to_datetime(last))
+             for symbol, exchange, count, first, last in series],
+        )
+
+
+def bump_import_version(conn) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"UPDATE `{IMPORT_VERSION_TABLE}` SET version = version + 1 WHERE id = 1")
 
-def load_csv(conn, csv_path: str, table: str) -> int:
+
+def load_high_water_marks(conn, table: str) -> dict[tuple[str, str], int]:
+    """Return the last imported daily bar per (symbol, exchange) as YYYYMMDD."""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT symbol, exchange, MAX(datetime) FROM `{table}` "
+            f"WHERE `interval` = 'd' GROUP BY symbol, exchange"
+        )
+        return {
+            (symbol, exchange): int(max_dt.strftime("%Y%m%d"))
+            for symbol, exchange, max_dt in cur.fetchall()
+            if max_dt is not None
+        }
+
+
+def load_daily_series(conn, table: str) -> set[tuple[str, str]]:
+    """(symbol, exchange) pairs that have daily bars in `table`."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT DISTINCT symbol, exchange FROM `{table}` WHERE `interval` = 'd'")
+        return {(symbol, exchange) for symbol, exchange in cur.fetchall()}
+
+
+def delete_daily_series(conn, table: str, keys) -> None:
+    """Delete the daily bars (and their summary rows) of the given series.
+
+    Each delete is a range on the (symbol, exchange, interval, datetime) key,
+    so minute and resampled bars of the same contracts are not touched.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    with conn.cursor() as cur:
+        cur.executemany(
+            f"DELETE FROM `{table}` WHERE symbol = %s AND exchange = %s AND `interval` = 'd'", keys,
+        )
+        cur.executemany(
+            f"DELETE FROM `{SUMMARY_TABLE}` WHERE symbol = %s AND exchange = %s AND `interval` = 'd'", keys,
+        )
+
+
+def table_has_daily_bars(conn, table: str) -> bool:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT 1 FROM `{table}` WHERE `interval` = 'd' LIMIT 1")
+        return cur.fetchone() is not None
+
+
+def load_csv(conn, csv_path: str, table: str, replace: bool = False) -> int:
+    duplicates = "REPLACE" if replace else ""
     sql = f"""
     LOAD DATA LOCAL INFILE %s
-    INTO TABLE `{table}`
+    {duplicates} INTO TABLE `{table}`
     CHARACTER SET utf8mb4
     FIELDS TERMINATED BY ','
     LINES TERMINATED BY '\\n'
     ({LOAD_COLUMNS})
+    SET datetime = STR_TO_DATE(@ymd, '%%Y%%m%%d')
     """
     with conn.cursor() as cur:
         cur.execute(sql, (csv_path,))
         return cur.rowcount or 0
 
 
+def _exit_on_sigterm(signum, frame):
+    # Unwind through main()'s cleanup (rollback, temp dir) when cancelled.
+    sys.exit(128 + signum)
+
+
 def main():
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
     parser = argparse.ArgumentParser(description="Import rqalpha futures.h5 into MariaDB dbbardata")
     parser.add_argument("--h5", required=True, help="Path to futures.h5")
     parser.add_argument("--pk", required=True, help="Path to instruments.pk")
     parser.add_argument("--table", default=os.getenv("DB_TABLE", "dbbardata"))
+    parser.add_argument("--mode", choices=("auto", "incremental", "full"), default="auto",
+                        help="incremental: only bars newer than the per-contract high-water mark; "
+                             "full: reload every contract's daily bars, one chunk per transaction; "
+                             "auto: incremental when daily bars already exist")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Parallel h5 export processes")
+    parser.add_argument("--chunk-datasets", type=int, default=200,
+                        help="Datasets per exported CSV chunk")
     args = parser.parse_args()
+    table = (args.table or "dbbardata").strip()
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", table):
+        raise ValueError("DB_TABLE/--table must be a simple table name in DB_NAME")
+    args.table = table
 
     h5_path = Path(args.h5)
     pk_path = Path(args.pk)
@@ -172,42 +387,81 @@ def main():
     if not pk_path.exists():
         raise FileNotFoundError(pk_path)
 
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".csv")
-    csv_path = tmp.name
-    tmp.close()
+    tmp_dir = tempfile.mkdtemp(prefix="futures_import_")
 
     conn = None
+    mode = args.mode
     try:
         print("Loading instruments.pk ...")
         exchange_map = load_instrument_exchange_map(str(pk_path))
         print(f"Loaded exchange map: {len(exchange_map)}")
 
-        print("Reading futures.h5 ...")
-        rows, datasets, missing_exchange = export_h5_to_csv(str(h5_path), csv_path, exchange_map)
-        print(f"Parsed rows={rows}, datasets={datasets}, missing_exchange_datasets={missing_exchange}")
-
-        if rows == 0:
-            raise RuntimeError("No rows parsed from futures.h5")
-
         conn = get_conn()
+        if mode == "auto":
+            mode = "incremental" if table_has_daily_bars(conn, args.table) else "full"
+        print(f"Import mode: {mode}")
+
+        high_water = None
+        summarized = set()
+        stored = set()
+        if mode == "incremental":
+            high_water = load_high_water_marks(conn, args.table)
+            print(f"Loaded high-water marks: {len(high_water)} contracts")
+            summarized = load_summarized_series(conn)
+        else:
+            stored = load_daily_series(conn, args.table)
+            print(f"Loaded stored daily series: {len(stored)}")
+
+        print(f"Reading futures.h5 with {args.workers} workers ...")
+        print("Loading data into MariaDB ...")
+        rows = datasets = missing_exchange = affected = 0
+        exported = set()
+        for csv_path, chunk_rows, chunk_datasets, chunk_missing, chunk_series, done, total in iter_exported_chunks(
+            str(h5_path), exchange_map, tmp_dir, max(1, args.workers), max(1, args.chunk_datasets),
+            high_water,
+        ):
+            rows += chunk_rows
+            datasets += chunk_datasets
+            missing_exchange += chunk_missing
+            if chunk_rows:
+                # Bars and summary rows of a chunk go in one transaction, so
+                # readers see each series either before or after its reload.
+                if mode == "full":
+                    keys = [(symbol, exchange) for symbol, exchange, *_ in chunk_series]
+                    delete_daily_series(conn, args.table, keys)
+                    exported.update(keys)
+                affected += load_csv(conn, csv_path, args.table, replace=True)
+                if mode == "incremental":
+                    merge_summary(conn, args.table, chunk_series, summarized)
+                else:
+                    write_daily_summary(conn, chunk_series)
+                bump_import_version(conn)
+                conn.commit()
+            Path(csv_path).unlink(missing_ok=True)
+            print(f"Loaded chunk {done}/{total}: rows={chunk_rows}")
 
-        print(f"Truncating table `{args.table}` ...")
-        truncate_table(conn, args.table)
+        print(f"Parsed rows={rows}, datasets={datasets}, missing_exchange_datasets={missing_exchange}")
 
-        print("Loading data into MariaDB ...")
-        affected = load_csv(conn, csv_path, args.table)
+        if mode == "full":
+            if rows == 0:
+                raise RuntimeError("No rows parsed from futures.h5")
+            stale = stored - exported
+            if stale:
+                delete_daily_series(conn, args.table, sorted(stale))
+                bump_import_version(conn)
+                conn.commit()
+            print(f"Removed stale daily series: {len(stale)}")
 
-        conn.commit()
-        print(f"Import finished. affected_rows={affected}")
+        print(f"Import finished. mode={mode}, affected_rows={affected}")
 
-    except Exception:
+    except BaseException:
         if conn is not None:
             conn.rollback()
         raise
     finally:
         if conn is not None:
             conn.close()
-        Path(csv_path).unlink(missing_ok=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
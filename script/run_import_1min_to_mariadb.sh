@@ -23,6 +23,13 @@ DB_NAME="${DB_NAME:-$(get_backend_env DB_NAME || true)}"
 DB_USER="${DB_USER:-$(get_backend_env DB_USER || true)}"
 DB_PASSWORD="${DB_PASSWORD:-$(get_backend_env DB_PASSWORD || true)}"
 DB_TABLE="${DB_TABLE:-$(get_backend_env DB_TABLE || true)}"
+# 导入后生成的多周期K线，与后端保持一致；未设置时使用脚本默认值（5m,15m,1h），设为空字符串则不生成
+if [[ -z "${MARKET_DATA_RESAMPLE_INTERVALS+x}" ]]; then
+  backend_resample_intervals="$(get_backend_env MARKET_DATA_RESAMPLE_INTERVALS || true)"
+  if [[ -n "$backend_resample_intervals" ]]; then
+    MARKET_DATA_RESAMPLE_INTERVALS="$backend_resample_intervals"
+  fi
+fi
 
 DB_HOST="${DB_HOST:-mariadb}"
 DB_PORT="${DB_PORT:-3306}"
@@ -36,6 +43,9 @@ REPLACE_DUPLICATES="${REPLACE_DUPLICATES:-0}"
 MIN_CONTRACT_YEAR="${MIN_CONTRACT_YEAR:-2015}"
 INTERVAL_VALUE="${INTERVAL_VALUE:-1m}"
 CSV_ENCODING="${CSV_ENCODING:-utf-8}"
+IMPORT_WORKERS="${IMPORT_WORKERS:-4}"
+MERGE_BATCH_FILES="${MERGE_BATCH_FILES:-20}"
+FORCE_REIMPORT="${FORCE_REIMPORT:-0}"
 
 # 默认只导入这些品种。传入 all 时改为全量导入。
 IMPORT_PRODUCT_CODES=(
@@ -98,12 +108,19 @@ docker_args=(
   -e "MIN_CONTRACT_YEAR=$MIN_CONTRACT_YEAR"
   -e "INTERVAL_VALUE=$INTERVAL_VALUE"
   -e "CSV_ENCODING=$CSV_ENCODING"
+  -e "IMPORT_WORKERS=$IMPORT_WORKERS"
+  -e "MERGE_BATCH_FILES=$MERGE_BATCH_FILES"
+  -e "FORCE_REIMPORT=$FORCE_REIMPORT"
 )
 
 if [[ -n "$PRODUCT_CODES" ]]; then
   docker_args+=(-e "PRODUCT_CODES=$PRODUCT_CODES")
 fi
 
+if [[ -n "${MARKET_DATA_RESAMPLE_INTERVALS+x}" ]]; then
+  docker_args+=(-e "MARKET_DATA_RESAMPLE_INTERVALS=$MARKET_DATA_RESAMPLE_INTERVALS")
+fi
+
 docker "${docker_args[@]}" \
   --entrypoint python \
   "$IMAGE" \